@@ -7,19 +7,49 @@
 import json
 import logging
 import asyncio
-from flask import Flask, render_template, request, jsonify
-from flask_socketio import SocketIO, emit
-import requests
-from simulation_service import MCPService
+import os
+from flask import Flask, Response, render_template, request, jsonify, g, send_file, abort, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from flask_socketio import SocketIO, emit, join_room
+from simulation_service import mcp_service, ollama_model_name
+from scene_registry import scene_registry, normalize_session_id
+from live_simulation import live_manager
+from parameter_sweep import sweep_manager
+import compression
+import gltf_export
+import trajectory_recorder
+import metrics
+import profiling
+import scene_events
+import serialization
+import outbound
 import threading
 import time
-import ollama
-import uuid
 import re
 
+class SerializationJSONProvider(DefaultJSONProvider):
+    """jsonify和request.get_json使用serialization：NumPy数组和形状直接编码，不先转为嵌套列表"""
+
+    def dumps(self, obj, **kwargs):
+        return serialization.dumps(obj)
+
+    def loads(self, s, **kwargs):
+        return serialization.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(serialization.dumps_bytes(obj), mimetype=self.mimetype)
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
-socketio = SocketIO(app, cors_allowed_origins="*")
+app.json = SerializationJSONProvider(app)
+# 大消息压缩为二进制附件（WebSocket）；长轮询传输由Engine.IO按同一阈值做HTTP压缩
+socketio = SocketIO(app, cors_allowed_origins="*", json=metrics.CountingJSON,
+                    serializer=compression.CompressingPacket,
+                    http_compression=compression.HTTP_COMPRESSION,
+                    compression_threshold=compression.COMPRESSION_MIN_BYTES)
+# 发往单个客户端的消息经有界出站队列发送，慢客户端不会让服务端无限缓存
+outbound_queue = outbound.OutboundManager(socketio)
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -30,25 +60,69 @@ simulation_data = {}
 
 # Ollama配置
 OLLAMA_MODEL = "modelscope.cn/unsloth/DeepSeek-R1-0528-Qwen3-8B-GGUF:Q4_K_M"  # 使用本地可用模型
-OLLAMA_BASE_URL = "http://localhost:11434"  # Ollama默认地址
 
-# 初始化Ollama客户端
-try:
-    ollama_client = ollama.Client(host=OLLAMA_BASE_URL)
-    # 测试连接
-    models = ollama_client.list()
-    logger.info(f"Ollama连接成功，可用模型: {[model['name'] for model in models['models']]}")
-except Exception as e:
-    logger.warning(f"Ollama连接失败: {e}")
-    ollama_client = None
+# MCP服务复用simulation_service中的全局实例，Ollama在后台探测，不阻塞启动
+readiness = mcp_service.readiness
+
+def get_ollama_client():
+    """获取Ollama客户端，后台探测确认不可用时返回None"""
+    return mcp_service.ollama_client
+
+# Socket.IO连接的sid -> 场景会话ID
+socket_sessions = {}
+
+def scene_room(session_id: str) -> str:
+    """同一场景的所有Socket.IO连接加入的房间"""
+    return f"scene:{session_id}"
+
+def current_session_id() -> str:
+    """当前请求的场景会话：Socket.IO事件用连接时指定的session_id（未指定时为sid），
+    REST请求用X-Session-ID请求头（未指定时为默认场景）"""
+    sid = getattr(request, 'sid', None)
+    if sid:
+        return socket_sessions.get(sid, sid)
+    return g.get('session_id') or normalize_session_id(request.headers.get('X-Session-ID'))
+
+def current_scene():
+    return scene_registry.get(current_session_id())
+
+def broadcast_live_frame(session_id: str, frame: dict) -> int:
+    """实时仿真快照发给场景房间内的每个连接，返回连接数；经出站队列发送，慢客户端只保留最新的帧"""
+    try:
+        participants = list(socketio.server.manager.get_participants('/', scene_room(session_id)))
+    except (AttributeError, KeyError):
+        return 0
+    for sid, _ in participants:
+        outbound_queue.send(sid, 'live_frame', frame, outbound.FRAME, key=session_id)
+    return len(participants)
+
+live_manager.on_frame = broadcast_live_frame
+
+def publish_live_result(session_id: str, action: str, result: dict, skip_sid=None) -> None:
+    """实时仿真状态变化通知同一场景的其他连接；单步和停止产生的快照发给整个房间"""
+    if action == 'status':
+        return
+    scene_events.publish(socketio, scene_room(session_id), 'live_status', result['data'], skip_sid=skip_sid)
+    if result.get('frame'):
+        broadcast_live_frame(session_id, result['frame'])
 
-# 初始化MCP服务
-mcp_service = MCPService()
+def publish_sweep_progress(session_id: str, data: dict) -> None:
+    """参数扫描进度（sweep_progress）和结束时的汇总（sweep_result）发给场景房间"""
+    event = 'sweep_progress' if data.get('state') == 'running' else 'sweep_result'
+    scene_events.publish(socketio, scene_room(session_id), event, data)
+
+sweep_manager.on_progress = publish_sweep_progress
 
 
 # FastMCP服务器配置
 FASTMCP_URL = "http://localhost:8000"
 
+# POST /api/sweeps 同步等待扫描结束的最长时间（秒）
+SWEEP_MAX_WAIT = float(os.environ.get("SWEEP_MAX_WAIT", "120"))
+
+# 管理接口令牌（设置后访问 /api/admin/* 需要携带 X-Admin-Token 请求头）
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
 # MCP客户端配置
 MCP_CONFIG = {
     "mcpServers": {
@@ -86,13 +160,19 @@ class MCPClient:
             if not await self.initialize():
                 return {"success": False, "error": "MCP连接未初始化"}
         
+        start = time.perf_counter()
+        status = "ok"
         try:
-            async with self.client:
-                # FastMCP工具期望直接传递参数值
-                result = await self.client.call_tool(tool_name, kwargs)
-                return {"success": True, "result": result}
+            with profiling.stage("mcp_roundtrip"):
+                async with self.client:
+                    # FastMCP工具期望直接传递参数值
+                    result = await self.client.call_tool(tool_name, kwargs)
+            return {"success": True, "result": result}
         except Exception as e:
+            status = "error"
             return {"success": False, "error": str(e)}
+        finally:
+            metrics.MCP_CLIENT_CALL_SECONDS.observe(time.perf_counter() - start, tool=tool_name, status=status)
 
     async def get_tools(self) -> list:
         """获取工具列表"""
@@ -111,13 +191,193 @@ class MCPClient:
 # 创建MCP客户端
 mcp_client = MCPClient(MCP_CONFIG)
 
-# 检查FastMCP服务器可用性并输出工具数量
-try:
+# 作用于场景的MCP工具，Flask调用时附带会话ID
+SCENE_TOOLS = {'create_shape', 'run_simulation', 'reset_view', 'clear_scene', 'get_status', 'process_ai_command',
+               'get_shape_lod', 'export_scene', 'raycast', 'query_radius', 'nearest_shapes', 'query_aabb',
+               'live_control', 'run_sweep', 'move_shape', 'set_transform', 'update_shape', 'delete_shape',
+               'get_simulation_frames', 'get_sweep', 'cancel_sweep'}
+
+# 修改单个形状的工具及其发给场景的差量事件
+SHAPE_DIFF_EVENTS = {'move_shape': 'shape_transformed', 'set_transform': 'shape_transformed',
+                     'update_shape': 'shape_updated', 'delete_shape': 'shape_deleted'}
+
+# 工具列表缓存，避免每条聊天消息都请求一次FastMCP服务器
+TOOLS_CACHE_TTL = float(os.environ.get("TOOLS_CACHE_TTL", "60"))
+_tools_cache = {"tools": [], "expires_at": 0.0}
+_tools_cache_lock = threading.Lock()
+
+def get_cached_tools(force_refresh: bool = False) -> list:
+    """获取工具列表（带TTL缓存）"""
+    with _tools_cache_lock:
+        if not force_refresh and _tools_cache["tools"] and time.time() < _tools_cache["expires_at"]:
+            metrics.record_cache("mcp_tools", hit=True)
+            return _tools_cache["tools"]
+    metrics.record_cache("mcp_tools", hit=False)
     tools = asyncio.run(mcp_client.get_tools())
+    if tools:
+        with _tools_cache_lock:
+            _tools_cache["tools"] = tools
+            _tools_cache["expires_at"] = time.time() + TOOLS_CACHE_TTL
+    return tools
+
+def probe_fastmcp() -> int:
+    """探测FastMCP服务器可用性，并预热工具列表缓存"""
+    tools = get_cached_tools(force_refresh=True)
+    if not tools:
+        raise ConnectionError("FastMCP服务器不可用，将使用本地MCP服务作为备选")
     logger.info(f"FastMCP服务器连接成功，可用工具: {len(tools)}")
-except Exception as e:
-    logger.warning(f"FastMCP服务器连接失败: {e}")
-    logger.warning("将使用本地MCP服务作为备选")
+    return len(tools)
+
+readiness.register("fastmcp", probe_fastmcp, retry_interval=10.0)
+
+def start_background_warmup():
+    """在后台线程中预热外部依赖（Ollama、FastMCP），可重复调用"""
+    readiness.start()
+
+@app.before_request
+def ensure_warmup():
+    """首个请求到来时确保后台预热已启动"""
+    start_background_warmup()
+
+@app.before_request
+def resolve_session():
+    """校验X-Session-ID请求头"""
+    try:
+        g.session_id = normalize_session_id(request.headers.get('X-Session-ID'))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+@app.after_request
+def compress_response(response):
+    """超过阈值的响应按Accept-Encoding压缩（gzip/deflate）；流式响应和send_file不处理。
+    after_request按注册的逆序执行，本函数最先注册，在分析结果写入响应体之后才压缩"""
+    if (not compression.HTTP_COMPRESSION or response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers):
+        return response
+    size = response.content_length or 0
+    if not compression.is_compressible(response.mimetype, size):
+        compression.record_uncompressed(size, "http", "below_threshold" if size < compression.COMPRESSION_MIN_BYTES
+                                        else "incompressible")
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(compression.HTTP_ENCODINGS)
+    if not encoding:
+        compression.record_uncompressed(size, "http", "not_accepted")
+        return response
+    response.set_data(compression.compress(response.get_data(), encoding, "http"))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.before_request
+def start_request_profiling():
+    """请求头 X-Profile: cprofile|sample 开启性能分析（需要管理员，见requested_profile_mode），X-Timing: 1 返回分阶段耗时"""
+    mode = requested_profile_mode(request.headers.get('X-Profile'))
+    timings = request.headers.get('X-Timing', '').lower() in ('1', 'true', 'yes')
+    if mode or timings:
+        g.profile_scope = profiling.ProfileScope(f"http-{request.endpoint}", mode, timings).start()
+
+@app.after_request
+def finish_request_profiling(response):
+    """把分析结果附加到响应（Server-Timing头，JSON响应中的timings字段）"""
+    scope = g.pop('profile_scope', None)
+    if scope is None:
+        return response
+    timer = scope.timer
+    report = scope.stop()
+    if report.get('profile_id'):
+        response.headers['X-Profile-Id'] = report['profile_id']
+    if timer is not None:
+        response.headers['Server-Timing'] = timer.server_timing()
+        body = response.get_json(silent=True) if response.is_json else None
+        if isinstance(body, dict):
+            body['timings'] = report['timings']
+            if report.get('profile_id'):
+                body['profile_id'] = report['profile_id']
+            response.set_data(serialization.dumps_bytes(body))
+    return response
+
+@app.teardown_request
+def cleanup_request_profiling(exc):
+    scope = g.pop('profile_scope', None)
+    if scope is not None:
+        scope.stop()
+
+def socket_profile_scope(event: str, data) -> profiling.ProfileScope:
+    """根据Socket.IO消息中的 profile / timings 字段创建分析范围；profile需要消息中的admin_token
+    或连接握手请求的X-Admin-Token头通过管理员校验"""
+    data = data if isinstance(data, dict) else {}
+    mode = requested_profile_mode(data.get('profile'), data.get('admin_token'))
+    return profiling.ProfileScope(f"socket-{event}", mode, bool(data.get('timings')))
+
+def emit_profile_report(event: str, scope: profiling.ProfileScope, sid=None) -> None:
+    """分析结束后单独发送profile_result事件"""
+    if scope.report:
+        socketio.emit('profile_result', {'event': event, **scope.report}, room=sid or request.sid)
+
+@app.after_request
+def record_request_metrics(response):
+    """按路由记录REST接口耗时"""
+    start = g.pop('request_start', None)
+    if start is not None and request.url_rule is not None:
+        metrics.HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            route=request.url_rule.rule, method=request.method, status=response.status_code
+        )
+    return response
+
+def is_admin(token=None) -> bool:
+    """token为空时取请求头X-Admin-Token；未配置ADMIN_TOKEN时一律拒绝"""
+    if not ADMIN_TOKEN:
+        return False
+    return (token or request.headers.get('X-Admin-Token')) == ADMIN_TOKEN
+
+def require_admin():
+    if not is_admin():
+        abort(403)
+
+def requested_profile_mode(value, token=None):
+    """请求的性能分析模式：需要 PROFILING_ENABLED=1 且通过管理员校验，否则忽略，任何客户端都只能使用分阶段耗时"""
+    if not value or not profiling.PROFILING_ENABLED or not is_admin(token):
+        return None
+    return profiling.parse_profile_mode(value)
+
+@app.route('/api/admin/profiles', methods=['GET'])
+def list_profiles():
+    """列出已保存的性能分析文件"""
+    require_admin()
+    return jsonify({"success": True, "profiles": profiling.list_profiles()})
+
+@app.route('/api/admin/profiles/<name>', methods=['GET'])
+def get_profile(name):
+    """下载性能分析文件（pstats或collapsed-stack），format=text时返回pstats文本摘要"""
+    require_admin()
+    if request.args.get('format') == 'text':
+        summary = profiling.summarize_pstats(name, request.args.get('limit', 30, type=int))
+        if summary is None:
+            return jsonify({"success": False, "error": f"性能分析文件不存在: {name}"}), 404
+        return Response(summary, mimetype='text/plain')
+    path = profiling.profile_path(name)
+    if not path:
+        return jsonify({"success": False, "error": f"性能分析文件不存在: {name}"}), 404
+    return send_file(path, as_attachment=True, download_name=name)
+
+@app.route('/api/admin/sessions', methods=['GET'])
+def list_sessions():
+    """内存中的会话场景及其资源占用"""
+    require_admin()
+    return jsonify({"success": True, **scene_registry.stats(), "live": live_manager.stats(),
+                    "sweeps": sweep_manager.stats(), "outbound": outbound_queue.stats(),
+                    "compression": compression.stats()})
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus格式的运行指标"""
+    return Response(metrics.registry.render(), mimetype=metrics.CONTENT_TYPE)
 
 @app.route('/')
 def index():
@@ -138,16 +398,18 @@ def test_shape():
 def create_shape():
     """创建3D形状API"""
     try:
-        data = request.get_json()
+        with profiling.stage("parse"):
+            data = request.get_json()
         shape_type = data.get('type')
         params = data.get('params', {})
         
         # 使用MCP服务创建形状
-        result = mcp_service.create_shape(shape_type, params)
+        result = current_scene().create_shape(shape_type, params)
         
         if result['success']:
             # 通过WebSocket发送到前端
-            socketio.emit('shape_created', result['data'])
+            with profiling.stage("emit"):
+                scene_events.publish(socketio, scene_room(g.session_id), 'shape_created', result['data'])
             return jsonify({"success": True, "message": f"成功创建{shape_type}"})
         else:
             return jsonify({"success": False, "error": result['error']})
@@ -156,20 +418,156 @@ def create_shape():
         logger.error(f"创建形状失败: {e}")
         return jsonify({"success": False, "error": str(e)})
 
+@app.route('/api/shapes/<int:shape_id>', methods=['PATCH'])
+def update_shape(shape_id):
+    """修改形状的几何参数和/或变换（position、rotation、scale），场景中的连接收到只含变化字段的shape_updated"""
+    try:
+        with profiling.stage("parse"):
+            data = request.get_json() or {}
+        result = current_scene().update_shape(shape_id, data.get('params', data))
+        if result['success']:
+            with profiling.stage("emit"):
+                scene_events.publish(socketio, scene_room(g.session_id), 'shape_updated', result['data'])
+            return jsonify(result)
+        return jsonify(result), 400
+    
+    except Exception as e:
+        logger.error(f"修改形状失败: {e}")
+        return jsonify({"success": False, "error": str(e)})
+
+@app.route('/api/shapes/<int:shape_id>', methods=['DELETE'])
+def delete_shape(shape_id):
+    """删除形状，场景中的连接收到shape_deleted"""
+    try:
+        result = current_scene().delete_shape(shape_id)
+        if result['success']:
+            with profiling.stage("emit"):
+                scene_events.publish(socketio, scene_room(g.session_id), 'shape_deleted', result['data'])
+            return jsonify(result)
+        return jsonify(result), 404
+    
+    except Exception as e:
+        logger.error(f"删除形状失败: {e}")
+        return jsonify({"success": False, "error": str(e)})
+
+@app.route('/api/shapes/<int:shape_id>/transform', methods=['PUT'])
+def set_shape_transform(shape_id):
+    """设置形状变换：position、rotation（欧拉角，度）、scale，或列主序的matrix；offset为相对移动"""
+    try:
+        with profiling.stage("parse"):
+            data = request.get_json() or {}
+        scene = current_scene()
+        if 'offset' in data:
+            result = scene.move_shape(shape_id, position=data.get('position'), offset=data['offset'])
+        else:
+            result = scene.set_transform(shape_id, position=data.get('position'), rotation=data.get('rotation'),
+                                         scale=data.get('scale'), matrix=data.get('matrix'))
+        if result['success']:
+            with profiling.stage("emit"):
+                scene_events.publish(socketio, scene_room(g.session_id), 'shape_transformed', result['data'])
+            return jsonify(result)
+        return jsonify(result), 400
+    
+    except Exception as e:
+        logger.error(f"设置形状变换失败: {e}")
+        return jsonify({"success": False, "error": str(e)})
+
+@app.route('/api/shapes/<int:shape_id>/lod', methods=['GET'])
+def get_shape_lod(shape_id):
+    """获取形状指定LOD级别的网格：level、max_error或distance三选一，都不传时返回最精细级别"""
+    try:
+        with profiling.stage("compute"):
+            result = current_scene().get_shape_lod(
+                shape_id,
+                level=request.args.get('level', None, type=int),
+                max_error=request.args.get('max_error', None, type=float),
+                distance=request.args.get('distance', None, type=float),
+                viewport_height=request.args.get('viewport_height', None, type=int),
+                fov=request.args.get('fov', None, type=float)
+            )
+        if result['success']:
+            with profiling.stage("serialize"):
+                return jsonify(result)
+        return jsonify(result), 404
+    
+    except Exception as e:
+        logger.error(f"获取LOD网格失败: {e}")
+        return jsonify({"success": False, "error": str(e)})
+
+@app.route('/api/spatial/<query>', methods=['POST'])
+def spatial_query(query):
+    """场景空间查询：raycast（origin, direction, max_distance, exact）、radius（center, radius）、
+    nearest（point, k）、overlap（min, max）"""
+    try:
+        with profiling.stage("parse"):
+            data = request.get_json() or {}
+        with profiling.stage("compute"):
+            if query == 'raycast':
+                result = current_scene().raycast(data['origin'], data['direction'],
+                                             data.get('max_distance'), data.get('exact', True))
+            elif query == 'radius':
+                result = current_scene().query_radius(data['center'], data['radius'])
+            elif query == 'nearest':
+                result = current_scene().nearest_shapes(data['point'], data.get('k', 1))
+            elif query == 'overlap':
+                result = current_scene().query_aabb(data['min'], data['max'])
+            else:
+                return jsonify({"success": False, "error": f"不支持的空间查询: {query}"}), 404
+        with profiling.stage("serialize"):
+            return jsonify(result), 200 if result['success'] else 400
+    
+    except KeyError as e:
+        return jsonify({"success": False, "error": f"缺少参数: {e.args[0]}"}), 400
+    except Exception as e:
+        logger.error(f"空间查询失败: {e}")
+        return jsonify({"success": False, "error": str(e)}), 400
+
+@app.route('/api/scene.glb', methods=['GET'])
+def export_scene_glb():
+    """以GLB格式流式导出当前场景；传入run_id时附带该轨迹运行的平移动画"""
+    try:
+        run_id = request.args.get('run_id') or None
+        stride = request.args.get('stride', 1, type=int)
+        with profiling.stage("compute"):
+            builder = current_scene().build_scene_glb(run_id, stride)
+        return Response(
+            stream_with_context(builder.iter_bytes()),
+            mimetype=gltf_export.CONTENT_TYPE,
+            headers={
+                'Content-Length': str(builder.content_length),
+                'Content-Disposition': 'attachment; filename="scene.glb"'
+            }
+        )
+    except KeyError as e:
+        return jsonify({"success": False, "error": str(e)}), 404
+    except Exception as e:
+        logger.error(f"导出场景失败: {e}")
+        return jsonify({"success": False, "error": str(e)}), 400
+
+@app.route('/api/exports/<name>', methods=['GET'])
+def download_export(name):
+    """下载export_scene工具生成的GLB文件"""
+    path = gltf_export.export_path(name)
+    if not path:
+        abort(404)
+    return send_file(path, mimetype=gltf_export.CONTENT_TYPE, as_attachment=True, download_name=name)
+
 @app.route('/api/simulation', methods=['POST'])
 def run_simulation():
     """运行仿真API"""
     try:
-        data = request.get_json()
+        with profiling.stage("parse"):
+            data = request.get_json()
         sim_type = data.get('type')
         params = data.get('params', {})
         
         # 使用MCP服务运行仿真
-        result = mcp_service.run_simulation(sim_type, params)
+        result = current_scene().run_simulation(sim_type, params)
         
         if result['success']:
             # 通过WebSocket发送仿真结果
-            socketio.emit('simulation_result', result.get('data', {}))
+            with profiling.stage("emit"):
+                scene_events.publish(socketio, scene_room(g.session_id), 'simulation_result', result.get('data', {}))
             return jsonify({"success": True, "message": f"仿真完成"})
         else:
             return jsonify({"success": False, "error": result['error']})
@@ -178,6 +576,68 @@ def run_simulation():
         logger.error(f"运行仿真失败: {e}")
         return jsonify({"success": False, "error": str(e)})
 
+@app.route('/api/simulation/runs', methods=['GET'])
+def list_simulation_runs():
+    """列出已持久化的仿真运行"""
+    result = current_scene().list_trajectory_runs()
+    return jsonify(result)
+
+@app.route('/api/simulation/<run_id>/frames', methods=['GET'])
+def get_simulation_frames(run_id):
+    """按切片读取仿真运行的帧数据"""
+    try:
+        start = request.args.get('start', 0, type=int)
+        stop = request.args.get('stop', None, type=int)
+        stride = request.args.get('stride', 1, type=int)
+        channels = request.args.get('channels')
+        channels = channels.split(',') if channels else None
+        encoding = request.args.get('format', 'json')
+        
+        with profiling.stage("compute"):
+            result = current_scene().get_trajectory_frames(run_id, start, stop, stride, channels, encoding)
+        if result['success'] and encoding == 'npz':
+            return Response(result['data'], mimetype=trajectory_recorder.NPZ_CONTENT_TYPE)
+        if result['success']:
+            with profiling.stage("serialize"):
+                return jsonify(result)
+        return jsonify(result), 404
+    
+    except Exception as e:
+        logger.error(f"读取仿真帧失败: {e}")
+        return jsonify({"success": False, "error": str(e)})
+
+@app.route('/api/sweeps', methods=['POST'])
+def start_sweep():
+    """开始参数扫描；wait大于0时最多等待wait秒，扫描在此之前结束则直接返回汇总结果"""
+    try:
+        data = request.get_json() or {}
+        result = sweep_manager.start(g.session_id, data)
+        wait = float(data.get('wait') or 0)
+        if result['success'] and wait > 0:
+            result = sweep_manager.wait(result['data']['sweep_id'], g.session_id, min(wait, SWEEP_MAX_WAIT))
+        return jsonify(result)
+    except Exception as e:
+        logger.error(f"开始参数扫描失败: {e}")
+        return jsonify({"success": False, "error": str(e)})
+
+@app.route('/api/sweeps', methods=['GET'])
+def list_sweeps():
+    """当前会话正在运行和最近结束的参数扫描"""
+    return jsonify({"success": True, "sweeps": sweep_manager.stats(g.session_id)})
+
+@app.route('/api/sweeps/<sweep_id>', methods=['GET'])
+def get_sweep(sweep_id):
+    """参数扫描的进度和已完成运行的汇总；runs=0时不返回逐次运行"""
+    include_runs = request.args.get('runs', '1') not in ('0', 'false')
+    result = sweep_manager.status(sweep_id, g.session_id, include_runs)
+    return jsonify(result), 200 if result['success'] else 404
+
+@app.route('/api/sweeps/<sweep_id>', methods=['DELETE'])
+def cancel_sweep(sweep_id):
+    """取消参数扫描"""
+    result = sweep_manager.cancel(sweep_id, g.session_id)
+    return jsonify(result), 200 if result['success'] else 404
+
 @app.route('/api/ai/chat', methods=['POST'])
 def ai_chat():
     """AI聊天API - 集成MCP工具调用"""
@@ -189,7 +649,9 @@ def ai_chat():
             return jsonify({"success": False, "error": "消息不能为空"})
         
         # 首先尝试使用MCP工具处理命令
-        mcp_result = asyncio.run(mcp_client.call_tool("process_ai_command", command=user_message))
+        mcp_result = asyncio.run(mcp_client.call_tool("process_ai_command", command=user_message,
+                                                      session_id=g.session_id))
+        room = scene_room(g.session_id)
         
         if mcp_result.get("success"):
             # MCP工具成功处理了命令
@@ -199,15 +661,14 @@ def ai_chat():
             socketio.emit('ai_response', {
                 'message': response_message,
                 'timestamp': time.time()
-            })
-            
-            # 如果有仿真数据，发送到前端
-            if 'simulation_data' in mcp_result.get("result", {}):
-                socketio.emit('simulation_result', mcp_result["result"]['simulation_data'])
+            }, room=room)
             
-            # 如果有形状数据，发送到前端
-            if 'shape_data' in mcp_result.get("result", {}):
-                socketio.emit('shape_created', mcp_result["result"]['shape_data'])
+            # 仿真数据和形状数据合并为一条scene_update发送到场景房间
+            with scene_events.batch(socketio, room):
+                if 'simulation_data' in mcp_result.get("result", {}):
+                    scene_events.publish(socketio, room, 'simulation_result', mcp_result["result"]['simulation_data'])
+                if 'shape_data' in mcp_result.get("result", {}):
+                    scene_events.publish(socketio, room, 'shape_created', mcp_result["result"]['shape_data'])
             
             return jsonify({
                 "success": True,
@@ -223,7 +684,7 @@ def ai_chat():
             socketio.emit('ai_response', {
                 'message': ai_response,
                 'timestamp': time.time()
-            })
+            }, room=room)
             
             return jsonify({
                 "success": True,
@@ -260,75 +721,205 @@ def generate_simple_ai_response(user_message: str) -> str:
 def get_available_tools():
     """获取可用工具列表"""
     try:
-        tools = asyncio.run(mcp_client.get_tools())
+        tools = get_cached_tools(force_refresh=request.args.get('refresh') == '1')
         return jsonify({"success": True, "tools": tools})
     except Exception as e:
         logger.error(f"获取工具列表失败: {e}")
         return jsonify({"success": False, "error": str(e)})
 
+@app.route('/health', methods=['GET'])
+def health():
+    """存活检查：进程能响应请求即返回200"""
+    return jsonify({"status": "ok", "service": "flask"})
+
+@app.route('/readiness', methods=['GET'])
+@app.route('/api/readiness', methods=['GET'])
+def get_readiness():
+    """获取外部依赖的就绪状态（与进程存活状态分开上报）"""
+    start_background_warmup()
+    snapshot = readiness.snapshot()
+    return jsonify({"success": True, **snapshot}), 200 if snapshot["ready"] else 503
+
 @app.route('/api/status', methods=['GET'])
 def get_status():
     """获取平台状态"""
     try:
-        status = mcp_service.get_simulation_status()
-        return jsonify({"success": True, "status": status})
+        status = current_scene().get_simulation_status()
+        with profiling.stage("serialize"):
+            return jsonify({"success": True, "status": status})
     except Exception as e:
         logger.error(f"获取状态失败: {e}")
         return jsonify({"success": False, "error": str(e)})
 
 @socketio.on('connect')
-def handle_connect():
-    """客户端连接处理"""
-    logger.info("客户端已连接")
-    emit('connected', {'message': '已连接到3D仿真平台'})
+def handle_connect(auth=None):
+    """客户端连接处理：连接参数session_id指定场景会话（可跨连接恢复），未指定时场景随连接存在"""
+    requested = auth.get('session_id') if isinstance(auth, dict) else None
+    requested = requested or request.args.get('session_id')
+    try:
+        session_id = normalize_session_id(requested) if requested else request.sid
+    except ValueError as e:
+        logger.warning(f"拒绝连接: {e}")
+        return False
+    socket_sessions[request.sid] = session_id
+    join_room(scene_room(session_id))
+    logger.info(f"客户端已连接，场景会话: {session_id}")
+    emit('connected', {'message': '已连接到3D仿真平台', 'session_id': session_id})
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    """客户端断开连接处理"""
+    """客户端断开连接处理：随连接存在的场景直接释放"""
+    outbound_queue.close(request.sid)
+    session_id = socket_sessions.pop(request.sid, None)
+    if session_id == request.sid:
+        scene_registry.evict(session_id, snapshot=False)
     logger.info("客户端已断开连接")
 
 @socketio.on('create_shape')
 def handle_create_shape(data):
     """处理创建形状的WebSocket消息"""
+    scope = socket_profile_scope('create_shape', data).start()
     try:
         shape_type = data.get('type')
         params = data.get('params', {})
         
         logger.info(f"收到创建形状请求: {shape_type}, 参数: {params}")
         
-        result = mcp_service.create_shape(shape_type, params)
+        result = current_scene().create_shape(shape_type, params)
         
+        with profiling.stage("emit"):
+            if result['success']:
+                outbound_queue.send(request.sid, 'shape_created', result['data'])
+                # 同一场景的其他连接
+                scene_events.publish(socketio, scene_room(current_session_id()), 'shape_created',
+                                     result['data'], skip_sid=request.sid)
+            else:
+                emit('error', {'message': result['error']})
+        scope.stop()
+        emit_profile_report('create_shape', scope)
+    
+    except Exception as e:
+        logger.error(f"WebSocket创建形状失败: {e}")
+        emit('error', {'message': str(e)})
+    finally:
+        scope.stop()
+
+@socketio.on('update_shape')
+def handle_update_shape(data):
+    """修改形状（字段同 PATCH /api/shapes/<id>），同一场景的所有连接收到shape_updated"""
+    try:
+        result = current_scene().update_shape(int(data.get('id', -1)), data.get('params') or {})
         if result['success']:
-            emit('shape_created', result['data'])
+            outbound_queue.send(request.sid, 'shape_updated', result['data'])
+            scene_events.publish(socketio, scene_room(current_session_id()), 'shape_updated',
+                                 result['data'], skip_sid=request.sid)
         else:
             emit('error', {'message': result['error']})
-    
     except Exception as e:
-        logger.error(f"WebSocket创建形状失败: {e}")
+        logger.error(f"WebSocket修改形状失败: {e}")
+        emit('error', {'message': str(e)})
+
+@socketio.on('delete_shape')
+def handle_delete_shape(data):
+    """删除形状，同一场景的所有连接收到shape_deleted"""
+    try:
+        result = current_scene().delete_shape(int(data.get('id', -1)))
+        if result['success']:
+            outbound_queue.send(request.sid, 'shape_deleted', result['data'])
+            scene_events.publish(socketio, scene_room(current_session_id()), 'shape_deleted',
+                                 result['data'], skip_sid=request.sid)
+        else:
+            emit('error', {'message': result['error']})
+    except Exception as e:
+        logger.error(f"WebSocket删除形状失败: {e}")
+        emit('error', {'message': str(e)})
+
+@socketio.on('set_transform')
+def handle_set_transform(data):
+    """设置形状变换（字段同 PUT /api/shapes/<id>/transform），同一场景的所有连接收到shape_transformed"""
+    try:
+        scene = current_scene()
+        shape_id = int(data.get('id', -1))
+        if 'offset' in data:
+            result = scene.move_shape(shape_id, position=data.get('position'), offset=data['offset'])
+        else:
+            result = scene.set_transform(shape_id, position=data.get('position'), rotation=data.get('rotation'),
+                                         scale=data.get('scale'), matrix=data.get('matrix'))
+        if result['success']:
+            outbound_queue.send(request.sid, 'shape_transformed', result['data'])
+            scene_events.publish(socketio, scene_room(current_session_id()), 'shape_transformed',
+                                 result['data'], skip_sid=request.sid)
+        else:
+            emit('error', {'message': result['error']})
+    except Exception as e:
+        logger.error(f"WebSocket设置形状变换失败: {e}")
+        emit('error', {'message': str(e)})
+
+@socketio.on('get_shape_lod')
+def handle_get_shape_lod(data):
+    """按需获取形状某一LOD级别的网格"""
+    try:
+        result = current_scene().get_shape_lod(
+            int(data.get('id', -1)),
+            level=data.get('level'),
+            max_error=data.get('max_error'),
+            distance=data.get('distance'),
+            viewport_height=data.get('viewport_height'),
+            fov=data.get('fov')
+        )
+        if result['success']:
+            emit('shape_lod', result['data'])
+        else:
+            emit('error', {'message': result['error']})
+    except Exception as e:
+        logger.error(f"WebSocket获取LOD网格失败: {e}")
         emit('error', {'message': str(e)})
 
 @socketio.on('simulate')
 def handle_simulate(data):
     """处理运行仿真的WebSocket消息（前端发送simulate事件）"""
+    scope = socket_profile_scope('simulate', data).start()
     try:
         sim_type = data.get('type')
         params = data.get('params', {})
         
         logger.info(f"收到仿真请求: {sim_type}, 参数: {params}")
         
-        result = mcp_service.run_simulation(sim_type, params)
+        result = current_scene().run_simulation(sim_type, params)
         
-        if result['success']:
-            emit('simulation_result', result.get('data', {}))
-        else:
-            emit('error', {'message': result['error']})
+        with profiling.stage("emit"):
+            if result['success']:
+                outbound_queue.send(request.sid, 'simulation_result', result.get('data', {}))
+                scene_events.publish(socketio, scene_room(current_session_id()), 'simulation_result',
+                                     result.get('data', {}), skip_sid=request.sid)
+            else:
+                emit('error', {'message': result['error']})
+        scope.stop()
+        emit_profile_report('simulate', scope)
     
     except Exception as e:
         logger.error(f"WebSocket运行仿真失败: {e}")
         emit('error', {'message': str(e)})
+    finally:
+        scope.stop()
+
+@socketio.on('live_control')
+def handle_live_control(data):
+    """实时仿真控制：action为start/pause/step/speed/stop/status，其余字段作为参数"""
+    data = data or {}
+    action = data.get('action', 'status')
+    params = {key: value for key, value in data.items() if key != 'action'}
+    session_id = current_session_id()
+    result = live_manager.control(session_id, action, params)
+    if not result['success']:
+        emit('error', {'message': result['error']})
+        return
+    outbound_queue.send(request.sid, 'live_status', result['data'])
+    publish_live_result(session_id, action, result, skip_sid=request.sid)
 
 def call_ollama_model_stream(message, session_id, sid=None):
     """流式调用Ollama本地大模型"""
+    ollama_client = get_ollama_client()
     if not ollama_client:
         raise Exception("Ollama客户端未初始化")
     
@@ -362,6 +953,7 @@ def call_ollama_model_stream(message, session_id, sid=None):
 
     try:
         # 使用流式调用
+        stream_start = time.perf_counter()
         stream = ollama_client.chat(
             model=OLLAMA_MODEL,
             messages=[
@@ -383,26 +975,30 @@ def call_ollama_model_stream(message, session_id, sid=None):
         )
         
         full_response = ""
+        stream_stats = OllamaStreamStats(OLLAMA_MODEL, stream_start)
         for chunk in stream:
             if 'message' in chunk and 'content' in chunk['message']:
                 content = chunk['message']['content']
+                stream_stats.on_chunk(chunk)
                 full_response += content
                 
                 # 发送流式内容（包含思考过程，但工具调用指令会被格式化显示）
                 if sid:
-                    socketio.emit('chat_message', {
+                    outbound_queue.send(sid, 'chat_message', {
                         'session_id': session_id,
                         'content': content,
                         'is_complete': False
-                    }, room=sid)
+                    }, outbound.TOKEN, key=session_id)
+        
+        stream_stats.finish()
         
         # 发送完整响应
         if sid:
-            socketio.emit('chat_message', {
+            outbound_queue.send(sid, 'chat_message', {
                 'session_id': session_id,
                 'content': full_response,
                 'is_complete': True
-            }, room=sid)
+            })
         
         return full_response
     
@@ -410,6 +1006,37 @@ def call_ollama_model_stream(message, session_id, sid=None):
         logger.error(f"Ollama流式API调用失败: {e}")
         raise e
 
+class OllamaStreamStats:
+    """统计一次流式调用的首token延迟和生成速度"""
+    def __init__(self, model: str, start: float):
+        self.model = model
+        self.start = start
+        self.first_token_at = None
+        self.tokens = 0
+        self.eval_count = None
+        self.eval_duration = None
+
+    def on_chunk(self, chunk) -> None:
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+            metrics.OLLAMA_TIME_TO_FIRST_TOKEN.observe(self.first_token_at - self.start, model=self.model)
+        self.tokens += 1
+        # 最后一个分块带有Ollama自己统计的token数和耗时（纳秒）
+        if chunk.get('done'):
+            self.eval_count = chunk.get('eval_count')
+            self.eval_duration = chunk.get('eval_duration')
+
+    def finish(self) -> None:
+        tokens = self.eval_count or self.tokens
+        metrics.OLLAMA_TOKENS.inc(tokens, model=self.model)
+        if self.eval_count and self.eval_duration:
+            rate = self.eval_count / (self.eval_duration / 1e9)
+        elif self.first_token_at is not None and self.tokens > 1:
+            rate = (self.tokens - 1) / max(time.perf_counter() - self.first_token_at, 1e-9)
+        else:
+            return
+        metrics.OLLAMA_TOKENS_PER_SECOND.observe(rate, model=self.model)
+
 def simulate_llm_response(message):
     """备用的大模型响应（当Ollama不可用时使用）"""
     # 简单的关键词匹配来模拟响应
@@ -432,11 +1059,12 @@ def simulate_llm_response(message):
 def get_available_models():
     """获取可用的Ollama模型列表"""
     try:
+        ollama_client = get_ollama_client()
         if ollama_client:
             models = ollama_client.list()
             return jsonify({
                 'success': True,
-                'models': [model['name'] for model in models['models']],
+                'models': [ollama_model_name(model) for model in models['models']],
                 'current_model': OLLAMA_MODEL
             })
         else:
@@ -462,9 +1090,10 @@ def set_model():
     if new_model:
         try:
             # 验证模型是否存在
+            ollama_client = get_ollama_client()
             if ollama_client:
                 models = ollama_client.list()
-                available_models = [model['name'] for model in models['models']]
+                available_models = [ollama_model_name(model) for model in models['models']]
                 if new_model in available_models:
                     OLLAMA_MODEL = new_model
                     return jsonify({
@@ -500,15 +1129,20 @@ def handle_chat_message(data):
     session_id = data.get('session_id', f'session_{int(time.time())}')
     
     try:
-        # 获取可用工具列表
-        tools = asyncio.run(mcp_client.get_tools())
+        # 获取可用工具列表（缓存）
+        tools = get_cached_tools()
         tools_info = "\n".join([f"- {tool['name']}: {tool['description']}" for tool in tools])
         
+        # 工具调用作用于发起聊天的连接所属的场景
+        scene_session = current_session_id()
+        
         # 发送开始流式响应的信号
-        socketio.emit('chat_start', {'session_id': session_id}, room=request.sid)
+        outbound_queue.send(request.sid, 'chat_start', {'session_id': session_id})
         
         # 在后台线程中处理流式响应
         def stream_response(sid):
+            metrics.ACTIVE_CHAT_THREADS.inc()
+            scope = socket_profile_scope('chat_message', data).start()
             try:
                 # 构建包含工具信息的系统提示词
                 system_prompt = f"""你是一个专业的3D仿真平台AI助手。你可以帮助用户：
@@ -557,39 +1191,44 @@ JSON格式要求：
 请用中文回答，回答要简洁专业。"""
 
                 # 调用Ollama获取响应
-                response = call_ollama_model_stream_with_tools(user_message, session_id, sid, system_prompt)
+                response = call_ollama_model_stream_with_tools(user_message, session_id, sid, system_prompt,
+                                                               scene_session)
                 
                 # 发送完成信号
-                socketio.emit('chat_complete', {
+                outbound_queue.send(sid, 'chat_complete', {
                     'session_id': session_id,
                     'model': OLLAMA_MODEL
-                }, room=sid)
+                })
                 
             except Exception as e:
                 logger.error(f"流式调用大模型失败: {e}")
                 # 发送错误信息
-                socketio.emit('chat_error', {
+                outbound_queue.send(sid, 'chat_error', {
                     'session_id': session_id,
                     'error': str(e)
-                }, room=sid)
+                })
                 # 使用备用响应
                 fallback_response = simulate_llm_response(user_message)
-                socketio.emit('chat_message', {
+                outbound_queue.send(sid, 'chat_message', {
                     'session_id': session_id,
                     'content': fallback_response,
                     'is_complete': True,
                     'model': 'fallback'
-                }, room=sid)
+                })
+            finally:
+                scope.stop()
+                emit_profile_report('chat_message', scope, sid)
+                metrics.ACTIVE_CHAT_THREADS.dec()
         
         thread = threading.Thread(target=stream_response, args=(request.sid,))
         thread.start()
         
     except Exception as e:
         logger.error(f"处理WebSocket聊天消息失败: {e}")
-        socketio.emit('chat_error', {
+        outbound_queue.send(request.sid, 'chat_error', {
             'session_id': session_id,
             'error': str(e)
-        }, room=request.sid)
+        })
 
 @socketio.on('mcp_command')
 def handle_mcp_command(data):
@@ -599,13 +1238,13 @@ def handle_mcp_command(data):
         params = data.get('parameters', {})
         
         if command == 'initialize':
-            result = mcp_service.initialize_simulation(params)
+            result = current_scene().initialize_simulation(params)
         elif command == 'simulate':
             simulation_type = params.get('type')
             sim_params = params.get('parameters', {})
-            result = mcp_service.run_simulation(simulation_type, sim_params)
+            result = current_scene().run_simulation(simulation_type, sim_params)
         elif command == 'reset':
-            result = mcp_service.reset_simulation()
+            result = current_scene().reset_simulation()
         else:
             result = {"success": False, "error": f"未知命令: {command}"}
         
@@ -613,13 +1252,15 @@ def handle_mcp_command(data):
     except Exception as e:
         emit('mcp_error', {"error": str(e)})
 
-def call_ollama_model_stream_with_tools(message, session_id, sid=None, system_prompt=None):
-    """流式调用Ollama本地大模型，支持多工具调用"""
+def call_ollama_model_stream_with_tools(message, session_id, sid=None, system_prompt=None, scene_session=None):
+    """流式调用Ollama本地大模型，支持多工具调用；工具在scene_session对应的场景中执行"""
+    ollama_client = get_ollama_client()
     if not ollama_client:
         raise Exception("Ollama客户端未初始化")
     if not system_prompt:
         system_prompt = """你是一个专业的仿真平台AI助手。你的主要功能包括：\n1. 帮助用户创建3D几何体（立方体、球体、圆柱体等）\n2. 进行物理仿真（重力、碰撞、流体等）\n3. 分析模型属性和仿真结果\n4. 提供技术支持和指导\n\n回答格式要求：\n1. 首先用<think>标签包含你的思考过程，说明你如何理解用户需求并决定采取的行动\n2. 如果需要调用工具，在思考过程后使用[TOOL_CALL:工具名:参数]格式\n3. 最后给出简洁专业的回答\n\n可用工具：\n- create_shape: 创建3D形状（参数：shape_type, size, radius, height等）\n- run_simulation: 运行仿真（参数：simulation_type, time_steps等）\n- reset_view: 重置视图\n- clear_scene: 清空场景\n- get_status: 获取状态\n\n示例格式：\n<think>\n用户要求创建一个立方体。我需要使用create_shape工具，指定shape_type为cube，并设置合适的尺寸。\n</think>\n[TOOL_CALL:create_shape:{\"shape_type\": \"cube\", \"size\": 1.0}]\n好的，我已经为您创建了一个立方体。\n\n请用中文回答，回答要简洁专业。"""
     try:
+        stream_start = time.perf_counter()
         stream = ollama_client.chat(
             model=OLLAMA_MODEL,
             messages=[
@@ -634,16 +1275,20 @@ def call_ollama_model_stream_with_tools(message, session_id, sid=None, system_pr
             stream=True
         )
         full_response = ""
+        stream_stats = OllamaStreamStats(OLLAMA_MODEL, stream_start)
         for chunk in stream:
             if 'message' in chunk and 'content' in chunk['message']:
                 content = chunk['message']['content']
+                stream_stats.on_chunk(chunk)
                 full_response += content
                 if sid:
-                    socketio.emit('chat_message', {
-                        'session_id': session_id,
-                        'content': content,
-                        'is_complete': False
-                    }, room=sid)
+                    with profiling.stage("emit"):
+                        outbound_queue.send(sid, 'chat_message', {
+                            'session_id': session_id,
+                            'content': content,
+                            'is_complete': False
+                        }, outbound.TOKEN, key=session_id)
+        stream_stats.finish()
         # 检查是否包含多条工具调用指令
         tool_call_pattern = r'\[TOOL_CALL:([^:]+):(.+?)\]'
         all_matches = list(re.finditer(tool_call_pattern, full_response, re.DOTALL))
@@ -657,90 +1302,116 @@ def call_ollama_model_stream_with_tools(message, session_id, sid=None, system_pr
             tool_calls = [ (m.group(1), m.group(2)) for m in all_matches[start_idx:] ]
         else:
             tool_calls = []
-        valid_tools = ['create_shape', 'run_simulation', 'reset_view', 'clear_scene', 'get_status', 'process_ai_command']
+        valid_tools = ['create_shape', 'run_simulation', 'reset_view', 'clear_scene', 'get_status', 'process_ai_command', 'get_simulation_frames', 'get_shape_lod', 'export_scene', 'raycast', 'query_radius', 'nearest_shapes', 'query_aabb', 'live_control', 'run_sweep', 'get_sweep', 'cancel_sweep', 'move_shape', 'set_transform', 'update_shape', 'delete_shape']
         if tool_calls:
             print(f"检测到多条工具调用指令: {tool_calls}")
             results = []
-            for tool_name, tool_params_str in tool_calls:
-                tool_name = tool_name.strip()
-                tool_params_str = tool_params_str.strip()
-                tool_params_str = tool_params_str.replace('\\"', '"').replace('\\\\', '\\')
-                if not tool_params_str.startswith('{'):
-                    tool_params_str = '{' + tool_params_str
-                if not tool_params_str.endswith('}'):
-                    tool_params_str = tool_params_str + '}'
-                try:
-                    import json
-                    tool_params = json.loads(tool_params_str)
-                except Exception:
-                    tool_params = {}
-                if tool_name not in valid_tools or not isinstance(tool_params, dict) or not tool_params:
-                    print(f"跳过无效工具调用: 工具={tool_name}, 参数={tool_params}")
-                    continue
-                async def execute_tool_call(tool_name, tool_params):
+            # 本次工具调用计划产生的场景事件合并为一条scene_update
+            with scene_events.batch(socketio, scene_room(scene_session) if scene_session else sid):
+                for tool_name, tool_params_str in tool_calls:
+                    tool_name = tool_name.strip()
+                    tool_params_str = tool_params_str.strip()
+                    tool_params_str = tool_params_str.replace('\\"', '"').replace('\\\\', '\\')
+                    if not tool_params_str.startswith('{'):
+                        tool_params_str = '{' + tool_params_str
+                    if not tool_params_str.endswith('}'):
+                        tool_params_str = tool_params_str + '}'
                     try:
-                        socketio.emit('tool_call_start', {'tool': tool_name, 'params': tool_params}, room=sid)
-                        result = await mcp_client.call_tool(tool_name, **tool_params)
-                        if result and isinstance(result, dict) and 'result' in result:
-                            r = result['result']
-                            try:
-                                from mcp.types import TextContent
-                            except ImportError:
-                                TextContent = None
-                            def textcontent_to_dict(obj):
-                                if hasattr(obj, 'text'):
-                                    try:
-                                        import json
-                                        return json.loads(obj.text)
-                                    except Exception:
-                                        return {'text': obj.text}
-                                return str(obj)
-                            if isinstance(r, list):
-                                result['result'] = [textcontent_to_dict(x) for x in r]
-                            elif TextContent and isinstance(r, TextContent):
-                                result['result'] = textcontent_to_dict(r)
-                            socketio.emit('tool_call_complete', {
+                        with profiling.stage("parse"):
+                            tool_params = json.loads(tool_params_str)
+                    except Exception:
+                        tool_params = {}
+                    if tool_name not in valid_tools or not isinstance(tool_params, dict) or not tool_params:
+                        print(f"跳过无效工具调用: 工具={tool_name}, 参数={tool_params}")
+                        continue
+                    async def execute_tool_call(tool_name, tool_params):
+                        try:
+                            outbound_queue.send(sid, 'tool_call_start', {'tool': tool_name, 'params': tool_params})
+                            call_params = dict(tool_params)
+                            if scene_session and tool_name in SCENE_TOOLS:
+                                call_params['session_id'] = scene_session
+                            if tool_name == 'live_control':
+                                # 实时仿真在本进程运行，快照直接推送给本进程的Socket.IO连接
+                                live_session = scene_session or sid
+                                action = call_params.pop('action', 'status')
+                                call_params.pop('session_id', None)
+                                live_result = live_manager.control(live_session, action, call_params)
+                                if live_result['success']:
+                                    publish_live_result(live_session, action, live_result)
+                                result = {'success': live_result['success'], 'result': live_result}
+                            else:
+                                result = await mcp_client.call_tool(tool_name, **call_params)
+                            if result and isinstance(result, dict) and 'result' in result:
+                                r = result['result']
+                                try:
+                                    from mcp.types import TextContent
+                                except ImportError:
+                                    TextContent = None
+                                def textcontent_to_dict(obj):
+                                    if hasattr(obj, 'text'):
+                                        try:
+                                            return serialization.loads(obj.text)
+                                        except Exception:
+                                            return {'text': obj.text}
+                                    return str(obj)
+                                # 新版客户端返回CallToolResult，工具结果在content中（服务端只输出文本内容）
+                                if hasattr(r, 'content') and isinstance(r.content, list):
+                                    r = r.content[0] if len(r.content) == 1 else r.content
+                                if isinstance(r, list):
+                                    result['result'] = [textcontent_to_dict(x) for x in r]
+                                elif TextContent and isinstance(r, TextContent):
+                                    result['result'] = textcontent_to_dict(r)
+                                outbound_queue.send(sid, 'tool_call_complete', {
+                                    'tool': tool_name,
+                                    'params': tool_params,
+                                    'success': result.get('success', False),
+                                    'result': result
+                                })
+                            if tool_name == "create_shape" and result.get("result"):
+                                shape_result = result["result"]
+                                # 同一场景的其他连接也显示新形状；整个工具调用计划的形状合并为一条scene_update
+                                shape_room = scene_room(scene_session) if scene_session else sid
+                                if isinstance(shape_result, list) and len(shape_result) > 0:
+                                    shape_data = shape_result[0].get("data")
+                                    if shape_data:
+                                        scene_events.publish(socketio, shape_room, 'shape_created', shape_data)
+                                elif isinstance(shape_result, dict) and "data" in shape_result:
+                                    scene_events.publish(socketio, shape_room, 'shape_created', shape_result["data"])
+                            if tool_name in SHAPE_DIFF_EVENTS and result.get("result"):
+                                diff_result = result["result"]
+                                if isinstance(diff_result, list) and len(diff_result) > 0:
+                                    diff_result = diff_result[0]
+                                if isinstance(diff_result, dict) and diff_result.get("data"):
+                                    scene_events.publish(socketio, scene_room(scene_session) if scene_session else sid,
+                                                         SHAPE_DIFF_EVENTS[tool_name], diff_result["data"])
+                            return {'tool': tool_name, 'params': tool_params, 'result': result}
+                        except Exception as e:
+                            outbound_queue.send(sid, 'tool_call_complete', {
                                 'tool': tool_name,
                                 'params': tool_params,
-                                'success': result.get('success', False),
-                                'result': result
-                            }, room=sid)
-                        if tool_name == "create_shape" and result.get("result"):
-                            shape_result = result["result"]
-                            if isinstance(shape_result, list) and len(shape_result) > 0:
-                                shape_data = shape_result[0].get("data")
-                                if shape_data:
-                                    socketio.emit('shape_created', shape_data, room=sid)
-                            elif isinstance(shape_result, dict) and "data" in shape_result:
-                                socketio.emit('shape_created', shape_result["data"], room=sid)
-                        return {'tool': tool_name, 'params': tool_params, 'result': result}
-                    except Exception as e:
-                        socketio.emit('tool_call_complete', {
-                            'tool': tool_name,
-                            'params': tool_params,
-                            'success': False,
-                            'error': str(e)
-                        }, room=sid)
-                        return {'tool': tool_name, 'params': tool_params, 'result': {'success': False, 'error': str(e)}}
-                import asyncio
-                result = asyncio.run(execute_tool_call(tool_name, tool_params))
-                results.append(result)
+                                'success': False,
+                                'error': str(e)
+                            })
+                            return {'tool': tool_name, 'params': tool_params, 'result': {'success': False, 'error': str(e)}}
+                    import asyncio
+                    result = asyncio.run(execute_tool_call(tool_name, tool_params))
+                    results.append(result)
             clean_response = re.sub(tool_call_pattern, '', full_response).strip()
             if clean_response:
                 if sid:
-                    socketio.emit('chat_message', {
+                    outbound_queue.send(sid, 'chat_message', {
                         'session_id': session_id,
                         'content': clean_response,
                         'is_complete': True
-                    }, room=sid)
+                    })
             return {'success': True, 'results': results}
         else:
             if sid:
-                socketio.emit('chat_message', {
+                outbound_queue.send(sid, 'chat_message', {
                     'session_id': session_id,
                     'content': full_response,
                     'is_complete': True
-                }, room=sid)
+                })
             return {'success': True, 'results': []}
     except Exception as e:
         logger.error(f"Ollama流式API调用失败: {e}")
@@ -753,5 +1424,10 @@ def jscad_editor():
 if __name__ == '__main__':
     logger.info("启动3D仿真平台...")
     logger.info(f"FastMCP服务器地址: {FASTMCP_URL}")
+    start_background_warmup()
     
-    socketio.run(app, host='0.0.0.0', port=6006, debug=True) 
\ No newline at end of file
+    # 自动重载会让整个应用再导入一次，默认关闭，需要时设置 FLASK_RELOAD=1
+    # 由start_services或压测工具以子进程启动时没有TTY，需要显式允许Werkzeug服务器
+    socketio.run(app, host='0.0.0.0', port=6006, debug=True,
+                 use_reloader=os.environ.get('FLASK_RELOAD') == '1',
+                 allow_unsafe_werkzeug=True)
@@ -0,0 +1,4 @@
+"""
+微基准测试 - 几何、物理和序列化内核的规模扫描
+运行: python -m benchmarks [--quick] [--baseline FILE] [--save-baseline FILE]
+"""
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+基准测试入口
+
+    python -m benchmarks                         # 完整规模扫描
+    python -m benchmarks --quick                 # 快速模式（较小规模）
+    python -m benchmarks --save-baseline base.json
+    python -m benchmarks --baseline base.json --threshold 0.2   # 回归超过20%时退出码为1
+"""
+
+import argparse
+import json
+import logging
+import sys
+
+from benchmarks.harness import RunOptions, compare_baseline, format_report, run_all, save_baseline
+from benchmarks.kernels import KERNELS
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="几何、物理和序列化内核的微基准测试")
+    parser.add_argument("--quick", action="store_true", help="只运行较小规模")
+    parser.add_argument("--filter", dest="name_filter", help="只运行名称包含该字符串的内核")
+    parser.add_argument("--baseline", help="与该基线JSON比较")
+    parser.add_argument("--save-baseline", help="把本次结果保存为基线JSON")
+    parser.add_argument("--output", help="把本次结果写入JSON文件")
+    parser.add_argument("--threshold", type=float, default=0.2, help="回归阈值（相对基线的比例，默认0.2）")
+    parser.add_argument("--min-time", type=float, default=0.2, help="每个用例的最少累计计时（秒）")
+    parser.add_argument("--case-budget", type=float, default=10.0,
+                        help="单次调用超过该秒数后跳过更大的规模")
+    parser.add_argument("--no-memory", action="store_true", help="不统计峰值内存和分配")
+    parser.add_argument("--list", action="store_true", help="列出所有内核")
+    args = parser.parse_args(argv)
+
+    # 基准测试过程中不输出服务日志
+    logging.basicConfig(level=logging.ERROR)
+
+    if args.list:
+        for kernel in KERNELS:
+            print(f"{kernel.name:<34} {kernel.param}: {list(kernel.values)}  {kernel.description}")
+        return 0
+
+    options = RunOptions(
+        quick=args.quick,
+        min_time=args.min_time,
+        case_budget=args.case_budget,
+        memory=not args.no_memory,
+        name_filter=args.name_filter
+    )
+    results = run_all(KERNELS, options)
+
+    regressions = []
+    if args.baseline:
+        regressions = compare_baseline(args.baseline, results, args.threshold)
+
+    print("\n" + format_report(results))
+
+    if args.save_baseline:
+        save_baseline(args.save_baseline, results)
+        print(f"\n基线已保存: {args.save_baseline}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump([r.to_dict() for r in results], f, ensure_ascii=False, indent=2)
+
+    if regressions:
+        print(f"\n检测到{len(regressions)}个性能回归（阈值 {args.threshold:.0%}）:")
+        for r in regressions:
+            print(f"  {r.key}: {r.baseline_min_s * 1e3:.3f}ms -> {r.min_s * 1e3:.3f}ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
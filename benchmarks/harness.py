@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+基准测试框架 - 计时、峰值内存/分配统计、基线保存与回归比较
+"""
+
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+@dataclass
+class Kernel:
+    """一个被测内核及其规模扫描参数"""
+    name: str
+    param: str
+    values: Sequence[int]
+    quick_values: Sequence[int]
+    # setup(value) 返回无参可调用对象，准备工作不计入耗时
+    setup: Callable[[int], Callable[[], Any]]
+    description: str = ""
+
+
+@dataclass
+class CaseResult:
+    kernel: str
+    param: str
+    value: int
+    repeats: int = 0
+    min_s: float = 0.0
+    median_s: float = 0.0
+    peak_bytes: int = 0
+    alloc_blocks: int = 0
+    skipped: Optional[str] = None
+    baseline_min_s: Optional[float] = None
+    regression: bool = False
+
+    @property
+    def key(self) -> str:
+        return f"{self.kernel}[{self.param}={self.value}]"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "kernel": self.kernel,
+            "param": self.param,
+            "value": self.value,
+            "repeats": self.repeats,
+            "min_s": self.min_s,
+            "median_s": self.median_s,
+            "peak_bytes": self.peak_bytes,
+            "alloc_blocks": self.alloc_blocks,
+            "skipped": self.skipped
+        }
+
+
+@dataclass
+class RunOptions:
+    quick: bool = False
+    min_time: float = 0.2        # 每个用例累计计时至少这么久
+    max_repeats: int = 50
+    min_repeats: int = 3
+    case_budget: float = 10.0    # 单次调用超过该时间后跳过更大的规模
+    memory: bool = True
+    name_filter: Optional[str] = None
+    log: Callable[[str], None] = field(default=print)
+
+
+def measure_time(fn: Callable[[], Any], options: RunOptions) -> List[float]:
+    """重复调用直到累计时间达到min_time，返回每次耗时"""
+    timings = []
+    total = 0.0
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        while len(timings) < options.max_repeats:
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+            timings.append(elapsed)
+            total += elapsed
+            if len(timings) >= options.min_repeats and total >= options.min_time:
+                break
+            if elapsed > options.case_budget:
+                break
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return timings
+
+
+def measure_memory(fn: Callable[[], Any]) -> Dict[str, int]:
+    """单独运行一次：tracemalloc峰值字节数，以及结果持有的内存块数"""
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        result = fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    alloc_blocks = sys.getallocatedblocks() - blocks_before
+    del result
+    return {"peak_bytes": peak, "alloc_blocks": max(alloc_blocks, 0)}
+
+
+def run_kernel(kernel: Kernel, options: RunOptions) -> List[CaseResult]:
+    """按规模从小到大运行内核；某个规模超出预算后更大的规模标记为跳过"""
+    results = []
+    over_budget = False
+    for value in (kernel.quick_values if options.quick else kernel.values):
+        case = CaseResult(kernel.name, kernel.param, value)
+        if over_budget:
+            case.skipped = "budget"
+            results.append(case)
+            continue
+        fn = kernel.setup(value)
+        timings = measure_time(fn, options)
+        case.repeats = len(timings)
+        case.min_s = min(timings)
+        case.median_s = statistics.median(timings)
+        if case.min_s > options.case_budget:
+            over_budget = True
+        elif options.memory:
+            case.__dict__.update(measure_memory(fn))
+        results.append(case)
+        options.log(_format_case(case))
+    return results
+
+
+def run_all(kernels: List[Kernel], options: RunOptions) -> List[CaseResult]:
+    results = []
+    for kernel in kernels:
+        if options.name_filter and options.name_filter not in kernel.name:
+            continue
+        options.log(f"\n== {kernel.name} ({kernel.param}) {kernel.description}")
+        results.extend(run_kernel(kernel, options))
+    return results
+
+
+def environment_info() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "timestamp": time.time()
+    }
+
+
+def save_baseline(path: str, results: List[CaseResult]) -> None:
+    payload = {
+        "environment": environment_info(),
+        "results": {r.key: r.to_dict() for r in results if not r.skipped}
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+
+
+def compare_baseline(path: str, results: List[CaseResult], threshold: float) -> List[CaseResult]:
+    """与基线比较最小耗时，超过 (1 + threshold) 倍记为回归"""
+    with open(path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    regressions = []
+    for result in results:
+        previous = baseline.get(result.key)
+        if result.skipped or not previous or not previous.get("min_s"):
+            continue
+        result.baseline_min_s = previous["min_s"]
+        if result.min_s > previous["min_s"] * (1 + threshold):
+            result.regression = True
+            regressions.append(result)
+    return regressions
+
+
+def format_report(results: List[CaseResult]) -> str:
+    lines = [f"{'kernel':<34}{'size':>10}{'median':>12}{'min':>12}{'peak':>12}{'blocks':>10}{'vs base':>10}"]
+    for r in results:
+        if r.skipped:
+            lines.append(f"{r.kernel:<34}{r.value:>10}{'skipped (' + r.skipped + ')':>24}")
+            continue
+        ratio = f"{r.min_s / r.baseline_min_s:.2f}x" if r.baseline_min_s else "-"
+        if r.regression:
+            ratio += " !"
+        lines.append(
+            f"{r.kernel:<34}{r.value:>10}{_format_seconds(r.median_s):>12}{_format_seconds(r.min_s):>12}"
+            f"{_format_bytes(r.peak_bytes):>12}{r.alloc_blocks:>10}{ratio:>10}"
+        )
+    return "\n".join(lines)
+
+
+def _format_case(case: CaseResult) -> str:
+    return (f"  {case.param}={case.value:<8} median {_format_seconds(case.median_s):>10}  "
+            f"peak {_format_bytes(case.peak_bytes):>10}  blocks {case.alloc_blocks}")
+
+
+def _format_seconds(seconds: float) -> str:
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f}us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds:.2f}s"
+
+
+def _format_bytes(size: int) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.0f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GiB"
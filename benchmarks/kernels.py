@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+被测内核定义 - 只依赖 MCPService 本身，不需要 Ollama 或 FastMCP 服务器
+"""
+
+import json
+from typing import List
+
+import numpy as np
+
+import ccd
+import geometry_precision
+import nbody
+import serialization
+from benchmarks.harness import Kernel
+from mesh_processing import normalize_mesh
+from simulation_service import MCPService
+from live_simulation import LiveWorld
+from shape_transforms import TransformStore, compose
+from spatial_index import SpatialIndex
+
+SEGMENTS = [8, 16, 32, 64, 128, 256, 512]
+BODIES = [1, 10, 100, 1000, 10000]
+STEPS = [100, 1000, 10000, 100000, 1000000]
+SHAPES = [1000, 10000, 100000]
+LIVE_BODIES = [100, 300, 1000, 3000]
+NBODY_BODIES = [1000, 10000, 100000]
+PAIRS = [1000, 10000, 100000, 1000000]
+STATUS_SHAPES = [10, 100, 300]
+FRAMES = [100, 1000, 10000]
+
+
+def _service() -> MCPService:
+    return MCPService()
+
+
+def _create_sphere(segments: int):
+    service = _service()
+    return lambda: service._create_sphere(1.0, segments)
+
+
+def _create_cylinder(segments: int):
+    service = _service()
+    return lambda: service._create_cylinder(1.0, 2.0, segments)
+
+
+def _normalize_sphere(segments: int):
+    service = _service()
+    positions, faces = service._create_sphere(1.0, segments)
+    return lambda: normalize_mesh(positions, faces)
+
+
+def _shape_to_dict(segments: int):
+    service = _service()
+    service.create_shape("sphere", {"radius": 1.0, "segments": segments})
+    shape = service.shapes[0]
+    return shape.to_dict
+
+
+def _check_collision(segments: int):
+    # 两个同心但半径不同的球体互不接触，强制遍历全部顶点对
+    service = _service()
+    service.create_shape("sphere", {"radius": 1.0, "segments": segments, "position": [0, 0, 0]})
+    service.create_shape("sphere", {"radius": 2.0, "segments": segments, "position": [0, 0, 0]})
+    first, second = service.shapes
+    return lambda: service._check_collision(first, second)
+
+
+def _collision_scene(shapes: int) -> MCPService:
+    """边长1的立方体排成间距1.05的网格，相邻立方体在接触阈值内"""
+    service = _service()
+    side = int(np.ceil(shapes ** (1 / 3)))
+    for n in range(shapes):
+        x, y, z = n % side, n // side % side, n // (side * side)
+        service.create_shape("cube", {"size": 1.0, "position": [1.05 * x, 1.05 * y, 1.05 * z]})
+    service._simulate_collision({})
+    return service
+
+
+def _collision_incremental(shapes: int):
+    """每次移动一个形状后重新查询，只重测它和邻居"""
+    service = _collision_scene(shapes)
+    shape_id = shapes // 2
+
+    def run():
+        service.set_shape_position(shape_id, service.shapes[shape_id].position + 0.01)
+        return service._simulate_collision({})
+    return run
+
+
+def _collision_full(shapes: int):
+    service = _collision_scene(shapes)
+    return lambda: service._simulate_collision({"full": True})
+
+
+def _world_refresh(shapes: int):
+    """所有形状（32分段球体网格）旋转后批量重算世界坐标顶点和包围盒"""
+    service = _service()
+    positions, _ = service._create_sphere(1.0, 32)
+    store = TransformStore()
+    for n in range(shapes):
+        store.add(positions, None, compose([n, 0, 0]))
+    store.refresh()
+    matrices = [compose([n, 0, 0], [0, 30, 0]) for n in range(shapes)]
+
+    def run():
+        for n, matrix in enumerate(matrices):
+            store.set(n, matrix)
+        return store.refresh()
+    return run
+
+
+def _status_scene(shapes: int) -> MCPService:
+    """shapes个32分段球体的场景状态（顶点和三角形索引占绝大部分）"""
+    service = _service()
+    for n in range(shapes):
+        service.create_shape("sphere", {"radius": 1.0, "segments": 32, "position": [3.0 * n, 0, 0]})
+    return service
+
+
+def _serialize_status(shapes: int):
+    service = _status_scene(shapes)
+    return lambda: serialization.dumps_bytes(service.get_simulation_status())
+
+
+def _serialize_status_stdlib(shapes: int):
+    """对照：旧的做法，先tolist()成顶点字典列表，再用标准库json编码"""
+    service = _status_scene(shapes)
+
+    def run():
+        status = dict(service.get_simulation_status()["data"])
+        status["shapes"] = [{**shape.transform_dict(), "id": shape.id, "type": shape.type.value,
+                             "vertices": [{"x": x, "y": y, "z": z} for x, y, z in
+                                          geometry_precision.round_for_transport(shape.vertices, "float32").tolist()],
+                             "faces": shape.faces.tolist(), "parameters": shape.parameters}
+                            for shape in status["shapes"]]
+        return json.dumps(status).encode("utf-8")
+    return run
+
+
+def _trajectory_frames(frames: int) -> np.ndarray:
+    """100个物体的轨迹 (帧, 物体, 3)"""
+    return np.random.default_rng(0).normal(size=(frames, 100, 3))
+
+
+def _serialize_trajectory(frames: int):
+    positions = _trajectory_frames(frames)
+    return lambda: serialization.dumps_bytes({"positions": positions})
+
+
+def _serialize_trajectory_stdlib(frames: int):
+    positions = _trajectory_frames(frames)
+    return lambda: json.dumps({"positions": positions.tolist()}).encode("utf-8")
+
+
+def _gravity_bodies(bodies: int):
+    service = _service()
+    params = {
+        "time_steps": 100,
+        "initial_position": [[float(i), 10.0, 0.0] for i in range(bodies)],
+        "initial_velocity": [0, 0, 0]
+    }
+    return lambda: service._simulate_gravity(params)
+
+
+def _gravity_steps(steps: int):
+    service = _service()
+    params = {"time_steps": steps}
+    return lambda: service._simulate_gravity(params)
+
+
+def _spatial_index(shapes: int) -> SpatialIndex:
+    """在200x200x200的空间内随机放置尺寸0.2~2的包围盒"""
+    rng = np.random.default_rng(0)
+    centers = rng.uniform(-100, 100, (shapes, 3))
+    half = rng.uniform(0.1, 1.0, (shapes, 3))
+    index = SpatialIndex()
+    for shape_id, (lo, hi) in enumerate(zip(centers - half, centers + half)):
+        index.insert(shape_id, lo, hi)
+    index.rebuild()
+    return index
+
+
+def _spatial_nearest(shapes: int):
+    index = _spatial_index(shapes)
+    return lambda: index.nearest([1.0, 2.0, 3.0], 10)
+
+
+def _spatial_radius(shapes: int):
+    index = _spatial_index(shapes)
+    return lambda: index.query_radius([1.0, 2.0, 3.0], 5.0)
+
+
+def _spatial_raycast(shapes: int):
+    index = _spatial_index(shapes)
+    return lambda: index.raycast_candidates([0.0, 0.0, -150.0], [0.05, 0.02, 1.0])
+
+
+def _spatial_build(shapes: int):
+    index = _spatial_index(shapes)
+    return index.rebuild
+
+
+def _live_step(bodies: int):
+    """20x20米区域内下落的物体，先推进1秒使一部分物体落地堆叠"""
+    rng = np.random.default_rng(0)
+    world = LiveWorld(rng.uniform([-10, 0.5, -10], [10, 20, 10], (bodies, 3)), rng.uniform(0.3, 0.6, bodies))
+    for _ in range(60):
+        world.step(1 / 60)
+    return lambda: world.step(1 / 60)
+
+
+def _swept_sphere_toi(pairs: int):
+    """随机相向运动的球对，先做包围盒时刻筛选再解球的二次方程"""
+    rng = np.random.default_rng(0)
+    a, b = rng.uniform(-1, 1, (pairs, 3)), rng.uniform(-1, 1, (pairs, 3))
+    reach = rng.uniform(0.05, 0.5, pairs)
+    motion = (a - b) * rng.uniform(0, 2, (pairs, 1))
+
+    def run():
+        box = ccd.swept_aabb_toi(a - reach[:, None], a + reach[:, None], b - reach[:, None], b + reach[:, None], motion)
+        hit = np.isfinite(box)
+        return ccd.swept_sphere_toi(a[hit], b[hit], reach[hit], motion[hit])
+    return run
+
+
+def _nbody_tree(bodies: int):
+    positions, _, masses = nbody.initial_conditions("plummer", bodies, seed=0)
+    return lambda: nbody.accelerations_tree(positions, masses)
+
+
+def _nbody_exact(bodies: int):
+    positions, _, masses = nbody.initial_conditions("plummer", bodies, seed=0)
+    return lambda: nbody.accelerations_exact(positions, masses)
+
+
+KERNELS: List[Kernel] = [
+    Kernel("geometry.create_sphere", "segments", SEGMENTS, [8, 32, 128], _create_sphere),
+    Kernel("geometry.create_cylinder", "segments", SEGMENTS, [8, 32, 128], _create_cylinder),
+    Kernel("geometry.normalize_sphere", "segments", SEGMENTS, [8, 32, 128], _normalize_sphere,
+           "焊接、去退化、三角化和顶点法线"),
+    Kernel("serialize.shape_to_dict", "segments", SEGMENTS, [8, 32, 128], _shape_to_dict,
+           "球体 Shape.to_dict"),
+    Kernel("serialize.scene_status", "shapes", STATUS_SHAPES, [10, 100], _serialize_status,
+           "32分段球体场景的状态响应，serialization直接编码"),
+    Kernel("serialize.scene_status_stdlib", "shapes", STATUS_SHAPES, [10, 100], _serialize_status_stdlib,
+           "先转为Python列表再用标准库json编码，用于对照"),
+    Kernel("serialize.trajectory", "frames", FRAMES, [100, 1000], _serialize_trajectory,
+           "100个物体的轨迹数组，serialization直接编码"),
+    Kernel("serialize.trajectory_stdlib", "frames", FRAMES, [100, 1000], _serialize_trajectory_stdlib,
+           "tolist()后用标准库json编码，用于对照"),
+    Kernel("physics.check_collision", "segments", SEGMENTS, [8, 16], _check_collision,
+           "不相交的两个球体，遍历全部顶点对"),
+    Kernel("geometry.world_refresh", "shapes", SHAPES[:2], [1000], _world_refresh,
+           "全部形状变换后批量计算世界坐标顶点和包围盒"),
+    Kernel("physics.collision_incremental", "shapes", SHAPES[:2], [1000, 10000], _collision_incremental,
+           "移动一个立方体后重新查询"),
+    Kernel("physics.collision_full", "shapes", SHAPES[:2], [1000], _collision_full,
+           "全部形状标记为脏，用于对照"),
+    Kernel("physics.simulate_gravity", "bodies", BODIES, [1, 100, 1000], _gravity_bodies,
+           "100步"),
+    Kernel("physics.simulate_gravity_steps", "steps", STEPS, [100, 1000, 10000], _gravity_steps,
+           "单个物体"),
+    Kernel("spatial.nearest", "shapes", SHAPES, [1000, 100000], _spatial_nearest, "k=10"),
+    Kernel("spatial.query_radius", "shapes", SHAPES, [1000, 100000], _spatial_radius, "半径5"),
+    Kernel("spatial.raycast_candidates", "shapes", SHAPES, [1000, 100000], _spatial_raycast,
+           "包围盒阶段，穿过整个场景"),
+    Kernel("spatial.rebuild", "shapes", SHAPES, [1000, 10000], _spatial_build, "Morton排序与逐层合并"),
+    Kernel("live.step", "bodies", LIVE_BODIES, [100, 1000], _live_step,
+           "实时仿真一个tick（60Hz预算16.7毫秒）"),
+    Kernel("physics.swept_toi", "pairs", PAIRS, [1000, 100000], _swept_sphere_toi,
+           "连续碰撞检测：包围盒与球的首次接触时刻"),
+    Kernel("nbody.barnes_hut", "bodies", NBODY_BODIES, [1000, 10000], _nbody_tree,
+           "Plummer球一步加速度，默认开角"),
+    Kernel("nbody.exact", "bodies", NBODY_BODIES[:2], [1000], _nbody_exact, "精确O(N²)，用于对照"),
+]
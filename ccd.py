@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+连续碰撞检测 - 一个步长内两物体沿直线运动时的首次接触时刻（time of impact），
+所有函数都对一批候选物体对同时计算（数组的第0维是物体对）。
+
+时刻用步长的比例表示：0为步长开始，1为步长结束，没有接触时为inf。
+- swept_aabb_toi:   两个轴对齐包围盒，按分离轴逐轴求进入/离开时刻（slab法）
+- swept_sphere_toi: 两个球，解相对运动下中心距离等于半径和的二次方程
+- overlapping_pairs: 包围盒相交的物体对，排序扫描（sweep and prune）作为宽相位
+"""
+
+from typing import Tuple
+
+import numpy as np
+
+
+def overlapping_pairs(lo: np.ndarray, hi: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """包围盒 (N,3) 两两相交的物体对 (i, j)，i、j为下标数组：
+    沿分布最广的轴按区间起点排序，逐个偏移量扫描相邻区间，再检查其余两轴"""
+    n = len(lo)
+    empty = np.empty(0, dtype=np.int64)
+    if n < 2:
+        return empty, empty
+    axis = int(np.argmax(hi.max(axis=0) - lo.min(axis=0)))
+    order = np.argsort(lo[:, axis], kind="stable")
+    start, end = lo[order, axis], hi[order, axis]
+    firsts, seconds = [], []
+    for offset in range(1, n):
+        # 区间起点已排序：某个偏移量下没有任何重叠时，更大的偏移量也不会有
+        overlap = np.flatnonzero(start[offset:] <= end[:n - offset])
+        if not len(overlap):
+            break
+        firsts.append(order[overlap])
+        seconds.append(order[overlap + offset])
+    if not firsts:
+        return empty, empty
+    i, j = np.concatenate(firsts), np.concatenate(seconds)
+    hit = np.all((lo[i] <= hi[j]) & (lo[j] <= hi[i]), axis=1)
+    return i[hit], j[hit]
+
+
+def swept_aabb_toi(lo_a: np.ndarray, hi_a: np.ndarray, lo_b: np.ndarray, hi_b: np.ndarray,
+                   motion: np.ndarray) -> np.ndarray:
+    """包围盒b相对a移动motion（b的位移减a的位移）时的首次接触时刻 (P,)；起始时已相交为0"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t_low = (lo_a - hi_b) / motion
+        t_high = (hi_a - lo_b) / motion
+    enter = np.minimum(t_low, t_high)
+    leave = np.maximum(t_low, t_high)
+    # 某轴上没有相对运动：始终重叠则该轴不限制时刻，始终分离则不会接触
+    still = motion == 0
+    overlapping = (lo_b <= hi_a) & (lo_a <= hi_b)
+    enter = np.where(still, np.where(overlapping, -np.inf, np.inf), enter)
+    leave = np.where(still, np.where(overlapping, np.inf, -np.inf), leave)
+    t_enter = enter.max(axis=1)
+    t_leave = leave.min(axis=1)
+    hit = (t_enter <= t_leave) & (t_enter <= 1) & (t_leave >= 0)
+    return np.where(hit, np.maximum(t_enter, 0.0), np.inf)
+
+
+def swept_sphere_toi(center_a: np.ndarray, center_b: np.ndarray, reach: np.ndarray,
+                     motion: np.ndarray) -> np.ndarray:
+    """球b相对a移动motion时中心距离首次等于reach（半径和）的时刻 (P,)；起始时已相交为0，
+    相互远离或错过时为inf"""
+    d = center_b - center_a
+    a = (motion ** 2).sum(axis=1)
+    b = 2 * (d * motion).sum(axis=1)
+    c = (d ** 2).sum(axis=1) - reach ** 2
+    disc = b * b - 4 * a * c
+    approaching = (a > 0) & (b < 0) & (disc >= 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = (-b - np.sqrt(np.maximum(disc, 0.0))) / (2 * a)
+    toi = np.where(approaching & (t <= 1), np.maximum(t, 0.0), np.inf)
+    return np.where(c <= 0, 0.0, toi)
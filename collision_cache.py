@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+增量碰撞检测 - 形状对的接触结果缓存和脏形状集合
+创建、移动形状时把形状标记为脏，清空场景时清空缓存；查询时只重测涉及脏形状的形状对，
+候选对由空间索引的包围盒查询给出，耗时与变化的形状数（及其邻居数）成正比，与场景大小无关
+"""
+
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+Pair = Tuple[int, int]
+
+
+class ContactCache:
+    """只保存有接触的形状对 (i<j) -> 接触信息；没有记录的对表示没有接触"""
+
+    def __init__(self):
+        self.contacts: Dict[Pair, Dict] = {}
+        self._partners: Dict[int, Set[int]] = {}
+        self._dirty: Set[int] = set()
+        # 实时仿真线程写回位置时也会标记脏形状
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.contacts)
+
+    @property
+    def dirty_count(self) -> int:
+        with self._lock:
+            return len(self._dirty)
+
+    def mark_dirty(self, shape_id: int) -> None:
+        with self._lock:
+            self._dirty.add(shape_id)
+
+    def remove(self, shape_id: int) -> None:
+        """形状被删除：丢弃它的接触，不再重测"""
+        with self._lock:
+            self._dirty.discard(shape_id)
+        self._drop(shape_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._dirty.clear()
+        self.contacts.clear()
+        self._partners.clear()
+
+    def update(self, candidates: Callable[[int], Iterable[int]],
+               test: Callable[[int, int], Optional[Dict]]) -> Dict[str, int]:
+        """重测涉及脏形状的形状对：candidates(id)返回可能与该形状接触的形状，
+        test(i, j)返回接触信息或None；返回本次的脏形状数和测试的形状对数"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        for shape_id in dirty:
+            self._drop(shape_id)
+        tested: Set[Pair] = set()
+        for shape_id in sorted(dirty):
+            for other in candidates(shape_id):
+                if other == shape_id:
+                    continue
+                pair = (min(shape_id, other), max(shape_id, other))
+                if pair in tested:
+                    continue
+                tested.add(pair)
+                contact = test(*pair)
+                if contact is not None:
+                    self.contacts[pair] = contact
+                    self._partners.setdefault(pair[0], set()).add(pair[1])
+                    self._partners.setdefault(pair[1], set()).add(pair[0])
+        return {"dirty_shapes": len(dirty), "pairs_tested": len(tested)}
+
+    def values(self) -> List[Dict]:
+        """全部接触信息（按写入顺序，不排序，避免每次查询付出与接触总数相关的排序开销）"""
+        return list(self.contacts.values())
+
+    def _drop(self, shape_id: int) -> None:
+        for other in self._partners.pop(shape_id, ()):
+            self.contacts.pop((min(shape_id, other), max(shape_id, other)), None)
+            partners = self._partners.get(other)
+            if partners is not None:
+                partners.discard(shape_id)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+响应压缩 - 超过 COMPRESSION_MIN_BYTES 的REST响应和Socket.IO消息压缩后发送，小消息（聊天片段等）原样发送：
+- REST：按请求的Accept-Encoding选择gzip或deflate（app.py的after_request）
+- Socket.IO：WebSocket传输（simple-websocket）不支持permessage-deflate，大事件改为二进制事件，
+  参数列表的JSON经zlib压缩后作为附件：[event, {"__compressed__": "deflate", "data": <附件>}]，
+  前端（static/js/main.js）解压后按原参数调用处理函数；长轮询传输另由Engine.IO按同一阈值做HTTP压缩
+压缩前后的字节数按传输方式和编码计入 compression_* 指标
+"""
+
+import gzip
+import os
+import zlib
+from typing import Any, Dict, Optional
+
+from socketio import packet
+
+import metrics
+import serialization
+
+# zlib压缩级别1-9；1的压缩比已接近6，耗时只有约1/5
+COMPRESSION_LEVEL = int(os.environ.get("COMPRESSION_LEVEL", "1"))
+# 小于该字节数的消息不压缩
+COMPRESSION_MIN_BYTES = int(os.environ.get("COMPRESSION_MIN_BYTES", "1024"))
+HTTP_COMPRESSION = os.environ.get("HTTP_COMPRESSION", "1") == "1"
+SOCKETIO_COMPRESSION = os.environ.get("SOCKETIO_COMPRESSION", "1") == "1"
+
+# 按优先顺序，值与Content-Encoding一致（HTTP的deflate即zlib格式）
+HTTP_ENCODINGS = ("gzip", "deflate")
+COMPRESSED_MARKER = "__compressed__"
+# 本身已压缩的内容再压缩没有收益
+INCOMPRESSIBLE_TYPES = ("image/", "video/", "audio/", "font/woff", "application/zip",
+                        "application/gzip", "model/gltf-binary")
+
+
+def is_compressible(mimetype: str, size: int) -> bool:
+    return size >= COMPRESSION_MIN_BYTES and not (mimetype or "").startswith(INCOMPRESSIBLE_TYPES)
+
+
+def compress(data: bytes, encoding: str, transport: str, level: Optional[int] = None) -> bytes:
+    """按编码压缩并计入指标；encoding为gzip或deflate"""
+    level = COMPRESSION_LEVEL if level is None else level
+    if encoding == "gzip":
+        # mtime固定为0，相同内容的压缩结果相同（便于ETag和缓存）
+        compressed = gzip.compress(data, level, mtime=0)
+    elif encoding == "deflate":
+        compressed = zlib.compress(data, level)
+    else:
+        raise ValueError(f"不支持的压缩编码: {encoding}")
+    metrics.COMPRESSION_INPUT_BYTES.inc(len(data), transport=transport, encoding=encoding)
+    metrics.COMPRESSION_OUTPUT_BYTES.inc(len(compressed), transport=transport, encoding=encoding)
+    return compressed
+
+
+def record_uncompressed(size: int, transport: str, reason: str) -> None:
+    """原样发送的字节数；reason为 below_threshold、not_accepted、incompressible 或 disabled"""
+    metrics.COMPRESSION_SKIPPED_BYTES.inc(size, transport=transport, reason=reason)
+
+
+class CompressingPacket(packet.Packet):
+    """Socket.IO包：编码后超过阈值的事件改为带压缩附件的二进制事件（Server的serializer参数）"""
+
+    def encode(self):
+        encoded = super().encode()
+        if self.packet_type != packet.EVENT or not isinstance(encoded, str) or len(self.data) < 2:
+            return encoded
+        if not SOCKETIO_COMPRESSION or len(encoded) < COMPRESSION_MIN_BYTES:
+            record_uncompressed(len(encoded), "socketio", "below_threshold" if SOCKETIO_COMPRESSION else "disabled")
+            return encoded
+        # 编码结果为 类型[/命名空间,][ID]["event",参数...]；参数部分直接取自已编码的文本，不再序列化
+        prefix = "[" + serialization.dumps(self.data[0])
+        start = encoded.index(prefix)
+        args = "[" + encoded[start + len(prefix) + 1:]
+        attachment = compress(args.encode("utf-8"), "deflate", "socketio")
+        # 基类Packet使用标准库json编码这个很小的信封，不重复计入CountingJSON的事件统计
+        return packet.Packet(packet.EVENT, [self.data[0], {COMPRESSED_MARKER: "deflate", "data": attachment}],
+                             namespace=self.namespace, id=self.id).encode()
+
+
+def stats() -> Dict[str, Any]:
+    """各传输方式压缩前后的字节数和压缩比"""
+    result: Dict[str, Dict[str, Any]] = {}
+    with metrics.COMPRESSION_INPUT_BYTES._lock:
+        inputs = dict(metrics.COMPRESSION_INPUT_BYTES._values)
+    with metrics.COMPRESSION_OUTPUT_BYTES._lock:
+        outputs = dict(metrics.COMPRESSION_OUTPUT_BYTES._values)
+    with metrics.COMPRESSION_SKIPPED_BYTES._lock:
+        skipped = dict(metrics.COMPRESSION_SKIPPED_BYTES._values)
+    for (transport, encoding), raw in inputs.items():
+        entry = result.setdefault(transport, {"raw_bytes": 0, "compressed_bytes": 0, "uncompressed_bytes": 0})
+        entry["raw_bytes"] += int(raw)
+        entry["compressed_bytes"] += int(outputs.get((transport, encoding), 0))
+    for (transport, _reason), size in skipped.items():
+        entry = result.setdefault(transport, {"raw_bytes": 0, "compressed_bytes": 0, "uncompressed_bytes": 0})
+        entry["uncompressed_bytes"] += int(size)
+    for entry in result.values():
+        entry["ratio"] = round(entry["compressed_bytes"] / entry["raw_bytes"], 4) if entry["raw_bytes"] else None
+    return {"level": COMPRESSION_LEVEL, "min_bytes": COMPRESSION_MIN_BYTES,
+            "http": HTTP_COMPRESSION, "socketio": SOCKETIO_COMPRESSION, "transports": result}
@@ -1,15 +1,28 @@
 #!/usr/bin/env python3
 """
 FastMCP服务器 - 提供3D建模和仿真相关的MCP工具
+作用于场景的工具都接受session_id参数，不传时使用默认的共享场景
 """
 
 import asyncio
+import functools
 import json
+import time
 import logging
 from typing import Dict, List, Optional, Any
-from fastmcp import FastMCP
+from fastmcp import Context, FastMCP
+from fastmcp.tools.tool import ToolResult
+from mcp.types import TextContent
 import numpy as np
-from simulation_service import MCPService
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from scene_registry import scene_registry
+from live_simulation import live_manager
+from parameter_sweep import sweep_manager
+import metrics
+import serialization
+from metrics import timed_tool
+from profiling import profiled_tool
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -18,12 +31,46 @@ logger = logging.getLogger(__name__)
 # 创建FastMCP应用
 app = FastMCP("3D-Simulation-Platform")
 
-# 初始化MCP服务
-mcp_service = MCPService()
+
+def mcp_tool(fn):
+    """注册MCP工具：结果由serialization编码为一个文本内容（NumPy数组和形状直接编码），
+    不再由pydantic另外转换一份结构化结果"""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        result = await fn(*args, **kwargs)
+        if isinstance(result, ToolResult):
+            return result
+        return ToolResult(content=[TextContent(type="text", text=serialization.dumps(result))])
+    return app.tool(output_schema=None)(wrapper)
+
+
+# 健康检查与就绪检查
+@app.custom_route("/health", methods=["GET"])
+async def health(request: Request) -> JSONResponse:
+    """存活检查：进程能响应请求即返回200"""
+    return JSONResponse({"status": "ok", "service": "fastmcp"})
+
+@app.custom_route("/readiness", methods=["GET"])
+async def readiness(request: Request) -> JSONResponse:
+    """就绪检查：工具注册完成后返回200"""
+    try:
+        tools = await app.get_tools()
+        ready = len(tools) > 0
+        return JSONResponse({"ready": ready, "tools": len(tools)}, status_code=200 if ready else 503)
+    except Exception as e:
+        logger.error(f"就绪检查失败: {e}")
+        return JSONResponse({"ready": False, "error": str(e)}, status_code=503)
+
+@app.custom_route("/metrics", methods=["GET"])
+async def get_metrics(request: Request) -> Response:
+    """Prometheus格式的运行指标"""
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
 
 # 定义MCP工具
-@app.tool()
-async def create_shape(shape_type: str, size: Optional[float] = 1.0, radius: Optional[float] = 1.0, height: Optional[float] = 2.0, segments: Optional[int] = 32) -> Dict[str, Any]:
+@mcp_tool
+@timed_tool
+@profiled_tool
+async def create_shape(shape_type: str, size: Optional[float] = 1.0, radius: Optional[float] = 1.0, height: Optional[float] = 2.0, segments: Optional[int] = 32, position: Optional[List[float]] = None, rotation: Optional[List[float]] = None, scale: Optional[List[float]] = None, session_id: Optional[str] = None, profile: Optional[str] = None) -> Dict[str, Any]:
     """
     创建3D形状（立方体、球体、圆柱体）
     
@@ -31,19 +78,29 @@ async def create_shape(shape_type: str, size: Optional[float] = 1.0, radius: Opt
     - cube: 创建立方体，需要指定size参数
     - sphere: 创建球体，需要指定radius参数
     - cylinder: 创建圆柱体，需要指定radius和height参数
+    球体和圆柱体返回lods（各级分段数、几何误差和切换距离），可用get_shape_lod获取对应网格
+    position为场景中的位置 [x, y, z]，不指定时随机摆放；rotation为XYZ顺序的欧拉角（度），scale为各轴缩放
+    session_id指定场景会话（Flask聊天调用时自动附带），超出会话的顶点数上限时返回错误
+    profile为cprofile或sample时对本次调用做性能分析（服务端需设置PROFILING_ENABLED=1），结果附带分阶段耗时和profile文件名
     """
     try:
         # 根据形状类型构建参数
         if shape_type == "cube":
             params = {"size": size}
         elif shape_type == "sphere":
-            params = {"radius": radius}
+            params = {"radius": radius, "segments": segments}
         elif shape_type == "cylinder":
             params = {"radius": radius, "height": height, "segments": segments}
         else:
             params = {}
+        if position is not None:
+            params["position"] = position
+        if rotation is not None:
+            params["rotation"] = rotation
+        if scale is not None:
+            params["scale"] = scale
         
-        result = mcp_service.create_shape(shape_type, params)
+        result = scene_registry.get(session_id).create_shape(shape_type, params)
         
         if result["success"]:
             return {
@@ -63,23 +120,38 @@ async def create_shape(shape_type: str, size: Optional[float] = 1.0, radius: Opt
             "error": str(e)
         }
 
-@app.tool()
-async def run_simulation(simulation_type: str, time_steps: Optional[int] = 100, num_objects: Optional[int] = 3, object_size: Optional[float] = 0.5) -> Dict[str, Any]:
+@mcp_tool
+@timed_tool
+@profiled_tool
+async def run_simulation(simulation_type: str, time_steps: Optional[int] = 100, num_objects: Optional[int] = 3, object_size: Optional[float] = 0.5, store_trajectory: Optional[bool] = False,
+                         bodies: Optional[int] = None, distribution: Optional[str] = None, method: Optional[str] = None,
+                         theta: Optional[float] = None, time_step: Optional[float] = None, seed: Optional[int] = None,
+                         record_stride: Optional[int] = None, session_id: Optional[str] = None,
+                         profile: Optional[str] = None) -> Dict[str, Any]:
     """
-    运行物理仿真（重力仿真、碰撞仿真）
+    运行物理仿真（重力仿真、碰撞仿真、N体引力仿真）
     
     执行物理仿真计算，包括：
     - gravity: 重力仿真，模拟物体在重力作用下的运动
     - collision: 碰撞仿真，模拟多个物体之间的碰撞
+    - nbody: N体引力仿真，bodies个物体（distribution: plummer/disk/uniform）相互吸引，
+      method为barnes_hut（默认，theta为开角，越小越精确）或exact（精确O(N²)，用于验证）
+    store_trajectory为true时轨迹写入磁盘，只返回run_id，可用get_simulation_frames分段读取；
+    record_stride为n时每n步记录一帧轨迹
+    profile为cprofile或sample时对本次调用做性能分析（服务端需设置PROFILING_ENABLED=1），结果附带分阶段耗时和profile文件名
     """
     try:
         params = {
             "time_steps": time_steps,
             "num_objects": num_objects,
-            "object_size": object_size
+            "object_size": object_size,
+            "store_trajectory": store_trajectory
         }
+        optional = {"bodies": bodies, "distribution": distribution, "method": method,
+                    "theta": theta, "time_step": time_step, "seed": seed, "record_stride": record_stride}
+        params.update({key: value for key, value in optional.items() if value is not None})
         
-        result = mcp_service.run_simulation(simulation_type, params)
+        result = scene_registry.get(session_id).run_simulation(simulation_type, params)
         
         if result["success"]:
             return {
@@ -99,13 +171,300 @@ async def run_simulation(simulation_type: str, time_steps: Optional[int] = 100,
             "error": str(e)
         }
 
-@app.tool()
-async def reset_view() -> Dict[str, Any]:
+@mcp_tool
+@timed_tool
+async def get_simulation_frames(run_id: str, start: Optional[int] = 0, stop: Optional[int] = None, stride: Optional[int] = 1,
+                                session_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    读取已持久化仿真运行的帧切片
+    
+    按 [start:stop:stride] 返回指定运行的位置和速度帧，不会加载整次运行
+    只能读取session_id对应场景中的运行
+    """
+    try:
+        return scene_registry.get(session_id).get_trajectory_frames(run_id, start or 0, stop, stride or 1)
+    except Exception as e:
+        logger.error(f"读取仿真帧失败: {e}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+@mcp_tool
+@timed_tool
+async def update_shape(shape_id: int, size: Optional[float] = None, radius: Optional[float] = None,
+                       height: Optional[float] = None, segments: Optional[int] = None,
+                       position: Optional[List[float]] = None, rotation: Optional[List[float]] = None,
+                       scale: Optional[List[float]] = None, session_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    修改一个形状
+    
+    只给出要修改的参数：几何参数（size、radius、height、segments）变化时只重新生成该形状的网格，
+    position、rotation（欧拉角，度）、scale修改变换。返回只含变化字段的差量，形状ID不变
+    """
+    try:
+        params = {key: value for key, value in (("size", size), ("radius", radius), ("height", height),
+                                                ("segments", segments), ("position", position),
+                                                ("rotation", rotation), ("scale", scale)) if value is not None}
+        return scene_registry.get(session_id).update_shape(shape_id, params)
+    except Exception as e:
+        logger.error(f"修改形状失败: {e}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+@mcp_tool
+@timed_tool
+async def delete_shape(shape_id: int, session_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    删除一个形状
+    
+    形状ID是稳定的：删除后其他形状的ID不变，已删除的ID不会再分配给新形状
+    """
+    try:
+        return scene_registry.get(session_id).delete_shape(shape_id)
+    except Exception as e:
+        logger.error(f"删除形状失败: {e}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+@mcp_tool
+@timed_tool
+async def move_shape(shape_id: int, position: Optional[List[float]] = None, offset: Optional[List[float]] = None,
+                     session_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    移动形状
+    
+    position为新的位置 [x, y, z]，offset为相对当前位置的位移，两者同时给出时先定位再偏移；旋转和缩放不变。
+    返回形状当前的position、rotation、scale和transform（列主序的4x4矩阵）
+    """
+    try:
+        return scene_registry.get(session_id).move_shape(shape_id, position=position, offset=offset)
+    except Exception as e:
+        logger.error(f"移动形状失败: {e}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+@mcp_tool
+@timed_tool
+async def set_transform(shape_id: int, position: Optional[List[float]] = None, rotation: Optional[List[float]] = None,
+                        scale: Optional[List[float]] = None, matrix: Optional[List[float]] = None,
+                        session_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    设置形状的变换
+    
+    position为位置，rotation为XYZ顺序的欧拉角（度，与Three.js一致），scale为各轴缩放，未给出的分量保持不变；
+    也可以直接给出matrix（列主序的16个数，只支持仿射变换）。碰撞、空间查询和导出都使用变换后的几何
+    """
+    try:
+        return scene_registry.get(session_id).set_transform(shape_id, position=position, rotation=rotation,
+                                                            scale=scale, matrix=matrix)
+    except Exception as e:
+        logger.error(f"设置形状变换失败: {e}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+@mcp_tool
+@timed_tool
+async def get_shape_lod(shape_id: int, level: Optional[int] = None, max_error: Optional[float] = None,
+                        distance: Optional[float] = None, session_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    获取形状某一细节层次（LOD）的网格
+    
+    create_shape返回的lods列出各级分段数和几何误差。可直接指定level，
+    或给出可接受的最大几何误差max_error、相机距离distance，由服务端选择最粗的合格级别
+    """
+    try:
+        return scene_registry.get(session_id).get_shape_lod(shape_id, level=level, max_error=max_error, distance=distance)
+    except Exception as e:
+        logger.error(f"获取LOD网格失败: {e}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+@mcp_tool
+@timed_tool
+async def raycast(origin: List[float], direction: List[float], max_distance: Optional[float] = None,
+                  exact: Optional[bool] = True, session_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    从origin沿direction发射射线，返回最先击中的形状
+    
+    exact为true时与形状的三角网格精确求交，返回形状ID、距离和交点；
+    为false时只做包围盒测试，返回射线穿过的所有形状（按进入距离排序）
+    """
+    try:
+        return scene_registry.get(session_id).raycast(origin, direction, max_distance, exact is not False)
+    except Exception as e:
+        logger.error(f"射线查询失败: {e}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+@mcp_tool
+@timed_tool
+async def query_radius(center: List[float], radius: float, session_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    查询距离center不超过radius的形状（按包围盒计算），按距离升序返回
+    """
+    try:
+        return scene_registry.get(session_id).query_radius(center, radius)
+    except Exception as e:
+        logger.error(f"半径查询失败: {e}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+@mcp_tool
+@timed_tool
+async def nearest_shapes(point: List[float], k: Optional[int] = 1, session_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    查询距离point最近的k个形状（按包围盒计算），按距离升序返回
+    """
+    try:
+        return scene_registry.get(session_id).nearest_shapes(point, k or 1)
+    except Exception as e:
+        logger.error(f"近邻查询失败: {e}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+@mcp_tool
+@timed_tool
+async def query_aabb(min_corner: List[float], max_corner: List[float], session_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    查询包围盒与 [min_corner, max_corner] 重叠的形状
+    """
+    try:
+        return scene_registry.get(session_id).query_aabb(min_corner, max_corner)
+    except Exception as e:
+        logger.error(f"包围盒查询失败: {e}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+@mcp_tool
+@timed_tool
+async def live_control(action: str, speed: Optional[float] = None, steps: Optional[int] = None,
+                       gravity: Optional[float] = None, restitution: Optional[float] = None,
+                       friction: Optional[float] = None, restart: Optional[bool] = None,
+                       ccd: Optional[bool] = None, session_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    控制场景的实时仿真（服务端按固定tick步进物理状态）
+    
+    action: start（开始或继续，可带speed/gravity/restitution/friction，restart为true时重新开始）、
+    pause、step（暂停时推进steps个tick）、speed（设置速度倍率）、stop（停止并把位置写回场景）、
+    status（当前状态和最新快照）、save（把最近的位置历史保存为轨迹运行，返回run_id）；
+    ccd为false时关闭连续碰撞检测
+    """
+    try:
+        params = {key: value for key, value in {
+            "speed": speed, "steps": steps, "gravity": gravity,
+            "restitution": restitution, "friction": friction, "restart": restart, "ccd": ccd
+        }.items() if value is not None}
+        return live_manager.control(session_id, action, params)
+    except Exception as e:
+        logger.error(f"实时仿真控制失败: {e}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+@mcp_tool
+@timed_tool
+async def run_sweep(simulation_type: Optional[str] = "rigid", grid: Optional[Dict[str, List[Any]]] = None,
+                    random: Optional[Dict[str, Any]] = None, samples: Optional[int] = None,
+                    base: Optional[Dict[str, Any]] = None, seed: Optional[int] = None,
+                    wait: Optional[float] = 60.0, session_id: Optional[str] = None,
+                    ctx: Optional[Context] = None) -> Dict[str, Any]:
+    """
+    参数扫描：按参数网格或随机分布批量运行仿真，返回聚合统计而不是每次运行的轨迹
+    
+    - simulation_type: rigid（场景中的形状，包围球物理，参数gravity/restitution/friction/duration/time_step）
+      或 gravity（抛体，参数gravity/time_step/time_steps/initial_position/initial_velocity）
+    - grid: 参数名 -> 取值列表，取笛卡尔积，如 {"restitution": [0.2, 0.5, 0.8]}
+    - random: 参数名 -> 分布，每个网格点抽samples次，如 {"friction": {"distribution": "uniform", "low": 0, "high": 1}}，
+      分布可选uniform(low, high)、normal(mean, std)、loguniform(low, high)、choice(values)
+    - base: 所有运行共用的参数
+    最多等待wait秒（期间报告进度），未结束时返回sweep_id，可用get_sweep查询、cancel_sweep取消
+    """
+    try:
+        spec = {"simulation_type": simulation_type, "grid": grid, "random": random,
+                "samples": samples, "base": base, "seed": seed}
+        result = sweep_manager.start(session_id, spec)
+        if not result["success"]:
+            return result
+        job = sweep_manager.get(result["data"]["sweep_id"], session_id)
+        deadline = time.monotonic() + max(0.0, wait or 0.0)
+        while not job.done.is_set() and time.monotonic() < deadline:
+            if ctx is not None:
+                progress = job.progress()
+                await ctx.report_progress(progress["completed"] + progress["failed"], progress["total"])
+            await asyncio.sleep(0.25)
+        return {"success": True, "data": job.status() if job.done.is_set() else job.progress()}
+    except Exception as e:
+        logger.error(f"参数扫描失败: {e}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+@mcp_tool
+@timed_tool
+async def get_sweep(sweep_id: str, include_runs: Optional[bool] = True,
+                    session_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    查询参数扫描的进度和已完成运行的聚合统计（include_runs为true时附带每次运行的参数和指标）
+    只能查询session_id对应场景启动的扫描
+    """
+    return sweep_manager.status(sweep_id, session_id, include_runs is not False)
+
+@mcp_tool
+@timed_tool
+async def cancel_sweep(sweep_id: str, session_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    取消参数扫描；已完成运行的统计仍可用get_sweep查询
+    只能取消session_id对应场景启动的扫描
+    """
+    return sweep_manager.cancel(sweep_id, session_id)
+
+@mcp_tool
+@timed_tool
+async def export_scene(run_id: Optional[str] = None, stride: Optional[int] = 1, session_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    把当前场景导出为glTF二进制文件（GLB）
+    
+    每个形状导出为带法线的索引三角网格；传入run_id时，把该轨迹运行的位置写成平移动画，
+    stride为帧间隔。返回文件名和大小，可从Flask的 /api/exports/<name> 下载
+    """
+    try:
+        return scene_registry.get(session_id).export_scene(run_id, stride or 1)
+    except Exception as e:
+        logger.error(f"导出场景失败: {e}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+@mcp_tool
+@timed_tool
+async def reset_view(session_id: Optional[str] = None) -> Dict[str, Any]:
     """
     重置3D视图到默认状态
     """
     try:
-        result = mcp_service.reset_view()
+        result = scene_registry.get(session_id).reset_view()
         return {
             "success": result["success"],
             "message": "视图已重置"
@@ -117,13 +476,14 @@ async def reset_view() -> Dict[str, Any]:
             "error": str(e)
         }
 
-@app.tool()
-async def clear_scene() -> Dict[str, Any]:
+@mcp_tool
+@timed_tool
+async def clear_scene(session_id: Optional[str] = None) -> Dict[str, Any]:
     """
     清空3D场景中的所有对象
     """
     try:
-        result = mcp_service.clear_scene()
+        result = scene_registry.get(session_id).clear_scene()
         return {
             "success": result["success"],
             "message": "场景已清空"
@@ -135,13 +495,14 @@ async def clear_scene() -> Dict[str, Any]:
             "error": str(e)
         }
 
-@app.tool()
-async def get_status() -> Dict[str, Any]:
+@mcp_tool
+@timed_tool
+async def get_status(session_id: Optional[str] = None) -> Dict[str, Any]:
     """
     获取仿真平台当前状态
     """
     try:
-        status = mcp_service.get_simulation_status()
+        status = scene_registry.get(session_id).get_simulation_status()
         return {
             "success": True,
             "status": status
@@ -153,8 +514,9 @@ async def get_status() -> Dict[str, Any]:
             "error": str(e)
         }
 
-@app.tool()
-async def process_ai_command(command: str) -> Dict[str, Any]:
+@mcp_tool
+@timed_tool
+async def process_ai_command(command: str, session_id: Optional[str] = None) -> Dict[str, Any]:
     """
     处理AI命令，自动解析用户输入并依次执行多条操作
     支持的命令类型：
@@ -178,14 +540,14 @@ async def process_ai_command(command: str) -> Dict[str, Any]:
                     size_match = re.search(r'(\d+(?:\.\d+)?)', sub_cmd)
                     if size_match:
                         size = float(size_match.group(1))
-                res = await create_shape(shape_type="cube", size=size)
+                res = await create_shape(shape_type="cube", size=size, session_id=session_id)
                 results.append({"command": sub_cmd, **res})
             elif "球体" in cmd_lower or "sphere" in cmd_lower:
                 radius = 1.0
                 radius_match = re.search(r'(\d+(?:\.\d+)?)', sub_cmd)
                 if radius_match:
                     radius = float(radius_match.group(1))
-                res = await create_shape(shape_type="sphere", radius=radius)
+                res = await create_shape(shape_type="sphere", radius=radius, session_id=session_id)
                 results.append({"command": sub_cmd, **res})
             elif "圆柱" in cmd_lower or "cylinder" in cmd_lower:
                 radius = 1.0
@@ -196,19 +558,19 @@ async def process_ai_command(command: str) -> Dict[str, Any]:
                     radius = float(radius_match.group(1))
                 if height_match:
                     height = float(height_match.group(1))
-                res = await create_shape(shape_type="cylinder", radius=radius, height=height)
+                res = await create_shape(shape_type="cylinder", radius=radius, height=height, session_id=session_id)
                 results.append({"command": sub_cmd, **res})
             elif "重力仿真" in cmd_lower or "gravity" in cmd_lower:
-                res = await run_simulation(simulation_type="gravity")
+                res = await run_simulation(simulation_type="gravity", session_id=session_id)
                 results.append({"command": sub_cmd, **res})
             elif "碰撞仿真" in cmd_lower or "collision" in cmd_lower:
-                res = await run_simulation(simulation_type="collision")
+                res = await run_simulation(simulation_type="collision", session_id=session_id)
                 results.append({"command": sub_cmd, **res})
             elif "重置" in cmd_lower or "reset" in cmd_lower:
-                res = await reset_view()
+                res = await reset_view(session_id=session_id)
                 results.append({"command": sub_cmd, **res})
             elif "清空" in cmd_lower or "clear" in cmd_lower:
-                res = await clear_scene()
+                res = await clear_scene(session_id=session_id)
                 results.append({"command": sub_cmd, **res})
             else:
                 results.append({
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+几何精度 - 场景网格的存储与传输精度（GEOMETRY_PRECISION）：
+- float64：顶点和法线按float64存储，传输完整精度
+- float32：按float32存储（浏览器本来就用float32渲染），世界坐标缓存也是float32，传输保留7位有效数字
+- quantized16：顶点按每个形状的包围盒量化为16位整数，法线量化到[-1, 1]区间；
+  传输时发送整数码和反量化参数（value = offset + code * scale，与KHR_mesh_quantization相同）
+float64以外的模式中，顶点数不超过65536的网格的三角形索引存为uint16
+变换矩阵、包围盒和物理积分器始终使用float64，只在这些边界处把存储的几何解码为float64
+"""
+
+import os
+from typing import Any, Dict, Optional, Tuple, Union
+
+import numpy as np
+
+PRECISION_MODES = ("float64", "float32", "quantized16")
+GEOMETRY_PRECISION = os.environ.get("GEOMETRY_PRECISION", "float32")
+# float32传输保留的有效数字位数
+FLOAT32_DIGITS = 7
+
+QUANTIZED_MAX = 65535
+
+
+class QuantizedArray:
+    """(N,3) 数组按各轴区间量化为uint16：value = lo + code * step"""
+
+    __slots__ = ("codes", "lo", "step")
+
+    def __init__(self, values: np.ndarray, lo: Optional[np.ndarray] = None, hi: Optional[np.ndarray] = None):
+        values = np.asarray(values, dtype=np.float64).reshape(-1, 3)
+        if lo is None:
+            lo = values.min(axis=0) if len(values) else np.zeros(3)
+        if hi is None:
+            hi = values.max(axis=0) if len(values) else np.zeros(3)
+        self.lo = np.asarray(lo, dtype=np.float64)
+        extent = np.asarray(hi, dtype=np.float64) - self.lo
+        self.step = np.where(extent > 0, extent / QUANTIZED_MAX, 1.0)
+        self.codes = np.clip(np.rint((values - self.lo) / self.step), 0, QUANTIZED_MAX).astype(np.uint16)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.codes.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.lo.nbytes + self.step.nbytes
+
+    def decode(self, dtype=np.float64) -> np.ndarray:
+        return (self.lo.astype(dtype) + self.codes.astype(dtype) * self.step.astype(dtype)).astype(dtype, copy=False)
+
+
+Stored = Union[np.ndarray, QuantizedArray]
+
+
+def validate(mode: str) -> str:
+    if mode not in PRECISION_MODES:
+        raise ValueError(f"不支持的几何精度: {mode}，可选: {', '.join(PRECISION_MODES)}")
+    return mode
+
+
+def compute_dtype(mode: str):
+    """世界坐标缓存等派生几何使用的浮点类型"""
+    return np.float64 if mode == "float64" else np.float32
+
+
+def encode(values: np.ndarray, mode: str, unit: bool = False) -> Stored:
+    """按存储精度编码 (N,3) 数组；unit为true时（法线）量化区间固定为[-1, 1]"""
+    if mode == "quantized16":
+        return QuantizedArray(values, -np.ones(3), np.ones(3)) if unit else QuantizedArray(values)
+    return np.ascontiguousarray(values, dtype=compute_dtype(mode))
+
+
+def encode_faces(faces: np.ndarray, mode: str, vertex_count: int) -> np.ndarray:
+    """三角形索引：float64以外的模式在顶点数不超过65536时存为uint16（与glTF的UNSIGNED_SHORT索引相同）"""
+    if mode != "float64" and vertex_count <= QUANTIZED_MAX + 1:
+        return np.ascontiguousarray(faces, dtype=np.uint16)
+    return faces
+
+
+def decode(stored: Optional[Stored], dtype=np.float64) -> Optional[np.ndarray]:
+    if stored is None:
+        return None
+    if isinstance(stored, QuantizedArray):
+        return stored.decode(dtype)
+    return np.asarray(stored, dtype=dtype)
+
+
+def mode_of(stored: Stored) -> str:
+    """存储数组对应的精度模式"""
+    if isinstance(stored, QuantizedArray):
+        return "quantized16"
+    return "float32" if stored.dtype == np.float32 else "float64"
+
+
+def nbytes(stored: Optional[Stored]) -> int:
+    return 0 if stored is None else int(stored.nbytes)
+
+
+def round_for_transport(values: np.ndarray, mode: str) -> np.ndarray:
+    """float32以下的精度按7位有效数字舍入，JSON中的数字更短；float64原样"""
+    values = np.asarray(values, dtype=np.float64)
+    if mode == "float64" or not values.size:
+        return values
+    magnitude = float(np.abs(values).max())
+    decimals = FLOAT32_DIGITS - (int(np.floor(np.log10(magnitude))) + 1 if magnitude > 0 else 0)
+    return np.round(values, max(decimals, 0)) + 0.0
+
+
+def to_wire(values: np.ndarray, mode: str, unit: bool = False) -> Tuple[np.ndarray, Optional[Dict[str, Any]]]:
+    """传输用的扁平数组（由serialization直接编码）及其编码说明：quantized16时为uint16整数码和
+    {"type", "offset", "scale"}，否则为舍入后的浮点数和None"""
+    if mode == "quantized16":
+        quantized = encode(values, mode, unit)
+        encoding = {"type": "quantized16", "offset": quantized.lo.tolist(), "scale": quantized.step.tolist()}
+        return quantized.codes.ravel(), encoding
+    return round_for_transport(values, mode).ravel(), None
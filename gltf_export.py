@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+glTF二进制（GLB）导出 - 把场景网格和可选的仿真轨迹写成一个GLB文件
+缓冲区直接来自NumPy数组的内存，不为每个顶点创建Python对象；
+所有长度在写出前已知，因此可以边生成边发送（流式响应）并给出Content-Length
+"""
+
+import json
+import logging
+import os
+import re
+import struct
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = os.environ.get(
+    "EXPORT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "exports")
+)
+EXPORT_MAX_FILES = int(os.environ.get("EXPORT_MAX_FILES", "20"))
+# 轨迹按帧分块读取，每块最多这么多帧
+ANIMATION_BLOCK_FRAMES = 65536
+
+GLB_MAGIC = 0x46546C67  # "glTF"
+GLB_VERSION = 2
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+CONTENT_TYPE = "model/gltf-binary"
+
+FLOAT = 5126
+UNSIGNED_INT = 5125
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+
+_EXPORT_NAME_PATTERN = re.compile(r"^[\w\-]+\.glb$")
+
+
+def _pad4(length: int) -> int:
+    return (4 - length % 4) % 4
+
+
+def _array_bytes(array: np.ndarray) -> memoryview:
+    """C连续数组的字节视图（不复制）"""
+    return memoryview(np.ascontiguousarray(array)).cast("B")
+
+
+class GlbBuilder:
+    """按顺序登记缓冲区片段并生成glTF JSON，最后以字节块迭代输出整个GLB"""
+
+    def __init__(self, generator: str = "3d-simulation-platform"):
+        self.gltf: Dict[str, Any] = {
+            "asset": {"version": "2.0", "generator": generator},
+            "scene": 0,
+            "scenes": [{"nodes": []}],
+            "nodes": [],
+            "meshes": [],
+            "accessors": [],
+            "bufferViews": [],
+            "buffers": [{"byteLength": 0}]
+        }
+        self._parts: List[Callable[[], Iterable[Any]]] = []
+        self._offset = 0
+        self._json: Optional[bytes] = None
+
+    def _add_view(self, byte_length: int, producer: Callable[[], Iterable[Any]],
+                  target: Optional[int] = None) -> int:
+        view = {"buffer": 0, "byteOffset": self._offset, "byteLength": byte_length}
+        if target:
+            view["target"] = target
+        self.gltf["bufferViews"].append(view)
+        self._parts.append(producer)
+        # 所有分量均为4字节，偏移天然4字节对齐
+        self._offset += byte_length
+        return len(self.gltf["bufferViews"]) - 1
+
+    def _add_accessor(self, view: int, component_type: int, count: int, accessor_type: str,
+                      minimum: Optional[List[float]] = None, maximum: Optional[List[float]] = None) -> int:
+        accessor = {"bufferView": view, "componentType": component_type, "count": count, "type": accessor_type}
+        if minimum is not None:
+            accessor["min"] = minimum
+            accessor["max"] = maximum
+        self.gltf["accessors"].append(accessor)
+        return len(self.gltf["accessors"]) - 1
+
+    def add_array(self, array: np.ndarray, accessor_type: str, target: Optional[int] = None,
+                  bounds: bool = False) -> int:
+        """登记一个内存中的数组（float32或uint32），返回accessor索引"""
+        if array.dtype == np.float32:
+            component_type = FLOAT
+        elif array.dtype == np.uint32:
+            component_type = UNSIGNED_INT
+        else:
+            raise ValueError(f"不支持的数组类型: {array.dtype}")
+        array = np.ascontiguousarray(array)
+        view = self._add_view(array.nbytes, lambda: (_array_bytes(array),), target)
+        minimum = maximum = None
+        if bounds and len(array):
+            rows = array.reshape(len(array), -1)
+            minimum = rows.min(axis=0).tolist()
+            maximum = rows.max(axis=0).tolist()
+        return self._add_accessor(view, component_type, len(array), accessor_type, minimum, maximum)
+
+    def add_node(self, name: str, mesh: Optional[int] = None,
+                 translation: Optional[List[float]] = None) -> int:
+        node: Dict[str, Any] = {"name": name}
+        if mesh is not None:
+            node["mesh"] = mesh
+        if translation is not None and any(translation):
+            node["translation"] = [float(v) for v in translation]
+        self.gltf["nodes"].append(node)
+        index = len(self.gltf["nodes"]) - 1
+        self.gltf["scenes"][0]["nodes"].append(index)
+        return index
+
+    def add_mesh(self, name: str, positions: np.ndarray, triangles: np.ndarray,
+                 normals: Optional[np.ndarray] = None, translation: Optional[List[float]] = None) -> int:
+        """添加一个三角网格及引用它的节点，返回节点索引"""
+        attributes = {
+            "POSITION": self.add_array(positions.astype(np.float32, copy=False), "VEC3", ARRAY_BUFFER, bounds=True)
+        }
+        if normals is not None and len(normals) == len(positions):
+            attributes["NORMAL"] = self.add_array(normals.astype(np.float32, copy=False), "VEC3", ARRAY_BUFFER)
+        indices = self.add_array(triangles.astype(np.uint32, copy=False).reshape(-1), "SCALAR",
+                                 ELEMENT_ARRAY_BUFFER)
+        self.gltf["meshes"].append({
+            "name": name,
+            "primitives": [{"attributes": attributes, "indices": indices, "mode": 4}]
+        })
+        return self.add_node(name, len(self.gltf["meshes"]) - 1, translation)
+
+    def add_translation_animation(self, name: str, times: np.ndarray, positions: np.ndarray,
+                                  nodes: List[int]) -> None:
+        """positions为 (frames, bodies, 3) 数组（可以是内存映射），第i个物体驱动nodes[i]的平移
+
+        glTF要求每个采样器的输出紧密排列，因此按物体逐个输出，每个物体再按帧分块读取
+        """
+        frames = len(times)
+        input_accessor = self.add_array(times.astype(np.float32, copy=False), "SCALAR",
+                                        bounds=True)
+        samplers, channels = [], []
+        for body, node in enumerate(nodes):
+            def produce(body=body):
+                for start in range(0, frames, ANIMATION_BLOCK_FRAMES):
+                    block = positions[start:start + ANIMATION_BLOCK_FRAMES, body, :]
+                    yield _array_bytes(np.asarray(block, dtype=np.float32))
+            view = self._add_view(frames * 12, produce)
+            output_accessor = self._add_accessor(view, FLOAT, frames, "VEC3")
+            samplers.append({"input": input_accessor, "output": output_accessor, "interpolation": "LINEAR"})
+            channels.append({"sampler": len(samplers) - 1, "target": {"node": node, "path": "translation"}})
+        if channels:
+            self.gltf.setdefault("animations", []).append({
+                "name": name, "samplers": samplers, "channels": channels
+            })
+
+    def _finalize(self) -> bytes:
+        if self._json is None:
+            self.gltf["buffers"][0]["byteLength"] = self._offset
+            gltf = {key: value for key, value in self.gltf.items() if value != []}
+            encoded = json.dumps(gltf, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            self._json = encoded + b" " * _pad4(len(encoded))
+        return self._json
+
+    @property
+    def content_length(self) -> int:
+        json_chunk = self._finalize()
+        return 12 + 8 + len(json_chunk) + (8 + self._offset if self._offset else 0)
+
+    def iter_bytes(self) -> Iterator[bytes]:
+        """逐块输出GLB：文件头、JSON块、BIN块（缓冲区片段依次生成）"""
+        json_chunk = self._finalize()
+        yield struct.pack("<III", GLB_MAGIC, GLB_VERSION, self.content_length)
+        yield struct.pack("<II", len(json_chunk), CHUNK_JSON) + json_chunk
+        if not self._offset:
+            return
+        yield struct.pack("<II", self._offset, CHUNK_BIN)
+        written = 0
+        for producer in self._parts:
+            for chunk in producer():
+                written += len(chunk)
+                yield chunk
+        if written != self._offset:
+            raise RuntimeError(f"GLB缓冲区长度不一致: {written} != {self._offset}")
+
+    def write(self, path: str) -> int:
+        with open(path, "wb") as f:
+            for chunk in self.iter_bytes():
+                f.write(chunk)
+        return self.content_length
+
+
+def save_export(builder: GlbBuilder, prefix: str = "scene") -> Dict[str, Any]:
+    """把GLB写入导出目录，返回文件名、路径和字节数"""
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    name = f"{prefix}-{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}.glb"
+    path = os.path.join(EXPORT_DIR, name)
+    tmp_path = path + ".tmp"
+    size = builder.write(tmp_path)
+    os.replace(tmp_path, path)
+    _prune_exports()
+    logger.info(f"场景已导出: {name} ({size} 字节)")
+    return {"name": name, "path": path, "bytes": size}
+
+
+def export_path(name: str) -> Optional[str]:
+    """校验文件名并返回导出文件路径，防止路径穿越"""
+    if not _EXPORT_NAME_PATTERN.match(name or ""):
+        return None
+    path = os.path.join(EXPORT_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+def _prune_exports() -> None:
+    try:
+        names = [n for n in os.listdir(EXPORT_DIR) if _EXPORT_NAME_PATTERN.match(n)]
+    except OSError:
+        return
+    names.sort(key=lambda n: os.path.getmtime(os.path.join(EXPORT_DIR, n)), reverse=True)
+    for name in names[EXPORT_MAX_FILES:]:
+        try:
+            os.remove(os.path.join(EXPORT_DIR, name))
+        except OSError:
+            pass
@@ -0,0 +1,504 @@
+#!/usr/bin/env python3
+"""
+实时仿真 - 服务端按固定tick推进场景中物体的物理状态，并按快照频率把紧凑的位置快照推送给订阅者
+（同一场景房间内的连接），客户端在相邻快照之间插值显示。
+
+物体按包围球近似：重力、与地面(y=0)的反弹和摩擦、球与球之间的冲量碰撞；
+宽相位在分布最广的轴上做排序扫描（sweep and prune），全部为NumPy向量运算，几百个物体时每tick约1毫秒。
+默认开启连续碰撞检测（ccd.py）：步长较大时快速物体不会穿过彼此。
+暂停和停止时把位置写回场景的形状（空间索引同步更新），之后的查询和导出看到的是仿真后的位置。
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import ccd
+import metrics
+from scene_registry import normalize_session_id, scene_registry
+from trajectory_recorder import TrajectoryRecorder
+from trajectory_store import trajectory_store
+
+logger = logging.getLogger(__name__)
+
+# 物理步进频率（Hz）和向客户端推送快照的频率（Hz）
+LIVE_TICK_RATE = float(os.environ.get("LIVE_TICK_RATE", "60"))
+LIVE_SNAPSHOT_RATE = float(os.environ.get("LIVE_SNAPSHOT_RATE", "20"))
+# 单个实时仿真的物体数上限
+LIVE_MAX_BODIES = int(os.environ.get("LIVE_MAX_BODIES", "2000"))
+# 落后时一次最多追赶的tick数，超出部分直接放弃（仿真时间变慢而不是越积越多）
+LIVE_MAX_CATCHUP_TICKS = 4
+LIVE_MIN_SPEED = 0.1
+LIVE_MAX_SPEED = 10.0
+LIVE_MAX_STEPS = 600
+# 连续碰撞检测只处理一步内位移超过该比例半径的物体
+LIVE_CCD_MIN_TRAVEL = 0.1
+# 快照坐标保留的小数位数
+LIVE_SNAPSHOT_DECIMALS = 3
+# 按快照频率保留的最近位置帧数（环形缓冲区，默认20Hz下约30秒），save操作把它保存为轨迹运行
+LIVE_HISTORY_FRAMES = int(os.environ.get("LIVE_HISTORY_FRAMES", "600"))
+# 有连接在观看的运行中场景多久刷新一次访问时间，避免被当作空闲场景淘汰；
+# 无人观看的实时仿真随场景空闲超时被停止
+LIVE_TOUCH_INTERVAL = 10.0
+
+STOPPED = "stopped"
+RUNNING = "running"
+PAUSED = "paused"
+
+ACTIONS = ("start", "pause", "step", "speed", "stop", "status", "save")
+
+
+class LiveWorld:
+    """实时仿真的物体状态：pos/vel (N,3)，radius (N,)，质量与包围球体积成正比"""
+
+    def __init__(self, positions: np.ndarray, radii: np.ndarray, gravity: float = 9.81,
+                 restitution: float = 0.6, friction: float = 0.3, ground: float = 0.0, ccd: bool = True):
+        self.pos = np.array(positions, dtype=np.float64).reshape(-1, 3)
+        self.vel = np.zeros_like(self.pos)
+        self.radius = np.maximum(np.asarray(radii, dtype=np.float64), 1e-3)
+        self.inv_mass = 1.0 / self.radius ** 3
+        self.gravity = gravity
+        self.restitution = restitution
+        self.friction = friction
+        self.ground = ground
+        self.ccd = ccd
+        # 最近一步的物体间接触对数和着地物体数；连续碰撞检测累计处理的碰撞数
+        self.contacts = 0
+        self.ground_contacts = 0
+        self.swept_contacts = 0
+
+    def __len__(self) -> int:
+        return len(self.pos)
+
+    def step(self, dt: float) -> None:
+        """半隐式欧拉积分一步，然后处理地面和物体间的接触；开启ccd时位置更新按首次接触时刻分段"""
+        self.vel[:, 1] -= self.gravity * dt
+        if self.ccd:
+            self._advance_swept(dt)
+        else:
+            self.pos += self.vel * dt
+        self._collide_ground(dt)
+        self._collide_pairs()
+
+    def _advance_swept(self, dt: float) -> None:
+        """连续碰撞检测：步长内会相撞的物体先移动到接触位置、施加冲量，再用新速度走完剩余时间。
+        每个物体每步只处理它最早的一次碰撞（双方的最早碰撞是同一对时），其余仍由离散接触处理"""
+        start = self.pos.copy()
+        displacement = self.vel * dt
+        self.pos += displacement
+        # 位移不到半径一定比例的物体不会穿过其他物体，全部物体都很慢时（如静止堆叠）跳过
+        fast = (displacement ** 2).sum(axis=1) > (LIVE_CCD_MIN_TRAVEL * self.radius) ** 2
+        if not fast.any():
+            return
+        radius = self.radius[:, None]
+        i, j = ccd.overlapping_pairs(np.minimum(start, self.pos) - radius, np.maximum(start, self.pos) + radius)
+        keep = fast[i] | fast[j]
+        i, j = i[keep], j[keep]
+        if not len(i):
+            return
+        motion = displacement[j] - displacement[i]
+        box_toi = ccd.swept_aabb_toi(start[i] - radius[i], start[i] + radius[i],
+                                     start[j] - radius[j], start[j] + radius[j], motion)
+        # 包围盒不会接触的对不必再算球；起始时已相交（时刻为0）的对交给离散接触
+        keep = np.isfinite(box_toi)
+        i, j, motion = i[keep], j[keep], motion[keep]
+        toi = ccd.swept_sphere_toi(start[i], start[j], self.radius[i] + self.radius[j], motion)
+        keep = np.isfinite(toi) & (toi > 0)
+        if not keep.any():
+            return
+        i, j, toi = i[keep], j[keep], toi[keep]
+        earliest = np.full(len(self.pos), np.inf)
+        np.minimum.at(earliest, i, toi)
+        np.minimum.at(earliest, j, toi)
+        first = (toi == earliest[i]) & (toi == earliest[j])
+        i, j, toi = i[first], j[first], toi[first]
+
+        bodies = np.unique(np.concatenate([i, j]))
+        hit_time = earliest[bodies][:, None]
+        contact = start[bodies] + displacement[bodies] * hit_time
+        self.pos[bodies] = contact
+        delta = self.pos[j] - self.pos[i]
+        self.swept_contacts += len(i)
+        self._apply_impulse(i, j, delta / np.maximum(np.linalg.norm(delta, axis=1), 1e-9)[:, None])
+        self.pos[bodies] = contact + self.vel[bodies] * dt * (1 - hit_time)
+
+    def _collide_ground(self, dt: float) -> None:
+        depth = self.ground + self.radius - self.pos[:, 1]
+        touching = depth > 0
+        self.ground_contacts = int(touching.sum())
+        if not self.ground_contacts:
+            return
+        self.pos[touching, 1] += depth[touching]
+        vy = self.vel[touching, 1]
+        # 低速接触不再反弹，避免静止物体在地面上抖动
+        bounce = np.where(vy < -2 * self.gravity * dt, -vy * self.restitution, np.maximum(vy, 0.0))
+        self.vel[touching, 1] = bounce
+        # 库仑摩擦：水平速度按 friction*g*dt 减小，减到0为止
+        horizontal = self.vel[touching][:, [0, 2]]
+        speed = np.linalg.norm(horizontal, axis=1)
+        scale = np.maximum(0.0, 1.0 - self.friction * self.gravity * dt / np.maximum(speed, 1e-12))
+        self.vel[np.flatnonzero(touching)[:, None], [0, 2]] = horizontal * scale[:, None]
+
+    def contact_pairs(self) -> np.ndarray:
+        """包围球相交的物体对 (P,2)：包围盒宽相位后检查球心距离"""
+        radius = self.radius[:, None]
+        i, j = ccd.overlapping_pairs(self.pos - radius, self.pos + radius)
+        delta = self.pos[j] - self.pos[i]
+        reach = self.radius[i] + self.radius[j]
+        hit = (delta ** 2).sum(axis=1) < reach ** 2
+        return np.stack([i[hit], j[hit]], axis=1)
+
+    def _collide_pairs(self) -> None:
+        pairs = self.contact_pairs()
+        self.contacts = len(pairs)
+        if not len(pairs):
+            return
+        i, j = pairs[:, 0], pairs[:, 1]
+        delta = self.pos[j] - self.pos[i]
+        distance = np.linalg.norm(delta, axis=1)
+        normal = np.where(distance[:, None] > 1e-9, delta / np.maximum(distance, 1e-9)[:, None], [0.0, 1.0, 0.0])
+        inv_i, inv_j = self.inv_mass[i], self.inv_mass[j]
+        inv_sum = inv_i + inv_j
+        self._apply_impulse(i, j, normal)
+
+        # 按质量比例把重叠部分推开（保留少量重叠以免接触反复断开）
+        overlap = np.maximum(self.radius[i] + self.radius[j] - distance - 1e-3, 0.0) * 0.8
+        np.add.at(self.pos, i, -(overlap * inv_i / inv_sum)[:, None] * normal)
+        np.add.at(self.pos, j, (overlap * inv_j / inv_sum)[:, None] * normal)
+
+    def _apply_impulse(self, i: np.ndarray, j: np.ndarray, normal: np.ndarray) -> None:
+        """沿法线（从i指向j）相互接近的物体对施加恢复系数冲量"""
+        inv_i, inv_j = self.inv_mass[i], self.inv_mass[j]
+        approach = ((self.vel[j] - self.vel[i]) * normal).sum(axis=1)
+        impulse = np.where(approach < 0, -(1 + self.restitution) * approach / (inv_i + inv_j), 0.0)
+        np.add.at(self.vel, i, -(impulse * inv_i)[:, None] * normal)
+        np.add.at(self.vel, j, (impulse * inv_j)[:, None] * normal)
+
+
+def bounding_spheres(shapes) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """形状的包围球（按缓存的世界坐标顶点，含旋转和缩放）：
+    (中心 (N,3)，半径 (N,)，中心相对形状位置的偏移 (N,3))"""
+    centers, radii = [], []
+    for shape in shapes:
+        vertices = shape.world_vertices()
+        lo, hi = shape.bounds()
+        center = (lo + hi) / 2
+        centers.append(center)
+        radii.append(float(np.linalg.norm(vertices - center, axis=1).max()) if len(vertices) else 0.0)
+    centers = np.array(centers, dtype=np.float64).reshape(-1, 3)
+    positions = np.array([shape.position for shape in shapes], dtype=np.float64).reshape(-1, 3)
+    return centers, np.array(radii, dtype=np.float64), centers - positions
+
+
+class LiveSimulation:
+    """单个场景的实时仿真：一个后台线程按固定tick步进，控制操作在调用方线程执行"""
+
+    def __init__(self, session_id: str, service, params: Optional[Dict] = None,
+                 on_frame: Optional[Callable[[str, Dict], int]] = None,
+                 on_watched: Optional[Callable[[str], None]] = None):
+        params = params or {}
+        self.session_id = session_id
+        self.service = service
+        self.on_frame = on_frame
+        self.on_watched = on_watched
+        self.tick_rate = float(np.clip(params.get("tick_rate", LIVE_TICK_RATE), 10, 240))
+        self.snapshot_rate = float(np.clip(params.get("snapshot_rate", LIVE_SNAPSHOT_RATE), 1, self.tick_rate))
+        self.frame_every = max(1, round(self.tick_rate / self.snapshot_rate))
+        self.speed = _clamp_speed(params.get("speed", 1.0))
+
+        # 物体取自启动时场景中的形状；包围球中心相对形状位置的偏移在写回时扣除
+        self.shapes = list(service.shapes)
+        if len(self.shapes) > LIVE_MAX_BODIES:
+            raise ValueError(f"物体数 {len(self.shapes)} 超过实时仿真上限 {LIVE_MAX_BODIES}")
+        self.ids = [shape.id for shape in self.shapes]
+        centers, radii, self.offsets = bounding_spheres(self.shapes)
+        self.world = LiveWorld(
+            centers, radii,
+            gravity=float(params.get("gravity", 9.81)),
+            restitution=float(params.get("restitution", 0.6)),
+            friction=float(params.get("friction", 0.3)),
+            ccd=bool(params.get("ccd", True))
+        )
+        if "initial_velocity" in params:
+            self.world.vel[:] = np.asarray(params["initial_velocity"], dtype=np.float64).reshape(-1, 3)
+
+        # 最近的位置历史，每个快照间隔记录一帧
+        self.history = TrajectoryRecorder(max(1, LIVE_HISTORY_FRAMES), len(self.world), {"positions": 3},
+                                          ring=True, dtype=np.float32)
+        self.history.record(positions=self.world.pos - self.offsets)
+
+        self.state = PAUSED
+        self.tick = 0
+        self.sim_time = 0.0
+        self.last_tick_seconds = 0.0
+        self.overruns = 0
+        self._cond = threading.Condition()
+        self._resync = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def interval(self) -> float:
+        return 1.0 / self.tick_rate
+
+    def start(self) -> None:
+        with self._cond:
+            if self.state == STOPPED:
+                raise RuntimeError("实时仿真已停止")
+            self.state = RUNNING
+            self._resync = True
+            self._cond.notify_all()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True,
+                                                name=f"live-{self.session_id}")
+                self._thread.start()
+
+    def pause(self) -> None:
+        with self._cond:
+            if self.state == RUNNING:
+                self.state = PAUSED
+                self._write_back()
+            self._cond.notify_all()
+
+    def step(self, steps: int = 1) -> Dict:
+        """暂停状态下手动推进若干tick，返回最新快照"""
+        with self._cond:
+            if self.state != PAUSED:
+                raise RuntimeError("只有暂停状态下可以单步推进")
+            for _ in range(steps):
+                self._advance()
+            self._write_back()
+            return self.frame()
+
+    def set_speed(self, speed: float) -> None:
+        with self._cond:
+            self.speed = _clamp_speed(speed)
+
+    def stop(self) -> Dict:
+        """停止仿真并写回位置，返回最后一帧"""
+        with self._cond:
+            if self.state != STOPPED:
+                self._write_back()
+                self.state = STOPPED
+            self._cond.notify_all()
+            frame = self.frame()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        return frame
+
+    def frame(self) -> Dict:
+        """紧凑快照：positions为按ids顺序展平的形状位置 [x0, y0, z0, x1, ...]"""
+        positions = np.round(self.world.pos - self.offsets, LIVE_SNAPSHOT_DECIMALS)
+        return {
+            "session_id": self.session_id,
+            "tick": self.tick,
+            "time": round(self.sim_time, 4),
+            "server_time": round(time.time(), 4),
+            "positions": positions.ravel()
+        }
+
+    def status(self) -> Dict:
+        return {
+            "session_id": self.session_id,
+            "state": self.state,
+            "tick": self.tick,
+            "time": round(self.sim_time, 4),
+            "speed": self.speed,
+            "tick_rate": self.tick_rate,
+            "snapshot_rate": self.tick_rate / self.frame_every,
+            "bodies": len(self.world),
+            "ids": self.ids,
+            "history_frames": len(self.history),
+            "tick_ms": round(self.last_tick_seconds * 1000, 3),
+            "tick_budget": round(self.last_tick_seconds / self.interval, 3),
+            "overruns": self.overruns
+        }
+
+    def _advance(self) -> None:
+        """推进一个tick；加速时拆成多个子步，保持每个物理步长不超过tick间隔"""
+        substeps = max(1, math.ceil(self.speed))
+        dt = self.interval * self.speed / substeps
+        for _ in range(substeps):
+            self.world.step(dt)
+        self.tick += 1
+        self.sim_time += self.interval * self.speed
+        if self.tick % self.frame_every == 0:
+            self.history.record(positions=self.world.pos - self.offsets)
+
+    def save_history(self) -> Dict:
+        """把保留的位置历史保存为轨迹运行（可按帧读取和随GLB导出），返回运行元数据"""
+        with self._cond:
+            frames = len(self.history)
+            # 只有位置通道（float32），按预算的每值字节数折算为2
+            self.service._check_trajectory_budget(frames, len(self.world), 2)
+            meta = self.history.save(
+                trajectory_store, "live", self.interval * self.frame_every,
+                metadata={"ids": self.ids, "tick": self.tick, "speed": self.speed,
+                          "dropped_frames": self.history.dropped}
+            )
+        self.service.trajectory_runs.append(meta["run_id"])
+        return meta
+
+    def _write_back(self) -> None:
+        """把当前位置写回场景中仍然存在的形状（同时更新空间索引和碰撞缓存）"""
+        positions = self.world.pos - self.offsets
+        shapes = self.service.shapes
+        for shape_id, shape, position in zip(self.ids, self.shapes, positions):
+            if shapes.get(shape_id) is shape:
+                self.service.set_shape_position(shape_id, position)
+
+    def _run(self) -> None:
+        """固定tick循环：按绝对时间表唤醒，落后时追赶最多LIVE_MAX_CATCHUP_TICKS个tick"""
+        next_tick = time.perf_counter()
+        last_touch = 0.0
+        while True:
+            with self._cond:
+                if self.state == STOPPED:
+                    return
+                if self.state == PAUSED:
+                    self._cond.wait()
+                    continue
+                now = time.perf_counter()
+                if self._resync:
+                    next_tick, self._resync = now, False
+                if now < next_tick:
+                    self._cond.wait(next_tick - now)
+                    continue
+                due = int((now - next_tick) / self.interval) + 1
+                skipped = max(0, due - LIVE_MAX_CATCHUP_TICKS)
+                try:
+                    for _ in range(due - skipped):
+                        self._advance()
+                except Exception as e:
+                    logger.error(f"实时仿真步进失败: {e}")
+                    self.state = PAUSED
+                    continue
+                next_tick += due * self.interval
+                elapsed = time.perf_counter() - now
+                self.last_tick_seconds = elapsed
+                frame = self.frame() if self.tick % self.frame_every < due - skipped else None
+
+            metrics.LIVE_TICK_SECONDS.observe(elapsed)
+            metrics.LIVE_TICK_BUDGET.observe(elapsed / self.interval)
+            if elapsed > self.interval:
+                self.overruns += 1
+                metrics.LIVE_TICK_OVERRUNS.inc()
+            if skipped:
+                metrics.LIVE_TICKS_SKIPPED.inc(skipped)
+            if frame is None or self.on_frame is None:
+                continue
+            try:
+                recipients = self.on_frame(self.session_id, frame)
+            except Exception as e:
+                logger.error(f"推送实时仿真快照失败: {e}")
+                continue
+            if recipients and self.on_watched is not None and now - last_touch > LIVE_TOUCH_INTERVAL:
+                last_touch = now
+                self.on_watched(self.session_id)
+
+
+def _clamp_speed(speed) -> float:
+    return float(np.clip(float(speed), LIVE_MIN_SPEED, LIVE_MAX_SPEED))
+
+
+class LiveSimulationManager:
+    """会话ID -> 实时仿真；场景被注册表移除时自动停止对应的仿真"""
+
+    def __init__(self, registry, on_frame: Optional[Callable[[str, Dict], int]] = None):
+        self.registry = registry
+        self.on_frame = on_frame
+        self._lock = threading.Lock()
+        self._sims: Dict[str, LiveSimulation] = {}
+        registry.add_evict_listener(self.stop)
+
+    def get(self, session_id: str) -> Optional[LiveSimulation]:
+        with self._lock:
+            return self._sims.get(session_id)
+
+    def control(self, session_id: Optional[str], action: str, params: Optional[Dict] = None) -> Dict:
+        """执行控制操作：start（新建或继续）、pause、step、speed、stop、status"""
+        params = params or {}
+        try:
+            session_id = normalize_session_id(session_id)
+            if action not in ACTIONS:
+                return {"success": False, "error": f"不支持的实时仿真操作: {action}"}
+            service = self.registry.get(session_id)
+            sim = self.get(session_id)
+            frame = None
+
+            if action == "start":
+                if sim is None or params.get("restart"):
+                    if sim is not None:
+                        sim.stop()
+                    sim = self._create(session_id, service, params)
+                elif "speed" in params:
+                    sim.set_speed(params["speed"])
+                sim.start()
+                message = "实时仿真已开始"
+            elif action == "status":
+                if sim is None:
+                    return {"success": True, "data": {"session_id": session_id, "state": STOPPED}}
+                return {"success": True, "data": {**sim.status(), "frame": sim.frame()}}
+            elif sim is None:
+                if action != "step":
+                    return {"success": False, "error": "当前场景没有实时仿真"}
+                sim = self._create(session_id, service, params)
+            if action == "pause":
+                sim.pause()
+                message = "实时仿真已暂停"
+            elif action == "step":
+                steps = int(np.clip(int(params.get("steps", 1)), 1, LIVE_MAX_STEPS))
+                frame = sim.step(steps)
+                message = f"实时仿真已推进 {steps} 个tick"
+            elif action == "speed":
+                sim.set_speed(params.get("speed", 1.0))
+                message = f"实时仿真速度: {sim.speed}x"
+            elif action == "save":
+                meta = sim.save_history()
+                return {"success": True, "data": {**sim.status(), "run_id": meta["run_id"], "frames": meta["frames"]},
+                        "message": f"已保存最近 {meta['frames']} 帧实时仿真轨迹"}
+            elif action == "stop":
+                frame = sim.stop()
+                with self._lock:
+                    self._sims.pop(session_id, None)
+                    metrics.LIVE_SIMULATIONS.set(len(self._sims))
+                message = "实时仿真已停止"
+
+            result = {"success": True, "data": sim.status(), "message": message}
+            if frame is not None:
+                result["frame"] = frame
+            return result
+        except (ValueError, RuntimeError) as e:
+            return {"success": False, "error": str(e)}
+        except Exception as e:
+            logger.error(f"实时仿真控制失败: {e}")
+            return {"success": False, "error": str(e)}
+
+    def stop(self, session_id: str) -> None:
+        """停止并移除会话的实时仿真（场景释放、连接断开时调用）"""
+        with self._lock:
+            sim = self._sims.pop(session_id, None)
+            metrics.LIVE_SIMULATIONS.set(len(self._sims))
+        if sim is not None:
+            sim.stop()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            sims = list(self._sims.values())
+        return [sim.status() for sim in sims]
+
+    def _create(self, session_id: str, service, params: Dict) -> LiveSimulation:
+        sim = LiveSimulation(session_id, service, params, on_frame=self.on_frame,
+                             on_watched=self.registry.touch)
+        with self._lock:
+            self._sims[session_id] = sim
+            metrics.LIVE_SIMULATIONS.set(len(self._sims))
+        return sim
+
+
+# 全局实时仿真管理器（Flask端设置on_frame把快照推送给场景房间，返回接收的连接数）
+live_manager = LiveSimulationManager(scene_registry)
@@ -0,0 +1,6 @@
+"""
+端到端压测工具 - 在真实的Flask + FastMCP服务上并发驱动Socket.IO和REST请求
+用本地的模拟Ollama服务器代替大模型，按可配置的速率流式输出token
+
+    python -m loadtest --spawn --users 20 --duration 60
+"""
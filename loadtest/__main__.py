@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+压测入口
+
+    python -m loadtest --spawn --users 20 --duration 60          # 自动启动模拟Ollama、FastMCP和Flask
+    python -m loadtest --users 50 --mix chat=1,simulate=3         # 压测已运行的服务
+    python -m loadtest.fake_ollama --port 11435 --token-rate 30   # 单独运行模拟Ollama
+"""
+
+import argparse
+import json
+import logging
+import sys
+from typing import Dict
+
+from loadtest.fake_ollama import FakeOllamaConfig, load_script
+from loadtest.runner import DEFAULT_MIX, LoadTestConfig, format_summary, run_load_test
+from loadtest.stack import LocalStack
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """解析 "chat=1,simulate=3"；未列出的操作权重为0"""
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"未知操作: {name}（可选: {', '.join(DEFAULT_MIX)}）")
+        mix[name] = float(weight) if weight else 1.0
+    return mix
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="3D仿真平台端到端压测")
+    parser.add_argument("--url", default="http://localhost:6006", help="Flask应用地址")
+    parser.add_argument("--mcp-url", default="http://localhost:8000", help="FastMCP服务器地址（用于采集线程数）")
+    parser.add_argument("--users", type=int, default=10, help="并发虚拟用户数")
+    parser.add_argument("--duration", type=float, default=30.0, help="压测时长（秒）")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="所有用户启动完毕所需秒数")
+    parser.add_argument("--think-time", type=float, default=0.0, help="操作之间的平均间隔（秒，指数分布）")
+    parser.add_argument("--timeout", type=float, default=60.0, help="单个操作超时（秒）")
+    parser.add_argument("--mix", type=parse_mix, help=f"操作权重，如 chat=1,simulate=3（可选: {', '.join(DEFAULT_MIX)}）")
+    parser.add_argument("--gravity-steps", type=int, default=100, help="simulate操作的仿真步数")
+    parser.add_argument("--transport", choices=["websocket", "polling"], help="强制Socket.IO传输方式")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="把汇总结果写入JSON文件")
+    stack = parser.add_argument_group("本地环境（--spawn）")
+    stack.add_argument("--spawn", action="store_true", help="启动模拟Ollama、FastMCP服务器和Flask应用")
+    stack.add_argument("--ollama-port", type=int, default=11435)
+    stack.add_argument("--token-rate", type=float, default=30.0, help="模拟Ollama每秒输出的token数")
+    stack.add_argument("--first-token-delay", type=float, default=0.2, help="模拟Ollama首token前的等待秒数")
+    stack.add_argument("--script", help="模拟Ollama的回复脚本JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    config = LoadTestConfig(
+        base_url=args.url.rstrip("/"),
+        mcp_url=args.mcp_url.rstrip("/") if args.mcp_url else None,
+        users=args.users,
+        duration=args.duration,
+        ramp_up=args.ramp_up,
+        think_time=args.think_time,
+        timeout=args.timeout,
+        mix=args.mix or dict(DEFAULT_MIX),
+        gravity_steps=args.gravity_steps,
+        seed=args.seed,
+        transports=[args.transport] if args.transport else None
+    )
+
+    local_stack = None
+    if args.spawn:
+        ollama_config = FakeOllamaConfig(
+            token_rate=args.token_rate,
+            first_token_delay=args.first_token_delay,
+            script=load_script(args.script) if args.script else None
+        )
+        local_stack = LocalStack(ollama_config, args.ollama_port).start()
+    try:
+        summary = run_load_test(config)
+    finally:
+        if local_stack is not None:
+            local_stack.stop()
+
+    print("\n" + format_summary(summary))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
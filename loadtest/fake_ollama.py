@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+模拟Ollama服务器 - 实现 /api/tags、/api/version 和流式 /api/chat
+按关键词匹配脚本化的回复（可包含 [TOOL_CALL:...] 指令），以固定速率逐token输出
+
+    python -m loadtest.fake_ollama --port 11435 --token-rate 30
+    OLLAMA_BASE_URL=http://localhost:11435 python app.py
+"""
+
+import argparse
+import json
+import logging
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "modelscope.cn/unsloth/DeepSeek-R1-0528-Qwen3-8B-GGUF:Q4_K_M"
+
+# 按顺序匹配：用户消息包含任一关键词时使用该回复
+DEFAULT_SCRIPT: Dict[str, Any] = {
+    "replies": [
+        {
+            "match": ["立方体", "cube"],
+            "reply": "<think>\n用户要求创建立方体，调用create_shape。\n</think>\n"
+                     "我来为您创建一个立方体。[TOOL_CALL:create_shape:{\"shape_type\":\"cube\",\"size\":1.0}]"
+        },
+        {
+            "match": ["球体", "sphere"],
+            "reply": "<think>\n用户要求创建球体，调用create_shape。\n</think>\n"
+                     "我来为您创建一个半径为1.5的球体。"
+                     "[TOOL_CALL:create_shape:{\"shape_type\":\"sphere\",\"radius\":1.5}]"
+        },
+        {
+            "match": ["重力", "gravity", "仿真"],
+            "reply": "<think>\n用户要求运行重力仿真，调用run_simulation。\n</think>\n"
+                     "开始运行重力仿真。[TOOL_CALL:run_simulation:{\"simulation_type\":\"gravity\",\"time_steps\":100}]"
+        }
+    ],
+    "default": "<think>\n用户在提问，不需要调用工具。\n</think>\n"
+               "我是3D仿真平台的AI助手，可以帮您创建几何体、运行物理仿真并分析结果。请告诉我您想做什么。"
+}
+
+_TOKEN_PATTERN = re.compile(r"[A-Za-z0-9_]+|\s+|.", re.DOTALL)
+
+
+def tokenize(text: str) -> List[str]:
+    """粗略切分token：英文单词/数字、空白、其余逐字符"""
+    return _TOKEN_PATTERN.findall(text)
+
+
+def _timestamp() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class FakeOllamaConfig:
+    """模拟服务器的行为参数，运行中可以修改"""
+
+    def __init__(self, token_rate: float = 30.0, first_token_delay: float = 0.2,
+                 jitter: float = 0.0, model: str = DEFAULT_MODEL,
+                 script: Optional[Dict[str, Any]] = None):
+        self.token_rate = token_rate              # 每秒token数，<=0 表示不限速
+        self.first_token_delay = first_token_delay  # 首token前的等待（模拟prompt处理）
+        self.jitter = jitter                      # 每个token间隔的随机抖动比例
+        self.model = model
+        self.script = script or DEFAULT_SCRIPT
+        self.lock = threading.Lock()
+        self.active_streams = 0
+        self.total_requests = 0
+
+    def pick_reply(self, message: str) -> str:
+        lowered = message.lower()
+        for entry in self.script.get("replies", []):
+            if any(keyword.lower() in lowered for keyword in entry.get("match", [])):
+                return entry["reply"]
+        return self.script.get("default", "")
+
+    def token_interval(self) -> float:
+        if self.token_rate <= 0:
+            return 0.0
+        interval = 1.0 / self.token_rate
+        if self.jitter:
+            interval *= 1 + random.uniform(-self.jitter, self.jitter)
+        return max(interval, 0.0)
+
+
+def load_script(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        script = json.load(f)
+    if not isinstance(script.get("replies", []), list):
+        raise ValueError("脚本的replies必须是列表")
+    return script
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeOllama/1.0"
+
+    @property
+    def config(self) -> FakeOllamaConfig:
+        return self.server.config
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _send_json(self, payload: Dict[str, Any], status: int = 200) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length).decode("utf-8"))
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path in ("/", ""):
+            body = b"Ollama is running"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == "/api/version":
+            self._send_json({"version": "0.0.0-fake"})
+        elif self.path == "/api/tags":
+            model = self.config.model
+            self._send_json({"models": [{
+                "name": model,
+                "model": model,
+                "modified_at": _timestamp(),
+                "size": 0,
+                "digest": "0" * 64,
+                "details": {"format": "gguf", "family": "fake", "parameter_size": "0B",
+                            "quantization_level": "Q4_K_M"}
+            }]})
+        else:
+            self._send_json({"error": f"未知路径: {self.path}"}, 404)
+
+    def do_POST(self):
+        if self.path != "/api/chat":
+            self._send_json({"error": f"未知路径: {self.path}"}, 404)
+            return
+        try:
+            request = self._read_json()
+        except ValueError as e:
+            self._send_json({"error": f"请求不是合法JSON: {e}"}, 400)
+            return
+
+        messages = request.get("messages") or []
+        user_messages = [m.get("content", "") for m in messages if m.get("role") == "user"]
+        reply = self.config.pick_reply(user_messages[-1] if user_messages else "")
+        model = request.get("model") or self.config.model
+        with self.config.lock:
+            self.config.total_requests += 1
+            self.config.active_streams += 1
+        try:
+            if request.get("stream", True):
+                self._stream_reply(model, reply)
+            else:
+                self._send_json(self._chunk(model, reply, done=True, eval_count=len(tokenize(reply))))
+        finally:
+            with self.config.lock:
+                self.config.active_streams -= 1
+
+    def _chunk(self, model: str, content: str, done: bool, **extra) -> Dict[str, Any]:
+        chunk = {
+            "model": model,
+            "created_at": _timestamp(),
+            "message": {"role": "assistant", "content": content},
+            "done": done
+        }
+        if done:
+            chunk["done_reason"] = "stop"
+        chunk.update(extra)
+        return chunk
+
+    def _stream_reply(self, model: str, reply: str) -> None:
+        """按NDJSON分块流式输出，最后一块带done和eval统计"""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        start = time.perf_counter()
+        if self.config.first_token_delay > 0:
+            time.sleep(self.config.first_token_delay)
+        tokens = tokenize(reply)
+        eval_start = time.perf_counter()
+        try:
+            for index, token in enumerate(tokens):
+                if index:
+                    interval = self.config.token_interval()
+                    if interval:
+                        time.sleep(interval)
+                self._write_chunk(self._chunk(model, token, done=False))
+            eval_ns = int((time.perf_counter() - eval_start) * 1e9)
+            self._write_chunk(self._chunk(
+                model, "", done=True,
+                total_duration=int((time.perf_counter() - start) * 1e9),
+                prompt_eval_count=0,
+                eval_count=len(tokens),
+                eval_duration=eval_ns
+            ))
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            logger.debug("客户端提前断开流式连接")
+
+    def _write_chunk(self, payload: Dict[str, Any]) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 11435,
+                 config: Optional[FakeOllamaConfig] = None):
+        super().__init__((host, port), FakeOllamaHandler)
+        self.config = config or FakeOllamaConfig()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start_background(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, daemon=True, name="fake-ollama")
+        thread.start()
+        return thread
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="模拟Ollama服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--token-rate", type=float, default=30.0, help="每秒输出的token数，0表示不限速")
+    parser.add_argument("--first-token-delay", type=float, default=0.2, help="首token前的等待秒数")
+    parser.add_argument("--jitter", type=float, default=0.0, help="token间隔的随机抖动比例")
+    parser.add_argument("--script", help="回复脚本JSON文件（格式同DEFAULT_SCRIPT）")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    config = FakeOllamaConfig(
+        token_rate=args.token_rate,
+        first_token_delay=args.first_token_delay,
+        jitter=args.jitter,
+        script=load_script(args.script) if args.script else None
+    )
+    server = FakeOllamaServer(args.host, args.port, config)
+    logger.info(f"模拟Ollama服务器已启动: {server.url}，速率 {args.token_rate} token/s")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+负载生成器 - 每个虚拟用户持有一个Socket.IO连接，按权重循环执行操作并记录延迟
+同时定期抓取服务端 /metrics 中的线程数，用于观察并发上限
+"""
+
+import json
+import queue
+import random
+import re
+import statistics
+import threading
+import time
+import uuid
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+import socketio
+
+# 操作名 -> 默认权重
+DEFAULT_MIX: Dict[str, float] = {
+    "chat": 2,
+    "create_shape": 3,
+    "simulate": 2,
+    "rest_create_shape": 1,
+    "rest_simulate": 1,
+    "rest_status": 1,
+    "rest_tools": 1
+}
+
+CHAT_PROMPTS = [
+    "帮我创建一个立方体",
+    "创建一个球体",
+    "运行重力仿真",
+    "你好，介绍一下你能做什么"
+]
+
+SHAPE_REQUESTS = [
+    ("cube", {"size": 1.0}),
+    ("sphere", {"radius": 1.0, "segments": 32}),
+    ("cylinder", {"radius": 0.5, "height": 2.0, "segments": 32})
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近秩百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+@dataclass
+class LoadTestConfig:
+    base_url: str = "http://localhost:6006"
+    mcp_url: Optional[str] = "http://localhost:8000"
+    users: int = 10
+    duration: float = 30.0
+    ramp_up: float = 5.0
+    think_time: float = 0.0
+    timeout: float = 60.0
+    mix: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_MIX))
+    gravity_steps: int = 100
+    metrics_interval: float = 1.0
+    seed: int = 0
+    transports: Optional[List[str]] = None
+
+
+class LoadStats:
+    """线程安全的延迟与错误统计"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, Dict[str, int]] = {}
+        self.ttft: List[float] = []
+        self.chat_tokens = 0
+        self.chat_stream_seconds = 0.0
+        self.connect_errors = 0
+
+    def record(self, op: str, latency: float, error: Optional[str] = None) -> None:
+        with self.lock:
+            if error:
+                bucket = self.errors.setdefault(op, {})
+                bucket[error] = bucket.get(error, 0) + 1
+            else:
+                self.latencies.setdefault(op, []).append(latency)
+
+    def record_chat(self, ttft: Optional[float], tokens: int, stream_seconds: float) -> None:
+        with self.lock:
+            if ttft is not None:
+                self.ttft.append(ttft)
+            self.chat_tokens += tokens
+            self.chat_stream_seconds += stream_seconds
+
+
+class ServerSampler(threading.Thread):
+    """定期抓取 /metrics 中的 process_threads 和 chat_active_threads"""
+
+    GAUGES = ("process_threads", "chat_active_threads")
+
+    def __init__(self, targets: Dict[str, str], interval: float):
+        super().__init__(daemon=True, name="loadtest-metrics")
+        self.targets = targets
+        self.interval = interval
+        self.samples: Dict[str, Dict[str, List[float]]] = {
+            name: {gauge: [] for gauge in self.GAUGES} for name in targets
+        }
+        self._stop_event = threading.Event()
+        self._session = requests.Session()
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            for name, url in self.targets.items():
+                try:
+                    text = self._session.get(f"{url}/metrics", timeout=2).text
+                except requests.RequestException:
+                    continue
+                for gauge in self.GAUGES:
+                    match = re.search(rf"^{gauge}(?:{{[^}}]*}})? ([0-9.eE+-]+)$", text, re.MULTILINE)
+                    if match:
+                        self.samples[name][gauge].append(float(match.group(1)))
+            self._stop_event.wait(self.interval)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join(timeout=5)
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        result = {}
+        for name, gauges in self.samples.items():
+            result[name] = {
+                gauge: {"min": min(values), "mean": statistics.fmean(values), "max": max(values)}
+                for gauge, values in gauges.items() if values
+            }
+        return result
+
+
+class VirtualUser(threading.Thread):
+    """一个虚拟用户：独立的Socket.IO连接和HTTP会话，串行执行操作"""
+
+    TERMINAL_EVENTS = {
+        "chat": ("chat_complete", "chat_error"),
+        "create_shape": ("shape_created", "error"),
+        "simulate": ("simulation_result", "error")
+    }
+
+    def __init__(self, index: int, config: LoadTestConfig, stats: LoadStats,
+                 stop_event: threading.Event, start_delay: float):
+        super().__init__(daemon=True, name=f"loadtest-user-{index}")
+        self.index = index
+        self.config = config
+        self.stats = stats
+        self.stop_event = stop_event
+        self.start_delay = start_delay
+        self.random = random.Random(config.seed * 100003 + index)
+        self.events: "queue.Queue[Tuple[str, Any, float]]" = queue.Queue()
+        self.http = requests.Session()
+        self.sio = socketio.Client(reconnection=False)
+        self.sio.on("*", self._on_event)
+        self.ops: Dict[str, Callable[[], None]] = {
+            "chat": self.op_chat,
+            "create_shape": self.op_create_shape,
+            "simulate": self.op_simulate,
+            "rest_create_shape": self.op_rest_create_shape,
+            "rest_simulate": self.op_rest_simulate,
+            "rest_status": lambda: self._rest("rest_status", "GET", "/api/status"),
+            "rest_tools": lambda: self._rest("rest_tools", "GET", "/api/tools")
+        }
+
+    def _on_event(self, event, data=None, *args):
+        # 服务端把大事件压缩为二进制附件（compression.CompressingPacket），解压为原参数
+        if isinstance(data, dict) and data.get("__compressed__") == "deflate" and not args:
+            data = (json.loads(zlib.decompress(data["data"])) or [None])[0]
+        self.events.put((event, data, time.perf_counter()))
+
+    def run(self) -> None:
+        if self.stop_event.wait(self.start_delay):
+            return
+        needs_socket = any(self.config.mix.get(op, 0) > 0 for op in self.TERMINAL_EVENTS)
+        if needs_socket:
+            try:
+                self.sio.connect(self.config.base_url, transports=self.config.transports,
+                                 wait_timeout=self.config.timeout)
+            except Exception:
+                with self.stats.lock:
+                    self.stats.connect_errors += 1
+                return
+        names = [op for op, weight in self.config.mix.items() if weight > 0]
+        weights = [self.config.mix[op] for op in names]
+        try:
+            while not self.stop_event.is_set():
+                op = self.random.choices(names, weights)[0]
+                self.ops[op]()
+                if self.config.think_time:
+                    self.stop_event.wait(self.random.expovariate(1.0 / self.config.think_time))
+        finally:
+            if self.sio.connected:
+                self.sio.disconnect()
+            self.http.close()
+
+    def _drain(self) -> None:
+        while True:
+            try:
+                self.events.get_nowait()
+            except queue.Empty:
+                return
+
+    def _socket_op(self, op: str, event: str, payload: Dict[str, Any],
+                   on_event: Optional[Callable[[str, Any, float], None]] = None) -> Optional[str]:
+        """发送事件并等待终止事件，返回错误描述（成功时为None）"""
+        if not self.sio.connected:
+            self.stats.record(op, 0.0, "disconnected")
+            return "disconnected"
+        success_event, error_event = self.TERMINAL_EVENTS[op]
+        self._drain()
+        start = time.perf_counter()
+        self.sio.emit(event, payload)
+        deadline = start + self.config.timeout
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                self.stats.record(op, 0.0, "timeout")
+                return "timeout"
+            try:
+                name, data, received_at = self.events.get(timeout=remaining)
+            except queue.Empty:
+                continue
+            if on_event:
+                on_event(name, data, received_at - start)
+            if name == success_event:
+                self.stats.record(op, received_at - start)
+                return None
+            if name == error_event:
+                self.stats.record(op, 0.0, error_event)
+                return error_event
+
+    def op_chat(self) -> None:
+        state = {"ttft": None, "tokens": 0, "last": 0.0}
+
+        def on_event(name, data, elapsed):
+            if name == "chat_message" and isinstance(data, dict) and not data.get("is_complete"):
+                if state["ttft"] is None:
+                    state["ttft"] = elapsed
+                state["tokens"] += 1
+                state["last"] = elapsed
+
+        payload = {
+            "message": self.random.choice(CHAT_PROMPTS),
+            "session_id": f"loadtest_{self.index}_{uuid.uuid4().hex[:8]}"
+        }
+        error = self._socket_op("chat", "chat_message", payload, on_event)
+        if error is None:
+            stream_seconds = state["last"] - state["ttft"] if state["ttft"] is not None else 0.0
+            self.stats.record_chat(state["ttft"], state["tokens"], stream_seconds)
+
+    def op_create_shape(self) -> None:
+        shape_type, params = self.random.choice(SHAPE_REQUESTS)
+        self._socket_op("create_shape", "create_shape", {"type": shape_type, "params": params})
+
+    def op_simulate(self) -> None:
+        self._socket_op("simulate", "simulate", {
+            "type": "gravity",
+            "params": {"time_steps": self.config.gravity_steps}
+        })
+
+    def op_rest_create_shape(self) -> None:
+        shape_type, params = self.random.choice(SHAPE_REQUESTS)
+        self._rest("rest_create_shape", "POST", "/api/shapes", {"type": shape_type, "params": params})
+
+    def op_rest_simulate(self) -> None:
+        self._rest("rest_simulate", "POST", "/api/simulation", {
+            "type": "gravity",
+            "params": {"time_steps": self.config.gravity_steps}
+        })
+
+    def _rest(self, op: str, method: str, path: str, body: Optional[Dict[str, Any]] = None) -> None:
+        start = time.perf_counter()
+        try:
+            response = self.http.request(method, f"{self.config.base_url}{path}", json=body,
+                                         timeout=self.config.timeout)
+            elapsed = time.perf_counter() - start
+            if response.status_code >= 400:
+                self.stats.record(op, elapsed, f"http_{response.status_code}")
+                return
+            payload = response.json()
+            if isinstance(payload, dict) and payload.get("success") is False:
+                self.stats.record(op, elapsed, "success_false")
+                return
+            self.stats.record(op, elapsed)
+        except requests.Timeout:
+            self.stats.record(op, 0.0, "timeout")
+        except (requests.RequestException, ValueError) as e:
+            self.stats.record(op, 0.0, type(e).__name__)
+
+
+def run_load_test(config: LoadTestConfig, log: Callable[[str], None] = print) -> Dict[str, Any]:
+    """运行一次压测并返回汇总结果"""
+    unknown = set(config.mix) - set(DEFAULT_MIX)
+    if unknown:
+        raise ValueError(f"未知操作: {sorted(unknown)}")
+
+    stats = LoadStats()
+    stop_event = threading.Event()
+    targets = {"flask": config.base_url}
+    if config.mcp_url:
+        targets["fastmcp"] = config.mcp_url
+    sampler = ServerSampler(targets, config.metrics_interval)
+    sampler.start()
+
+    users = [
+        VirtualUser(i, config, stats, stop_event,
+                    config.ramp_up * i / config.users if config.users > 1 else 0.0)
+        for i in range(config.users)
+    ]
+    log(f"启动 {config.users} 个虚拟用户，持续 {config.duration:.0f}s（爬坡 {config.ramp_up:.0f}s）")
+    start = time.perf_counter()
+    for user in users:
+        user.start()
+    try:
+        stop_event.wait(config.duration)
+    except KeyboardInterrupt:
+        log("收到中断，提前结束")
+    finally:
+        stop_event.set()
+    for user in users:
+        user.join(timeout=config.timeout + 5)
+    elapsed = time.perf_counter() - start
+    sampler.stop()
+    return summarize(config, stats, sampler, elapsed)
+
+
+def summarize(config: LoadTestConfig, stats: LoadStats, sampler: ServerSampler,
+              elapsed: float) -> Dict[str, Any]:
+    operations = {}
+    total_ok = total_errors = 0
+    for op in config.mix:
+        latencies = stats.latencies.get(op, [])
+        errors = stats.errors.get(op, {})
+        error_count = sum(errors.values())
+        if not latencies and not error_count:
+            continue
+        total_ok += len(latencies)
+        total_errors += error_count
+        operations[op] = {
+            "count": len(latencies),
+            "errors": error_count,
+            "error_kinds": errors,
+            "throughput": len(latencies) / elapsed if elapsed else 0.0,
+            "p50": percentile(latencies, 50),
+            "p90": percentile(latencies, 90),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies) if latencies else 0.0
+        }
+    chat = {}
+    if stats.ttft:
+        chat = {
+            "ttft_p50": percentile(stats.ttft, 50),
+            "ttft_p99": percentile(stats.ttft, 99),
+            "tokens": stats.chat_tokens,
+            "tokens_per_second_per_stream": (stats.chat_tokens / stats.chat_stream_seconds
+                                             if stats.chat_stream_seconds else 0.0)
+        }
+    return {
+        "users": config.users,
+        "duration": elapsed,
+        "throughput": total_ok / elapsed if elapsed else 0.0,
+        "requests": total_ok,
+        "errors": total_errors,
+        "connect_errors": stats.connect_errors,
+        "operations": operations,
+        "chat": chat,
+        "server": sampler.summary()
+    }
+
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    lines = [
+        f"用户数 {summary['users']}  时长 {summary['duration']:.1f}s  "
+        f"成功 {summary['requests']}  失败 {summary['errors']}  连接失败 {summary['connect_errors']}  "
+        f"吞吐 {summary['throughput']:.1f} req/s",
+        "",
+        f"{'operation':<20}{'ok':>8}{'err':>6}{'req/s':>9}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}"
+    ]
+    for op, s in summary["operations"].items():
+        lines.append(
+            f"{op:<20}{s['count']:>8}{s['errors']:>6}{s['throughput']:>9.2f}"
+            f"{s['p50'] * 1e3:>8.1f}ms{s['p90'] * 1e3:>8.1f}ms{s['p99'] * 1e3:>8.1f}ms{s['max'] * 1e3:>8.1f}ms"
+        )
+        if s["error_kinds"]:
+            kinds = ", ".join(f"{kind}={count}" for kind, count in s["error_kinds"].items())
+            lines.append(f"{'':<20}错误: {kinds}")
+    chat = summary["chat"]
+    if chat:
+        lines.append("")
+        lines.append(f"首token延迟 p50 {chat['ttft_p50'] * 1e3:.1f}ms  p99 {chat['ttft_p99'] * 1e3:.1f}ms  "
+                     f"单流速率 {chat['tokens_per_second_per_stream']:.1f} token/s  共 {chat['tokens']} token")
+    for name, gauges in summary["server"].items():
+        for gauge, s in gauges.items():
+            lines.append(f"{name} {gauge}: min {s['min']:.0f}  mean {s['mean']:.1f}  max {s['max']:.0f}")
+    return "\n".join(lines)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+本地压测环境 - 启动模拟Ollama，再以子进程启动FastMCP服务器和Flask应用
+Flask通过 OLLAMA_BASE_URL 连接模拟Ollama，其余代码路径与生产一致
+"""
+
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import List, Optional, Tuple
+
+from loadtest.fake_ollama import FakeOllamaConfig, FakeOllamaServer
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOG_DIR = os.path.join(BASE_DIR, "data", "loadtest")
+
+# (脚本, 就绪检查地址)，按顺序启动
+STACK_SERVICES: List[Tuple[str, str]] = [
+    ("fastmcp_server.py", "http://localhost:8000/readiness"),
+    ("app.py", "http://localhost:6006/readiness")
+]
+
+
+def wait_until_ready(url: str, timeout: float, process: Optional[subprocess.Popen] = None) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.1)
+    return False
+
+
+class LocalStack:
+    """模拟Ollama + FastMCP + Flask，用作上下文管理器"""
+
+    def __init__(self, ollama_config: FakeOllamaConfig, ollama_port: int = 11435,
+                 ready_timeout: float = 60.0, log=print):
+        self.ollama_config = ollama_config
+        self.ollama_port = ollama_port
+        self.ready_timeout = ready_timeout
+        self.log = log
+        self.ollama = None
+        self.processes: List[subprocess.Popen] = []
+        self._log_files = []
+
+    def start(self) -> "LocalStack":
+        self.ollama = FakeOllamaServer("127.0.0.1", self.ollama_port, self.ollama_config)
+        self.ollama.start_background()
+        self.log(f"模拟Ollama: {self.ollama.url}")
+
+        os.makedirs(LOG_DIR, exist_ok=True)
+        env = dict(os.environ, OLLAMA_BASE_URL=self.ollama.url, PYTHONUNBUFFERED="1")
+        for script, ready_url in STACK_SERVICES:
+            log_path = os.path.join(LOG_DIR, f"{os.path.splitext(script)[0]}.log")
+            log_file = open(log_path, "w", encoding="utf-8")
+            self._log_files.append(log_file)
+            process = subprocess.Popen([sys.executable, script], cwd=BASE_DIR, env=env,
+                                       stdout=log_file, stderr=subprocess.STDOUT)
+            self.processes.append(process)
+            if not wait_until_ready(ready_url, self.ready_timeout, process):
+                self.stop()
+                raise RuntimeError(f"{script} 未能就绪，日志: {log_path}")
+            self.log(f"{script} 已就绪（日志: {log_path}）")
+        return self
+
+    def stop(self) -> None:
+        for process in reversed(self.processes):
+            if process.poll() is None:
+                process.terminate()
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+        self.processes = []
+        for log_file in self._log_files:
+            log_file.close()
+        self._log_files = []
+        if self.ollama is not None:
+            self.ollama.shutdown()
+            self.ollama.server_close()
+            self.ollama = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+网格细节层次（LOD） - 参数化形状按分段数减半生成LOD链
+每一级记录几何误差（多边形近似圆的最大偏差），据此按屏幕空间误差选择层级
+"""
+
+import math
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import geometry_precision
+from mesh_processing import CREASE_ANGLE_DEGREES
+
+# 允许的最大分段数，超出时截断，避免单个形状占满服务端和浏览器内存
+MAX_SHAPE_SEGMENTS = int(os.environ.get("MAX_SHAPE_SEGMENTS", "256"))
+MIN_LOD_SEGMENTS = int(os.environ.get("MIN_LOD_SEGMENTS", "8"))
+# 相邻侧面夹角为 360/分段数，不超过折痕角时曲面是平滑的（法线不拆分）
+SMOOTH_MIN_SEGMENTS = math.ceil(360.0 / CREASE_ANGLE_DEGREES - 1e-9)
+
+# 默认视口参数，与前端相机一致（PerspectiveCamera fov=75）
+DEFAULT_FOV = 75.0
+DEFAULT_VIEWPORT_HEIGHT = 1080
+DEFAULT_PIXEL_ERROR = 1.0
+
+ROUND_SHAPES = ("sphere", "cylinder")
+
+
+def clamp_segments(segments: Any, minimum: int = 3) -> int:
+    """把分段数限制在 [minimum, MAX_SHAPE_SEGMENTS]"""
+    return max(minimum, min(int(segments), MAX_SHAPE_SEGMENTS))
+
+
+def lod_segment_levels(segments: int, min_segments: int = MIN_LOD_SEGMENTS) -> List[int]:
+    """从请求的分段数开始逐级减半，直到不小于min_segments的最后一级"""
+    levels = [segments]
+    while levels[-1] // 2 >= min_segments:
+        levels.append(levels[-1] // 2)
+    return levels
+
+
+def geometric_error(shape_type: str, params: Dict[str, Any], segments: Optional[int]) -> float:
+    """正多边形近似半径为r的圆时的最大偏差 r * (1 - cos(pi / n))；立方体为精确表示"""
+    if shape_type not in ROUND_SHAPES or not segments:
+        return 0.0
+    radius = float(params.get("radius", 1.0))
+    return radius * (1.0 - math.cos(math.pi / segments))
+
+
+def vertex_count(shape_type: str, segments: Optional[int]) -> int:
+    """焊接并按折痕角拆分后的顶点数（球体接缝列合并、两极各一个顶点；立方体每个面4个顶点；
+    圆柱体底面边缘为硬边，侧面和底面各有一份顶点）。分段数少到相邻侧面的夹角超过折痕角时
+    曲面也按硬边拆分，球体此时返回上限（每个三角形3个顶点）"""
+    smooth = segments is not None and segments >= SMOOTH_MIN_SEGMENTS
+    if shape_type == "sphere":
+        return segments * (segments - 1) + 2 if smooth else 3 * triangle_count(shape_type, segments)
+    if shape_type == "cylinder":
+        return 4 * segments if smooth else 6 * segments
+    return 24
+
+
+def triangle_count(shape_type: str, segments: Optional[int]) -> int:
+    if shape_type == "sphere":
+        return 2 * segments * (segments - 1)
+    if shape_type == "cylinder":
+        return 4 * segments - 4
+    return 12
+
+
+def switch_distance(error: float, fov: float = DEFAULT_FOV,
+                    viewport_height: int = DEFAULT_VIEWPORT_HEIGHT,
+                    pixel_error: float = DEFAULT_PIXEL_ERROR) -> float:
+    """几何误差投影到屏幕上不超过pixel_error像素所需的最小相机距离"""
+    if error <= 0:
+        return 0.0
+    return error * viewport_height / (2.0 * math.tan(math.radians(fov) / 2.0) * pixel_error)
+
+
+def build_lod_chain(shape_type: str, params: Dict[str, Any], segments: Optional[int] = None,
+                    fov: float = DEFAULT_FOV, viewport_height: int = DEFAULT_VIEWPORT_HEIGHT,
+                    pixel_error: float = DEFAULT_PIXEL_ERROR) -> List[Dict[str, Any]]:
+    """生成LOD链描述（0级最精细），distance为默认视口下切换到该级的相机距离"""
+    if shape_type not in ROUND_SHAPES:
+        return [{
+            "level": 0,
+            "segments": None,
+            "vertex_count": vertex_count(shape_type, None),
+            "triangle_count": triangle_count(shape_type, None),
+            "geometric_error": 0.0,
+            "distance": 0.0
+        }]
+    chain = []
+    for level, level_segments in enumerate(lod_segment_levels(segments)):
+        error = geometric_error(shape_type, params, level_segments)
+        chain.append({
+            "level": level,
+            "segments": level_segments,
+            "vertex_count": vertex_count(shape_type, level_segments),
+            "triangle_count": triangle_count(shape_type, level_segments),
+            "geometric_error": error,
+            "distance": 0.0 if level == 0 else switch_distance(error, fov, viewport_height, pixel_error)
+        })
+    return chain
+
+
+def select_lod_level(chain: Sequence[Dict[str, Any]], level: Optional[int] = None,
+                     max_error: Optional[float] = None, distance: Optional[float] = None,
+                     fov: float = DEFAULT_FOV, viewport_height: int = DEFAULT_VIEWPORT_HEIGHT,
+                     pixel_error: float = DEFAULT_PIXEL_ERROR) -> int:
+    """按显式层级、最大几何误差或相机距离选择层级；都未指定时返回0级"""
+    if level is not None:
+        return max(0, min(int(level), len(chain) - 1))
+    if distance is not None:
+        # 该距离下屏幕误差不超过pixel_error对应的世界空间误差
+        max_error = float(distance) * 2.0 * math.tan(math.radians(fov) / 2.0) * pixel_error / viewport_height
+    if max_error is None:
+        return 0
+    selected = 0
+    for entry in chain:
+        if entry["geometric_error"] <= max_error:
+            selected = entry["level"]
+    return selected
+
+
+def flatten_mesh(mesh, precision: str = "float64") -> Dict[str, Any]:
+    """转为前端BufferGeometry可直接使用的扁平坐标、法线和三角形索引（NumPy数组，由serialization直接编码）；
+    quantized16精度时坐标和法线为16位整数码，encoding给出各自的反量化参数"""
+    positions, position_encoding = geometry_precision.to_wire(mesh.positions, precision)
+    normals, normal_encoding = geometry_precision.to_wire(mesh.normals, precision, unit=True)
+    flat = {
+        "positions": positions,
+        "normals": normals,
+        "indices": mesh.triangles.ravel()
+    }
+    if position_encoding is not None:
+        flat["encoding"] = {"positions": position_encoding, "normals": normal_encoding}
+    return flat
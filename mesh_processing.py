@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+网格规范化 - 把几何体生成器的输出统一为焊接后的索引三角网格
+步骤：多边形扇形三角化 -> 按容差焊接重复顶点 -> 删除退化三角形和未引用顶点 -> 按折痕角拆分顶点并计算顶点法线
+碰撞检测、序列化和渲染都只使用这一种布局：positions (V,3) float64、triangles (T,3) int32、normals (V,3)
+"""
+
+import math
+from dataclasses import dataclass
+from typing import Optional, Sequence, Union
+
+import numpy as np
+
+# 焊接容差（相对于网格包围盒尺寸）
+WELD_RELATIVE_TOLERANCE = 1e-9
+# 面积小于该值（相对于包围盒尺寸平方）的三角形视为退化
+DEGENERATE_RELATIVE_AREA = 1e-12
+# 相邻面法线夹角超过该角度的边为硬边（与Three.js的toCreasedNormals默认值相同），
+# 立方体的棱、圆柱体的底面边缘和分段很少的曲面按硬边拆分顶点
+CREASE_ANGLE_DEGREES = 60.0
+
+
+@dataclass
+class TriangleMesh:
+    positions: np.ndarray
+    triangles: np.ndarray
+    normals: np.ndarray
+
+    @property
+    def vertex_count(self) -> int:
+        return len(self.positions)
+
+    @property
+    def triangle_count(self) -> int:
+        return len(self.triangles)
+
+
+def triangulate(faces: Union[np.ndarray, Sequence[Sequence[int]]]) -> np.ndarray:
+    """把任意多边形面按扇形拆成三角形，返回 (T,3) int64"""
+    if isinstance(faces, np.ndarray) and faces.ndim == 2:
+        groups = {faces.shape[1]: faces}
+    else:
+        groups = {}
+        for face in faces:
+            groups.setdefault(len(face), []).append(face)
+    triangles = []
+    for size, group in groups.items():
+        if size < 3:
+            continue
+        polygons = np.asarray(group, dtype=np.int64)
+        # 第k个三角形为 (v0, vk, vk+1)
+        for k in range(1, size - 1):
+            triangles.append(polygons[:, [0, k, k + 1]])
+    if not triangles:
+        return np.empty((0, 3), dtype=np.int64)
+    return np.concatenate(triangles)
+
+
+def weld_vertices(positions: np.ndarray, tolerance: float) -> tuple[np.ndarray, np.ndarray]:
+    """合并坐标在容差内的顶点，保持首次出现的顺序，返回 (新坐标, 旧索引->新索引)"""
+    keys = np.ascontiguousarray(np.round(positions / tolerance).astype(np.int64))
+    # 每行视为一个24字节的整体比较，比 np.unique(axis=0) 快
+    rows = keys.view(np.dtype((np.void, keys.dtype.itemsize * 3))).ravel()
+    _, first_index, inverse = np.unique(rows, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    # np.unique按键排序，这里改回首次出现的顺序，使焊接结果与生成顺序一致
+    order = np.argsort(first_index, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return positions[first_index[order]], rank[inverse]
+
+
+def face_cross(positions: np.ndarray, triangles: np.ndarray) -> np.ndarray:
+    """每个三角形两条边的叉积：方向为面法线，长度为面积的两倍"""
+    a, b, c = (positions[triangles[:, i]] for i in range(3))
+    return np.cross(b - a, c - a)
+
+
+def triangle_areas(positions: np.ndarray, triangles: np.ndarray) -> np.ndarray:
+    return 0.5 * np.linalg.norm(face_cross(positions, triangles), axis=1)
+
+
+def _accumulate(index: np.ndarray, values: np.ndarray, count: int) -> np.ndarray:
+    """按index累加 (N,3) 向量，比 np.add.at 快"""
+    return np.stack([np.bincount(index, values[:, k], minlength=count) for k in range(3)], axis=1)
+
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    lengths = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return np.divide(vectors, lengths, out=np.zeros_like(vectors), where=lengths > 0)
+
+
+def corner_angles(positions: np.ndarray, triangles: np.ndarray) -> np.ndarray:
+    """每个三角形三个角的内角 (T,3)，用作法线权重，使结果与三角剖分方式无关"""
+    corners = positions[triangles]
+    angles = np.empty(triangles.shape)
+    for i in range(3):
+        u = corners[:, (i + 1) % 3] - corners[:, i]
+        v = corners[:, (i + 2) % 3] - corners[:, i]
+        angles[:, i] = np.arctan2(np.linalg.norm(np.cross(u, v), axis=1), np.einsum("ij,ij->i", u, v))
+    return angles
+
+
+def vertex_normals(positions: np.ndarray, triangles: np.ndarray,
+                   face_normals: Optional[np.ndarray] = None) -> np.ndarray:
+    """角度加权的顶点法线：单位面法线乘以该面在顶点处的内角，累加后归一化（不拆分顶点）"""
+    if not len(triangles):
+        return np.zeros_like(positions)
+    if face_normals is None:
+        face_normals = face_cross(positions, triangles)
+    weighted = _unit(face_normals)[:, None, :] * corner_angles(positions, triangles)[:, :, None]
+    return _unit(_accumulate(triangles.reshape(-1), weighted.reshape(-1, 3), len(positions)))
+
+
+def _connected_labels(count: int, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """无向图 (u[k], v[k]) 的连通分量：每个节点标记为所在分量的最小节点号（最小标号传播加指针跳跃）"""
+    labels = np.arange(count)
+    while True:
+        low = np.minimum(labels[u], labels[v])
+        updated = labels.copy()
+        np.minimum.at(updated, u, low)
+        np.minimum.at(updated, v, low)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def split_creases(positions: np.ndarray, triangles: np.ndarray, face_normals: Optional[np.ndarray] = None,
+                  crease_angle: float = CREASE_ANGLE_DEGREES) -> TriangleMesh:
+    """按折痕角拆分顶点并计算角度加权的顶点法线：
+    共享一个顶点的三角形角（corner）经过非硬边相连时属于同一平滑组，每个平滑组成为一个顶点；
+    硬边两侧的面各自有一份顶点（例如立方体每个面4个顶点，共24个）"""
+    count = len(triangles)
+    if not count:
+        return TriangleMesh(positions, triangles.astype(np.int32), np.zeros_like(positions))
+    if face_normals is None:
+        face_normals = face_cross(positions, triangles)
+    unit = _unit(face_normals)
+    weighted = unit[:, None, :] * corner_angles(positions, triangles)[:, :, None]
+
+    # 角c = 3*t + i；边c从角c指向同一三角形的下一个角
+    corner_vertex = triangles.reshape(-1)
+    next_corner = (np.arange(3 * count).reshape(count, 3)[:, [1, 2, 0]]).reshape(-1)
+    a, b = corner_vertex, corner_vertex[next_corner]
+    keys = np.minimum(a, b).astype(np.int64) * len(positions) + np.maximum(a, b)
+    order = np.argsort(keys, kind="stable")
+    # 按边排序后相邻的两条半边属于共享这条边的两个三角形（非流形边依次两两相连）
+    same = keys[order[1:]] == keys[order[:-1]]
+    e1, e2 = order[:-1][same], order[1:][same]
+    # 夹角恰好等于折痕角（例如6分段圆柱的侧面）时按平滑处理，不受舍入误差影响
+    smooth = np.einsum("ij,ij->i", unit[e1 // 3], unit[e2 // 3]) >= math.cos(math.radians(crease_angle)) - 1e-9
+    e1, e2 = e1[smooth], e2[smooth]
+    # 两条半边方向相反（一致的绕序）时，e1的起点对应e2的终点
+    reversed_ = corner_vertex[e1] != corner_vertex[e2]
+    rows = np.concatenate([e1, next_corner[e1]])
+    cols = np.concatenate([np.where(reversed_, next_corner[e2], e2), np.where(reversed_, e2, next_corner[e2])])
+    # 分量标号即组内最小的角，也就是该平滑组首次出现的角
+    labels = _connected_labels(3 * count, rows, cols)
+    first_corner = np.unique(labels)
+    groups = len(first_corner)
+
+    # 新顶点按原顶点顺序排列，同一原顶点的平滑组按首次出现的角排列
+    new_order = np.lexsort((first_corner, corner_vertex[first_corner]))
+    rank = np.empty(3 * count, dtype=np.int64)
+    rank[first_corner[new_order]] = np.arange(groups)
+    corner_group = rank[labels]
+
+    normals = _unit(_accumulate(corner_group, weighted.reshape(-1, 3), groups))
+    new_positions = positions[corner_vertex[first_corner[new_order]]]
+    return TriangleMesh(new_positions, corner_group.reshape(-1, 3).astype(np.int32), normals)
+
+
+def normalize_mesh(positions, faces) -> TriangleMesh:
+    """焊接、三角化并清理网格，按折痕角拆分顶点并计算顶点法线"""
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    triangles = triangulate(faces)
+    if not len(positions):
+        return TriangleMesh(positions, triangles.astype(np.int32), positions.copy())
+
+    extent = float(np.ptp(positions, axis=0).max()) or 1.0
+    positions, remap = weld_vertices(positions, extent * WELD_RELATIVE_TOLERANCE)
+    triangles = remap[triangles]
+
+    # 焊接后出现重复索引或面积为零的三角形（例如球体两极）
+    distinct = ((triangles[:, 0] != triangles[:, 1]) &
+                (triangles[:, 1] != triangles[:, 2]) &
+                (triangles[:, 0] != triangles[:, 2]))
+    triangles = triangles[distinct]
+    cross = face_cross(positions, triangles)
+    keep = 0.5 * np.linalg.norm(cross, axis=1) > DEGENERATE_RELATIVE_AREA * extent * extent
+    triangles, cross = triangles[keep], cross[keep]
+
+    # 删除不再被引用的顶点
+    used = np.zeros(len(positions), dtype=bool)
+    used[triangles.ravel()] = True
+    if not used.all():
+        compact = np.cumsum(used) - 1
+        positions = positions[used]
+        triangles = compact[triangles]
+
+    return split_creases(positions, triangles, cross)
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+运行指标 - 轻量级的Prometheus文本格式指标注册表
+热路径上只做一次加锁的字典更新，渲染在 /metrics 请求时进行
+"""
+
+import functools
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import serialization
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+    type_name = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值；也可以通过回调在渲染时计算"""
+    type_name = "gauge"
+
+    def __init__(self, *args, callback: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._callback = callback
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def remove(self, **labels) -> None:
+        with self._lock:
+            self._values.pop(self._key(labels), None)
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        if self._callback:
+            items = list(self._callback().items())
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    """分桶直方图"""
+    type_name = "histogram"
+
+    def __init__(self, *args, buckets: Iterable[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [每个桶的计数..., +Inf计数, 总和]
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def time(self, **labels) -> "_Timer":
+        """上下文管理器：记录代码块耗时"""
+        return _Timer(self, labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        lines = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self.start
+        self.histogram.observe(self.elapsed, **self.labels)
+        return False
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+              callback: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, callback=callback))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets=buckets))
+
+    def render(self) -> str:
+        """生成Prometheus文本格式"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# 全局指标注册表
+registry = MetricsRegistry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 请求与工具延迟
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "REST接口处理耗时", ["route", "method", "status"])
+MCP_TOOL_SECONDS = registry.histogram(
+    "mcp_tool_duration_seconds", "MCP工具执行耗时", ["tool", "status"])
+MCP_CLIENT_CALL_SECONDS = registry.histogram(
+    "mcp_client_call_duration_seconds", "Flask端调用FastMCP工具的往返耗时", ["tool", "status"])
+
+# 仿真与几何
+SIMULATION_SECONDS = registry.histogram(
+    "simulation_duration_seconds", "仿真计算耗时", ["simulation_type"])
+SIMULATION_BODY_STEPS = registry.counter(
+    "simulation_body_steps_total", "已计算的物体步数（物体数 x 步数）", ["simulation_type"])
+SIMULATION_BODY_STEPS_PER_SECOND = registry.gauge(
+    "simulation_body_steps_per_second", "最近一次仿真的吞吐量（物体步数/秒）", ["simulation_type"])
+COLLISION_PAIRS_TESTED = registry.counter(
+    "collision_pairs_tested_total", "碰撞仿真中实际重测的形状对数（缓存命中的对不计）")
+MESH_VERTICES = registry.counter(
+    "mesh_vertices_generated_total", "生成的网格顶点数", ["shape_type"])
+SPATIAL_QUERY_SECONDS = registry.histogram(
+    "spatial_query_duration_seconds", "空间查询（BVH）耗时", ["query"],
+    buckets=(1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 5e-2))
+
+# 大模型流式输出
+OLLAMA_TIME_TO_FIRST_TOKEN = registry.histogram(
+    "ollama_time_to_first_token_seconds", "Ollama首个token延迟", ["model"])
+OLLAMA_TOKENS = registry.counter(
+    "ollama_tokens_total", "Ollama生成的token数", ["model"])
+OLLAMA_TOKENS_PER_SECOND = registry.histogram(
+    "ollama_tokens_per_second", "Ollama生成速度（token/秒）", ["model"],
+    buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100, 200, 500))
+
+# Socket.IO 与聊天
+SOCKETIO_EMITS = registry.counter(
+    "socketio_emit_total", "Socket.IO发送的消息数", ["event"])
+SOCKETIO_EMIT_BYTES = registry.counter(
+    "socketio_emit_bytes_total", "Socket.IO发送的消息字节数（编码后）", ["event"])
+ACTIVE_CHAT_THREADS = registry.gauge(
+    "chat_active_threads", "正在处理的聊天流式线程数")
+
+# 响应压缩（REST和Socket.IO）
+COMPRESSION_INPUT_BYTES = registry.counter(
+    "compression_input_bytes_total", "压缩发送的消息压缩前的字节数", ["transport", "encoding"])
+COMPRESSION_OUTPUT_BYTES = registry.counter(
+    "compression_output_bytes_total", "压缩发送的消息压缩后的字节数", ["transport", "encoding"])
+COMPRESSION_SKIPPED_BYTES = registry.counter(
+    "compression_skipped_bytes_total", "未压缩发送的字节数", ["transport", "reason"])
+
+# 会话场景
+ACTIVE_SCENES = registry.gauge(
+    "scene_sessions_active", "内存中的会话场景数（不含默认场景）")
+SCENE_EVICTIONS = registry.counter(
+    "scene_evictions_total", "从内存中移除的会话场景数", ["reason"])
+SCENE_EVENTS = registry.counter(
+    "scene_events_total", "发布的场景事件数", ["event"])
+SCENE_EVENT_DELIVERIES = registry.counter(
+    "scene_event_deliveries_total", "场景事件送达的连接数（事件数 x 房间内连接数）", ["event"])
+SCENE_EVENT_BYTES = registry.counter(
+    "scene_event_bytes_total", "scene_update消息中各类场景事件的编码字节数", ["event"])
+SCENE_UPDATE_BATCH_SIZE = registry.histogram(
+    "scene_update_batch_size", "每条scene_update合并的事件数", buckets=(1, 2, 5, 10, 20, 50, 100, 500))
+
+# 实时仿真循环
+LIVE_SIMULATIONS = registry.gauge(
+    "live_simulations_active", "正在运行或暂停的实时仿真数")
+LIVE_TICK_SECONDS = registry.histogram(
+    "live_tick_duration_seconds", "实时仿真每次循环的计算耗时（含追赶的多个步长）",
+    buckets=(2.5e-4, 5e-4, 1e-3, 2e-3, 4e-3, 8e-3, 1.6e-2, 3.3e-2, 6.6e-2))
+LIVE_TICK_BUDGET = registry.histogram(
+    "live_tick_budget_ratio", "每个tick计算耗时占tick间隔的比例（>1表示超出预算）",
+    buckets=(0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 4.0))
+LIVE_TICK_OVERRUNS = registry.counter(
+    "live_tick_overruns_total", "计算耗时超过tick间隔的次数")
+LIVE_TICKS_SKIPPED = registry.counter(
+    "live_ticks_skipped_total", "落后过多时放弃追赶的tick数")
+
+# Socket.IO出站队列
+OUTBOUND_QUEUE_DEPTH = registry.gauge(
+    "socketio_outbound_queue_depth", "各客户端出站队列中待发送的消息数", ["sid"])
+OUTBOUND_DROPPED = registry.counter(
+    "socketio_outbound_dropped_total", "客户端拥塞时丢弃的消息数（仅实时帧）", ["event"])
+OUTBOUND_MERGED = registry.counter(
+    "socketio_outbound_merged_total", "客户端拥塞时合并的聊天片段数", ["event"])
+
+# 参数扫描
+SWEEPS_ACTIVE = registry.gauge(
+    "sweeps_active", "正在运行的参数扫描数")
+SWEEP_RUNS = registry.counter(
+    "sweep_runs_total", "参数扫描中完成的单次运行数", ["simulation_type", "status"])
+SWEEP_SECONDS = registry.histogram(
+    "sweep_duration_seconds", "参数扫描总耗时", ["simulation_type"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300))
+
+# 缓存
+CACHE_REQUESTS = registry.counter(
+    "cache_requests_total", "缓存访问次数", ["cache", "result"])
+
+
+def _cache_hit_ratio() -> Dict[Tuple[str, ...], float]:
+    with CACHE_REQUESTS._lock:
+        values = dict(CACHE_REQUESTS._values)
+    totals: Dict[str, List[float]] = {}
+    for (cache, result), count in values.items():
+        entry = totals.setdefault(cache, [0, 0])
+        entry[0 if result == "hit" else 1] += count
+    return {(cache,): hits / (hits + misses) for cache, (hits, misses) in totals.items() if hits + misses}
+
+
+CACHE_HIT_RATIO = registry.gauge(
+    "cache_hit_ratio", "缓存命中率", ["cache"], callback=_cache_hit_ratio)
+
+PROCESS_THREADS = registry.gauge(
+    "process_threads", "进程当前线程数", callback=lambda: {(): threading.active_count()})
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def timed_tool(fn):
+    """MCP工具装饰器：记录耗时，结果中success为False时记为error"""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            result = await fn(*args, **kwargs)
+            if isinstance(result, dict) and result.get("success") is False:
+                status = "error"
+            return result
+        except Exception:
+            status = "exception"
+            raise
+        finally:
+            MCP_TOOL_SECONDS.observe(time.perf_counter() - start, tool=fn.__name__, status=status)
+    return wrapper
+
+
+class CountingJSON:
+    """传给Socket.IO的json模块：用serialization编码（NumPy数组直接编码），顺带统计每个事件的消息数和字节数，不额外序列化"""
+
+    @staticmethod
+    def dumps(obj, *args, **kwargs):
+        if (isinstance(obj, list) and len(obj) == 2 and obj[0] == "scene_update"
+                and isinstance(obj[1], dict) and isinstance(obj[1].get("events"), list)):
+            encoded = CountingJSON._dumps_scene_update(obj[1], *args, **kwargs)
+        else:
+            encoded = serialization.dumps(obj, *args, **kwargs)
+        if isinstance(obj, list) and obj and isinstance(obj[0], str):
+            SOCKETIO_EMITS.inc(event=obj[0])
+            SOCKETIO_EMIT_BYTES.inc(len(encoded), event=obj[0])
+        return encoded
+
+    @staticmethod
+    def _dumps_scene_update(payload, *args, **kwargs) -> str:
+        """逐个编码合并消息中的事件并拼接，顺带按事件类型统计字节数，仍然只序列化一次"""
+        parts = []
+        for entry in payload["events"]:
+            part = serialization.dumps(entry, *args, **kwargs)
+            SCENE_EVENT_BYTES.inc(len(part), event=entry.get("event", "unknown"))
+            parts.append(part)
+        rest = serialization.dumps({key: value for key, value in payload.items() if key != "events"}, *args, **kwargs)
+        separator = "," if len(rest) > 2 else ""
+        return f'["scene_update",{rest[:-1]}{separator}"events":[{",".join(parts)}]}}]'
+
+    @staticmethod
+    def loads(*args, **kwargs):
+        return serialization.loads(*args, **kwargs)
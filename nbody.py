@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+N体引力 - Barnes–Hut八叉树近似与精确O(N²)两种加速度计算，蛙跳（kick-drift-kick）积分
+
+八叉树由排序后的63位Morton码逐层切分得到（线性八叉树），节点的质量和质心用前缀和按区间求得。
+力的计算为节点对节点的双树遍历：每轮对整批 (目标节点, 源节点) 对做开角判断，
+  - 满足 d·θ > r_target + r_source 时，源节点的质心在目标节点中心处产生的局部展开（加速度a、
+    潮汐张量T及其梯度U，二阶）记到目标节点上，最后逐层平移下传到叶子，在每个物体位置处求值
+    （目标侧二阶展开的误差随r_target/d三次方减小，中心有大质量天体时适当减小θ）
+  - 不满足时打开半径较大的一侧；两侧都是叶子时放入近场列表，逐对直接求和
+远场相互作用数随N线性增长，全部为NumPy批量运算，没有逐节点或逐物体的Python循环
+"""
+
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# 默认开角；源节点半径取质心到包围盒最远点的距离，目标节点半径取包围盒半对角线，
+# θ不超过1时相互包含的两个节点不会被当作远场
+NBODY_THETA = 0.7
+NBODY_LEAF_SIZE = 8
+NBODY_SOFTENING = 1e-2
+# 近场逐对求和、精确模式每块的物体对数上限，限制临时内存
+NBODY_BLOCK_PAIRS = 1 << 21
+NBODY_FAR_BLOCK = 1 << 17
+MORTON_BITS = 21
+
+DISTRIBUTIONS = ("plummer", "disk", "uniform")
+
+
+def _expand_bits(values: np.ndarray) -> np.ndarray:
+    """把21位整数的每一位间隔两个0展开，用于交织三个坐标"""
+    v = values.astype(np.uint64) & np.uint64(0x1FFFFF)
+    v = (v | (v << np.uint64(32))) & np.uint64(0x1F00000000FFFF)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x1F0000FF0000FF)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x100F00F00F00F00F)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x10C30C30C30C30C3)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x1249249249249249)
+    return v
+
+
+def morton_codes(points: np.ndarray, lo: np.ndarray, size: float) -> np.ndarray:
+    """点在边长为size的立方体内的63位Morton码"""
+    scale = ((1 << MORTON_BITS) - 1) / size
+    grid = np.clip(((points - lo) * scale).astype(np.int64), 0, (1 << MORTON_BITS) - 1)
+    return (_expand_bits(grid[:, 0]) << np.uint64(2)) | (_expand_bits(grid[:, 1]) << np.uint64(1)) | _expand_bits(grid[:, 2])
+
+
+def _norm2(v: np.ndarray) -> np.ndarray:
+    """逐行平方和（比 (v ** 2).sum(axis=1) 少一个临时数组）"""
+    return np.einsum("ij,ij->i", v, v)
+
+
+def _expand_ranges(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """把若干区间 [start, start+count) 展开并拼接成一个下标数组"""
+    total = int(counts.sum())
+    if not total:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.cumsum(counts) - counts
+    return np.repeat(starts - offsets, counts) + np.arange(total)
+
+
+class Octree:
+    """线性八叉树；物体按Morton码排序（order），每个节点对应排序后的一个连续区间"""
+
+    def __init__(self, positions: np.ndarray, masses: np.ndarray, leaf_size: int = NBODY_LEAF_SIZE):
+        lo = positions.min(axis=0)
+        size = float(max((positions.max(axis=0) - lo).max(), 1e-12)) * (1 + 1e-9)
+        codes = morton_codes(positions, lo, size)
+        self.order = np.argsort(codes, kind="stable")
+        codes = codes[self.order]
+        self.pos = positions[self.order]
+        self.mass = masses[self.order]
+        cum_mass = np.concatenate([[0.0], np.cumsum(self.mass)])
+        cum_moment = np.concatenate([np.zeros((1, 3)), np.cumsum(self.pos * self.mass[:, None], axis=0)])
+
+        n = len(positions)
+        starts, counts = [np.zeros(1, dtype=np.int64)], [np.array([n])]
+        levels, parents = [np.zeros(1, dtype=np.int64)], [np.full(1, -1)]
+        bbox_lo, bbox_hi = [self.pos.min(axis=0)[None]], [self.pos.max(axis=0)[None]]
+        level_first = 0
+        for level in range(MORTON_BITS):
+            level_starts, level_counts = starts[-1], counts[-1]
+            split = np.flatnonzero(level_counts > leaf_size)
+            if not len(split):
+                break
+            # 只切分物体数超过leaf_size的节点；子节点的Morton前缀多3位
+            members = _expand_ranges(level_starts[split], level_counts[split])
+            child_key = codes[members] >> np.uint64(3 * (MORTON_BITS - level - 1))
+            first = np.concatenate([[True], (child_key[1:] != child_key[:-1]) | (members[1:] != members[:-1] + 1)])
+            boundaries = np.flatnonzero(first)
+            child_starts = members[boundaries]
+            child_counts = np.diff(np.append(boundaries, len(members)))
+            parent_slot = np.searchsorted(level_starts[split], child_starts, side="right") - 1
+            parents.append(level_first + split[parent_slot])
+            starts.append(child_starts)
+            counts.append(child_counts)
+            levels.append(np.full(len(child_starts), level + 1, dtype=np.int64))
+            member_pos = self.pos[members]
+            bbox_lo.append(np.minimum.reduceat(member_pos, boundaries, axis=0))
+            bbox_hi.append(np.maximum.reduceat(member_pos, boundaries, axis=0))
+            level_first += len(level_starts)
+
+        self.start = np.concatenate(starts)
+        self.count = np.concatenate(counts)
+        self.level = np.concatenate(levels)
+        self.parent = np.concatenate(parents)
+        # 第L层节点的下标范围为 [level_offsets[L], level_offsets[L+1])
+        self.level_offsets = np.concatenate([[0], np.cumsum([len(level) for level in starts])])
+        lo_all, hi_all = np.concatenate(bbox_lo), np.concatenate(bbox_hi)
+        end = self.start + self.count
+        self.node_mass = cum_mass[end] - cum_mass[self.start]
+        self.com = (cum_moment[end] - cum_moment[self.start]) / np.maximum(self.node_mass, 1e-300)[:, None]
+        # 节点半径：质心到包围盒最远角点的距离
+        far_corner = np.maximum(np.abs(hi_all - self.com), np.abs(self.com - lo_all))
+        self.radius = np.sqrt((far_corner ** 2).sum(axis=1))
+        self.center = (lo_all + hi_all) / 2
+        self.half_diagonal = np.sqrt((((hi_all - lo_all) / 2) ** 2).sum(axis=1))
+
+        # 子节点在下一层中连续排列
+        child_ids = np.arange(1, len(self.start))
+        child_parent = self.parent[child_ids]
+        self.child_count = np.bincount(child_parent, minlength=len(self.start))
+        self.first_child = np.full(len(self.start), -1, dtype=np.int64)
+        first_seen = np.concatenate([[True], child_parent[1:] != child_parent[:-1]])[:len(child_ids)]
+        self.first_child[child_parent[first_seen]] = child_ids[first_seen]
+        self.is_leaf = self.child_count == 0
+        self.leaves = np.flatnonzero(self.is_leaf)
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    @property
+    def depth(self) -> int:
+        return int(self.level.max())
+
+
+# 远场展开的分量：加速度a(3)、潮汐张量T(6: xx yy zz xy xz yz)、三阶导数U(10)
+FIELD_COMPONENTS = 19
+
+
+def _far_field(tree: Octree, targets: np.ndarray, sources: np.ndarray, softening: float,
+               field: np.ndarray) -> None:
+    """远场：源节点质心在目标节点中心处产生的二阶局部展开（a、T、U）累加到field"""
+    # 分块计算，让中间数组留在缓存中
+    for first in range(0, len(targets), NBODY_FAR_BLOCK):
+        block = slice(first, first + NBODY_FAR_BLOCK)
+        _far_field_block(tree, targets[block], sources[block], softening, field)
+
+
+def _far_field_block(tree: Octree, targets: np.ndarray, sources: np.ndarray, softening: float,
+                     field: np.ndarray) -> None:
+    r = tree.com[sources] - tree.center[targets]
+    d2 = _norm2(r) + softening ** 2
+    inv3 = tree.node_mass[sources] / (d2 * np.sqrt(d2))
+    inv5 = 3 * inv3 / d2
+    inv7 = 5 * inv5 / d2
+    x, y, z = r[:, 0], r[:, 1], r[:, 2]
+    xi5, yi5, zi5 = x * inv5, y * inv5, z * inv5
+    x7, y7, z7 = x * inv7, y * inv7, z * inv7
+    components = (
+        x * inv3, y * inv3, z * inv3,
+        x * xi5 - inv3, y * yi5 - inv3, z * zi5 - inv3, x * yi5, x * zi5, y * zi5,
+        x * x * x7 - 3 * xi5, y * y * y7 - 3 * yi5, z * z * z7 - 3 * zi5,
+        x * x * y7 - yi5, x * x * z7 - zi5, x * y * y7 - xi5,
+        y * y * z7 - zi5, x * z * z7 - xi5, y * z * z7 - yi5, x * y * z7
+    )
+    for k, weights in enumerate(components):
+        field[:, k] += np.bincount(targets, weights=weights, minlength=len(field))
+
+
+def _shift_field(field: np.ndarray, dx: np.ndarray) -> np.ndarray:
+    """把局部展开平移dx：a' = a + (T + U·dx/2)·dx，T' = T + U·dx，U不变"""
+    x, y, z = dx[:, 0], dx[:, 1], dx[:, 2]
+    f = field.T
+    u_dx = (
+        f[9] * x + f[12] * y + f[13] * z,   # xx
+        f[14] * x + f[10] * y + f[15] * z,  # yy
+        f[16] * x + f[17] * y + f[11] * z,  # zz
+        f[12] * x + f[14] * y + f[18] * z,  # xy
+        f[13] * x + f[18] * y + f[16] * z,  # xz
+        f[18] * x + f[15] * y + f[17] * z   # yz
+    )
+    w = [f[3 + k] + u_dx[k] / 2 for k in range(6)]
+    shifted = field.copy()
+    shifted[:, 0] += w[0] * x + w[3] * y + w[4] * z
+    shifted[:, 1] += w[3] * x + w[1] * y + w[5] * z
+    shifted[:, 2] += w[4] * x + w[5] * y + w[2] * z
+    for k in range(6):
+        shifted[:, 3 + k] += u_dx[k]
+    return shifted
+
+
+def _near_field(tree: Octree, groups: np.ndarray, nodes: np.ndarray, softening: float,
+                acc: np.ndarray) -> int:
+    """近场：组内每个物体与叶子节点内每个物体逐对求和，按块处理；返回物体对数"""
+    g_start, g_count = tree.start[groups], tree.count[groups]
+    n_start, n_count = tree.start[nodes], tree.count[nodes]
+    pair_sizes = g_count * n_count
+    cumulative = np.cumsum(pair_sizes)
+    total = int(cumulative[-1]) if len(cumulative) else 0
+    cuts = np.searchsorted(cumulative, np.arange(NBODY_BLOCK_PAIRS, total, NBODY_BLOCK_PAIRS), side="right")
+    edges = np.unique(np.concatenate([[0], cuts, [len(groups)]]))
+    eps2 = softening ** 2
+    for first, last in zip(edges[:-1], edges[1:]):
+        block = slice(int(first), int(last))
+        # 先按目标物体展开 (物体, 节点)，再按源物体展开 (物体, 物体)
+        targets = _expand_ranges(g_start[block], g_count[block])
+        pair_of_target = np.repeat(np.arange(block.start, block.stop), g_count[block])
+        source_counts = n_count[pair_of_target]
+        sources = _expand_ranges(n_start[pair_of_target], source_counts)
+        targets = np.repeat(targets, source_counts)
+        r = tree.pos[sources] - tree.pos[targets]
+        d2 = _norm2(r) + eps2
+        with np.errstate(divide="ignore"):
+            inv_d3 = tree.mass[sources] / (d2 * np.sqrt(d2))
+        # 物体与自身（以及重合的物体）不产生作用
+        inv_d3[d2 == 0] = 0.0
+        for k in range(3):
+            acc[:, k] += np.bincount(targets, weights=r[:, k] * inv_d3, minlength=len(acc))
+    return total
+
+
+def accelerations_tree(positions: np.ndarray, masses: np.ndarray, theta: float = NBODY_THETA,
+                       softening: float = NBODY_SOFTENING, G: float = 1.0,
+                       leaf_size: int = NBODY_LEAF_SIZE) -> Tuple[np.ndarray, Dict]:
+    """Barnes–Hut近似加速度 (N,3)，并返回树和相互作用的统计"""
+    if not 0 < theta <= 1:
+        raise ValueError(f"开角theta必须在(0, 1]内: {theta}")
+    tree = Octree(positions, masses, leaf_size)
+    field = np.zeros((len(tree), FIELD_COMPONENTS))
+    far_pairs = 0
+    near_targets, near_sources = [], []
+
+    # 从 (根, 根) 开始，每轮整批判断；不满足开角条件时打开半径较大的一侧（叶子不能再打开）
+    targets = np.zeros(1, dtype=np.int64)
+    sources = np.zeros(1, dtype=np.int64)
+    while len(targets):
+        target_radius = tree.half_diagonal[targets]
+        source_radius = tree.radius[sources]
+        d = np.sqrt(_norm2(tree.com[sources] - tree.center[targets]))
+        accept = d * theta > target_radius + source_radius
+        if accept.any():
+            _far_field(tree, targets[accept], sources[accept], softening, field)
+            far_pairs += int(accept.sum())
+        target_leaf = tree.is_leaf[targets]
+        source_leaf = tree.is_leaf[sources]
+        near = ~accept & target_leaf & source_leaf
+        near_targets.append(targets[near])
+        near_sources.append(sources[near])
+        split_target = ~accept & ~target_leaf & (source_leaf | (target_radius >= source_radius))
+        split_source = ~accept & ~near & ~split_target
+        target_children = tree.child_count[targets[split_target]]
+        source_children = tree.child_count[sources[split_source]]
+        targets = np.concatenate([
+            _expand_ranges(tree.first_child[targets[split_target]], target_children),
+            np.repeat(targets[split_source], source_children)
+        ])
+        sources = np.concatenate([
+            np.repeat(sources[split_target], target_children),
+            _expand_ranges(tree.first_child[sources[split_source]], source_children)
+        ])
+
+    # 远场展开逐层下传：子节点继承父节点的展开（平移到子节点中心）
+    for level in range(1, tree.depth + 1):
+        nodes = np.arange(tree.level_offsets[level], tree.level_offsets[level + 1])
+        parents = tree.parent[nodes]
+        dx = tree.center[nodes] - tree.center[parents]
+        field[nodes] += _shift_field(field[parents], dx)
+
+    # 叶子内的物体：远场展开 + 近场逐对求和
+    sorted_acc = np.zeros((len(positions), 3))
+    near_pairs = _near_field(tree, np.concatenate(near_targets), np.concatenate(near_sources), softening, sorted_acc)
+    leaves = tree.leaves
+    member_leaf = np.repeat(leaves, tree.count[leaves])
+    members = _expand_ranges(tree.start[leaves], tree.count[leaves])
+    sorted_acc[members] += _shift_field(field[member_leaf], tree.pos[members] - tree.center[member_leaf])[:, :3]
+
+    acc = np.empty_like(sorted_acc)
+    acc[tree.order] = sorted_acc * G
+    return acc, {
+        "nodes": len(tree),
+        "leaves": len(leaves),
+        "depth": tree.depth,
+        "far_interactions": far_pairs,
+        "near_pairs": near_pairs
+    }
+
+
+def accelerations_exact(positions: np.ndarray, masses: np.ndarray, softening: float = NBODY_SOFTENING,
+                        G: float = 1.0) -> np.ndarray:
+    """精确O(N²)加速度 (N,3)，按块计算以限制临时内存（用于验证树算法）"""
+    n = len(positions)
+    acc = np.zeros((n, 3))
+    eps2 = softening ** 2
+    block = max(1, NBODY_BLOCK_PAIRS // max(n, 1))
+    for start in range(0, n, block):
+        chunk = positions[start:start + block]
+        r = positions[None, :, :] - chunk[:, None, :]
+        d2 = (r ** 2).sum(axis=-1) + eps2
+        with np.errstate(divide="ignore", invalid="ignore"):
+            inv_d3 = masses[None, :] / (d2 * np.sqrt(d2))
+        inv_d3[~np.isfinite(inv_d3)] = 0.0
+        acc[start:start + block] = (r * inv_d3[..., None]).sum(axis=1)
+    return acc * G
+
+
+def accelerations(positions: np.ndarray, masses: np.ndarray, method: str = "barnes_hut",
+                  theta: float = NBODY_THETA, softening: float = NBODY_SOFTENING,
+                  G: float = 1.0) -> Tuple[np.ndarray, Dict]:
+    if method == "exact":
+        n = len(positions)
+        return accelerations_exact(positions, masses, softening, G), {"pairs": n * n}
+    if method == "barnes_hut":
+        return accelerations_tree(positions, masses, theta, softening, G)
+    raise ValueError(f"不支持的N体计算方法: {method}")
+
+
+def leapfrog(positions: np.ndarray, velocities: np.ndarray, masses: np.ndarray, time_step: float,
+             steps: int, method: str = "barnes_hut", theta: float = NBODY_THETA,
+             softening: float = NBODY_SOFTENING, G: float = 1.0):
+    """kick-drift-kick蛙跳积分；逐步产出 (步号, 位置, 速度, 本步统计)，第0步为初始状态
+
+    每步只计算一次加速度（上一步末尾的加速度用于下一步开头的半步kick）
+    """
+    pos = np.array(positions, dtype=np.float64)
+    vel = np.array(velocities, dtype=np.float64)
+    acc, stats = accelerations(pos, masses, method, theta, softening, G)
+    yield 0, pos, vel, stats
+    for step in range(1, steps):
+        start = time.perf_counter()
+        vel += acc * (time_step / 2)
+        pos += vel * time_step
+        acc, stats = accelerations(pos, masses, method, theta, softening, G)
+        vel += acc * (time_step / 2)
+        stats["seconds"] = time.perf_counter() - start
+        yield step, pos, vel, stats
+
+
+def kinetic_energy(velocities: np.ndarray, masses: np.ndarray) -> float:
+    return float(0.5 * (masses * (velocities ** 2).sum(axis=1)).sum())
+
+
+def initial_conditions(distribution: str, bodies: int, total_mass: float = 1.0, scale: float = 1.0,
+                       G: float = 1.0, seed: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """演示用初始条件，返回 (位置, 速度, 质量)
+    - plummer: Plummer球（星团），各处速度弥散取局部维里平衡值
+    - disk:    中心天体（占总质量90%）加XZ平面内的圆轨道盘（Y轴向上）
+    - uniform: 均匀立方体，初速度为0（冷塌缩）
+    """
+    rng = np.random.default_rng(seed)
+    if bodies < 1:
+        raise ValueError("物体数必须大于0")
+    if distribution == "plummer":
+        masses = np.full(bodies, total_mass / bodies)
+        u = rng.uniform(1e-6, 1 - 1e-6, bodies)
+        radius = scale / np.sqrt(u ** (-2 / 3) - 1)
+        positions = _random_directions(rng, bodies) * radius[:, None]
+        sigma = np.sqrt(G * total_mass / (6 * np.sqrt(radius ** 2 + scale ** 2)))
+        velocities = rng.normal(size=(bodies, 3)) * sigma[:, None]
+    elif distribution == "disk":
+        masses = np.full(bodies, 0.1 * total_mass / max(bodies - 1, 1))
+        masses[0] = 0.9 * total_mass
+        radius = scale * np.sqrt(rng.uniform(0.05, 1.0, bodies))
+        radius[0] = 0.0
+        angle = rng.uniform(0, 2 * np.pi, bodies)
+        positions = np.stack([radius * np.cos(angle), rng.normal(0, 0.01 * scale, bodies), radius * np.sin(angle)], axis=1)
+        positions[0] = 0.0
+        # 圆轨道速度按半径以内的质量计算
+        order = np.argsort(radius)
+        enclosed = np.empty(bodies)
+        enclosed[order] = np.cumsum(masses[order])
+        speed = np.sqrt(G * enclosed / np.maximum(radius, 1e-12))
+        speed[0] = 0.0
+        velocities = np.stack([-np.sin(angle) * speed, np.zeros(bodies), np.cos(angle) * speed], axis=1)
+    elif distribution == "uniform":
+        masses = np.full(bodies, total_mass / bodies)
+        positions = rng.uniform(-scale, scale, (bodies, 3))
+        velocities = np.zeros((bodies, 3))
+    else:
+        raise ValueError(f"不支持的初始分布: {distribution}，可选: {', '.join(DISTRIBUTIONS)}")
+    # 移到质心参考系
+    positions -= (positions * masses[:, None]).sum(axis=0) / masses.sum()
+    velocities -= (velocities * masses[:, None]).sum(axis=0) / masses.sum()
+    return positions, velocities, masses
+
+
+def _random_directions(rng: np.random.Generator, count: int) -> np.ndarray:
+    v = rng.normal(size=(count, 3))
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Socket.IO出站队列 - 每个客户端一个有界队列，由一个发送线程按客户端的实际接收速度转发
+Engine.IO自身的发送队列积压超过 OUTBOUND_TRANSPORT_BACKLOG 个包时暂停向该客户端转发，
+积压期间新消息在本队列中按类别处理：
+- control: 控制事件（结果、完成、错误等），从不丢弃
+- frame:   实时仿真帧，同一key只保留最新的若干帧，丢弃较旧的中间帧
+- token:   聊天流式片段，与队尾同一会话的未发送片段合并
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+CONTROL = "control"
+FRAME = "frame"
+TOKEN = "token"
+
+# 每个客户端队列中可丢弃/可合并消息（frame、token）的上限；control不受限制
+OUTBOUND_MAX_MESSAGES = int(os.environ.get("OUTBOUND_MAX_MESSAGES", "256"))
+# 同一key最多保留的待发送帧数
+OUTBOUND_MAX_PENDING_FRAMES = int(os.environ.get("OUTBOUND_MAX_PENDING_FRAMES", "2"))
+# Engine.IO发送队列中未写出的包超过该数量时视为客户端拥塞
+OUTBOUND_TRANSPORT_BACKLOG = int(os.environ.get("OUTBOUND_TRANSPORT_BACKLOG", "16"))
+# 没有可发送消息（或所有客户端都拥塞）时的轮询间隔
+OUTBOUND_POLL_INTERVAL = 0.005
+
+
+class OutboundMessage:
+    __slots__ = ("event", "data", "kind", "key")
+
+    def __init__(self, event: str, data: Any, kind: str, key: Optional[str]):
+        self.event = event
+        self.data = data
+        self.kind = kind
+        self.key = key
+
+
+class ClientQueue:
+    """单个客户端的待发送消息；调用方负责加锁"""
+
+    def __init__(self, sid: str, max_messages: int = OUTBOUND_MAX_MESSAGES,
+                 max_pending_frames: int = OUTBOUND_MAX_PENDING_FRAMES):
+        self.sid = sid
+        self.max_messages = max_messages
+        self.max_pending_frames = max_pending_frames
+        self.messages: Deque[OutboundMessage] = deque()
+        self.droppable = 0
+        self.dropped = 0
+        self.merged = 0
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def put(self, message: OutboundMessage) -> None:
+        if message.kind == TOKEN and self._merge_token(message):
+            return
+        if message.kind == FRAME:
+            self._drop_frames(message.key, self.max_pending_frames - 1)
+        if message.kind != CONTROL:
+            if self.droppable >= self.max_messages and not self._drop_oldest_frame():
+                if message.kind == FRAME:
+                    self._record_drop(message)
+                    return
+                # 全是聊天片段时合并到同一会话最近的片段，不丢内容
+                if message.kind == TOKEN and self._merge_token(message, tail_only=False):
+                    return
+            self.droppable += 1
+        self.messages.append(message)
+
+    def pop(self) -> Optional[OutboundMessage]:
+        if not self.messages:
+            return None
+        message = self.messages.popleft()
+        if message.kind != CONTROL:
+            self.droppable -= 1
+        return message
+
+    def _merge_token(self, message: OutboundMessage, tail_only: bool = True) -> bool:
+        candidates = [self.messages[-1]] if tail_only and self.messages else reversed(self.messages)
+        for pending in candidates:
+            if (pending.kind == TOKEN and pending.key == message.key
+                    and isinstance(pending.data, dict) and isinstance(message.data, dict)):
+                pending.data = {**pending.data, "content": pending.data.get("content", "") + message.data.get("content", "")}
+                self.merged += 1
+                metrics.OUTBOUND_MERGED.inc(event=message.event)
+                return True
+        return False
+
+    def _drop_frames(self, key: Optional[str], keep: int) -> None:
+        """同一key的待发送帧只保留最新的keep个"""
+        frames = [m for m in self.messages if m.kind == FRAME and m.key == key]
+        for stale in frames[:max(0, len(frames) - keep)]:
+            self.messages.remove(stale)
+            self.droppable -= 1
+            self._record_drop(stale)
+
+    def _drop_oldest_frame(self) -> bool:
+        for pending in self.messages:
+            if pending.kind == FRAME:
+                self.messages.remove(pending)
+                self.droppable -= 1
+                self._record_drop(pending)
+                return True
+        return False
+
+    def _record_drop(self, message: OutboundMessage) -> None:
+        self.dropped += 1
+        metrics.OUTBOUND_DROPPED.inc(event=message.event)
+
+
+class OutboundManager:
+    """所有客户端的出站队列和发送线程"""
+
+    def __init__(self, socketio, namespace: str = "/",
+                 transport_backlog: int = OUTBOUND_TRANSPORT_BACKLOG):
+        self.socketio = socketio
+        self.namespace = namespace
+        self.transport_backlog = transport_backlog
+        self._lock = threading.Condition()
+        self._queues: Dict[str, ClientQueue] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def send(self, sid: Optional[str], event: str, data: Any = None, kind: str = CONTROL,
+             key: Optional[str] = None) -> None:
+        """把消息放入客户端队列；sid为空时直接广播（与socketio.emit一致）"""
+        if not sid:
+            self.socketio.emit(event, data)
+            return
+        with self._lock:
+            queue = self._queues.get(sid)
+            if queue is None:
+                queue = self._queues[sid] = ClientQueue(sid)
+            queue.put(OutboundMessage(event, data, kind, key))
+            metrics.OUTBOUND_QUEUE_DEPTH.set(len(queue), sid=sid)
+            self._lock.notify()
+        self._ensure_thread()
+
+    def close(self, sid: str) -> None:
+        """客户端断开时丢弃其队列"""
+        with self._lock:
+            self._queues.pop(sid, None)
+        metrics.OUTBOUND_QUEUE_DEPTH.remove(sid=sid)
+
+    def depths(self) -> Dict[str, int]:
+        with self._lock:
+            return {sid: len(queue) for sid, queue in self._queues.items()}
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {"sid": sid, "depth": len(queue), "dropped": queue.dropped, "merged": queue.merged,
+                 "transport_backlog": self._transport_backlog(sid)}
+                for sid, queue in self._queues.items()
+            ]
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, daemon=True, name="socketio-outbound")
+        self._thread.start()
+
+    def _transport_backlog(self, sid: str) -> int:
+        """Engine.IO层尚未写出的包数；取不到时（如测试客户端）视为0"""
+        try:
+            eio_sid = self.socketio.server.manager.eio_sid_from_sid(sid, self.namespace)
+            socket = self.socketio.server.eio.sockets.get(eio_sid)
+            return socket.queue.qsize() if socket is not None else 0
+        except (AttributeError, NotImplementedError):
+            return 0
+
+    def _next_batch(self) -> List[Tuple[str, OutboundMessage]]:
+        """每个未拥塞的客户端取一条消息；没有消息时等待新消息，只有拥塞的客户端时轮询"""
+        with self._lock:
+            while True:
+                ready, congested = [], False
+                for sid, queue in self._queues.items():
+                    if not queue.messages:
+                        continue
+                    if self._transport_backlog(sid) >= self.transport_backlog:
+                        congested = True
+                        continue
+                    ready.append((sid, queue.pop()))
+                    metrics.OUTBOUND_QUEUE_DEPTH.set(len(queue), sid=sid)
+                if ready:
+                    return ready
+                self._lock.wait(OUTBOUND_POLL_INTERVAL if congested else None)
+
+    def _run(self) -> None:
+        while True:
+            try:
+                for sid, message in self._next_batch():
+                    self.socketio.emit(message.event, message.data, to=sid, namespace=self.namespace)
+            except Exception as e:
+                logger.error(f"Socket.IO出站发送失败: {e}")
+                time.sleep(OUTBOUND_POLL_INTERVAL)
@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""
+参数扫描 - 同一场景按参数网格或随机分布批量运行仿真，只返回聚合统计（末位置、接触数、能量），
+不返回每次运行的轨迹。
+
+- rigid:   场景中的形状按包围球近似（与实时仿真相同的物理），每次运行是进程池中的一个任务
+- gravity: 均匀重力场中的抛体，同一批运行沿批次维度向量化，在扫描线程内直接计算
+
+扫描在后台线程中执行，可查询进度、取消；取消后已完成运行的统计仍然可用。
+扫描属于启动它的会话场景，只能由同一会话查询和取消。
+"""
+
+import itertools
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+import metrics
+from live_simulation import LIVE_MAX_BODIES, LiveWorld, bounding_spheres
+from scene_registry import normalize_session_id, scene_registry
+
+logger = logging.getLogger(__name__)
+
+# 进程池大小（默认CPU核数）和单次扫描的运行数上限
+SWEEP_WORKERS = int(os.environ.get("SWEEP_WORKERS", str(os.cpu_count() or 1)))
+SWEEP_MAX_RUNS = int(os.environ.get("SWEEP_MAX_RUNS", "1000"))
+# 同时运行的扫描数上限
+SWEEP_MAX_ACTIVE = int(os.environ.get("SWEEP_MAX_ACTIVE", "2"))
+# 保留多少个已结束扫描的结果供查询
+SWEEP_KEEP_FINISHED = 20
+# 向量化引擎每批的运行数（批之间检查取消并报告进度）
+SWEEP_BATCH_SIZE = 256
+# 进度回调的最短间隔（秒）
+SWEEP_PROGRESS_INTERVAL = 0.5
+# rigid单次运行的最大步数
+SWEEP_MAX_STEPS = 20000
+
+RUNNING = "running"
+COMPLETED = "completed"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+SIMULATION_TYPES = ("rigid", "gravity")
+DISTRIBUTIONS = ("uniform", "normal", "loguniform", "choice")
+
+# 每种仿真汇总统计的标量指标
+SCALAR_METRICS = {
+    "rigid": ("kinetic_energy", "potential_energy", "energy_ratio", "contacts", "peak_contacts",
+              "ground_contacts", "max_speed"),
+    "gravity": ("kinetic_energy", "potential_energy", "min_height", "max_speed"),
+}
+
+
+def expand_runs(spec: Dict) -> List[Dict[str, Any]]:
+    """把grid（参数名 -> 取值列表）的笛卡尔积与random（参数名 -> 分布）的samples次抽样组合成运行列表"""
+    grid = spec.get("grid") or {}
+    random_params = spec.get("random") or {}
+    for name, values in grid.items():
+        if not isinstance(values, (list, tuple)) or not values:
+            raise ValueError(f"网格参数 {name} 必须是非空列表")
+    samples = int(spec.get("samples") or 10) if random_params else 1
+    if samples < 1:
+        raise ValueError("samples必须为正整数")
+
+    names = list(grid)
+    points = [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    total = len(points) * samples
+    if total > SWEEP_MAX_RUNS:
+        raise ValueError(f"运行数 {total} 超过上限 {SWEEP_MAX_RUNS}")
+    if not grid and not random_params:
+        raise ValueError("至少需要指定grid或random中的一个参数")
+
+    rng = np.random.default_rng(spec.get("seed"))
+    runs = []
+    for point in points:
+        for _ in range(samples):
+            drawn = {name: _draw(rng, name, distribution) for name, distribution in random_params.items()}
+            runs.append({**point, **drawn})
+    return runs
+
+
+def _draw(rng: np.random.Generator, name: str, distribution: Any) -> Any:
+    """按分布抽一个值；[low, high] 为均匀分布的简写"""
+    if isinstance(distribution, (list, tuple)) and len(distribution) == 2:
+        distribution = {"distribution": "uniform", "low": distribution[0], "high": distribution[1]}
+    if not isinstance(distribution, dict):
+        raise ValueError(f"随机参数 {name} 的分布格式无效")
+    kind = distribution.get("distribution", "uniform")
+    if kind == "uniform":
+        return float(rng.uniform(distribution["low"], distribution["high"]))
+    if kind == "normal":
+        return float(rng.normal(distribution["mean"], distribution["std"]))
+    if kind == "loguniform":
+        return float(np.exp(rng.uniform(np.log(distribution["low"]), np.log(distribution["high"]))))
+    if kind == "choice":
+        values = distribution["values"]
+        return values[int(rng.integers(len(values)))]
+    raise ValueError(f"不支持的分布: {kind}，可选: {', '.join(DISTRIBUTIONS)}")
+
+
+def run_rigid(centers: np.ndarray, radii: np.ndarray, params: Dict) -> Dict[str, Any]:
+    """单次刚体运行（在工作进程中执行）：推进duration秒，统计接触和能量"""
+    start = time.perf_counter()
+    gravity = float(params.get("gravity", 9.81))
+    time_step = float(params.get("time_step", 1 / 60))
+    steps = int(round(float(params.get("duration", 2.0)) / time_step))
+    if not 0 < steps <= SWEEP_MAX_STEPS:
+        raise ValueError(f"步数 {steps} 超出范围 (0, {SWEEP_MAX_STEPS}]")
+    world = LiveWorld(centers, radii, gravity=gravity,
+                      restitution=float(params.get("restitution", 0.6)),
+                      friction=float(params.get("friction", 0.3)),
+                      ccd=bool(params.get("ccd", True)))
+    if "initial_velocity" in params:
+        world.vel[:] = np.asarray(params["initial_velocity"], dtype=np.float64).reshape(-1, 3)
+    mass = 1.0 / world.inv_mass
+
+    def energy():
+        kinetic = 0.5 * float((mass * (world.vel ** 2).sum(axis=1)).sum())
+        potential = float((mass * gravity * (world.pos[:, 1] - world.radius - world.ground)).sum())
+        return kinetic, potential
+
+    initial = sum(energy())
+    contacts = peak_contacts = 0
+    for _ in range(steps):
+        world.step(time_step)
+        contacts += world.contacts
+        peak_contacts = max(peak_contacts, world.contacts)
+    kinetic, potential = energy()
+    return {
+        "final_positions": world.pos,
+        "kinetic_energy": kinetic,
+        "potential_energy": potential,
+        "energy_ratio": (kinetic + potential) / initial if initial > 0 else 1.0,
+        "contacts": contacts,
+        "peak_contacts": peak_contacts,
+        "ground_contacts": world.ground_contacts,
+        "max_speed": float(np.linalg.norm(world.vel, axis=1).max()) if len(world) else 0.0,
+        "seconds": time.perf_counter() - start
+    }
+
+
+def run_gravity_batch(runs: List[Dict]) -> List[Dict[str, Any]]:
+    """一批抛体运行沿批次维度向量化：与MCPService的gravity仿真相同的积分，返回最后一帧的统计
+    步数和物体数相同的运行放在同一个 (运行, 物体, 3) 数组中"""
+    results: List[Optional[Dict]] = [None] * len(runs)
+    groups: Dict[tuple, List[int]] = {}
+    states = []
+    for index, params in enumerate(runs):
+        pos = np.array(params.get("initial_position", [0, 10, 0]), dtype=np.float64).reshape(-1, 3)
+        vel = np.array(params.get("initial_velocity", [0, 0, 0]), dtype=np.float64).reshape(-1, 3)
+        pos, vel = np.broadcast_arrays(pos, vel)
+        steps = int(params.get("time_steps", 100))
+        if steps < 1:
+            raise ValueError("time_steps必须为正整数")
+        states.append((pos, vel))
+        groups.setdefault((steps, len(pos)), []).append(index)
+
+    for (steps, _), members in groups.items():
+        start = time.perf_counter()
+        pos = np.stack([states[i][0] for i in members])
+        vel = np.stack([states[i][1] for i in members])
+        gravity = np.array([float(runs[i].get("gravity", 9.81)) for i in members])
+        dt = np.array([float(runs[i].get("time_step", 0.05)) for i in members])
+        min_height = pos[:, :, 1].min(axis=1)
+        # 最后一帧是第steps-1次更新后的状态
+        for _ in range(steps - 1):
+            vel[:, :, 1] -= (gravity * dt)[:, None]
+            pos += vel * dt[:, None, None]
+            np.minimum(min_height, pos[:, :, 1].min(axis=1), out=min_height)
+        kinetic = 0.5 * (vel ** 2).sum(axis=(1, 2))
+        potential = gravity * pos[:, :, 1].sum(axis=1)
+        max_speed = np.linalg.norm(vel, axis=2).max(axis=1)
+        seconds = (time.perf_counter() - start) / len(members)
+        for k, index in enumerate(members):
+            results[index] = {
+                "final_positions": pos[k],
+                "kinetic_energy": float(kinetic[k]),
+                "potential_energy": float(potential[k]),
+                "min_height": float(min_height[k]),
+                "max_speed": float(max_speed[k]),
+                "seconds": seconds
+            }
+    return results
+
+
+def _statistics(values: np.ndarray) -> Dict[str, float]:
+    p05, p50, p95 = np.percentile(values, [5, 50, 95])
+    return {
+        "mean": round(float(values.mean()), 6),
+        "std": round(float(values.std()), 6),
+        "min": round(float(values.min()), 6),
+        "max": round(float(values.max()), 6),
+        "p05": round(float(p05), 6),
+        "p50": round(float(p50), 6),
+        "p95": round(float(p95), 6)
+    }
+
+
+class SweepJob:
+    """一次参数扫描的运行列表、逐次结果和进度"""
+
+    def __init__(self, session_id: str, simulation_type: str, runs: List[Dict], base: Dict):
+        self.sweep_id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.simulation_type = simulation_type
+        self.runs = runs
+        self.base = base
+        self.parameters = sorted({name for run in runs for name in run})
+        self.results: List[Optional[Dict]] = [None] * len(runs)
+        self.errors: Dict[int, str] = {}
+        self.state = RUNNING
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.cancel_event = threading.Event()
+        self.done = threading.Event()
+        self.futures: List = []
+
+    @property
+    def completed(self) -> int:
+        return sum(result is not None for result in self.results)
+
+    def record(self, index: int, result: Dict) -> None:
+        self.results[index] = result
+        metrics.SWEEP_RUNS.inc(simulation_type=self.simulation_type, status="ok")
+
+    def record_error(self, index: int, error: str) -> None:
+        self.errors[index] = error
+        metrics.SWEEP_RUNS.inc(simulation_type=self.simulation_type, status="error")
+
+    def finish(self, state: str, error: Optional[str] = None) -> None:
+        self.state = state
+        self.error = error
+        self.finished_at = time.time()
+        metrics.SWEEP_SECONDS.observe(self.finished_at - self.started_at, simulation_type=self.simulation_type)
+        self.done.set()
+
+    def progress(self) -> Dict[str, Any]:
+        completed = self.completed
+        data = {
+            "sweep_id": self.sweep_id,
+            "simulation_type": self.simulation_type,
+            "state": self.state,
+            "total": len(self.runs),
+            "completed": completed,
+            "failed": len(self.errors),
+            "progress": round((completed + len(self.errors)) / max(len(self.runs), 1), 4),
+            "elapsed": round((self.finished_at or time.time()) - self.started_at, 3)
+        }
+        if self.error:
+            data["error"] = self.error
+        return data
+
+    def status(self, include_runs: bool = True) -> Dict[str, Any]:
+        """进度加上已完成运行的聚合统计；include_runs为True时附带每次运行的参数和标量指标"""
+        data = {**self.progress(), "parameters": self.parameters, "base": self.base}
+        done = [(index, result) for index, result in enumerate(self.results) if result is not None]
+        names = SCALAR_METRICS[self.simulation_type]
+        if done:
+            data["summary"] = {
+                name: _statistics(np.array([result[name] for _, result in done], dtype=np.float64))
+                for name in names
+            }
+            data["mean_run_seconds"] = round(float(np.mean([result["seconds"] for _, result in done])), 6)
+            shapes = {result["final_positions"].shape for _, result in done}
+            if len(shapes) == 1:
+                final = np.stack([result["final_positions"] for _, result in done])
+                data["final_positions"] = {
+                    "mean": np.round(final.mean(axis=0), 4).tolist(),
+                    "std": np.round(final.std(axis=0), 4).tolist()
+                }
+        if include_runs:
+            rows = []
+            for index, params in enumerate(self.runs):
+                row = {"index": index, "params": params}
+                if self.results[index] is not None:
+                    row.update({name: round(float(self.results[index][name]), 6) for name in names})
+                elif index in self.errors:
+                    row["error"] = self.errors[index]
+                rows.append(row)
+            data["runs"] = rows
+        return data
+
+
+class SweepManager:
+    """参数扫描：后台线程分发运行，进程池在首次需要时创建"""
+
+    def __init__(self, registry, on_progress: Optional[Callable[[str, Dict], None]] = None,
+                 workers: int = SWEEP_WORKERS):
+        self.registry = registry
+        self.on_progress = on_progress
+        self.workers = max(1, workers)
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, SweepJob] = {}
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self, session_id: Optional[str], spec: Dict) -> Dict:
+        """开始扫描，立即返回sweep_id和进度；spec包含simulation_type、base、grid、random、samples、seed"""
+        try:
+            session_id = normalize_session_id(session_id)
+            simulation_type = spec.get("simulation_type") or "rigid"
+            if simulation_type not in SIMULATION_TYPES:
+                return {"success": False, "error": f"不支持的扫描仿真类型: {simulation_type}，可选: {', '.join(SIMULATION_TYPES)}"}
+            base = dict(spec.get("base") or {})
+            runs = expand_runs(spec)
+            job = SweepJob(session_id, simulation_type, runs, base)
+            target, args = self._run_gravity, ()
+            if simulation_type == "rigid":
+                shapes = list(self.registry.get(session_id).shapes)
+                if not shapes:
+                    return {"success": False, "error": "当前场景没有形状，无法进行刚体扫描"}
+                if len(shapes) > LIVE_MAX_BODIES:
+                    return {"success": False, "error": f"物体数 {len(shapes)} 超过上限 {LIVE_MAX_BODIES}"}
+                centers, radii, _ = bounding_spheres(shapes)
+                target, args = self._run_rigid, (centers, radii)
+
+            with self._lock:
+                active = sum(1 for other in self._jobs.values() if other.state == RUNNING)
+                if active >= SWEEP_MAX_ACTIVE:
+                    return {"success": False, "error": f"同时运行的参数扫描数已达上限 {SWEEP_MAX_ACTIVE}"}
+                self._jobs[job.sweep_id] = job
+                self._prune()
+                metrics.SWEEPS_ACTIVE.set(active + 1)
+            logger.info(f"参数扫描开始 {job.sweep_id}: {simulation_type}，{len(runs)}次运行")
+            threading.Thread(target=self._execute, args=(job, target, *args), daemon=True,
+                             name=f"sweep-{job.sweep_id[:8]}").start()
+            return {"success": True, "data": job.progress(), "message": f"参数扫描已开始（{len(runs)}次运行）"}
+        except (ValueError, KeyError, TypeError) as e:
+            return {"success": False, "error": str(e)}
+        except Exception as e:
+            logger.error(f"开始参数扫描失败: {e}")
+            return {"success": False, "error": str(e)}
+
+    def get(self, sweep_id: str, session_id: Optional[str]) -> Optional[SweepJob]:
+        """按ID取扫描；不是session_id对应场景启动的扫描视为不存在"""
+        try:
+            session_id = normalize_session_id(session_id)
+        except ValueError:
+            return None
+        with self._lock:
+            job = self._jobs.get(sweep_id)
+        return job if job is not None and job.session_id == session_id else None
+
+    def status(self, sweep_id: str, session_id: Optional[str], include_runs: bool = True) -> Dict:
+        job = self.get(sweep_id, session_id)
+        if job is None:
+            return {"success": False, "error": f"参数扫描不存在: {sweep_id}"}
+        return {"success": True, "data": job.status(include_runs)}
+
+    def wait(self, sweep_id: str, session_id: Optional[str], timeout: Optional[float] = None) -> Dict:
+        """等待扫描结束（或超时）后返回状态"""
+        job = self.get(sweep_id, session_id)
+        if job is None:
+            return {"success": False, "error": f"参数扫描不存在: {sweep_id}"}
+        job.done.wait(timeout)
+        return {"success": True, "data": job.status()}
+
+    def cancel(self, sweep_id: str, session_id: Optional[str]) -> Dict:
+        """取消扫描：未开始的运行不再执行，正在执行的运行结束后丢弃"""
+        job = self.get(sweep_id, session_id)
+        if job is None:
+            return {"success": False, "error": f"参数扫描不存在: {sweep_id}"}
+        if job.state == RUNNING:
+            job.cancel_event.set()
+            for future in list(job.futures):
+                future.cancel()
+        return {"success": True, "data": job.progress(), "message": "参数扫描已取消"}
+
+    def stats(self, session_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """扫描进度列表；指定session_id时只列出该会话的扫描，不指定时列出全部（管理接口）"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        if session_id is not None:
+            session_id = normalize_session_id(session_id)
+            jobs = [job for job in jobs if job.session_id == session_id]
+        return [job.progress() for job in jobs]
+
+    def _prune(self) -> None:
+        finished = sorted((job for job in self._jobs.values() if job.state != RUNNING),
+                          key=lambda job: job.finished_at or 0)
+        for job in finished[:max(0, len(finished) - SWEEP_KEEP_FINISHED)]:
+            self._jobs.pop(job.sweep_id, None)
+
+    def _execute(self, job: SweepJob, target: Callable[..., None], *args) -> None:
+        try:
+            target(job, *args)
+            job.finish(CANCELLED if job.cancel_event.is_set() else COMPLETED)
+        except Exception as e:
+            logger.error(f"参数扫描失败: {e}")
+            job.finish(FAILED, str(e))
+        finally:
+            with self._lock:
+                metrics.SWEEPS_ACTIVE.set(sum(1 for other in self._jobs.values() if other.state == RUNNING))
+            logger.info(f"参数扫描结束 {job.sweep_id}: {job.state}，完成{job.completed}/{len(job.runs)}")
+            self._report(job, final=True)
+
+    def _report(self, job: SweepJob, final: bool = False) -> None:
+        if self.on_progress is None:
+            return
+        try:
+            self.on_progress(job.session_id, job.status(include_runs=False) if final else job.progress())
+        except Exception as e:
+            logger.error(f"参数扫描进度回调失败: {e}")
+
+    def _progress_reporter(self, job: SweepJob) -> Callable[[], None]:
+        last = [0.0]
+
+        def report():
+            now = time.monotonic()
+            if now - last[0] >= SWEEP_PROGRESS_INTERVAL:
+                last[0] = now
+                self._report(job)
+        return report
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _run_rigid(self, job: SweepJob, centers: np.ndarray, radii: np.ndarray) -> None:
+        report = self._progress_reporter(job)
+        executor = self._pool()
+        futures = {}
+        for index, params in enumerate(job.runs):
+            futures[executor.submit(run_rigid, centers, radii, {**job.base, **params})] = index
+        job.futures = list(futures)
+        try:
+            for future in as_completed(futures):
+                if job.cancel_event.is_set():
+                    # 取消后结束的运行（包括正在执行的）不再记录
+                    for pending in futures:
+                        pending.cancel()
+                    break
+                try:
+                    job.record(futures[future], future.result())
+                except CancelledError:
+                    continue
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:
+                    job.record_error(futures[future], str(e))
+                report()
+        except BrokenProcessPool:
+            # 工作进程异常退出：丢弃进程池，下次扫描重新创建
+            with self._lock:
+                self._executor = None
+            raise RuntimeError("参数扫描工作进程异常退出")
+        finally:
+            job.futures = []
+
+    def _run_gravity(self, job: SweepJob) -> None:
+        report = self._progress_reporter(job)
+        for first in range(0, len(job.runs), SWEEP_BATCH_SIZE):
+            if job.cancel_event.is_set():
+                return
+            batch = [{**job.base, **params} for params in job.runs[first:first + SWEEP_BATCH_SIZE]]
+            for offset, result in enumerate(run_gravity_batch(batch)):
+                job.record(first + offset, result)
+            report()
+
+
+# 全局参数扫描管理器（Flask端设置on_progress把进度推送给场景房间）
+sweep_manager = SweepManager(scene_registry)
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+按需性能分析 - 针对单个请求开启cProfile或栈采样，并提供分阶段耗时统计
+未开启时stage()只是一次contextvar读取，不影响热路径
+"""
+
+import contextlib
+import contextvars
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.environ.get(
+    "PROFILE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "profiles")
+)
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", "200"))
+SAMPLE_INTERVAL = float(os.environ.get("PROFILE_SAMPLE_INTERVAL", "0.005"))
+# 由请求触发的cProfile/栈采样会拖慢请求并写文件，默认关闭；分阶段耗时（X-Timing）不受此开关影响
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "0") == "1"
+
+PROFILE_MODES = ("cprofile", "sample")
+_PROFILE_NAME_PATTERN = re.compile(r"^[\w\-.]+\.(pstats|folded)$")
+
+_current_timer: contextvars.ContextVar[Optional["StageTimer"]] = contextvars.ContextVar(
+    "stage_timer", default=None)
+
+
+def parse_profile_mode(value: Any) -> Optional[str]:
+    """解析请求中的性能分析开关：true/1 表示cprofile，也可以直接指定模式"""
+    if value is None or value is False:
+        return None
+    if value is True:
+        return "cprofile"
+    value = str(value).strip().lower()
+    if value in PROFILE_MODES:
+        return value
+    if value in ("1", "true", "yes", "on"):
+        return "cprofile"
+    return None
+
+
+class StageTimer:
+    """分阶段耗时统计（解析、MCP往返、计算、序列化、发送等），同名阶段累加"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self._token = None
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def activate(self) -> "StageTimer":
+        """设为当前上下文的计时器，之后的profiling.stage()都会记录到这里"""
+        self._token = _current_timer.set(self)
+        return self
+
+    def deactivate(self) -> None:
+        if self._token is not None:
+            _current_timer.reset(self._token)
+            self._token = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        total = time.perf_counter() - self.start
+        stages = {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()}
+        return {"total_ms": round(total * 1000, 3), "stages_ms": stages}
+
+    def server_timing(self) -> str:
+        """生成Server-Timing响应头"""
+        return ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.stages.items())
+
+
+def stage(name: str):
+    """在当前计时器上记录一个阶段；没有激活计时器时为空操作"""
+    timer = _current_timer.get()
+    if timer is None:
+        return contextlib.nullcontext()
+    return timer.stage(name)
+
+
+def current_timer() -> Optional[StageTimer]:
+    return _current_timer.get()
+
+
+class _StackSampler(threading.Thread):
+    """定时采样目标线程的调用栈，生成collapsed-stack格式"""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(daemon=True, name="profile-sampler")
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+class RequestProfiler:
+    """单个请求的性能分析器，在同一线程中start/stop"""
+
+    def __init__(self, name: str, mode: str = "cprofile", interval: float = SAMPLE_INTERVAL):
+        self.name = re.sub(r"[^\w\-]", "_", name)[:64]
+        self.mode = mode
+        self.interval = interval
+        self.profile_id = None
+        self._profiler = None
+        self._sampler = None
+
+    def start(self) -> "RequestProfiler":
+        if self.mode == "sample":
+            self._sampler = _StackSampler(threading.get_ident(), self.interval)
+            self._sampler.start()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return self
+
+    def stop(self) -> Optional[str]:
+        """停止分析并保存文件，返回profile文件名"""
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profile_id = f"{self.name}-{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+            if self._sampler is not None:
+                self._sampler.stop()
+                filename = f"{profile_id}.folded"
+                with open(os.path.join(PROFILE_DIR, filename), "w", encoding="utf-8") as f:
+                    for stack, count in self._sampler.samples.most_common():
+                        f.write(f"{stack} {count}\n")
+            else:
+                self._profiler.disable()
+                filename = f"{profile_id}.pstats"
+                self._profiler.dump_stats(os.path.join(PROFILE_DIR, filename))
+            self.profile_id = filename
+            _prune_profiles()
+            logger.info(f"性能分析已保存: {filename}")
+            return filename
+        except Exception as e:
+            logger.error(f"保存性能分析失败: {e}")
+            return None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+
+class ProfileScope:
+    """一次请求的分析范围：按需开启分阶段计时和/或性能分析"""
+
+    def __init__(self, name: str, mode: Optional[str] = None, timings: bool = False):
+        self.name = name
+        self.mode = mode
+        self.timings = timings or mode is not None
+        self.timer = None
+        self.profiler = None
+        self.report: Dict[str, Any] = {}
+        self._stopped = False
+
+    @property
+    def active(self) -> bool:
+        return self.timings
+
+    def start(self) -> "ProfileScope":
+        if self.timings:
+            self.timer = StageTimer().activate()
+        if self.mode:
+            self.profiler = RequestProfiler(self.name, self.mode).start()
+        return self
+
+    def stop(self) -> Dict[str, Any]:
+        """结束分析，返回 {"timings": ..., "profile_id": ...}；重复调用直接返回结果"""
+        if self._stopped:
+            return self.report
+        self._stopped = True
+        if self.profiler is not None:
+            self.report["profile_id"] = self.profiler.stop()
+            self.profiler = None
+        if self.timer is not None:
+            self.report["timings"] = self.timer.as_dict()
+            self.timer.deactivate()
+        return self.report
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+
+def profiled_tool(fn):
+    """MCP工具装饰器：调用参数profile为cprofile/sample/true时分析本次调用，结果附带profile字段；
+    PROFILING_ENABLED关闭时忽略profile参数"""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        mode = parse_profile_mode(kwargs.get("profile")) if PROFILING_ENABLED else None
+        if not mode:
+            return await fn(*args, **kwargs)
+        with ProfileScope(f"mcp-{fn.__name__}", mode) as scope:
+            result = await fn(*args, **kwargs)
+        if isinstance(result, dict):
+            result["profile"] = scope.report
+        return result
+    return wrapper
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """列出已保存的性能分析文件（新的在前）"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(PROFILE_DIR):
+        if not _PROFILE_NAME_PATTERN.match(name):
+            continue
+        path = os.path.join(PROFILE_DIR, name)
+        stat = os.stat(path)
+        profiles.append({
+            "name": name,
+            "format": name.rsplit(".", 1)[1],
+            "bytes": stat.st_size,
+            "created_at": stat.st_mtime
+        })
+    profiles.sort(key=lambda p: p["created_at"], reverse=True)
+    return profiles
+
+
+def profile_path(name: str) -> Optional[str]:
+    """校验文件名并返回路径，防止路径穿越"""
+    if not _PROFILE_NAME_PATTERN.match(name or ""):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+def summarize_pstats(name: str, limit: int = 30) -> Optional[str]:
+    """返回pstats文件按累计耗时排序的文本摘要"""
+    path = profile_path(name)
+    if not path or not name.endswith(".pstats"):
+        return None
+    stream = io.StringIO()
+    pstats.Stats(path, stream=stream).sort_stats("cumulative").print_stats(limit)
+    return stream.getvalue()
+
+
+def _prune_profiles() -> None:
+    profiles = list_profiles()
+    for profile in profiles[PROFILE_MAX_FILES:]:
+        with contextlib.suppress(OSError):
+            os.remove(os.path.join(PROFILE_DIR, profile["name"]))
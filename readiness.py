@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+就绪状态跟踪 - 外部依赖（Ollama、FastMCP等）在后台线程中探测，
+不阻塞进程启动，就绪情况通过独立的接口上报
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+READY = "ready"
+UNAVAILABLE = "unavailable"
+
+
+class ReadinessTracker:
+    """记录各个外部组件的就绪状态，并负责后台探测"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._components: Dict[str, Dict[str, Any]] = {}
+        self._probes: Dict[str, Callable[[], Any]] = {}
+        self._started = False
+
+    def register(self, name: str, probe: Callable[[], Any], required: bool = False,
+                 retry_interval: Optional[float] = 30.0) -> None:
+        """注册组件探测函数；probe抛出异常表示组件不可用"""
+        with self._lock:
+            self._probes[name] = probe
+            self._components[name] = {
+                "state": PENDING,
+                "required": required,
+                "retry_interval": retry_interval,
+                "detail": None,
+                "checked_at": None
+            }
+
+    def start(self) -> None:
+        """在后台线程中探测所有已注册组件（可重复调用，只启动一次）"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            names = list(self._probes.keys())
+        for name in names:
+            thread = threading.Thread(target=self._probe_loop, args=(name,), daemon=True,
+                                      name=f"readiness-{name}")
+            thread.start()
+
+    def check(self, name: str) -> bool:
+        """同步探测一次指定组件并更新状态"""
+        probe = self._probes[name]
+        try:
+            detail = probe()
+            self.mark(name, READY, detail)
+            return True
+        except Exception as e:
+            self.mark(name, UNAVAILABLE, str(e))
+            return False
+
+    def mark(self, name: str, state: str, detail: Any = None) -> None:
+        """手动更新组件状态（例如调用失败后标记为不可用）"""
+        with self._lock:
+            component = self._components.setdefault(name, {
+                "state": PENDING, "required": False, "retry_interval": None
+            })
+            previous = component["state"]
+            component.update({"state": state, "detail": detail, "checked_at": time.time()})
+        if previous != state:
+            log = logger.info if state == READY else logger.warning
+            log(f"组件 {name} 状态: {previous} -> {state} ({detail})")
+
+    def state(self, name: str) -> str:
+        with self._lock:
+            component = self._components.get(name)
+            return component["state"] if component else UNAVAILABLE
+
+    def is_ready(self, name: str) -> bool:
+        return self.state(name) == READY
+
+    def is_unavailable(self, name: str) -> bool:
+        return self.state(name) == UNAVAILABLE
+
+    def snapshot(self) -> Dict[str, Any]:
+        """返回整体就绪情况；只有required组件影响整体ready"""
+        with self._lock:
+            components = {name: dict(c) for name, c in self._components.items()}
+        ready = all(c["state"] == READY for c in components.values() if c["required"])
+        return {"ready": ready, "components": components}
+
+    def _probe_loop(self, name: str) -> None:
+        while not self.check(name):
+            retry_interval = self._components[name]["retry_interval"]
+            if not retry_interval:
+                return
+            time.sleep(retry_interval)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+场景事件分发 - 场景变化（新形状、仿真结果等）只发给该场景房间内的连接，
+一次请求或一次工具调用计划内产生的多个事件合并为一条 scene_update 消息：
+    {"events": [{"event": "shape_created", "data": {...}}, ...], "count": N}
+"""
+
+import contextvars
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SCENE_UPDATE_EVENT = "scene_update"
+
+_current_batch: "contextvars.ContextVar[Optional[SceneEventBatch]]" = contextvars.ContextVar(
+    "scene_event_batch", default=None)
+
+
+class SceneEventBatch:
+    """同一房间的待发送场景事件；skip_sid对应的连接已单独收到应答，不再重复发送"""
+
+    def __init__(self, room: str, skip_sid: Optional[str] = None):
+        self.room = room
+        self.skip_sid = skip_sid
+        self.events: List[Dict[str, Any]] = []
+
+    def add(self, event: str, data: Any) -> None:
+        self.events.append({"event": event, "data": data})
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def flush(self, socketio) -> int:
+        """把积累的事件作为一条scene_update发送，返回接收方连接数"""
+        if not self.events:
+            return 0
+        events, self.events = self.events, []
+        recipients = room_size(socketio, self.room, self.skip_sid)
+        for entry in events:
+            metrics.SCENE_EVENTS.inc(event=entry["event"])
+            metrics.SCENE_EVENT_DELIVERIES.inc(recipients, event=entry["event"])
+        metrics.SCENE_UPDATE_BATCH_SIZE.observe(len(events))
+        if recipients:
+            socketio.emit(SCENE_UPDATE_EVENT, {"events": events, "count": len(events)},
+                          room=self.room, skip_sid=self.skip_sid)
+        return recipients
+
+
+def room_size(socketio, room: str, skip_sid: Optional[str] = None) -> int:
+    """房间内的连接数（不含skip_sid）"""
+    try:
+        participants = socketio.server.manager.get_participants("/", room)
+        return sum(1 for sid, _ in participants if sid != skip_sid)
+    except (AttributeError, KeyError):
+        return 0
+
+
+@contextmanager
+def batch(socketio, room: str, skip_sid: Optional[str] = None) -> Iterator[SceneEventBatch]:
+    """在with块内publish到同一房间的事件合并，退出时一次发送"""
+    current = SceneEventBatch(room, skip_sid)
+    token = _current_batch.set(current)
+    try:
+        yield current
+    finally:
+        _current_batch.reset(token)
+        try:
+            current.flush(socketio)
+        except Exception as e:
+            logger.error(f"发送场景更新失败: {e}")
+
+
+def publish(socketio, room: str, event: str, data: Any, skip_sid: Optional[str] = None) -> None:
+    """发布场景事件：处于同一房间的batch内时加入批次，否则立即单独发送"""
+    current = _current_batch.get()
+    if current is not None and current.room == room:
+        current.add(event, data)
+        return
+    single = SceneEventBatch(room, skip_sid)
+    single.add(event, data)
+    single.flush(socketio)
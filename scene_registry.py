@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+场景注册表 - 按会话ID隔离场景，每个会话首次访问时才创建自己的MCPService
+空闲超时的场景写入快照文件并从内存移除，再次访问时按快照重建；
+活跃场景数有上限，超出时淘汰最久未访问的场景，单个会话的顶点数和轨迹字节数由MCPService限制
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import metrics
+from simulation_service import MCPService, mcp_service
+
+logger = logging.getLogger(__name__)
+
+SESSION_SNAPSHOT_DIR = os.environ.get(
+    "SESSION_SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sessions")
+)
+# 空闲多少秒后把场景写入快照并释放内存
+SESSION_IDLE_TIMEOUT = float(os.environ.get("SESSION_IDLE_TIMEOUT", "1800"))
+# 同时保留在内存中的场景数上限（不含默认场景）
+MAX_ACTIVE_SESSIONS = int(os.environ.get("MAX_ACTIVE_SESSIONS", "100"))
+# 快照保留时间，超过后删除
+SESSION_SNAPSHOT_MAX_AGE = float(os.environ.get("SESSION_SNAPSHOT_MAX_AGE", str(7 * 24 * 3600)))
+SESSION_SWEEP_INTERVAL = 60.0
+
+# 未指定会话ID的请求使用全局默认场景（兼容原有的单场景行为）
+DEFAULT_SESSION = "default"
+
+_SESSION_ID_PATTERN = re.compile(r"^[\w\-]{1,64}$")
+
+
+def normalize_session_id(session_id: Optional[str]) -> str:
+    """校验会话ID（只允许字母、数字、下划线和连字符，最长64），为空时返回默认会话"""
+    if not session_id:
+        return DEFAULT_SESSION
+    session_id = str(session_id)
+    if not _SESSION_ID_PATTERN.match(session_id):
+        raise ValueError(f"无效的会话ID: {session_id[:80]}")
+    return session_id
+
+
+class SceneRegistry:
+    """会话ID -> MCPService；线程安全，后台线程定期淘汰空闲场景"""
+
+    def __init__(self, default_service: MCPService, snapshot_dir: str = SESSION_SNAPSHOT_DIR,
+                 idle_timeout: float = SESSION_IDLE_TIMEOUT, max_sessions: int = MAX_ACTIVE_SESSIONS):
+        self.default_service = default_service
+        self.snapshot_dir = snapshot_dir
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._scenes: Dict[str, MCPService] = {}
+        self._last_access: Dict[str, float] = {}
+        self._sweeper: Optional[threading.Thread] = None
+        self._evict_listeners: List[Callable[[str], None]] = []
+
+    def get(self, session_id: Optional[str] = None) -> MCPService:
+        """获取会话的场景，不存在时创建（有快照则从快照恢复）"""
+        session_id = normalize_session_id(session_id)
+        if session_id == DEFAULT_SESSION:
+            return self.default_service
+        self._start_sweeper()
+        with self._lock:
+            service = self._scenes.get(session_id)
+            if service is not None:
+                self._last_access[session_id] = time.time()
+                return service
+            service = MCPService()
+            snapshot = self._load_snapshot(session_id)
+            if snapshot:
+                self._restore(service, snapshot)
+            self._scenes[session_id] = service
+            self._last_access[session_id] = time.time()
+            overflow = self._least_recent(len(self._scenes) - self.max_sessions, exclude=session_id)
+        for victim in overflow:
+            self.evict(victim)
+        metrics.ACTIVE_SCENES.set(len(self._scenes))
+        return service
+
+    def touch(self, session_id: str) -> None:
+        """刷新场景的最近访问时间（不创建场景），用于没有请求但仍在使用的场景"""
+        with self._lock:
+            if session_id in self._scenes:
+                self._last_access[session_id] = time.time()
+
+    def add_evict_listener(self, listener: Callable[[str], None]) -> None:
+        """场景从内存移除时（写入快照前）调用listener(session_id)"""
+        self._evict_listeners.append(listener)
+
+    def evict(self, session_id: str, snapshot: bool = True) -> bool:
+        """把场景写入快照（snapshot为False时直接丢弃）并从内存移除"""
+        with self._lock:
+            service = self._scenes.pop(session_id, None)
+            self._last_access.pop(session_id, None)
+        if service is None:
+            return False
+        for listener in self._evict_listeners:
+            try:
+                listener(session_id)
+            except Exception as e:
+                logger.error(f"场景移除回调失败: {e}")
+        # 没有形状但有持久化轨迹运行的场景（如n体仿真）也要保存，否则恢复后失去这些运行的归属；
+        # 清空过的场景保存ID计数，恢复后不复用已删除形状的ID
+        if snapshot and (service.shapes or service.trajectory_runs or service.shapes.next_id):
+            self._save_snapshot(session_id, service)
+        metrics.SCENE_EVICTIONS.inc(reason="snapshot" if snapshot else "discard")
+        metrics.ACTIVE_SCENES.set(len(self._scenes))
+        logger.info(f"场景已{'写入快照并' if snapshot else ''}释放: {session_id}（{len(service.shapes)}个形状）")
+        return True
+
+    def evict_idle(self, now: Optional[float] = None) -> List[str]:
+        """淘汰超过空闲时间的场景，返回被淘汰的会话ID"""
+        now = time.time() if now is None else now
+        with self._lock:
+            idle = [sid for sid, last in self._last_access.items() if now - last > self.idle_timeout]
+        for session_id in idle:
+            self.evict(session_id)
+        return idle
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            scenes = dict(self._scenes)
+            last_access = dict(self._last_access)
+        now = time.time()
+        return {
+            "active": len(scenes),
+            "max_sessions": self.max_sessions,
+            "idle_timeout": self.idle_timeout,
+            "sessions": [
+                {
+                    "session_id": session_id,
+                    "shapes": len(service.shapes),
+                    **service.resource_usage(),
+                    "idle_seconds": round(now - last_access.get(session_id, now), 1)
+                }
+                for session_id, service in scenes.items()
+            ]
+        }
+
+    def _least_recent(self, count: int, exclude: str) -> List[str]:
+        if count <= 0:
+            return []
+        candidates = sorted((last, sid) for sid, last in self._last_access.items() if sid != exclude)
+        return [sid for _, sid in candidates[:count]]
+
+    def _start_sweeper(self) -> None:
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(target=self._sweep_loop, daemon=True, name="scene-sweeper")
+        self._sweeper.start()
+
+    def _sweep_loop(self) -> None:
+        while True:
+            time.sleep(min(SESSION_SWEEP_INTERVAL, self.idle_timeout))
+            try:
+                self.evict_idle()
+                self._prune_snapshots()
+            except Exception as e:
+                logger.error(f"清理空闲场景失败: {e}")
+
+    # 快照：只保存重建场景所需的形状参数和变换，网格在恢复时重新生成
+
+    def _snapshot_path(self, session_id: str) -> str:
+        return os.path.join(self.snapshot_dir, f"{session_id}.json")
+
+    def _save_snapshot(self, session_id: str, service: MCPService) -> None:
+        snapshot = {
+            "session_id": session_id,
+            "saved_at": time.time(),
+            "view_mode": service.view_mode.value,
+            "next_shape_id": service.shapes.next_id,
+            "shapes": [
+                {"id": shape.id, "type": shape.type.value, "parameters": shape.parameters,
+                 "position": shape.position.tolist(), "transform": shape.transform_dict()["transform"]}
+                for shape in service.shapes
+            ],
+            "trajectory_runs": list(service.trajectory_runs)
+        }
+        try:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            path = self._snapshot_path(session_id)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            logger.error(f"保存场景快照失败: {e}")
+
+    def _load_snapshot(self, session_id: str) -> Optional[Dict[str, Any]]:
+        path = self._snapshot_path(session_id)
+        if not os.path.isfile(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            os.remove(path)
+            return snapshot
+        except (OSError, ValueError) as e:
+            logger.error(f"读取场景快照失败: {e}")
+            return None
+
+    @staticmethod
+    def _restore(service: MCPService, snapshot: Dict[str, Any]) -> None:
+        service.trajectory_runs.extend(snapshot.get("trajectory_runs", []))
+        for shape in snapshot.get("shapes", []):
+            result = service.create_shape(shape["type"], {**shape["parameters"], "position": shape["position"]},
+                                          shape_id=shape.get("id"))
+            if result["success"] and shape.get("transform"):
+                result = service.set_transform(result["data"]["id"], matrix=shape["transform"])
+            if not result["success"]:
+                logger.warning(f"恢复形状失败: {result['error']}")
+        service.shapes.advance(snapshot.get("next_shape_id", 0))
+        service.set_view_mode(snapshot.get("view_mode", service.view_mode.value))
+        service.update_simulation_status("idle")
+        logger.info(f"已从快照恢复场景: {snapshot.get('session_id')}（{len(service.shapes)}个形状）")
+
+    def _prune_snapshots(self) -> None:
+        try:
+            names = os.listdir(self.snapshot_dir)
+        except OSError:
+            return
+        cutoff = time.time() - SESSION_SNAPSHOT_MAX_AGE
+        for name in names:
+            path = os.path.join(self.snapshot_dir, name)
+            try:
+                if name.endswith(".json") and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+# 全局场景注册表，默认会话即原来的全局mcp_service
+scene_registry = SceneRegistry(mcp_service)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+序列化 - REST响应（Flask的JSON provider）、Socket.IO消息（metrics.CountingJSON）和MCP工具结果共用的JSON编码：
+- NumPy数组和标量直接编码，不先tolist()成嵌套的Python列表；安装了orjson时由orjson原生编码数组，否则回退到标准库json
+- 实现了 __json__() 的对象（形状、轨迹记录器）在编码时才生成自己的表示，其中可以包含数组和预编码片段
+- 预编码片段（Fragment）原样嵌入文档，例如 (N,3) 顶点数组一次性格式化为 [{"x":..,"y":..,"z":..}, ...]
+JSON_BACKEND 环境变量为 auto（默认，有orjson时使用）、orjson 或 stdlib
+"""
+
+import json
+import os
+import re
+from typing import Any, Callable, List, Optional
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_BACKEND = os.environ.get("JSON_BACKEND", "auto")
+CONTENT_TYPE = "application/json"
+
+# 片段在文档中先编码为占位字符串（\u0000<序号>\u0000），编码完成后一次替换为片段内容
+_PLACEHOLDER = re.compile(rb'"\\u0000(\d+)\\u0000"')
+
+
+class Fragment:
+    """已编码的JSON片段，原样嵌入文档"""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+
+class PointList:
+    """(N,3) 数组编码为 [{"x": .., "y": .., "z": ..}, ...]，不逐点构造字典"""
+
+    __slots__ = ("values",)
+
+    def __init__(self, values: np.ndarray):
+        self.values = np.asarray(values).reshape(-1, 3)
+
+
+def _use_orjson() -> bool:
+    if JSON_BACKEND == "stdlib":
+        return False
+    if orjson is None:
+        if JSON_BACKEND == "orjson":
+            raise RuntimeError("JSON_BACKEND=orjson 但未安装orjson")
+        return False
+    return True
+
+
+def backend() -> str:
+    return "orjson" if _use_orjson() else "stdlib"
+
+
+def _encode_array(values: np.ndarray) -> bytes:
+    if _use_orjson():
+        if values.dtype == np.float16:
+            values = values.astype(np.float32)
+        return orjson.dumps(np.ascontiguousarray(values), option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(values.tolist(), separators=(",", ":")).encode("utf-8")
+
+
+def _encode_points(values: np.ndarray) -> bytes:
+    """[[x,y,z],[x,y,z]] 按文本改写为 [{"x":x,"y":y,"z":z},...]：
+    行分隔符先换成 |，剩下的逗号都在行内，交替换成 y、z 的键"""
+    count = len(values)
+    if not count:
+        return b"[]"
+    pieces = _encode_array(values).replace(b"],[", b"|")[2:-2].split(b",")
+    out: List[Optional[bytes]] = [None] * (4 * count + 1)
+    out[0::2] = pieces
+    out[1::4] = [b',"y":'] * count
+    out[3::4] = [b',"z":'] * count
+    return b'[{"x":' + b"".join(out).replace(b"|", b'},{"x":') + b"}]"
+
+
+def _default_for(fragments: List[bytes]) -> Callable[[Any], Any]:
+    """两种后端共用的回退编码：orjson不能原生编码的数组（非连续、不支持的类型）、NumPy标量、
+    __json__对象和片段；片段和点列表替换为占位字符串"""
+
+    def default(obj):
+        if isinstance(obj, PointList):
+            obj = Fragment(_encode_points(obj.values))
+        if isinstance(obj, Fragment):
+            fragments.append(obj.data)
+            return f"\x00{len(fragments) - 1}\x00"
+        if hasattr(obj, "__json__"):
+            return obj.__json__()
+        if isinstance(obj, np.ndarray):
+            if obj.dtype.kind in "fiub" and _use_orjson():
+                fragments.append(_encode_array(obj))
+                return f"\x00{len(fragments) - 1}\x00"
+            return obj.tolist()
+        if isinstance(obj, np.generic):
+            return obj.item()
+        if isinstance(obj, (set, frozenset, tuple)):
+            return list(obj)
+        raise TypeError(f"无法序列化的类型: {type(obj).__name__}")
+
+    return default
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """编码为UTF-8的JSON字节串"""
+    fragments: List[bytes] = []
+    default = _default_for(fragments)
+    if _use_orjson():
+        encoded = orjson.dumps(obj, default=default, option=orjson.OPT_SERIALIZE_NUMPY
+                               | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATACLASS)
+    else:
+        encoded = json.dumps(obj, default=default, ensure_ascii=False,
+                             separators=(",", ":")).encode("utf-8")
+    if fragments:
+        encoded = _PLACEHOLDER.sub(lambda match: fragments[int(match.group(1))], encoded)
+    return encoded
+
+
+def dumps(obj: Any, *args, **kwargs) -> str:
+    """编码为JSON字符串；其余参数（如Socket.IO传入的separators）忽略，输出总是紧凑格式"""
+    return dumps_bytes(obj).decode("utf-8")
+
+
+def loads(data, *args, **kwargs) -> Any:
+    if _use_orjson():
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def to_builtins(obj: Any) -> Any:
+    """转为纯Python对象（字典、列表）；只在需要在Python中检查内容时使用"""
+    return loads(dumps_bytes(obj))
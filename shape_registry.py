@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+形状注册表 - 场景中的形状按稳定ID保存：ID单调递增，删除形状和清空场景后都不会复用，
+查找、更新、删除都是O(1)；形状几何所在的变换数组槽位由TransformStore的空闲列表复用
+"""
+
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class ShapeRegistry:
+    """稳定ID -> 形状；按创建顺序迭代"""
+
+    def __init__(self):
+        self._shapes: Dict[int, Any] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._shapes)
+
+    def __iter__(self) -> Iterator[Any]:
+        # 迭代副本：实时仿真线程写回位置时其他线程可能在增删形状
+        return iter(list(self._shapes.values()))
+
+    def __contains__(self, shape_id: int) -> bool:
+        return shape_id in self._shapes
+
+    def __getitem__(self, shape_id: int) -> Any:
+        try:
+            return self._shapes[shape_id]
+        except KeyError:
+            raise KeyError(f"形状不存在: {shape_id}") from None
+
+    def get(self, shape_id: int) -> Optional[Any]:
+        return self._shapes.get(shape_id)
+
+    def ids(self) -> List[int]:
+        return list(self._shapes)
+
+    @property
+    def next_id(self) -> int:
+        return self._next_id
+
+    def allocate(self, shape_id: Optional[int] = None) -> int:
+        """分配新ID；指定shape_id时（从快照恢复）使用该ID，之后的ID从它之后继续"""
+        with self._lock:
+            if shape_id is None:
+                shape_id = self._next_id
+            elif shape_id in self._shapes:
+                raise ValueError(f"形状ID已存在: {shape_id}")
+            self._next_id = max(self._next_id, shape_id + 1)
+            return shape_id
+
+    def advance(self, next_id: int) -> None:
+        """ID计数至少推进到next_id（从快照恢复时还原已删除形状用过的ID）"""
+        with self._lock:
+            self._next_id = max(self._next_id, int(next_id))
+
+    def put(self, shape_id: int, shape: Any) -> None:
+        self._shapes[shape_id] = shape
+
+    def pop(self, shape_id: int) -> Optional[Any]:
+        return self._shapes.pop(shape_id, None)
+
+    def clear(self) -> None:
+        """清空形状；ID计数不重置"""
+        self._shapes.clear()
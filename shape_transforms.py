@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+形状变换 - 场景中所有形状的4x4仿射变换存放在一个 (N,4,4) 数组中（按形状下标），
+世界坐标顶点和包围盒在读取时对所有过期的形状批量计算（相同顶点数的形状堆叠为一次矩阵乘法），
+并缓存到该形状的变换再次改变为止。只改变平移时包围盒直接平移，不需要重算顶点。
+删除形状释放的槽位进入空闲列表，由之后新建的形状复用，数组不会随增删无限增长。
+
+对外的矩阵格式与Three.js的Matrix4.elements和glTF一致：16个数，按列主序展开。
+"""
+
+import math
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import geometry_precision
+
+
+def compose(position: Optional[Sequence[float]] = None, rotation: Optional[Sequence[float]] = None,
+            scale: Optional[Sequence[float]] = None) -> np.ndarray:
+    """平移、旋转（XYZ顺序的欧拉角，单位度，与Three.js的Euler默认顺序一致）和缩放组成矩阵 T·R·S"""
+    matrix = np.eye(4)
+    if rotation is not None:
+        x, y, z = np.radians(np.asarray(rotation, dtype=np.float64).reshape(3))
+        cx, sx, cy, sy, cz, sz = math.cos(x), math.sin(x), math.cos(y), math.sin(y), math.cos(z), math.sin(z)
+        rx = np.array([[1, 0, 0], [0, cx, -sx], [0, sx, cx]])
+        ry = np.array([[cy, 0, sy], [0, 1, 0], [-sy, 0, cy]])
+        rz = np.array([[cz, -sz, 0], [sz, cz, 0], [0, 0, 1]])
+        matrix[:3, :3] = rx @ ry @ rz
+    if scale is not None:
+        scale = np.broadcast_to(np.asarray(scale, dtype=np.float64), 3)
+        if np.any(scale == 0):
+            raise ValueError("缩放不能为0")
+        matrix[:3, :3] = matrix[:3, :3] * scale
+    if position is not None:
+        matrix[:3, 3] = np.asarray(position, dtype=np.float64).reshape(3)
+    return _validate(matrix)
+
+
+def decompose(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """compose的逆：(平移, 欧拉角（度）, 缩放)；含错切的矩阵只能近似分解"""
+    linear = matrix[:3, :3]
+    scale = np.linalg.norm(linear, axis=0)
+    if np.linalg.det(linear) < 0:
+        scale[0] = -scale[0]
+    r = linear / scale
+    y = math.asin(max(-1.0, min(1.0, r[0, 2])))
+    if abs(r[0, 2]) < 0.9999999:
+        x, z = math.atan2(-r[1, 2], r[2, 2]), math.atan2(-r[0, 1], r[0, 0])
+    else:
+        x, z = math.atan2(r[2, 1], r[1, 1]), 0.0
+    return matrix[:3, 3].copy(), np.degrees([x, y, z]), scale
+
+
+def from_elements(elements: Sequence[float]) -> np.ndarray:
+    """列主序的16个数转为4x4矩阵"""
+    values = np.asarray(elements, dtype=np.float64)
+    if values.size != 16:
+        raise ValueError("matrix必须是16个数（列主序）")
+    return _validate(values.reshape(4, 4).T.copy())
+
+
+def to_elements(matrix: np.ndarray) -> List[float]:
+    return matrix.T.reshape(-1).tolist()
+
+
+def _validate(matrix: np.ndarray) -> np.ndarray:
+    if not np.all(np.isfinite(matrix)):
+        raise ValueError("变换包含非有限值")
+    if not np.allclose(matrix[3], [0, 0, 0, 1]):
+        raise ValueError("只支持仿射变换（最后一行为 0 0 0 1）")
+    if abs(np.linalg.det(matrix[:3, :3])) < 1e-12:
+        raise ValueError("变换矩阵不可逆")
+    return matrix
+
+
+class TransformStore:
+    """形状变换与世界坐标几何缓存；每个形状占一个槽位（与形状ID无关，释放后复用）"""
+
+    def __init__(self, capacity: int = 64, precision: str = "float64"):
+        # 局部网格按几何精度存储（可能是量化的），世界坐标缓存使用对应的浮点类型
+        self.dtype = geometry_precision.compute_dtype(geometry_precision.validate(precision))
+        self.matrices = np.tile(np.eye(4), (capacity, 1, 1))
+        self._lo = np.zeros((capacity, 3))
+        self._hi = np.zeros((capacity, 3))
+        # 包围盒是否有效（只改平移时仍有效）、世界坐标顶点是否过期
+        self._bounds_valid = np.zeros(capacity, dtype=bool)
+        self._stale = np.zeros(capacity, dtype=bool)
+        self._local: List[np.ndarray] = []
+        self._local_normals: List[Optional[np.ndarray]] = []
+        self._world: List[Optional[np.ndarray]] = []
+        self._world_normals: List[Optional[np.ndarray]] = []
+        self._free: List[int] = []
+        # 实时仿真线程写回位置时也会修改变换
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        """使用中的槽位数"""
+        return len(self._local) - len(self._free)
+
+    def add(self, vertices: np.ndarray, normals: Optional[np.ndarray], matrix: np.ndarray) -> int:
+        """占用一个槽位（优先复用空闲槽位），返回槽位号"""
+        with self._lock:
+            if self._free:
+                slot = self._free.pop()
+            else:
+                slot = len(self._local)
+                if slot == len(self.matrices):
+                    self._grow()
+                self._local.append(vertices)
+                self._local_normals.append(normals)
+                self._world.append(None)
+                self._world_normals.append(None)
+            self.matrices[slot] = matrix
+            self.replace_geometry(slot, vertices, normals)
+            return slot
+
+    def replace_geometry(self, slot: int, vertices: np.ndarray, normals: Optional[np.ndarray]) -> None:
+        """替换槽位的局部网格（修改形状参数后重新生成），世界坐标缓存过期"""
+        with self._lock:
+            self._local[slot] = vertices
+            self._local_normals[slot] = normals
+            self._world[slot] = None
+            self._world_normals[slot] = None
+            self._bounds_valid[slot] = False
+            self._stale[slot] = True
+
+    def release(self, slot: int) -> None:
+        """释放槽位：丢弃网格引用和缓存，槽位进入空闲列表"""
+        with self._lock:
+            self._local[slot] = np.empty((0, 3))
+            self._local_normals[slot] = None
+            self._world[slot] = None
+            self._world_normals[slot] = None
+            self.matrices[slot] = np.eye(4)
+            self._bounds_valid[slot] = False
+            self._stale[slot] = False
+            self._free.append(slot)
+
+    def _grow(self) -> None:
+        capacity = 2 * len(self.matrices)
+        matrices = np.tile(np.eye(4), (capacity, 1, 1))
+        matrices[:len(self.matrices)] = self.matrices
+        self.matrices = matrices
+        for name in ("_lo", "_hi", "_bounds_valid", "_stale"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.matrices[:] = np.eye(4)
+            self._bounds_valid[:] = False
+            self._stale[:] = False
+            self._local.clear()
+            self._local_normals.clear()
+            self._world.clear()
+            self._world_normals.clear()
+            self._free.clear()
+
+    def matrix(self, slot: int) -> np.ndarray:
+        return self.matrices[slot].copy()
+
+    def position(self, slot: int) -> np.ndarray:
+        return self.matrices[slot, :3, 3].copy()
+
+    def set(self, slot: int, matrix: np.ndarray) -> None:
+        """修改一个形状的变换，使它的世界坐标缓存过期"""
+        with self._lock:
+            old = self.matrices[slot]
+            if self._bounds_valid[slot] and np.array_equal(old[:3, :3], matrix[:3, :3]):
+                delta = matrix[:3, 3] - old[:3, 3]
+                self._lo[slot] += delta
+                self._hi[slot] += delta
+            else:
+                self._bounds_valid[slot] = False
+            self.matrices[slot] = matrix
+            self._stale[slot] = True
+            self._world[slot] = None
+            self._world_normals[slot] = None
+
+    def bounds(self, slot: int) -> Tuple[np.ndarray, np.ndarray]:
+        """世界坐标包围盒 (lo, hi)"""
+        with self._lock:
+            if not self._bounds_valid[slot]:
+                self.refresh()
+            return self._lo[slot].copy(), self._hi[slot].copy()
+
+    def world_vertices(self, slot: int) -> np.ndarray:
+        """世界坐标顶点 (V,3)，只读的缓存数组"""
+        with self._lock:
+            if self._stale[slot]:
+                self.refresh()
+            return self._world[slot]
+
+    def world_normals(self, slot: int) -> Optional[np.ndarray]:
+        """世界坐标单位法线 (V,3)：按线性部分的逆转置变换后归一化"""
+        with self._lock:
+            normals = self._world_normals[slot]
+            if normals is None and self._local_normals[slot] is not None:
+                normal_matrix = np.linalg.inv(self.matrices[slot, :3, :3]).T.astype(self.dtype)
+                normals = geometry_precision.decode(self._local_normals[slot], self.dtype) @ normal_matrix.T
+                lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+                normals /= np.where(lengths > 0, lengths, 1.0)
+                normals.flags.writeable = False
+                self._world_normals[slot] = normals
+            return normals
+
+    def refresh(self) -> int:
+        """批量计算所有过期形状的世界坐标顶点和包围盒，返回计算的形状数"""
+        with self._lock:
+            slots = np.flatnonzero(self._stale[:len(self._local)])
+            groups: Dict[int, List[int]] = {}
+            for slot in slots.tolist():
+                groups.setdefault(len(self._local[slot]), []).append(slot)
+            for count, members in groups.items():
+                members = np.asarray(members)
+                if count == 0:
+                    self._lo[members] = self.matrices[members, :3, 3]
+                    self._hi[members] = self.matrices[members, :3, 3]
+                    for slot in members.tolist():
+                        self._world[slot] = np.empty((0, 3), dtype=self.dtype)
+                    continue
+                # 按 (G,3,V) 排列：批量矩阵乘法和沿顶点轴的最值都在连续内存上进行
+                local = np.stack([geometry_precision.decode(self._local[slot], self.dtype).T
+                                  for slot in members.tolist()])
+                matrices = self.matrices[members].astype(self.dtype, copy=False)
+                world = matrices[:, :3, :3] @ local + matrices[:, :3, 3:]
+                self._lo[members] = world.min(axis=2)
+                self._hi[members] = world.max(axis=2)
+                world = np.ascontiguousarray(world.transpose(0, 2, 1))
+                world.flags.writeable = False
+                for k, slot in enumerate(members.tolist()):
+                    self._world[slot] = world[k]
+            self._bounds_valid[slots] = True
+            self._stale[slots] = False
+            return len(slots)
+
+    def nbytes(self) -> Dict[str, int]:
+        """变换数组（含包围盒）和世界坐标缓存实际占用的字节数"""
+        with self._lock:
+            cached = sum(w.nbytes for w in self._world if w is not None)
+            cached += sum(n.nbytes for n in self._world_normals if n is not None)
+            return {"transforms": int(self.matrices.nbytes + self._lo.nbytes + self._hi.nbytes),
+                    "world_cache": int(cached)}
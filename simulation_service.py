@@ -1,17 +1,59 @@
 import json
 import logging
+import os
+from collections import OrderedDict
 from typing import Dict, List, Optional, Any
-import ollama
 import numpy as np
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
 import asyncio
+import time
 import uuid
-import httpx
-from pydantic import BaseModel
+import geometry_precision
+import metrics
+import mesh_lod
+import nbody
+import profiling
+import serialization
+from mesh_processing import TriangleMesh, normalize_mesh
+from gltf_export import GlbBuilder, save_export
+from readiness import ReadinessTracker
+from spatial_index import SpatialIndex, ray_triangles
+from collision_cache import ContactCache
+import shape_transforms
+import trajectory_recorder
+from shape_transforms import TransformStore
+from shape_registry import ShapeRegistry
+from trajectory_store import trajectory_store
+from geometry_precision import GEOMETRY_PRECISION
 
 logger = logging.getLogger(__name__)
 
+# Ollama地址（客户端在首次使用时才创建）
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
+
+# LOD网格缓存条目数
+LOD_CACHE_SIZE = int(os.environ.get("LOD_CACHE_SIZE", "64"))
+# 碰撞检测每块距离矩阵的元素数上限
+COLLISION_BLOCK_ELEMENTS = 1 << 20
+# 两个形状的顶点距离小于该值时视为接触
+COLLISION_THRESHOLD = 0.1
+# 空间查询单次返回的最大结果数
+SPATIAL_MAX_RESULTS = int(os.environ.get("SPATIAL_MAX_RESULTS", "1000"))
+# 单个场景（会话）的资源上限：网格顶点总数、轨迹数据字节数（含已持久化的运行）
+SCENE_MAX_VERTICES = int(os.environ.get("SCENE_MAX_VERTICES", "2000000"))
+SCENE_MAX_TRAJECTORY_BYTES = int(os.environ.get("SCENE_MAX_TRAJECTORY_BYTES", str(256 * 1024 ** 2)))
+# N体仿真的物体数上限；精确O(N²)模式只用于验证，上限更低
+NBODY_MAX_BODIES = int(os.environ.get("NBODY_MAX_BODIES", "200000"))
+NBODY_EXACT_MAX_BODIES = int(os.environ.get("NBODY_EXACT_MAX_BODIES", "5000"))
+
+def ollama_model_name(model) -> str:
+    """兼容新旧版ollama客户端：旧版模型列表项带name，新版只有model"""
+    try:
+        return model['name']
+    except (KeyError, AttributeError, TypeError):
+        return model['model']
+
 class ShapeType(Enum):
     CUBE = "cube"
     SPHERE = "sphere"
@@ -21,39 +63,86 @@ class ViewMode(Enum):
     WIREFRAME = "wireframe"
     SOLID = "solid"
 
-@dataclass
-class Vector3:
-    x: float
-    y: float
-    z: float
-
-    def to_dict(self) -> Dict:
-        return {"x": self.x, "y": self.y, "z": self.z}
-
 @dataclass
 class Shape:
+    """形状及其规范化网格：vertices (V,3)、faces (T,3) 三角形索引、normals (V,3)，
+    顶点为局部坐标，vertices和normals按场景的几何精度存储（见geometry_precision）；场景中的变换保存在所属场景的TransformStore中（slot为槽位），
+    世界坐标顶点和包围盒由TransformStore按需计算并缓存；id为场景内的稳定ID"""
     type: ShapeType
-    vertices: List[Vector3]
-    faces: List[List[int]]
+    vertices: np.ndarray
+    faces: np.ndarray
     parameters: Dict
+    normals: Optional[np.ndarray] = None
+    transforms: Optional[TransformStore] = field(default=None, repr=False)
+    slot: int = -1
+    id: int = -1
 
-    def to_dict(self) -> Dict:
+    @property
+    def matrix(self) -> np.ndarray:
+        return np.eye(4) if self.transforms is None else self.transforms.matrix(self.slot)
+
+    @property
+    def position(self) -> np.ndarray:
+        return np.zeros(3) if self.transforms is None else self.transforms.position(self.slot)
+
+    def world_vertices(self) -> np.ndarray:
+        return self.vertices if self.transforms is None else self.transforms.world_vertices(self.slot)
+
+    def world_normals(self) -> Optional[np.ndarray]:
+        return self.normals if self.transforms is None else self.transforms.world_normals(self.slot)
+
+    def bounds(self) -> tuple[np.ndarray, np.ndarray]:
+        """世界坐标下的包围盒 (lo, hi)"""
+        if self.transforms is not None:
+            return self.transforms.bounds(self.slot)
+        if not len(self.vertices):
+            return np.zeros(3), np.zeros(3)
+        return self.vertices.min(axis=0), self.vertices.max(axis=0)
+
+    def transform_dict(self) -> Dict:
+        """变换的两种表示：平移/欧拉角（度）/缩放，以及列主序的16个数"""
+        matrix = self.matrix
+        position, rotation, scale = shape_transforms.decompose(matrix)
+        return {
+            "position": position.tolist(),
+            "rotation": (np.round(rotation, 9) + 0.0).tolist(),
+            "scale": (np.round(scale, 12) + 0.0).tolist(),
+            "transform": shape_transforms.to_elements(matrix)
+        }
+
+    def __json__(self) -> Dict:
+        """由serialization直接编码：顶点数组一次性格式化为 [{"x", "y", "z"}, ...]，三角形索引直接编码"""
+        vertices = geometry_precision.round_for_transport(
+            geometry_precision.decode(self.vertices), geometry_precision.mode_of(self.vertices))
         return {
+            "id": self.id,
             "type": self.type.value,
-            "vertices": [v.to_dict() for v in self.vertices],
+            "vertices": serialization.PointList(vertices),
             "faces": self.faces,
-            "parameters": self.parameters
+            "parameters": self.parameters,
+            **self.transform_dict()
         }
 
+    def to_dict(self) -> Dict:
+        return serialization.to_builtins(self)
+
 class MCPClient:
     """MCP客户端，用于与FastMCP服务器通信"""
     
     def __init__(self, base_url: str = "http://localhost:8000"):
         self.base_url = base_url
         self.session_id = str(uuid.uuid4())
-        self.client = httpx.AsyncClient()
+        self._client = None
         self.initialized = False
     
+    @property
+    def client(self):
+        """HTTP客户端，首次使用时创建"""
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient()
+        return self._client
+    
     async def initialize(self) -> bool:
         """初始化MCP连接"""
         try:
@@ -137,14 +226,35 @@ class MCPClient:
     
     async def close(self):
         """关闭客户端"""
-        await self.client.aclose()
+        if self._client is not None:
+            await self._client.aclose()
+
+class SceneLimitError(Exception):
+    """场景超出资源上限"""
 
 class MCPService:
-    def __init__(self):
-        self.shapes: List[Shape] = []
+    def __init__(self, max_vertices: int = SCENE_MAX_VERTICES,
+                 max_trajectory_bytes: int = SCENE_MAX_TRAJECTORY_BYTES,
+                 precision: str = GEOMETRY_PRECISION):
+        # 网格存储与传输精度：float64、float32或quantized16
+        self.precision = geometry_precision.validate(precision)
+        # 稳定ID -> 形状；ID不随删除和清空场景复用
+        self.shapes = ShapeRegistry()
+        self.max_vertices = max_vertices
+        self.max_trajectory_bytes = max_trajectory_bytes
+        self.vertex_count = 0
+        # 本场景持久化的轨迹运行（用于统计轨迹字节数）
+        self.trajectory_runs: List[str] = []
         self.view_mode: ViewMode = ViewMode.SOLID
-        self.ollama_client = None
-        self.initialize_ollama()
+        self._ollama_client = None
+        self._lod_cache: "OrderedDict[tuple, Dict]" = OrderedDict()
+        self.spatial_index = SpatialIndex()
+        # 所有形状的变换 (N,4,4) 及世界坐标顶点、包围盒缓存
+        self.transforms = TransformStore(precision=self.precision)
+        # 碰撞仿真的接触缓存：只重测涉及新建或移动过的形状的形状对
+        self.contact_cache = ContactCache()
+        self.readiness = ReadinessTracker()
+        self.readiness.register("ollama", self.initialize_ollama)
         self.simulation_status = {
             "status": "idle",
             "current_simulation": None,
@@ -152,64 +262,65 @@ class MCPService:
             "view_mode": self.view_mode.value
         }
 
-    def initialize_ollama(self):
-        """初始化Ollama客户端"""
-        try:
-            self.ollama_client = ollama.Client(host="http://localhost:11434")
-            models = self.ollama_client.list()
-            logger.info(f"Ollama连接成功，可用模型: {[model['name'] for model in models['models']]}")
-        except Exception as e:
-            logger.warning(f"Ollama连接失败: {e}")
-            self.ollama_client = None
+    @property
+    def ollama_client(self):
+        """Ollama客户端；创建时不做网络请求，探测失败后返回None"""
+        if self.readiness.is_unavailable("ollama"):
+            return None
+        if self._ollama_client is None:
+            import ollama
+            self._ollama_client = ollama.Client(host=OLLAMA_BASE_URL)
+        return self._ollama_client
+
+    def initialize_ollama(self) -> List[str]:
+        """探测Ollama连接（由readiness在后台线程调用），失败时抛出异常"""
+        import ollama
+        client = ollama.Client(host=OLLAMA_BASE_URL)
+        models = client.list()
+        self._ollama_client = client
+        names = [ollama_model_name(model) for model in models['models']]
+        logger.info(f"Ollama连接成功，可用模型: {names}")
+        return names
+
+    def start_background_warmup(self) -> None:
+        """在后台探测外部依赖，不阻塞调用方"""
+        self.readiness.start()
 
-    def create_shape(self, shape_type: str, params: Dict) -> Dict:
-        """创建3D形状"""
+    def create_shape(self, shape_type: str, params: Dict, shape_id: Optional[int] = None) -> Dict:
+        """创建3D形状；shape_id只在从快照恢复时指定，其余情况分配新的稳定ID"""
         try:
             shape_type_enum = ShapeType(shape_type)
             
-            # 生成唯一ID
-            shape_id = len(self.shapes)
-            
-            # 创建形状数据（简化版本，适合前端Three.js使用）
-            shape_data = {
-                "id": shape_id,
-                "type": shape_type,
-                "parameters": params
-            }
+            # 场景位置：未指定时随机摆放（与前端原先的随机范围一致），前端按返回的position放置；
+            # 可选rotation（欧拉角，度）和scale
+            params = dict(params)
+            position = params.pop("position", None)
+            if position is None:
+                position = [np.random.uniform(-5, 5), np.random.uniform(1, 6), np.random.uniform(-5, 5)]
+            matrix = shape_transforms.compose(position, params.pop("rotation", None), params.pop("scale", None))
             
-            # 根据形状类型添加特定参数
-            if shape_type_enum == ShapeType.CUBE:
-                shape_data["size"] = params.get("size", 1.0)
-            elif shape_type_enum == ShapeType.SPHERE:
-                shape_data["radius"] = params.get("radius", 1.0)
-            elif shape_type_enum == ShapeType.CYLINDER:
-                shape_data["radius"] = params.get("radius", 1.0)
-                shape_data["height"] = params.get("height", 2.0)
-            else:
-                return {"success": False, "error": f"不支持的形状类型: {shape_type}"}
-
-            # 创建完整的Shape对象用于内部存储
-            if shape_type_enum == ShapeType.CUBE:
-                vertices, faces = self._create_cube(params.get("size", 1.0))
-            elif shape_type_enum == ShapeType.SPHERE:
-                vertices, faces = self._create_sphere(
-                    params.get("radius", 1.0),
-                    params.get("segments", 32)
-                )
-            elif shape_type_enum == ShapeType.CYLINDER:
-                vertices, faces = self._create_cylinder(
-                    params.get("radius", 1.0),
-                    params.get("height", 2.0),
-                    params.get("segments", 32)
-                )
+            geometry, mesh = self._build_shape_geometry(shape_type_enum, params)
+            vertices, normals = self._encode_mesh(mesh)
 
+            # 生成唯一ID（单调递增，不复用）
+            shape_id = self.shapes.allocate(shape_id)
             shape = Shape(
                 type=shape_type_enum,
                 vertices=vertices,
-                faces=faces,
-                parameters=params
+                faces=geometry_precision.encode_faces(mesh.triangles, self.precision, mesh.vertex_count),
+                parameters=params,
+                normals=normals,
+                transforms=self.transforms,
+                slot=self.transforms.add(vertices, normals, matrix),
+                id=shape_id
             )
-            self.shapes.append(shape)
+            # 创建形状数据（简化版本，适合前端Three.js使用）
+            shape_data = {"id": shape_id, **geometry, **shape.transform_dict()}
+            self.shapes.put(shape_id, shape)
+            self.vertex_count += mesh.vertex_count
+            self.spatial_index.insert(shape_id, *shape.bounds())
+            self.contact_cache.mark_dirty(shape_id)
+            metrics.MESH_VERTICES.inc(mesh.vertex_count, shape_type=shape_type)
             self.update_simulation_status("active")
 
             return {
@@ -217,92 +328,299 @@ class MCPService:
                 "data": shape_data,
                 "message": f"成功创建{shape_type}形状"
             }
+        except SceneLimitError as e:
+            logger.warning(f"创建形状被拒绝: {e}")
+            return {"success": False, "error": str(e)}
         except Exception as e:
             logger.error(f"创建形状失败: {e}")
             return {"success": False, "error": str(e)}
 
-    def _create_cube(self, size: float) -> tuple[List[Vector3], List[List[int]]]:
-        """创建立方体"""
+    def _encode_mesh(self, mesh: TriangleMesh) -> tuple:
+        """按场景的几何精度编码网格的顶点和法线"""
+        return (geometry_precision.encode(mesh.positions, self.precision),
+                geometry_precision.encode(mesh.normals, self.precision, unit=True))
+
+    def _build_shape_geometry(self, shape_type: ShapeType, params: Dict,
+                              replacing: int = 0) -> tuple[Dict, TriangleMesh]:
+        """按形状参数生成网格；返回前端需要的几何字段（类型参数、分段数、LOD链）和网格。
+        replacing为被替换网格的顶点数（修改形状时），检查上限时扣除"""
+        geometry = {"type": shape_type.value, "parameters": params}
+        
+        # 根据形状类型添加特定参数
+        segments = None
+        if shape_type == ShapeType.CUBE:
+            geometry["size"] = params.get("size", 1.0)
+        elif shape_type == ShapeType.SPHERE:
+            geometry["radius"] = params.get("radius", 1.0)
+        elif shape_type == ShapeType.CYLINDER:
+            geometry["radius"] = params.get("radius", 1.0)
+            geometry["height"] = params.get("height", 2.0)
+        if shape_type != ShapeType.CUBE:
+            requested = params.get("segments", 32)
+            segments = mesh_lod.clamp_segments(requested)
+            if segments != requested:
+                logger.warning(f"分段数 {requested} 超出范围，已调整为 {segments}")
+            geometry["segments"] = segments
+        # LOD链：前端按相机距离切换，其他客户端通过get_shape_lod按需获取
+        geometry["lods"] = mesh_lod.build_lod_chain(shape_type.value, params, segments)
+
+        # 先按LOD链中最精细级别的顶点数检查上限，避免生成超限的网格
+        self._check_vertex_budget(geometry["lods"][0]["vertex_count"] - replacing)
+
+        # 创建完整的网格用于内部存储
+        with profiling.stage("compute"):
+            mesh = self._create_geometry(shape_type, params, segments)
+        return geometry, mesh
+
+    def update_shape(self, shape_id: int, params: Dict) -> Dict:
+        """修改形状：几何参数（size、radius、height、segments）和/或变换（position、rotation、scale）。
+        只重建这一个形状，返回只含变化字段的差量：几何变化时含类型参数和LOD链，变换变化时含变换"""
+        try:
+            shape = self.shapes.get(shape_id)
+            if shape is None:
+                return {"success": False, "error": f"形状不存在: {shape_id}"}
+            params = dict(params)
+            if params.pop("type", shape.type.value) != shape.type.value:
+                return {"success": False, "error": "不能修改形状类型，请删除后重新创建"}
+            transform = {key: params.pop(key) for key in ("position", "rotation", "scale") if key in params}
+            diff = {"id": shape_id}
+            parameters = {**shape.parameters, **params}
+            geometry_changed = parameters != shape.parameters
+            if geometry_changed:
+                geometry, mesh = self._build_shape_geometry(shape.type, parameters, replacing=len(shape.vertices))
+                self.vertex_count += mesh.vertex_count - len(shape.vertices)
+                shape.vertices, shape.normals = self._encode_mesh(mesh)
+                shape.faces = geometry_precision.encode_faces(mesh.triangles, self.precision, mesh.vertex_count)
+                shape.parameters = parameters
+                self.transforms.replace_geometry(shape.slot, shape.vertices, shape.normals)
+                metrics.MESH_VERTICES.inc(mesh.vertex_count, shape_type=shape.type.value)
+                diff.update(geometry)
+            matrix = shape.matrix
+            if transform:
+                current = shape_transforms.decompose(matrix)
+                matrix = shape_transforms.compose(*(transform.get(key, current[k])
+                                                    for k, key in enumerate(("position", "rotation", "scale"))))
+            if transform or geometry_changed:
+                self._apply_transform(shape_id, matrix)
+            if transform:
+                diff.update(shape.transform_dict())
+            return {"success": True, "data": diff}
+        except SceneLimitError as e:
+            logger.warning(f"修改形状被拒绝: {e}")
+            return {"success": False, "error": str(e)}
+        except Exception as e:
+            logger.error(f"修改形状失败: {e}")
+            return {"success": False, "error": str(e)}
+
+    def delete_shape(self, shape_id: int) -> Dict:
+        """删除一个形状，释放它的变换槽位、空间索引条目和接触缓存"""
+        try:
+            shape = self.shapes.pop(shape_id)
+            if shape is None:
+                return {"success": False, "error": f"形状不存在: {shape_id}"}
+            self.spatial_index.remove(shape_id)
+            self.contact_cache.remove(shape_id)
+            self.transforms.release(shape.slot)
+            self.vertex_count -= len(shape.vertices)
+            if not self.shapes:
+                self.update_simulation_status("idle")
+            return {"success": True, "data": {"id": shape_id}}
+        except Exception as e:
+            logger.error(f"删除形状失败: {e}")
+            return {"success": False, "error": str(e)}
+
+    def _check_vertex_budget(self, vertices: int) -> None:
+        if self.max_vertices and self.vertex_count + vertices > self.max_vertices:
+            raise SceneLimitError(
+                f"场景顶点数超出上限: 当前{self.vertex_count}，新增{vertices}，上限{self.max_vertices}")
+
+    def _check_trajectory_budget(self, frames: int, bodies: int, bytes_per_value: int) -> None:
+        """轨迹（位置和速度）预计字节数加上本场景已持久化的运行不得超过上限"""
+        if not self.max_trajectory_bytes:
+            return
+        requested = frames * bodies * 6 * bytes_per_value
+        stored = self.trajectory_bytes()
+        if stored + requested > self.max_trajectory_bytes:
+            raise SceneLimitError(
+                f"轨迹数据超出上限: 已占用{stored}字节，本次约{requested}字节，上限{self.max_trajectory_bytes}字节")
+
+    def trajectory_bytes(self) -> int:
+        """本场景仍存在的持久化运行占用的字节数；已被保留策略删除的运行不再计入"""
+        total = 0
+        alive = []
+        for run_id in self.trajectory_runs:
+            meta = trajectory_store.get_meta(run_id)
+            if not meta:
+                continue
+            alive.append(run_id)
+            dims = sum(meta["channels"].values())
+            total += meta["capacity"] * meta["bodies"] * dims * np.dtype(meta["dtype"]).itemsize
+        self.trajectory_runs[:] = alive
+        return total
+
+    def resource_usage(self) -> Dict:
+        return {
+            "vertices": self.vertex_count,
+            "max_vertices": self.max_vertices,
+            "geometry": self.geometry_bytes(),
+            "trajectory_bytes": self.trajectory_bytes(),
+            "max_trajectory_bytes": self.max_trajectory_bytes
+        }
+
+    def geometry_bytes(self) -> Dict:
+        """场景几何实际占用的字节数（按当前精度存储的网格、变换数组和世界坐标缓存），
+        以及同样的网格全部用float64存储时的字节数"""
+        shapes = list(self.shapes)
+        held = {
+            "vertices": sum(geometry_precision.nbytes(shape.vertices) for shape in shapes),
+            "normals": sum(geometry_precision.nbytes(shape.normals) for shape in shapes),
+            "faces": sum(int(shape.faces.nbytes) for shape in shapes),
+            **self.transforms.nbytes()
+        }
+        vertex_values = sum(len(shape.vertices) for shape in shapes) * 3
+        face_values = sum(shape.faces.size for shape in shapes)
+        # float64模式：顶点和法线各8字节，索引int32，世界坐标缓存（含已计算的世界法线）也是float64
+        cache_values = held["world_cache"] // np.dtype(self.transforms.dtype).itemsize
+        float64 = 4 * face_values + held["transforms"] + 16 * vertex_values + 8 * cache_values
+        return {
+            "precision": self.precision,
+            "bytes": held,
+            "total_bytes": sum(held.values()),
+            "float64_bytes": float64
+        }
+
+    def _create_geometry(self, shape_type: ShapeType, params: Dict,
+                         segments: Optional[int]) -> TriangleMesh:
+        """按形状类型和分段数生成网格，并规范化为焊接后的三角网格"""
+        if shape_type == ShapeType.CUBE:
+            positions, faces = self._create_cube(params.get("size", 1.0))
+        elif shape_type == ShapeType.SPHERE:
+            positions, faces = self._create_sphere(params.get("radius", 1.0), segments)
+        else:
+            positions, faces = self._create_cylinder(params.get("radius", 1.0), params.get("height", 2.0), segments)
+        return normalize_mesh(positions, faces)
+
+    def get_shape_lod(self, shape_id: int, level: Optional[int] = None,
+                      max_error: Optional[float] = None, distance: Optional[float] = None,
+                      viewport_height: Optional[int] = None, fov: Optional[float] = None) -> Dict:
+        """获取形状某一LOD级别的网格；可按层级、最大几何误差或相机距离选择"""
+        try:
+            shape = self.shapes.get(shape_id)
+            if shape is None:
+                return {"success": False, "error": f"形状不存在: {shape_id}"}
+            shape_type = shape.type.value
+            segments = None
+            if shape.type != ShapeType.CUBE:
+                segments = mesh_lod.clamp_segments(shape.parameters.get("segments", 32))
+            chain = mesh_lod.build_lod_chain(shape_type, shape.parameters, segments)
+            selected = mesh_lod.select_lod_level(
+                chain, level=level, max_error=max_error, distance=distance,
+                fov=fov or mesh_lod.DEFAULT_FOV,
+                viewport_height=viewport_height or mesh_lod.DEFAULT_VIEWPORT_HEIGHT
+            )
+            entry = chain[selected]
+            mesh = self._lod_mesh(shape.type, shape.parameters, entry["segments"])
+            return {
+                "success": True,
+                "data": {
+                    "id": shape_id,
+                    "type": shape_type,
+                    "level": selected,
+                    "levels": len(chain),
+                    "segments": entry["segments"],
+                    "geometric_error": entry["geometric_error"],
+                    **mesh
+                }
+            }
+        except Exception as e:
+            logger.error(f"获取LOD网格失败: {e}")
+            return {"success": False, "error": str(e)}
+
+    def _lod_mesh(self, shape_type: ShapeType, params: Dict, segments: Optional[int]) -> Dict:
+        """生成LOD网格，按几何参数缓存（同尺寸同分段的形状共用一份）"""
+        key = (shape_type.value, params.get("size", 1.0), params.get("radius", 1.0),
+               params.get("height", 2.0), segments)
+        mesh = self._lod_cache.get(key)
+        if mesh is not None:
+            self._lod_cache.move_to_end(key)
+            metrics.record_cache("lod_mesh", hit=True)
+            return mesh
+        metrics.record_cache("lod_mesh", hit=False)
+        with profiling.stage("compute"):
+            mesh = mesh_lod.flatten_mesh(self._create_geometry(shape_type, params, segments), self.precision)
+        self._lod_cache[key] = mesh
+        while len(self._lod_cache) > LOD_CACHE_SIZE:
+            self._lod_cache.popitem(last=False)
+        return mesh
+
+    def _create_cube(self, size: float) -> tuple[np.ndarray, np.ndarray]:
+        """创建立方体（8个顶点，6个四边形面；normalize_mesh按硬边拆分为每个面4个顶点）"""
         half_size = size / 2
-        vertices = [
-            Vector3(-half_size, -half_size, -half_size),  # 0
-            Vector3(half_size, -half_size, -half_size),   # 1
-            Vector3(half_size, half_size, -half_size),    # 2
-            Vector3(-half_size, half_size, -half_size),   # 3
-            Vector3(-half_size, -half_size, half_size),   # 4
-            Vector3(half_size, -half_size, half_size),    # 5
-            Vector3(half_size, half_size, half_size),     # 6
-            Vector3(-half_size, half_size, half_size)     # 7
-        ]
-        faces = [
-            [0, 1, 2, 3],  # 底面
+        vertices = np.array([
+            [-half_size, -half_size, -half_size],  # 0
+            [half_size, -half_size, -half_size],   # 1
+            [half_size, half_size, -half_size],    # 2
+            [-half_size, half_size, -half_size],   # 3
+            [-half_size, -half_size, half_size],   # 4
+            [half_size, -half_size, half_size],    # 5
+            [half_size, half_size, half_size],     # 6
+            [-half_size, half_size, half_size]     # 7
+        ])
+        faces = np.array([
+            [0, 3, 2, 1],  # 底面
             [4, 5, 6, 7],  # 顶面
             [0, 4, 7, 3],  # 左面
-            [1, 5, 6, 2],  # 右面
+            [1, 2, 6, 5],  # 右面
             [0, 1, 5, 4],  # 前面
-            [3, 2, 6, 7]   # 后面
-        ]
+            [3, 7, 6, 2]   # 后面
+        ])
         return vertices, faces
 
-    def _create_sphere(self, radius: float, segments: int) -> tuple[List[Vector3], List[List[int]]]:
-        """创建球体"""
-        vertices = []
-        faces = []
-        
-        # 生成顶点
-        for i in range(segments + 1):
-            lat = np.pi * (-0.5 + float(i) / segments)
-            for j in range(segments + 1):
-                lon = 2 * np.pi * float(j) / segments
-                x = radius * np.cos(lat) * np.cos(lon)
-                y = radius * np.cos(lat) * np.sin(lon)
-                z = radius * np.sin(lat)
-                vertices.append(Vector3(x, y, z))
-        
-        # 生成面
-        for i in range(segments):
-            for j in range(segments):
-                first = i * (segments + 1) + j
-                second = first + segments + 1
-                faces.append([first, second, first + 1])
-                faces.append([second, second + 1, first + 1])
-        
+    def _create_sphere(self, radius: float, segments: int) -> tuple[np.ndarray, np.ndarray]:
+        """创建球体（经纬网格，含接缝列和两极退化行，由normalize_mesh焊接清理）"""
+        lat = np.pi * (-0.5 + np.arange(segments + 1) / segments)
+        lon = 2 * np.pi * np.arange(segments + 1) / segments
+        cos_lat = np.cos(lat)[:, None]
+        vertices = np.stack([
+            radius * cos_lat * np.cos(lon)[None, :],
+            radius * cos_lat * np.sin(lon)[None, :],
+            radius * np.broadcast_to(np.sin(lat)[:, None], (segments + 1, segments + 1))
+        ], axis=-1).reshape(-1, 3)
+
+        # 每个网格单元两个三角形，从外部看为逆时针
+        i, j = np.meshgrid(np.arange(segments), np.arange(segments), indexing="ij")
+        first = (i * (segments + 1) + j).ravel()
+        second = first + segments + 1
+        faces = np.stack([
+            np.stack([first, first + 1, second], axis=1),
+            np.stack([second, first + 1, second + 1], axis=1)
+        ], axis=1).reshape(-1, 3)
         return vertices, faces
 
-    def _create_cylinder(self, radius: float, height: float, segments: int) -> tuple[List[Vector3], List[List[int]]]:
+    def _create_cylinder(self, radius: float, height: float, segments: int) -> tuple[np.ndarray, np.ndarray]:
         """创建圆柱体"""
-        vertices = []
-        faces = []
         half_height = height / 2
-        
-        # 生成底面顶点
-        for i in range(segments):
-            angle = 2 * np.pi * i / segments
-            x = radius * np.cos(angle)
-            y = radius * np.sin(angle)
-            vertices.append(Vector3(x, y, -half_height))
-        
-        # 生成顶面顶点
-        for i in range(segments):
-            angle = 2 * np.pi * i / segments
-            x = radius * np.cos(angle)
-            y = radius * np.sin(angle)
-            vertices.append(Vector3(x, y, half_height))
-        
-        # 生成侧面
-        for i in range(segments):
-            next_i = (i + 1) % segments
-            faces.append([i, i + segments, next_i + segments])
-            faces.append([i, next_i + segments, next_i])
-        
-        # 生成底面
-        for i in range(1, segments - 1):
-            faces.append([0, i, i + 1])
-        
-        # 生成顶面
-        for i in range(1, segments - 1):
-            faces.append([segments, segments + i, segments + i + 1])
-        
+        angle = 2 * np.pi * np.arange(segments) / segments
+        ring = np.stack([radius * np.cos(angle), radius * np.sin(angle)], axis=1)
+        vertices = np.concatenate([
+            np.column_stack([ring, np.full(segments, -half_height)]),  # 底面顶点
+            np.column_stack([ring, np.full(segments, half_height)])    # 顶面顶点
+        ])
+
+        i = np.arange(segments)
+        next_i = (i + 1) % segments
+        fan = np.arange(1, segments - 1)
+        faces = np.concatenate([
+            # 侧面（从外部看为逆时针）
+            np.stack([
+                np.stack([i, next_i + segments, i + segments], axis=1),
+                np.stack([i, next_i, next_i + segments], axis=1)
+            ], axis=1).reshape(-1, 3),
+            # 底面（从下方看为逆时针）
+            np.stack([np.zeros_like(fan), fan + 1, fan], axis=1),
+            # 顶面
+            np.stack([np.full_like(fan, segments), segments + fan, segments + fan + 1], axis=1)
+        ])
         return vertices, faces
 
     def reset_view(self) -> Dict:
@@ -345,13 +663,20 @@ class MCPService:
         try:
             self.update_simulation_status("running", simulation_type)
             
-            if simulation_type == "gravity":
-                result = self._simulate_gravity(params)
-            elif simulation_type == "collision":
-                result = self._simulate_collision(params)
-            else:
-                return {"success": False, "error": f"不支持的仿真类型: {simulation_type}"}
+            start = time.perf_counter()
+            with profiling.stage("compute"):
+                if simulation_type == "gravity":
+                    result = self._simulate_gravity(params)
+                elif simulation_type == "collision":
+                    result = self._simulate_collision(params)
+                elif simulation_type == "nbody":
+                    result = self._simulate_nbody(params)
+                else:
+                    return {"success": False, "error": f"不支持的仿真类型: {simulation_type}"}
+            elapsed = time.perf_counter() - start
             
+            if result.get("success"):
+                self._record_simulation_metrics(simulation_type, result.get("data", {}), elapsed)
             self.update_simulation_status("active")
             return result
         except Exception as e:
@@ -359,62 +684,223 @@ class MCPService:
             self.update_simulation_status("error")
             return {"success": False, "error": str(e)}
 
+    def _record_simulation_metrics(self, simulation_type: str, data: Dict, elapsed: float) -> None:
+        """记录仿真耗时和吞吐量（物体步数/秒）"""
+        body_steps = data.get("time_steps", 1) * data.get("bodies", len(self.shapes) or 1)
+        metrics.SIMULATION_SECONDS.observe(elapsed, simulation_type=simulation_type)
+        metrics.SIMULATION_BODY_STEPS.inc(body_steps, simulation_type=simulation_type)
+        if elapsed > 0:
+            metrics.SIMULATION_BODY_STEPS_PER_SECOND.set(body_steps / elapsed, simulation_type=simulation_type)
+
     def _simulate_gravity(self, params: Dict) -> Dict:
         """重力仿真"""
         try:
             gravity = params.get("gravity", 9.81)
             time_step = params.get("time_step", 0.05)
             steps = params.get("time_steps", 100)
+            stride = int(params.get("record_stride") or 1)
             initial_position = params.get("initial_position", [0, 10, 0])
             initial_velocity = params.get("initial_velocity", [0, 0, 0])
             
-            positions = []
-            velocities = []
             pos = np.array(initial_position, dtype=float)
             vel = np.array(initial_velocity, dtype=float)
             
-            for i in range(steps):
-                t = i * time_step
-                positions.append(pos.tolist())
-                velocities.append(vel.tolist())
-                # 沿着Y轴（黄色轴）重力
-                vel = vel + np.array([0, -gravity * time_step, 0])
-                pos = pos + vel * time_step
-            
-            return {
-                "success": True,
-                "data": {
-                    "type": "gravity",
-                    "positions": positions,
-                    "velocities": velocities,
-                    "time_steps": steps
+            bodies = np.broadcast(pos.reshape(-1, 3), vel.reshape(-1, 3)).shape[0]
+            pos, vel = (np.broadcast_to(value.reshape(-1, 3), (bodies, 3)).copy() if bodies > 1 else value
+                        for value in (pos, vel))
+            frames = trajectory_recorder.frame_count(steps, stride)
+            store = bool(params.get("store_trajectory"))
+            # 需要持久化时直接写入内存映射轨迹文件，不在内存中保留整条轨迹
+            self._check_trajectory_budget(frames, bodies, 4 if store else 8)
+            if store:
+                recorder = trajectory_recorder.create_stored(
+                    trajectory_store, "gravity", steps, bodies, time_step, stride,
+                    metadata={"gravity": gravity}
+                )
+                self.trajectory_runs.append(recorder.writer.run_id)
+            else:
+                recorder = trajectory_recorder.TrajectoryRecorder(frames, bodies, stride=stride)
+
+            # 沿着Y轴（黄色轴）重力
+            dv = np.array([0, -gravity * time_step, 0])
+            try:
+                for _ in range(steps):
+                    recorder.record(positions=pos, velocities=vel)
+                    vel = vel + dv
+                    pos = pos + vel * time_step
+                meta = recorder.close() if store else None
+            except Exception:
+                recorder.abort()
+                raise
+
+            data = {"type": "gravity", "bodies": bodies, "time_steps": steps}
+            if stride > 1:
+                data["record_stride"] = stride
+            if meta is not None:
+                data["run_id"] = meta["run_id"]
+            else:
+                # 单个物体且初始位置是一维时每帧为 [x, y, z]，与多物体的 [[x, y, z], ...] 区分
+                data.update(recorder.to_json(squeeze=pos.ndim == 1))
+            return {"success": True, "data": data}
+        except Exception as e:
+            logger.error(f"重力仿真失败: {e}")
+            return {"success": False, "error": str(e)}
+
+    def _simulate_nbody(self, params: Dict) -> Dict:
+        """N体引力仿真：物体间相互吸引，Barnes–Hut八叉树（或精确O(N²)）加速度 + 蛙跳积分"""
+        try:
+            method = params.get("method") or "barnes_hut"
+            theta = float(params.get("theta") or nbody.NBODY_THETA)
+            softening = float(params.get("softening") or nbody.NBODY_SOFTENING)
+            G = float(params.get("G", 1.0))
+            time_step = float(params.get("time_step") or 0.01)
+            steps = int(params.get("time_steps") or 100)
+            distribution = params.get("distribution") or "plummer"
+            limit = NBODY_EXACT_MAX_BODIES if method == "exact" else NBODY_MAX_BODIES
+
+            explicit = params.get("positions") is not None
+            if explicit:
+                pos = np.asarray(params["positions"], dtype=np.float64).reshape(-1, 3)
+                bodies = len(pos)
+            else:
+                bodies = int(params.get("bodies") or 1000)
+            # 先检查上限再生成初始条件
+            if bodies > limit:
+                raise SceneLimitError(f"N体仿真物体数超出上限: {bodies}，{method}模式上限{limit}")
+            if explicit:
+                vel = np.zeros_like(pos) if params.get("velocities") is None else \
+                    np.asarray(params["velocities"], dtype=np.float64).reshape(-1, 3)
+                masses = np.broadcast_to(np.asarray(params.get("masses", 1.0), dtype=np.float64), bodies).copy()
+                if vel.shape != pos.shape:
+                    raise ValueError("velocities与positions的物体数不一致")
+            else:
+                pos, vel, masses = nbody.initial_conditions(distribution, bodies, G=G, seed=params.get("seed"))
+
+            stride = int(params.get("record_stride") or 1)
+            frames = trajectory_recorder.frame_count(steps, stride)
+            store = bool(params.get("store_trajectory"))
+            self._check_trajectory_budget(frames, bodies, 4 if store else 8)
+            if store:
+                recorder = trajectory_recorder.create_stored(
+                    trajectory_store, "nbody", steps, bodies, time_step, stride,
+                    metadata={"method": method, "theta": theta, "softening": softening, "G": G,
+                              "distribution": None if explicit else distribution}
+                )
+                self.trajectory_runs.append(recorder.writer.run_id)
+            else:
+                recorder = trajectory_recorder.TrajectoryRecorder(frames, bodies, stride=stride)
+
+            step_seconds = []
+            interactions = {"far_interactions": 0, "near_pairs": 0, "pairs": 0}
+            initial_energy = nbody.kinetic_energy(vel, masses)
+            try:
+                for step, p, v, stats in nbody.leapfrog(pos, vel, masses, time_step, steps, method,
+                                                        theta, softening, G):
+                    recorder.record(positions=p, velocities=v)
+                    if "seconds" in stats:
+                        step_seconds.append(stats["seconds"])
+                    for key in interactions:
+                        interactions[key] += stats.get(key, 0)
+                    pos, vel = p, v
+                meta = recorder.close() if store else None
+            except Exception:
+                recorder.abort()
+                raise
+
+            data = {
+                "type": "nbody",
+                "method": method,
+                "theta": theta if method == "barnes_hut" else None,
+                "bodies": bodies,
+                "time_steps": steps,
+                "stats": {
+                    "step_seconds_mean": round(float(np.mean(step_seconds)), 6) if step_seconds else 0.0,
+                    "step_seconds_max": round(float(np.max(step_seconds)), 6) if step_seconds else 0.0,
+                    **{key: value for key, value in interactions.items() if value},
+                    "kinetic_energy_initial": initial_energy,
+                    "kinetic_energy_final": nbody.kinetic_energy(vel, masses)
                 }
             }
+            if stride > 1:
+                data["record_stride"] = stride
+            if meta is not None:
+                data["run_id"] = meta["run_id"]
+            else:
+                data.update(recorder.to_json(decimals=6))
+            return {"success": True, "data": data}
+        except SceneLimitError as e:
+            logger.warning(f"N体仿真被拒绝: {e}")
+            return {"success": False, "error": str(e)}
         except Exception as e:
-            logger.error(f"重力仿真失败: {e}")
+            logger.error(f"N体仿真失败: {e}")
+            return {"success": False, "error": str(e)}
+
+    def move_shape(self, shape_id: int, position: Optional[List[float]] = None,
+                   offset: Optional[List[float]] = None) -> Dict:
+        """移动形状到position，或按offset相对移动；旋转和缩放不变"""
+        try:
+            if shape_id not in self.shapes:
+                return {"success": False, "error": f"形状不存在: {shape_id}"}
+            if position is None and offset is None:
+                return {"success": False, "error": "需要指定position或offset"}
+            target = self.shapes[shape_id].position if position is None else position
+            target = np.asarray(target, dtype=np.float64).reshape(3)
+            if offset is not None:
+                target = target + np.asarray(offset, dtype=np.float64).reshape(3)
+            self.set_shape_position(shape_id, target)
+            return {"success": True, "data": {"id": shape_id, **self.shapes[shape_id].transform_dict()}}
+        except Exception as e:
+            logger.error(f"移动形状失败: {e}")
+            return {"success": False, "error": str(e)}
+
+    def set_transform(self, shape_id: int, position: Optional[List[float]] = None,
+                      rotation: Optional[List[float]] = None, scale: Optional[List[float]] = None,
+                      matrix: Optional[List[float]] = None) -> Dict:
+        """设置形状的变换：matrix为列主序的16个数；否则按平移、欧拉角（度）、缩放组合，
+        未指定的分量保持当前值"""
+        try:
+            if shape_id not in self.shapes:
+                return {"success": False, "error": f"形状不存在: {shape_id}"}
+            if matrix is not None:
+                transform = shape_transforms.from_elements(matrix)
+            else:
+                current = shape_transforms.decompose(self.shapes[shape_id].matrix)
+                transform = shape_transforms.compose(
+                    *(current[k] if value is None else value for k, value in enumerate((position, rotation, scale))))
+            self._apply_transform(shape_id, transform)
+            return {"success": True, "data": {"id": shape_id, **self.shapes[shape_id].transform_dict()}}
+        except Exception as e:
+            logger.error(f"设置形状变换失败: {e}")
             return {"success": False, "error": str(e)}
 
+    def set_shape_position(self, shape_id: int, position) -> None:
+        """只改变形状的平移（实时仿真写回位置也走这里）"""
+        transform = self.shapes[shape_id].matrix
+        transform[:3, 3] = np.asarray(position, dtype=np.float64).reshape(3)
+        self._apply_transform(shape_id, transform)
+
+    def _apply_transform(self, shape_id: int, transform: np.ndarray) -> None:
+        """更新变换后同步空间索引，并标记碰撞缓存"""
+        shape = self.shapes[shape_id]
+        self.transforms.set(shape.slot, transform)
+        self.spatial_index.remove(shape_id)
+        self.spatial_index.insert(shape_id, *shape.bounds())
+        self.contact_cache.mark_dirty(shape_id)
+
     def _simulate_collision(self, params: Dict) -> Dict:
-        """碰撞仿真"""
+        """碰撞仿真：增量更新接触缓存，只重测涉及新建或移动过的形状的形状对"""
         try:
             restitution = params.get("restitution", 0.8)
             friction = params.get("friction", 0.1)
             time_step = params.get("time_step", 0.1)
             duration = params.get("duration", 1.0)
             
-            # 模拟碰撞效果
-            collision_points = []
-            for i in range(len(self.shapes)):
-                for j in range(i + 1, len(self.shapes)):
-                    # 检测形状之间的碰撞
-                    collision = self._check_collision(self.shapes[i], self.shapes[j])
-                    if collision:
-                        collision_points.append({
-                            "shape1": i,
-                            "shape2": j,
-                            "point": collision["point"].to_dict(),
-                            "normal": collision["normal"].to_dict()
-                        })
+            if params.get("full"):
+                for shape_id in self.shapes.ids():
+                    self.contact_cache.mark_dirty(shape_id)
+            stats = self.contact_cache.update(self._collision_candidates, self._collision_pair)
+            metrics.COLLISION_PAIRS_TESTED.inc(stats["pairs_tested"])
+            collision_points = self.contact_cache.values()
             
             return {
                 "success": True,
@@ -424,7 +910,8 @@ class MCPService:
                     "results": {
                         "collision_points": collision_points,
                         "impact_forces": [1.0] * len(collision_points),  # 简化的力计算
-                        "time": duration
+                        "time": duration,
+                        **stats
                     }
                 }
             }
@@ -432,36 +919,54 @@ class MCPService:
             logger.error(f"碰撞仿真失败: {e}")
             return {"success": False, "error": str(e)}
 
+    def _collision_candidates(self, shape_id: int) -> List[int]:
+        """包围盒（扩大接触阈值）与该形状相交的形状"""
+        shape = self.shapes.get(shape_id)
+        if shape is None:
+            return []
+        lo, hi = shape.bounds()
+        return self.spatial_index.query_aabb(lo - COLLISION_THRESHOLD, hi + COLLISION_THRESHOLD)
+
+    def _collision_pair(self, i: int, j: int) -> Optional[Dict]:
+        collision = self._check_collision(self.shapes[i], self.shapes[j])
+        if collision is None:
+            return None
+        point, normal = (geometry_precision.round_for_transport(collision[key], self.precision).tolist()
+                         for key in ("point", "normal"))
+        return {"shape1": i, "shape2": j,
+                "point": dict(zip("xyz", point)), "normal": dict(zip("xyz", normal))}
+
     def _check_collision(self, shape1: Shape, shape2: Shape) -> Optional[Dict]:
-        """检测两个形状之间的碰撞"""
+        """检测两个形状之间的碰撞：按顶点顺序返回第一对距离小于阈值的顶点（世界坐标）"""
         # 简化的碰撞检测
         # 在实际应用中，这里应该实现更复杂的碰撞检测算法
-        for v1 in shape1.vertices:
-            for v2 in shape2.vertices:
-                distance = np.sqrt(
-                    (v1.x - v2.x) ** 2 +
-                    (v1.y - v2.y) ** 2 +
-                    (v1.z - v2.z) ** 2
-                )
-                if distance < 0.1:  # 碰撞阈值
-                    return {
-                        "point": Vector3(
-                            (v1.x + v2.x) / 2,
-                            (v1.y + v2.y) / 2,
-                            (v1.z + v2.z) / 2
-                        ),
-                        "normal": Vector3(
-                            v1.x - v2.x,
-                            v1.y - v2.y,
-                            v1.z - v2.z
-                        )
-                    }
+        threshold = COLLISION_THRESHOLD
+        a, b = shape1.world_vertices(), shape2.world_vertices()
+        if not len(a) or not len(b):
+            return None
+        # 包围盒（扩大阈值）不相交时不可能有顶点对足够接近
+        if np.any(a.min(axis=0) - threshold > b.max(axis=0)) or np.any(b.min(axis=0) - threshold > a.max(axis=0)):
+            return None
+        # 分块计算距离矩阵，限制临时内存
+        block = max(1, COLLISION_BLOCK_ELEMENTS // len(b))
+        for start in range(0, len(a), block):
+            chunk = a[start:start + block]
+            distances = np.sqrt(((chunk[:, None, :] - b[None, :, :]) ** 2).sum(axis=-1))
+            hits = np.flatnonzero(distances < threshold)
+            if len(hits):
+                row, col = divmod(int(hits[0]), len(b))
+                v1, v2 = chunk[row], b[col]
+                return {"point": (v1 + v2) / 2, "normal": v1 - v2}
         return None
 
     def clear_scene(self) -> Dict:
         """清空场景"""
         try:
             self.shapes.clear()
+            self.vertex_count = 0
+            self.spatial_index.clear()
+            self.transforms.clear()
+            self.contact_cache.clear()
             self.update_simulation_status("idle")
             return {
                 "success": True,
@@ -623,7 +1128,9 @@ class MCPService:
             self.simulation_status.update({
                 "shapes_count": len(self.shapes),
                 "view_mode": self.view_mode.value,
-                "shapes": [shape.to_dict() for shape in self.shapes]
+                "resources": self.resource_usage(),
+                # 形状在编码响应时才序列化（Shape.__json__），不先转为嵌套的Python列表
+                "shapes": list(self.shapes)
             })
             return {
                 "success": True,
@@ -633,6 +1140,169 @@ class MCPService:
             logger.error(f"获取仿真状态失败: {e}")
             return {"success": False, "error": str(e)}
 
+    def _owned_run_meta(self, run_id: str) -> Dict:
+        """本场景的轨迹运行元数据；其他会话的运行按不存在处理，不能被列出或读取"""
+        meta = trajectory_store.get_meta(run_id) if run_id in self.trajectory_runs else None
+        if not meta:
+            raise KeyError(f"轨迹运行不存在: {run_id}")
+        return meta
+
+    def get_trajectory_frames(self, run_id: str, start: int = 0, stop: Optional[int] = None,
+                              stride: int = 1, channels: Optional[List[str]] = None,
+                              encoding: str = "json") -> Dict:
+        """读取本场景已持久化仿真运行的帧切片；encoding为npz时data为NPZ二进制（数组不转为列表）"""
+        try:
+            self._owned_run_meta(run_id)
+            frames = trajectory_store.read_frames(run_id, start, stop, stride, channels)
+            if encoding == "npz":
+                return {"success": True, "data": trajectory_recorder.encode_npz(frames)}
+            return {"success": True, "data": frames}
+        except KeyError as e:
+            return {"success": False, "error": str(e.args[0])}
+        except Exception as e:
+            logger.error(f"读取轨迹失败: {e}")
+            return {"success": False, "error": str(e)}
+
+    def list_trajectory_runs(self) -> Dict:
+        """列出本场景已持久化的仿真运行，按创建时间倒序"""
+        try:
+            runs = [meta for meta in map(trajectory_store.get_meta, list(self.trajectory_runs)) if meta]
+            runs.sort(key=lambda m: m.get("created_at", 0), reverse=True)
+            return {"success": True, "runs": runs}
+        except Exception as e:
+            logger.error(f"列出轨迹运行失败: {e}")
+            return {"success": False, "error": str(e)}
+
+    def build_scene_glb(self, run_id: Optional[str] = None, stride: int = 1) -> GlbBuilder:
+        """把当前场景（和可选的本场景轨迹运行的动画）组装为GLB，缓冲区直接引用NumPy数组"""
+        builder = GlbBuilder()
+        nodes = []
+        for shape in self.shapes:
+            if len(shape.faces):
+                # 网格使用缓存的世界坐标顶点（旋转和缩放已烘焙），平移留在节点上供轨迹动画覆盖
+                # 镜像变换（行列式为负）翻转三角形绕向，保持正面朝外
+                position = shape.position
+                faces = shape.faces if np.linalg.det(shape.matrix[:3, :3]) > 0 else shape.faces[:, ::-1]
+                nodes.append(builder.add_mesh(f"{shape.type.value}_{shape.id}", shape.world_vertices() - position,
+                                              faces, shape.world_normals(),
+                                              translation=position.tolist()))
+        if run_id:
+            if stride < 1:
+                raise ValueError("stride必须为正整数")
+            meta = self._owned_run_meta(run_id)
+            positions = trajectory_store.open_channel(run_id, "positions")[::stride]
+            times = np.arange(len(positions), dtype=np.float32) * np.float32(meta["time_step"] * stride)
+            # 物体多于形状时为多出的物体创建空节点
+            while len(nodes) < meta["bodies"]:
+                nodes.append(builder.add_node(f"body_{len(nodes)}"))
+            builder.add_translation_animation(f"{meta['simulation_type']}_{run_id[:8]}", times,
+                                              positions, nodes[:meta["bodies"]])
+        return builder
+
+    def export_scene(self, run_id: Optional[str] = None, stride: int = 1) -> Dict:
+        """导出当前场景为GLB文件"""
+        try:
+            with profiling.stage("compute"):
+                builder = self.build_scene_glb(run_id, stride)
+                export = save_export(builder)
+            return {
+                "success": True,
+                "data": {
+                    **export,
+                    "shapes": len(self.shapes),
+                    "run_id": run_id
+                },
+                "message": f"场景已导出为 {export['name']}"
+            }
+        except Exception as e:
+            logger.error(f"导出场景失败: {e}")
+            return {"success": False, "error": str(e)}
+
+    def _spatial_result(self, query: str, hits: List[Dict], start: float, **extra) -> Dict:
+        """空间查询的统一返回格式：命中列表（截断到SPATIAL_MAX_RESULTS）和耗时（微秒）"""
+        elapsed = time.perf_counter() - start
+        metrics.SPATIAL_QUERY_SECONDS.observe(elapsed, query=query)
+        elapsed_us = elapsed * 1e6
+        return {
+            "success": True,
+            "data": {
+                "hits": hits[:SPATIAL_MAX_RESULTS],
+                "count": len(hits),
+                "truncated": len(hits) > SPATIAL_MAX_RESULTS,
+                "elapsed_us": round(elapsed_us, 1),
+                **extra
+            }
+        }
+
+    def raycast(self, origin: List[float], direction: List[float],
+                max_distance: Optional[float] = None, exact: bool = True) -> Dict:
+        """射线查询：先用BVH找包围盒命中的形状，exact为true时按进入距离依次与三角网格精确求交
+
+        返回按距离排序的命中列表；exact时只返回真正与网格相交的形状及交点
+        """
+        try:
+            start = time.perf_counter()
+            origin = np.asarray(origin, dtype=np.float64).reshape(3)
+            direction = np.asarray(direction, dtype=np.float64).reshape(3)
+            limit = np.inf if max_distance is None else float(max_distance)
+            candidates = self.spatial_index.raycast_candidates(origin, direction, limit)
+            if not exact:
+                hits = [{"id": shape_id, "distance": t} for shape_id, t in candidates]
+                return self._spatial_result("raycast_aabb", hits, start)
+
+            unit = direction / np.linalg.norm(direction)
+            hits = []
+            for shape_id, t_near in candidates:
+                # 候选按包围盒进入距离排序，进入距离已超过最近交点的形状不可能更近
+                if hits and t_near > hits[0]["distance"]:
+                    break
+                shape = self.shapes[shape_id]
+                t = ray_triangles(origin, unit, shape.world_vertices(), shape.faces)
+                if t is not None and t <= limit and (not hits or t < hits[0]["distance"]):
+                    hits = [{"id": shape_id, "type": shape.type.value, "distance": t,
+                             "point": (origin + unit * t).tolist()}]
+            return self._spatial_result("raycast", hits, start, candidates=len(candidates))
+        except Exception as e:
+            logger.error(f"射线查询失败: {e}")
+            return {"success": False, "error": str(e)}
+
+    def query_radius(self, center: List[float], radius: float) -> Dict:
+        """半径查询：包围盒与球体相交的形状，按距离升序"""
+        try:
+            start = time.perf_counter()
+            found = self.spatial_index.query_radius(np.asarray(center, dtype=np.float64).reshape(3), float(radius))
+            hits = [{"id": shape_id, "distance": d} for shape_id, d in found]
+            return self._spatial_result("radius", hits, start)
+        except Exception as e:
+            logger.error(f"半径查询失败: {e}")
+            return {"success": False, "error": str(e)}
+
+    def nearest_shapes(self, point: List[float], k: int = 1) -> Dict:
+        """k近邻查询：距离点最近的k个形状（点到包围盒距离）"""
+        try:
+            start = time.perf_counter()
+            k = max(1, min(int(k), SPATIAL_MAX_RESULTS))
+            found = self.spatial_index.nearest(np.asarray(point, dtype=np.float64).reshape(3), k)
+            hits = [{"id": shape_id, "distance": d} for shape_id, d in found]
+            return self._spatial_result("nearest", hits, start)
+        except Exception as e:
+            logger.error(f"近邻查询失败: {e}")
+            return {"success": False, "error": str(e)}
+
+    def query_aabb(self, lo: List[float], hi: List[float]) -> Dict:
+        """包围盒重叠查询"""
+        try:
+            start = time.perf_counter()
+            lo = np.asarray(lo, dtype=np.float64).reshape(3)
+            hi = np.asarray(hi, dtype=np.float64).reshape(3)
+            if np.any(lo > hi):
+                return {"success": False, "error": "包围盒的min必须不大于max"}
+            hits = [{"id": shape_id} for shape_id in sorted(self.spatial_index.query_aabb(lo, hi))]
+            return self._spatial_result("aabb", hits, start)
+        except Exception as e:
+            logger.error(f"包围盒查询失败: {e}")
+            return {"success": False, "error": str(e)}
+
     def update_simulation_status(self, status: str, simulation_type: Optional[str] = None) -> None:
         """更新仿真状态"""
         self.simulation_status["status"] = status
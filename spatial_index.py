@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+场景空间索引 - 基于包围盒（AABB）的BVH，支持射线、半径、k近邻和包围盒重叠查询
+叶子按中心点的Morton码排序后每LEAF_SIZE个一组，上层每BRANCHING个节点合并，全部存为扁平NumPy数组；
+查询按层批量处理整层候选节点，没有逐节点的Python递归
+新增的形状先放入待处理列表（线性扫描），积累到一定数量后整体重建；
+删除已建树的形状只做标记（查询时过滤），删除待处理的形状直接从列表移除，因此删除后重新插入同一ID（移动形状）不会留下旧包围盒
+"""
+
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+LEAF_SIZE = 16
+# 每个内部节点的子节点数；查询耗时主要是每层固定的NumPy调用开销，较宽的树层数更少
+BRANCHING = 8
+# 待处理列表超过 max(REBUILD_MIN_PENDING, 已索引数量 * REBUILD_RATIO) 时重建
+REBUILD_MIN_PENDING = 256
+REBUILD_RATIO = 0.1
+MORTON_BITS = 10
+
+
+def _expand_bits(values: np.ndarray) -> np.ndarray:
+    """把10位整数的每一位间隔两个0展开，用于交织三个坐标"""
+    v = values.astype(np.uint64) & np.uint64(0x3FF)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x030000FF)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x0300F00F)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x030C30C3)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x09249249)
+    return v
+
+
+def morton_codes(points: np.ndarray) -> np.ndarray:
+    """点在其包围盒内归一化后的30位Morton码"""
+    lo = points.min(axis=0)
+    extent = np.maximum(points.max(axis=0) - lo, 1e-12)
+    grid = np.clip(((points - lo) / extent * ((1 << MORTON_BITS) - 1)).astype(np.int64), 0, (1 << MORTON_BITS) - 1)
+    return (_expand_bits(grid[:, 0]) << np.uint64(2)) | (_expand_bits(grid[:, 1]) << np.uint64(1)) | _expand_bits(grid[:, 2])
+
+
+def _point_box_distance(point: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """点到一组包围盒的最近距离（点在盒内为0）"""
+    delta = np.maximum(np.maximum(lo - point, point - hi), 0.0)
+    return np.sqrt((delta * delta).sum(axis=1))
+
+
+def _point_box_max_distance(point: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """点到一组包围盒的最远距离"""
+    delta = np.maximum(np.abs(lo - point), np.abs(hi - point))
+    return np.sqrt((delta * delta).sum(axis=1))
+
+
+def _ray_box(origin: np.ndarray, inv_dir: np.ndarray, lo: np.ndarray, hi: np.ndarray,
+             max_distance: float) -> Tuple[np.ndarray, np.ndarray]:
+    """slab法射线-包围盒相交，返回 (是否相交, 进入距离)"""
+    parallel = np.isinf(inv_dir)
+    with np.errstate(invalid="ignore"):
+        t1 = (lo - origin) * inv_dir
+        t2 = (hi - origin) * inv_dir
+    t_min = np.minimum(t1, t2)
+    t_max = np.maximum(t1, t2)
+    if parallel.any():
+        # 与某个轴平行：原点在该slab内则不限制，否则必不相交
+        inside = (lo[:, parallel] <= origin[parallel]) & (origin[parallel] <= hi[:, parallel])
+        t_min[:, parallel] = np.where(inside, -np.inf, np.inf)
+        t_max[:, parallel] = np.where(inside, np.inf, -np.inf)
+    t_near = np.maximum(t_min.max(axis=1), 0.0)
+    t_far = t_max.min(axis=1)
+    return (t_near <= t_far) & (t_near <= max_distance), t_near
+
+
+class SpatialIndex:
+    """形状包围盒的BVH；线程安全（写操作加锁，查询读取不可变快照）"""
+
+    def __init__(self, leaf_size: int = LEAF_SIZE):
+        self.leaf_size = leaf_size
+        self._lock = threading.Lock()
+        self._clear_state()
+
+    def _clear_state(self) -> None:
+        # 已建树部分：按Morton顺序排列的物体
+        self._ids = np.empty(0, dtype=np.int64)
+        self._tree_ids: set = set()
+        self._lo = np.empty((0, 3))
+        self._hi = np.empty((0, 3))
+        # levels[0]为叶子层，levels[-1]为根
+        self._levels: List[Tuple[np.ndarray, np.ndarray]] = []
+        # 待处理部分；_removed只标记已建树部分中被删除的ID
+        self._pending_ids: List[int] = []
+        self._pending_lo: List[np.ndarray] = []
+        self._pending_hi: List[np.ndarray] = []
+        self._removed: set = set()
+        self._pending_cache: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+
+    def __len__(self) -> int:
+        return len(self._ids) + len(self._pending_ids) - len(self._removed)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clear_state()
+
+    def insert(self, shape_id: int, lo, hi) -> None:
+        """加入一个形状的包围盒；待处理列表过长时重建"""
+        with self._lock:
+            self._pending_ids.append(int(shape_id))
+            self._pending_lo.append(np.asarray(lo, dtype=np.float64))
+            self._pending_hi.append(np.asarray(hi, dtype=np.float64))
+            self._pending_cache = None
+            if len(self._pending_ids) > max(REBUILD_MIN_PENDING, len(self._ids) * REBUILD_RATIO):
+                self._rebuild()
+
+    def remove(self, shape_id: int) -> None:
+        """删除一个形状：待处理列表中的直接移除，已建树的标记删除，下次重建时真正移除"""
+        shape_id = int(shape_id)
+        with self._lock:
+            if shape_id in self._pending_ids:
+                keep = [k for k, pending_id in enumerate(self._pending_ids) if pending_id != shape_id]
+                self._pending_ids = [self._pending_ids[k] for k in keep]
+                self._pending_lo = [self._pending_lo[k] for k in keep]
+                self._pending_hi = [self._pending_hi[k] for k in keep]
+                self._pending_cache = None
+            if shape_id in self._tree_ids:
+                self._removed.add(shape_id)
+
+    def rebuild(self) -> None:
+        with self._lock:
+            self._rebuild()
+
+    def _rebuild(self) -> None:
+        keep = self._drop_removed(self._ids, self._removed)
+        pending_ids, pending_lo, pending_hi = self._pending()
+        ids = np.concatenate([self._ids[keep], pending_ids])
+        lo = np.concatenate([self._lo[keep], pending_lo])
+        hi = np.concatenate([self._hi[keep], pending_hi])
+        self._tree_ids = set(ids.tolist())
+        self._pending_ids, self._pending_lo, self._pending_hi = [], [], []
+        self._pending_cache = None
+        self._removed = set()
+        if not len(ids):
+            self._ids, self._lo, self._hi, self._levels = ids, lo, hi, []
+            return
+        order = np.argsort(morton_codes((lo + hi) * 0.5), kind="stable")
+        self._ids, self._lo, self._hi = ids[order], lo[order], hi[order]
+
+        # 叶子层：每leaf_size个物体一个节点
+        starts = np.arange(0, len(ids), self.leaf_size)
+        levels = [(np.minimum.reduceat(self._lo, starts, axis=0), np.maximum.reduceat(self._hi, starts, axis=0))]
+        while len(levels[-1][0]) > 1:
+            lo_level, hi_level = levels[-1]
+            groups = np.arange(0, len(lo_level), BRANCHING)
+            levels.append((np.minimum.reduceat(lo_level, groups, axis=0),
+                           np.maximum.reduceat(hi_level, groups, axis=0)))
+        self._levels = levels
+
+    def _pending(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if self._pending_cache is None:
+            if self._pending_ids:
+                self._pending_cache = (np.array(self._pending_ids, dtype=np.int64),
+                                       np.vstack(self._pending_lo), np.vstack(self._pending_hi))
+            else:
+                self._pending_cache = (np.empty(0, dtype=np.int64), np.empty((0, 3)), np.empty((0, 3)))
+        return self._pending_cache
+
+    def _snapshot(self):
+        with self._lock:
+            return self._ids, self._lo, self._hi, self._levels, self._pending(), frozenset(self._removed)
+
+    def _traverse(self, levels, node_test) -> np.ndarray:
+        """自根向下逐层筛选节点，返回通过测试的叶子节点编号"""
+        if not levels:
+            return np.empty(0, dtype=np.int64)
+        nodes = np.zeros(1, dtype=np.int64)
+        lo, hi = levels[-1]
+        nodes = nodes[node_test(lo[nodes], hi[nodes], len(levels) - 1)]
+        for depth in range(len(levels) - 2, -1, -1):
+            lo, hi = levels[depth]
+            children = (nodes[:, None] * BRANCHING + np.arange(BRANCHING)).ravel()
+            children = children[children < len(lo)]
+            if not len(children):
+                return children
+            nodes = children[node_test(lo[children], hi[children], depth)]
+        return nodes
+
+    def _leaf_items(self, leaves: np.ndarray, ids: np.ndarray, removed: frozenset) -> np.ndarray:
+        """叶子节点编号 -> 物体在已建树数组中的下标（去掉标记删除的）"""
+        if not len(leaves):
+            return np.empty(0, dtype=np.int64)
+        offsets = (leaves[:, None] * self.leaf_size + np.arange(self.leaf_size)).ravel()
+        offsets = offsets[offsets < len(ids)]
+        return offsets[self._drop_removed(ids[offsets], removed)]
+
+    @staticmethod
+    def _drop_removed(ids: np.ndarray, mask_source: frozenset) -> np.ndarray:
+        if not mask_source:
+            return np.ones(len(ids), dtype=bool)
+        return ~np.isin(ids, np.fromiter(mask_source, dtype=np.int64))
+
+    def query_aabb(self, lo, hi) -> List[int]:
+        """与给定包围盒重叠的形状ID"""
+        lo = np.asarray(lo, dtype=np.float64)
+        hi = np.asarray(hi, dtype=np.float64)
+        ids, item_lo, item_hi, levels, pending, removed = self._snapshot()
+
+        def overlaps(a_lo, a_hi, _depth=None):
+            return np.all((a_lo <= hi) & (a_hi >= lo), axis=1)
+
+        items = self._leaf_items(self._traverse(levels, overlaps), ids, removed)
+        items = items[overlaps(item_lo[items], item_hi[items])]
+        result = np.concatenate([ids[items], pending[0][overlaps(pending[1], pending[2])]])
+        return result.tolist()
+
+    def query_radius(self, center, radius: float) -> List[Tuple[int, float]]:
+        """包围盒与球体相交的形状，按距离（点到包围盒）升序返回 (ID, 距离)"""
+        center = np.asarray(center, dtype=np.float64)
+        ids, item_lo, item_hi, levels, pending, removed = self._snapshot()
+
+        def within(a_lo, a_hi, _depth=None):
+            return _point_box_distance(center, a_lo, a_hi) <= radius
+
+        items = self._leaf_items(self._traverse(levels, within), ids, removed)
+        result_ids = np.concatenate([ids[items], pending[0]])
+        distances = np.concatenate([_point_box_distance(center, item_lo[items], item_hi[items]),
+                                    _point_box_distance(center, pending[1], pending[2])])
+        keep = distances <= radius
+        result_ids, distances = result_ids[keep], distances[keep]
+        order = np.argsort(distances, kind="stable")
+        return list(zip(result_ids[order].tolist(), distances[order].tolist()))
+
+    def nearest(self, point, k: int = 1) -> List[Tuple[int, float]]:
+        """距离点最近的k个形状（点到包围盒距离），升序返回 (ID, 距离)"""
+        point = np.asarray(point, dtype=np.float64)
+        ids, item_lo, item_hi, levels, pending, removed = self._snapshot()
+        k = max(1, int(k))
+
+        # 每个节点至少含一个物体，所以第k小的"最远距离"是第k近物体距离的上界
+        def prune(a_lo, a_hi, _depth=None):
+            min_d = _point_box_distance(point, a_lo, a_hi)
+            if len(min_d) <= k:
+                return np.ones(len(min_d), dtype=bool)
+            max_d = _point_box_max_distance(point, a_lo, a_hi)
+            bound = np.partition(max_d, k - 1)[k - 1]
+            return min_d <= bound
+
+        items = self._leaf_items(self._traverse(levels, prune), ids, removed)
+        result_ids = np.concatenate([ids[items], pending[0]])
+        distances = np.concatenate([_point_box_distance(point, item_lo[items], item_hi[items]),
+                                    _point_box_distance(point, pending[1], pending[2])])
+        if len(distances) > k:
+            top = np.argpartition(distances, k - 1)[:k]
+            result_ids, distances = result_ids[top], distances[top]
+        order = np.argsort(distances, kind="stable")
+        return list(zip(result_ids[order].tolist(), distances[order].tolist()))
+
+    def raycast_candidates(self, origin, direction, max_distance: float = np.inf) -> List[Tuple[int, float]]:
+        """射线穿过的形状包围盒，按进入距离升序返回 (ID, 进入距离)"""
+        origin = np.asarray(origin, dtype=np.float64)
+        direction = np.asarray(direction, dtype=np.float64)
+        norm = np.linalg.norm(direction)
+        if norm == 0:
+            raise ValueError("射线方向不能为零向量")
+        direction = direction / norm
+        with np.errstate(divide="ignore"):
+            inv_dir = 1.0 / direction
+        ids, item_lo, item_hi, levels, pending, removed = self._snapshot()
+
+        def hit(a_lo, a_hi, _depth=None):
+            return _ray_box(origin, inv_dir, a_lo, a_hi, max_distance)[0]
+
+        items = self._leaf_items(self._traverse(levels, hit), ids, removed)
+        result_ids = np.concatenate([ids[items], pending[0]])
+        hits, t_near = _ray_box(origin, inv_dir,
+                                np.concatenate([item_lo[items], pending[1]]),
+                                np.concatenate([item_hi[items], pending[2]]), max_distance)
+        result_ids, t_near = result_ids[hits], t_near[hits]
+        order = np.argsort(t_near, kind="stable")
+        return list(zip(result_ids[order].tolist(), t_near[order].tolist()))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "shapes": len(self),
+                "indexed": int(len(self._ids)),
+                "pending": len(self._pending_ids),
+                "removed": len(self._removed),
+                "depth": len(self._levels)
+            }
+
+
+def ray_triangles(origin: np.ndarray, direction: np.ndarray, positions: np.ndarray,
+                  triangles: np.ndarray) -> Optional[float]:
+    """Möller–Trumbore射线-三角形求交（向量化），返回最近交点距离，未相交返回None"""
+    a = positions[triangles[:, 0]]
+    edge1 = positions[triangles[:, 1]] - a
+    edge2 = positions[triangles[:, 2]] - a
+    p = np.cross(direction, edge2)
+    det = (edge1 * p).sum(axis=1)
+    valid = np.abs(det) > 1e-12
+    inv_det = np.divide(1.0, det, out=np.zeros_like(det), where=valid)
+    s = origin - a
+    u = (s * p).sum(axis=1) * inv_det
+    q = np.cross(s, edge1)
+    v = (q @ direction) * inv_det
+    t = (q * edge2).sum(axis=1) * inv_det
+    hit = valid & (u >= 0) & (v >= 0) & (u + v <= 1) & (t >= 0)
+    if not hit.any():
+        return None
+    return float(t[hit].min())
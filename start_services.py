@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """
 启动脚本 - 同时启动FastMCP服务器和Flask应用
+通过就绪检查接口按依赖顺序启动服务，并在服务崩溃后按退避策略重启
 """
 
 import subprocess
@@ -8,19 +9,73 @@ import time
 import signal
 import sys
 import os
-from threading import Thread
+import re
+import urllib.request
+import urllib.error
+from collections import deque
+from importlib import metadata
+from threading import Thread, Lock
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONDA_ACTIVATE = "source /root/miniconda3/bin/activate simulation-env"
+
+# 服务定义：按列表顺序启动，depends_on中的服务就绪后才启动当前服务
+SERVICES = [
+    {
+        "name": "FastMCP服务器",
+        "script": "fastmcp_server.py",
+        "ready_url": "http://localhost:8000/readiness",
+        "depends_on": []
+    },
+    {
+        "name": "Flask应用",
+        "script": "app.py",
+        "ready_url": "http://localhost:6006/readiness",
+        "depends_on": ["FastMCP服务器"]
+    }
+]
+
+READY_TIMEOUT = 60.0        # 等待单个服务就绪的最长时间（秒）
+READY_POLL_INTERVAL = 0.1   # 就绪检查轮询间隔（秒）
+RESTART_BACKOFF_INITIAL = 1.0
+RESTART_BACKOFF_MAX = 30.0
+STABLE_UPTIME = 60.0        # 连续运行超过该时间后重置退避
+OUTPUT_TAIL_LINES = 200     # 每个服务保留的最近输出行数
+
+
+class ManagedService:
+    """被管理的子进程及其输出、重启状态"""
+
+    def __init__(self, spec: dict):
+        self.name = spec["name"]
+        self.script = spec["script"]
+        self.ready_url = spec["ready_url"]
+        self.depends_on = spec.get("depends_on", [])
+        self.process = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.backoff = RESTART_BACKOFF_INITIAL
+        self.next_restart_at = None
+        self.output_tail = deque(maxlen=OUTPUT_TAIL_LINES)
+        self.output_lock = Lock()
+
 
 class ServiceManager:
     def __init__(self):
-        self.processes = []
+        self.services = [ManagedService(spec) for spec in SERVICES]
         self.running = True
-    
+
+    @property
+    def processes(self):
+        """兼容旧接口：(名称, 进程) 列表"""
+        return [(s.name, s.process) for s in self.services if s.process]
+
     def activate_conda_env(self):
         """激活conda环境"""
         print("激活conda环境...")
         try:
             # 激活conda环境
-            activate_cmd = "bash -c 'source /root/miniconda3/bin/activate simulation-env'"
+            activate_cmd = f"bash -c '{CONDA_ACTIVATE}'"
             result = subprocess.run(activate_cmd, shell=True, capture_output=True, text=True)
             if result.returncode != 0:
                 print(f"激活conda环境失败: {result.stderr}")
@@ -30,13 +85,34 @@ class ServiceManager:
         except Exception as e:
             print(f"激活conda环境时出错: {e}")
             return False
-    
+
+    def missing_requirements(self):
+        """返回requirements.txt中尚未安装的依赖"""
+        missing = []
+        requirements_path = os.path.join(BASE_DIR, "requirements.txt")
+        with open(requirements_path, "r", encoding="utf-8") as f:
+            for line in f:
+                requirement = line.split("#", 1)[0].strip()
+                if not requirement:
+                    continue
+                name = re.split(r"[<>=!~\[; ]", requirement, 1)[0]
+                try:
+                    metadata.version(name)
+                except metadata.PackageNotFoundError:
+                    missing.append(requirement)
+        return missing
+
     def install_dependencies(self):
-        """安装缺失的依赖"""
+        """安装缺失的依赖（依赖已满足时跳过pip）"""
         print("检查并安装依赖...")
         try:
-            # 安装flask-socketio
-            install_cmd = "bash -c 'source /root/miniconda3/bin/activate simulation-env && pip install flask-socketio'"
+            missing = self.missing_requirements()
+            if not missing:
+                print("依赖已满足，跳过安装")
+                return True
+            print(f"缺失依赖: {', '.join(missing)}")
+            packages = " ".join(f'"{r}"' for r in missing)
+            install_cmd = f"bash -c '{CONDA_ACTIVATE} && pip install {packages}'"
             result = subprocess.run(install_cmd, shell=True, capture_output=True, text=True)
             if result.returncode != 0:
                 print(f"安装依赖失败: {result.stderr}")
@@ -46,53 +122,109 @@ class ServiceManager:
         except Exception as e:
             print(f"安装依赖时出错: {e}")
             return False
-    
-    def start_fastmcp_server(self):
-        """启动FastMCP服务器"""
-        print("启动FastMCP服务器...")
+
+    def _drain_output(self, service: ManagedService, process: subprocess.Popen):
+        """持续读取子进程输出，避免管道写满导致子进程阻塞"""
+        for line in process.stdout:
+            line = line.rstrip("\n")
+            with service.output_lock:
+                service.output_tail.append(line)
+            print(f"[{service.name}] {line}", flush=True)
+        process.stdout.close()
+
+    def launch(self, service: ManagedService):
+        """启动单个服务进程"""
+        print(f"启动{service.name}...")
+        # exec让python进程替换bash，保证记录的PID就是服务进程本身
+        cmd = ["bash", "-c", f"{CONDA_ACTIVATE} && exec python {service.script}"]
+        with service.output_lock:
+            service.output_tail.clear()
+        process = subprocess.Popen(
+            cmd, cwd=BASE_DIR,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            text=True, bufsize=1
+        )
+        service.process = process
+        service.started_at = time.time()
+        Thread(target=self._drain_output, args=(service, process), daemon=True,
+               name=f"drain-{service.script}").start()
+        print(f"{service.name}已启动 (PID: {process.pid})")
+
+    def is_ready(self, service: ManagedService):
+        """请求服务的就绪检查接口"""
         try:
-            # 使用conda环境启动FastMCP服务器
-            cmd = "bash -c 'source /root/miniconda3/bin/activate simulation-env && python fastmcp_server.py'"
-            process = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            self.processes.append(("FastMCP服务器", process))
-            print(f"FastMCP服务器已启动 (PID: {process.pid})")
-            
-            # 等待一下检查是否启动成功
-            time.sleep(5)
-            if process.poll() is not None:
-                stdout, stderr = process.communicate()
-                print(f"FastMCP服务器启动失败:")
-                print(f"STDOUT: {stdout}")
-                print(f"STDERR: {stderr}")
-                return False
-            return True
-        except Exception as e:
-            print(f"启动FastMCP服务器时出错: {e}")
+            with urllib.request.urlopen(service.ready_url, timeout=1.0) as response:
+                return response.status == 200
+        except (urllib.error.URLError, OSError):
             return False
-    
+
+    def wait_until_ready(self, service: ManagedService, timeout: float = READY_TIMEOUT):
+        """轮询就绪检查接口，服务就绪后立即返回"""
+        deadline = time.time() + timeout
+        while self.running and time.time() < deadline:
+            if service.process.poll() is not None:
+                print(f"{service.name}启动失败 (退出码: {service.process.returncode})")
+                self.print_output_tail(service)
+                return False
+            if self.is_ready(service):
+                print(f"{service.name}已就绪 ({time.time() - service.started_at:.2f}s)")
+                return True
+            time.sleep(READY_POLL_INTERVAL)
+        print(f"{service.name}在{timeout:.0f}秒内未就绪")
+        return False
+
+    def print_output_tail(self, service: ManagedService):
+        with service.output_lock:
+            tail = list(service.output_tail)[-20:]
+        if tail:
+            print(f"{service.name}最近输出:")
+            for line in tail:
+                print(f"  {line}")
+
+    def start_fastmcp_server(self):
+        """启动FastMCP服务器"""
+        return self.start_service(self.services[0])
+
     def start_flask_app(self):
         """启动Flask应用"""
-        print("启动Flask应用...")
+        return self.start_service(self.services[1])
+
+    def start_service(self, service: ManagedService):
+        """启动服务并等待其就绪"""
         try:
-            # 使用conda环境启动Flask应用
-            cmd = "bash -c 'source /root/miniconda3/bin/activate simulation-env && python app.py'"
-            process = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            self.processes.append(("Flask应用", process))
-            print(f"Flask应用已启动 (PID: {process.pid})")
-            
-            # 等待一下检查是否启动成功
-            time.sleep(5)
-            if process.poll() is not None:
-                stdout, stderr = process.communicate()
-                print(f"Flask应用启动失败:")
-                print(f"STDOUT: {stdout}")
-                print(f"STDERR: {stderr}")
-                return False
-            return True
+            self.launch(service)
+            return self.wait_until_ready(service)
         except Exception as e:
-            print(f"启动Flask应用时出错: {e}")
+            print(f"启动{service.name}时出错: {e}")
             return False
-    
+
+    def schedule_restart(self, service: ManagedService):
+        """服务退出后按指数退避安排重启"""
+        uptime = time.time() - service.started_at
+        if uptime >= STABLE_UPTIME:
+            service.backoff = RESTART_BACKOFF_INITIAL
+        print(f"{service.name}已停止 (退出码: {service.process.returncode}，运行{uptime:.1f}s)，"
+              f"{service.backoff:.0f}秒后重启")
+        self.print_output_tail(service)
+        service.next_restart_at = time.time() + service.backoff
+        service.backoff = min(service.backoff * 2, RESTART_BACKOFF_MAX)
+
+    def supervise(self):
+        """监控子进程，崩溃后按退避策略重启"""
+        while self.running:
+            time.sleep(0.5)
+            for service in self.services:
+                if not self.running:
+                    break
+                if service.next_restart_at is not None:
+                    if time.time() >= service.next_restart_at:
+                        service.next_restart_at = None
+                        service.restarts += 1
+                        print(f"重启{service.name} (第{service.restarts}次)")
+                        self.launch(service)
+                elif service.process and service.process.poll() is not None:
+                    self.schedule_restart(service)
+
     def start_services(self):
         """启动所有服务"""
         try:
@@ -100,82 +232,78 @@ class ServiceManager:
             if not self.activate_conda_env():
                 print("激活conda环境失败，停止启动流程")
                 return False
-            
+
             # 安装依赖
             if not self.install_dependencies():
                 print("安装依赖失败，停止启动流程")
                 return False
-            
-            # 启动FastMCP服务器
-            if not self.start_fastmcp_server():
-                print("FastMCP服务器启动失败，停止启动流程")
-                return False
-            
-            time.sleep(3)  # 等待FastMCP服务器完全启动
-            
-            # 启动Flask应用
-            if not self.start_flask_app():
-                print("Flask应用启动失败，停止启动流程")
-                return False
-            
+
+            # 按依赖顺序启动：依赖的服务就绪后立即启动下一个
+            started = time.time()
+            for service in self.services:
+                dependencies = [d for d in self.services if d.name in service.depends_on]
+                not_ready = [d.name for d in dependencies if not self.is_ready(d)]
+                if not_ready:
+                    print(f"{service.name}依赖的服务未就绪: {', '.join(not_ready)}")
+                    self.stop_services()
+                    return False
+                if not self.start_service(service):
+                    print(f"{service.name}启动失败，停止启动流程")
+                    self.stop_services()
+                    return False
+
             print("\n" + "="*50)
-            print("所有服务已启动:")
+            print(f"所有服务已启动 (耗时 {time.time() - started:.2f}s):")
             print("- FastMCP服务器: http://localhost:8000")
             print("- Flask应用: http://localhost:6006")
             print("="*50)
             print("按 Ctrl+C 停止所有服务")
-            
-            # 等待进程
-            while self.running:
-                time.sleep(1)
-                # 检查进程是否还在运行
-                for name, process in self.processes:
-                    if process.poll() is not None:
-                        stdout, stderr = process.communicate()
-                        print(f"{name}已停止 (退出码: {process.returncode})")
-                        if stderr:
-                            print(f"{name}错误输出: {stderr}")
-                        self.running = False
-                        break
-                        
+
+            self.supervise()
+            return True
+
         except KeyboardInterrupt:
             print("\n正在停止所有服务...")
             self.stop_services()
-    
+
     def stop_services(self):
-        """停止所有服务"""
-        for name, process in self.processes:
+        """停止所有服务（按启动的逆序）"""
+        self.running = False
+        for service in reversed(self.services):
+            process = service.process
+            if not process or process.poll() is not None:
+                continue
             try:
-                print(f"正在停止{name}...")
+                print(f"正在停止{service.name}...")
                 process.terminate()
                 process.wait(timeout=5)
-                print(f"{name}已停止")
+                print(f"{service.name}已停止")
             except subprocess.TimeoutExpired:
-                print(f"强制停止{name}...")
+                print(f"强制停止{service.name}...")
                 process.kill()
             except Exception as e:
-                print(f"停止{name}时出错: {e}")
-    
+                print(f"停止{service.name}时出错: {e}")
+
     def signal_handler(self, signum, frame):
         """信号处理器"""
         print(f"\n收到信号 {signum}，正在停止服务...")
-        self.running = False
         self.stop_services()
         sys.exit(0)
 
 def main():
-    # 注册信号处理器
-    signal.signal(signal.SIGINT, lambda s, f: None)  # 忽略Ctrl+C，让ServiceManager处理
-    
     manager = ServiceManager()
-    manager.signal_handler = lambda s, f: manager.signal_handler(s, f)
-    
+
+    # 注册信号处理器
+    signal.signal(signal.SIGINT, manager.signal_handler)
+    signal.signal(signal.SIGTERM, manager.signal_handler)
+
     try:
-        manager.start_services()
+        if manager.start_services() is False:
+            sys.exit(1)
     except Exception as e:
         print(f"启动服务时出错: {e}")
         manager.stop_services()
         sys.exit(1)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -9,6 +9,14 @@ let shapes = [];
 let simulationObjects = [];
 let isSimulating = false;
 let simulationAnimationId = null;
+// 实时仿真：服务端快照缓冲，渲染时在相邻快照之间插值
+let liveSim = {
+    state: 'stopped',
+    ids: [],
+    snapshots: [],
+    clockOffset: null,
+    interpolationDelay: 0.1
+};
 let initialized = false;
 
 // 初始化
@@ -150,6 +158,217 @@ function addGrid() {
     scene.add(gridHelper);
 }
 
+// 当前标签页的场景会话ID
+function getSceneSessionId() {
+    let sessionId = sessionStorage.getItem('scene_session_id');
+    if (!sessionId) {
+        sessionId = 'scene-' + Date.now().toString(36) + '-' + Math.random().toString(36).slice(2, 10);
+        sessionStorage.setItem('scene_session_id', sessionId);
+    }
+    return sessionId;
+}
+
+// 收到新形状
+function onShapeCreated(data) {
+    console.log('=== SHAPE_CREATED EVENT RECEIVED ===');
+    console.log('Raw data:', data);
+    console.log('Data type:', typeof data);
+    console.log('Data structure:', JSON.stringify(data, null, 2));
+    
+    // 检查数据格式
+    if (data && typeof data === 'object') {
+        console.log('Data is valid object');
+        if (data.type) {
+            console.log('Shape type found:', data.type);
+        } else {
+            console.log('No shape type found in data');
+        }
+    } else {
+        console.error('Invalid data format:', data);
+        return;
+    }
+    
+    createShapeFromData(data);
+}
+
+// 服务端列主序的4x4变换分解为Three.js的位置、旋转和缩放
+function applyShapeTransform(obj, elements) {
+    const matrix = new THREE.Matrix4().fromArray(elements);
+    matrix.decompose(obj.position, obj.quaternion, obj.scale);
+}
+
+// 形状被移动或设置了新的变换
+function onShapeTransformed(data) {
+    if (!data || !Array.isArray(data.transform)) {
+        return;
+    }
+    const obj = objects.find(o => o.userData.id === data.id);
+    if (obj) {
+        applyShapeTransform(obj, data.transform);
+    }
+}
+
+// 从场景中移除一个形状
+function removeShapeObject(obj) {
+    scene.remove(obj);
+    objects = objects.filter(o => o !== obj);
+    if (selectedObject === obj) {
+        selectedObject = null;
+    }
+}
+
+// 形状被修改：差量含lods时几何已重建，按新参数替换网格（保留当前变换），否则只更新变换
+function onShapeUpdated(data) {
+    if (!data) {
+        return;
+    }
+    const obj = objects.find(o => o.userData.id === data.id);
+    if (!obj) {
+        return;
+    }
+    if (Array.isArray(data.lods)) {
+        obj.updateMatrix();
+        removeShapeObject(obj);
+        createShapeFromData(Object.assign({ transform: obj.matrix.toArray() }, data));
+    } else if (Array.isArray(data.transform)) {
+        applyShapeTransform(obj, data.transform);
+    }
+}
+
+// 形状被删除
+function onShapeDeleted(data) {
+    const obj = data && objects.find(o => o.userData.id === data.id);
+    if (obj) {
+        removeShapeObject(obj);
+    }
+}
+
+// 实时仿真状态变化（开始、暂停、停止等）
+function onLiveStatus(status) {
+    if (!status || !status.state) {
+        return;
+    }
+    const previous = liveSim.state;
+    liveSim.state = status.state;
+    if (Array.isArray(status.ids)) {
+        liveSim.ids = status.ids;
+    }
+    if (status.snapshot_rate) {
+        // 插值延迟取两个快照间隔，保证渲染时刻两侧都有快照
+        liveSim.interpolationDelay = 2 / status.snapshot_rate;
+    }
+    if (status.state === 'stopped') {
+        liveSim.snapshots = [];
+        liveSim.clockOffset = null;
+    }
+    updateLiveButtons();
+    if (previous !== status.state) {
+        addChatMessage('系统', `实时仿真: ${status.state}（${status.bodies || 0}个物体，${status.speed || 1}x）`, 'bot');
+    }
+}
+
+// 实时仿真快照：按服务端时间戳缓存，渲染循环中插值
+function onLiveFrame(frame) {
+    if (!frame || !Array.isArray(frame.positions)) {
+        return;
+    }
+    const offset = Date.now() / 1000 - frame.server_time;
+    // 时钟偏移取观测到的最小值（网络延迟最小的那一帧），避免抖动影响插值时刻
+    liveSim.clockOffset = liveSim.clockOffset === null ? offset : Math.min(liveSim.clockOffset, offset);
+    liveSim.snapshots.push(frame);
+    if (liveSim.snapshots.length > 30) {
+        liveSim.snapshots.shift();
+    }
+    // 暂停或单步时直接显示最新位置
+    if (liveSim.state !== 'running') {
+        applyLivePositions(frame.positions, frame.positions, 0);
+    }
+}
+
+function applyLivePositions(from, to, alpha) {
+    const byId = new Map(objects.map(obj => [obj.userData.id, obj]));
+    liveSim.ids.forEach((id, index) => {
+        const obj = byId.get(id);
+        const i = index * 3;
+        if (!obj || i + 2 >= to.length) {
+            return;
+        }
+        obj.position.set(
+            from[i] + (to[i] - from[i]) * alpha,
+            from[i + 1] + (to[i + 1] - from[i + 1]) * alpha,
+            from[i + 2] + (to[i + 2] - from[i + 2]) * alpha
+        );
+    });
+}
+
+// 在渲染时刻（当前时间减去插值延迟）两侧的快照之间线性插值
+function updateLiveInterpolation() {
+    const snapshots = liveSim.snapshots;
+    if (liveSim.state !== 'running' || snapshots.length === 0) {
+        return;
+    }
+    const renderTime = Date.now() / 1000 - liveSim.clockOffset - liveSim.interpolationDelay;
+    while (snapshots.length > 2 && snapshots[1].server_time <= renderTime) {
+        snapshots.shift();
+    }
+    const a = snapshots[0];
+    const b = snapshots.length > 1 ? snapshots[1] : a;
+    const span = b.server_time - a.server_time;
+    const alpha = span > 0 ? Math.min(Math.max((renderTime - a.server_time) / span, 0), 1) : 1;
+    applyLivePositions(a.positions, b.positions, alpha);
+}
+
+function liveControl(action, params = {}) {
+    if (!socket) {
+        return;
+    }
+    socket.emit('live_control', Object.assign({ action: action }, params));
+}
+
+function updateLiveButtons() {
+    const toggle = document.getElementById('live-toggle');
+    if (toggle) {
+        toggle.innerHTML = liveSim.state === 'running'
+            ? '<i class="fas fa-pause"></i>暂停'
+            : '<i class="fas fa-play"></i>实时仿真';
+    }
+}
+
+// 服务端把超过阈值的事件压缩为二进制附件：{__compressed__: 'deflate', data: ArrayBuffer}，解压后是原参数列表的JSON。
+// 解压是异步的，所有服务端事件经同一个Promise链按到达顺序交给处理函数
+let socketEventChain = Promise.resolve();
+
+function inflateEventArgs(args) {
+    const envelope = args[0];
+    if (args.length !== 1 || !envelope || envelope.__compressed__ !== 'deflate') {
+        return Promise.resolve(args);
+    }
+    const stream = new Blob([envelope.data]).stream().pipeThrough(new DecompressionStream('deflate'));
+    return new Response(stream).text().then(JSON.parse);
+}
+
+function onServerEvent(event, handler) {
+    socket.on(event, function(...args) {
+        socketEventChain = socketEventChain
+            .then(function() { return inflateEventArgs(args); })
+            .then(function(decoded) { handler(...decoded); })
+            .catch(function(error) { console.error('处理服务端事件失败:', event, error); });
+    });
+}
+
+// scene_update中各类场景事件的处理函数
+const SCENE_EVENT_HANDLERS = {
+    shape_created: onShapeCreated,
+    shape_transformed: onShapeTransformed,
+    shape_updated: onShapeUpdated,
+    shape_deleted: onShapeDeleted,
+    live_status: onLiveStatus,
+    simulation_result: function(data) {
+        console.log('Simulation result:', data);
+        displaySimulationResult(data);
+    }
+};
+
 // 初始化WebSocket连接
 function initSocket() {
     console.log('开始初始化WebSocket连接...');
@@ -161,7 +380,8 @@ function initSocket() {
         return;
     }
     
-    socket = io();
+    // 场景会话ID保存在sessionStorage中，刷新页面后重连到同一个场景
+    socket = io({ auth: { session_id: getSceneSessionId() } });
     console.log('Socket.IO客户端创建完成');
     
     socket.on('connect', function() {
@@ -174,34 +394,31 @@ function initSocket() {
         addChatMessage('系统', '与服务器断开连接', 'bot');
     });
 
-    socket.on('shape_created', function(data) {
-        console.log('=== SHAPE_CREATED EVENT RECEIVED ===');
-        console.log('Raw data:', data);
-        console.log('Data type:', typeof data);
-        console.log('Data structure:', JSON.stringify(data, null, 2));
-        
-        // 检查数据格式
-        if (data && typeof data === 'object') {
-            console.log('Data is valid object');
-            if (data.type) {
-                console.log('Shape type found:', data.type);
+    onServerEvent('shape_created', onShapeCreated);
+    onServerEvent('shape_transformed', onShapeTransformed);
+    onServerEvent('shape_updated', onShapeUpdated);
+    onServerEvent('shape_deleted', onShapeDeleted);
+
+    onServerEvent('simulation_result', SCENE_EVENT_HANDLERS.simulation_result);
+
+    onServerEvent('live_status', onLiveStatus);
+    onServerEvent('live_frame', onLiveFrame);
+
+    // 同一场景中其他连接、REST请求或聊天工具调用产生的场景事件，合并为一条scene_update
+    onServerEvent('scene_update', function(update) {
+        const events = (update && update.events) || [];
+        console.log('场景更新，事件数:', events.length);
+        events.forEach(function(entry) {
+            const handler = SCENE_EVENT_HANDLERS[entry.event];
+            if (handler) {
+                handler(entry.data);
             } else {
-                console.log('No shape type found in data');
+                console.warn('未知的场景事件:', entry.event);
             }
-        } else {
-            console.error('Invalid data format:', data);
-            return;
-        }
-        
-        createShapeFromData(data);
-    });
-
-    socket.on('simulation_result', function(data) {
-        console.log('Simulation result:', data);
-        displaySimulationResult(data);
+        });
     });
 
-    socket.on('simulation_started', function(data) {
+    onServerEvent('simulation_started', function(data) {
         console.log('=== SIMULATION_STARTED EVENT RECEIVED ===');
         console.log('Raw data:', data);
         console.log('Data type:', typeof data);
@@ -221,12 +438,12 @@ function initSocket() {
     });
 
     // 流式对话事件监听器
-    socket.on('chat_start', function(data) {
+    onServerEvent('chat_start', function(data) {
         console.log('Chat started:', data);
         // 可以在这里添加开始聊天的UI指示
     });
 
-    socket.on('chat_message', function(data) {
+    onServerEvent('chat_message', function(data) {
         console.log('Chat message received:', data);
         const messageId = `ai_${data.session_id}`;
         
@@ -250,13 +467,13 @@ function initSocket() {
         }
     });
 
-    socket.on('chat_complete', function(data) {
+    onServerEvent('chat_complete', function(data) {
         console.log('Chat completed:', data);
         const messageId = `ai_${data.session_id}`;
         hideTypingIndicator(messageId);
     });
 
-    socket.on('chat_error', function(data) {
+    onServerEvent('chat_error', function(data) {
         console.error('Chat error:', data);
         const messageId = `ai_${data.session_id}`;
         hideTypingIndicator(messageId);
@@ -264,13 +481,13 @@ function initSocket() {
     });
 
     // MCP相关事件监听器
-    socket.on('chat_response', function(data) {
+    onServerEvent('chat_response', function(data) {
         console.log('Chat response:', data);
         const messageId = `ai_${data.session_id}`;
         updateChatMessage(messageId, data.response);
     });
 
-    socket.on('simulation_response', function(data) {
+    onServerEvent('simulation_response', function(data) {
         console.log('Simulation response:', data);
         // 处理仿真响应
         if (data.data && data.data.type) {
@@ -278,24 +495,29 @@ function initSocket() {
         }
     });
 
-    socket.on('simulation_error', function(data) {
+    onServerEvent('simulation_error', function(data) {
         console.error('Simulation error:', data);
         addChatMessage('系统', `仿真错误: ${data.error}`, 'bot');
     });
 
-    socket.on('error', function(data) {
+    onServerEvent('error', function(data) {
         console.error('WebSocket error:', data);
         hideLoading(); // 隐藏加载状态
         addChatMessage('系统', `WebSocket错误: ${data.message || '未知错误'}`, 'bot');
     });
 
+    // 性能分析结果（请求中带 profile/timings 标志时返回）
+    onServerEvent('profile_result', function(data) {
+        console.log('性能分析结果:', data.event, data.timings, data.profile_id);
+    });
+
     // 工具调用事件监听器
-    socket.on('tool_call_start', function(data) {
+    onServerEvent('tool_call_start', function(data) {
         console.log('工具调用开始:', data);
         addToolCallMessage(data.tool, data.params, null, 'start');
     });
 
-    socket.on('tool_call_complete', function(data) {
+    onServerEvent('tool_call_complete', function(data) {
         console.log('工具调用完成:', data);
         updateToolCallMessage(data.tool, data.params, data.success, data.result || data.error);
     });
@@ -356,6 +578,26 @@ function initEventListeners() {
         console.log('碰撞仿真按钮事件监听器添加完成');
     }
     
+    // 实时仿真控制
+    const liveToggleBtn = document.getElementById('live-toggle');
+    const liveStepBtn = document.getElementById('live-step');
+    const liveStopBtn = document.getElementById('live-stop');
+    if (liveToggleBtn) {
+        liveToggleBtn.addEventListener('click', function() {
+            liveControl(liveSim.state === 'running' ? 'pause' : 'start');
+        });
+    }
+    if (liveStepBtn) {
+        liveStepBtn.addEventListener('click', function() {
+            liveControl('step', { steps: 1 });
+        });
+    }
+    if (liveStopBtn) {
+        liveStopBtn.addEventListener('click', function() {
+            liveControl('stop');
+        });
+    }
+    
     if (clearSceneBtn) {
         clearSceneBtn.addEventListener('click', clearScene);
         console.log('清空场景按钮事件监听器添加完成');
@@ -670,22 +912,9 @@ function createShapeFromData(data) {
     console.log('形状类型:', shapeType);
     console.log('形状数据键:', Object.keys(shapeData));
     
-    let geometry, material, mesh;
+    let material, mesh;
     
-    if (shapeType === 'cube') {
-        const size = shapeData.size || shapeData.parameters?.size || 1.0;
-        geometry = new THREE.BoxGeometry(size, size, size);
-        console.log('创建立方体，尺寸:', size);
-    } else if (shapeType === 'sphere') {
-        const radius = shapeData.radius || shapeData.parameters?.radius || 1.0;
-        geometry = new THREE.SphereGeometry(radius, 32, 32);
-        console.log('创建球体，半径:', radius);
-    } else if (shapeType === 'cylinder') {
-        const radius = shapeData.radius || shapeData.parameters?.radius || 1.0;
-        const height = shapeData.height || shapeData.parameters?.height || 2.0;
-        geometry = new THREE.CylinderGeometry(radius, radius, height, 32);
-        console.log('创建圆柱体，半径:', radius, '高度:', height);
-    } else {
+    if (!['cube', 'sphere', 'cylinder'].includes(shapeType)) {
         console.error('未知的形状类型:', shapeType);
         return;
     }
@@ -696,17 +925,40 @@ function createShapeFromData(data) {
         opacity: 0.8
     });
     
-    mesh = new THREE.Mesh(geometry, material);
+    const lods = Array.isArray(shapeData.lods) ? shapeData.lods : [];
+    if (lods.length > 1) {
+        // 服务端给出的LOD链：按本地相机和视口计算切换距离，由THREE.LOD在渲染时自动切换
+        mesh = new THREE.LOD();
+        lods.forEach(level => {
+            const levelMesh = new THREE.Mesh(buildShapeGeometry(shapeType, shapeData, level.segments), material);
+            levelMesh.castShadow = true;
+            levelMesh.receiveShadow = true;
+            mesh.addLevel(levelMesh, lodSwitchDistance(level.geometric_error));
+        });
+        // 共享材质挂在LOD上，线框/实体切换对所有级别生效
+        mesh.material = material;
+        console.log('创建LOD形状，级别分段数:', lods.map(level => level.segments));
+    } else {
+        const segments = shapeData.segments || shapeData.parameters?.segments || 32;
+        mesh = new THREE.Mesh(buildShapeGeometry(shapeType, shapeData, segments), material);
+    }
+    
     mesh.castShadow = true;
     mesh.receiveShadow = true;
-    mesh.userData = { type: shapeType, id: shapeData.id || Date.now() };
+    mesh.userData = { type: shapeType, id: shapeData.id ?? Date.now() };
     
-    // 随机位置
-    mesh.position.set(
-        (Math.random() - 0.5) * 10,
-        Math.random() * 5 + 1,
-        (Math.random() - 0.5) * 10
-    );
+    // 使用服务端分配的变换（空间查询和碰撞基于该变换），旧数据没有transform/position时随机摆放
+    if (Array.isArray(shapeData.transform) && shapeData.transform.length === 16) {
+        applyShapeTransform(mesh, shapeData.transform);
+    } else if (Array.isArray(shapeData.position) && shapeData.position.length === 3) {
+        mesh.position.set(shapeData.position[0], shapeData.position[1], shapeData.position[2]);
+    } else {
+        mesh.position.set(
+            (Math.random() - 0.5) * 10,
+            Math.random() * 5 + 1,
+            (Math.random() - 0.5) * 10
+        );
+    }
     
     scene.add(mesh);
     objects.push(mesh);
@@ -731,6 +983,31 @@ function createShapeFromData(data) {
     addChatMessage('系统', `已创建${getShapeName(shapeType)}`, 'bot');
 }
 
+// 按分段数生成形状几何体
+function buildShapeGeometry(shapeType, shapeData, segments) {
+    if (shapeType === 'cube') {
+        const size = shapeData.size || shapeData.parameters?.size || 1.0;
+        return new THREE.BoxGeometry(size, size, size);
+    }
+    const radius = shapeData.radius || shapeData.parameters?.radius || 1.0;
+    if (shapeType === 'sphere') {
+        return new THREE.SphereGeometry(radius, segments, segments);
+    }
+    const height = shapeData.height || shapeData.parameters?.height || 2.0;
+    return new THREE.CylinderGeometry(radius, radius, height, segments);
+}
+
+// 几何误差投影到屏幕上不超过LOD_PIXEL_ERROR像素时的相机距离
+const LOD_PIXEL_ERROR = 1.0;
+function lodSwitchDistance(geometricError) {
+    if (!geometricError) {
+        return 0;
+    }
+    const height = renderer ? renderer.domElement.clientHeight || renderer.domElement.height : 1080;
+    const fov = THREE.MathUtils.degToRad(camera ? camera.fov : 75);
+    return geometricError * height / (2 * Math.tan(fov / 2) * LOD_PIXEL_ERROR);
+}
+
 // 获取形状名称
 function getShapeName(type) {
     const names = {
@@ -797,6 +1074,12 @@ function displaySimulationResult(data) {
     
     console.log('仿真类型:', data.type);
     
+    if (data.type === 'gravity' && data.run_id && !data.positions) {
+        // 轨迹已持久化到服务器，按需分段拉取
+        loadSimulationFrames(data);
+        return;
+    }
+    
     if (data.type === 'gravity') {
         console.log('处理重力仿真数据');
         let html = '<h4>重力仿真结果</h4>';
@@ -836,6 +1119,33 @@ function displaySimulationResult(data) {
     }
 }
 
+// 从服务器拉取持久化的仿真帧
+function loadSimulationFrames(data) {
+    const stride = Math.max(1, Math.ceil(data.time_steps / 1000));
+    fetch(`/api/simulation/${data.run_id}/frames?stride=${stride}`, {
+        headers: { 'X-Session-ID': getSceneSessionId() }
+    })
+        .then(response => response.json())
+        .then(result => {
+            if (!result.success) {
+                addChatMessage('系统', `读取仿真帧失败: ${result.error}`, 'bot');
+                return;
+            }
+            // 只取第一个物体的轨迹用于回放
+            const frames = result.data;
+            displaySimulationResult({
+                type: 'gravity',
+                run_id: data.run_id,
+                time_steps: data.time_steps,
+                positions: frames.positions.map(frame => frame[0]),
+                velocities: frames.velocities.map(frame => frame[0])
+            });
+        })
+        .catch(error => {
+            console.error('读取仿真帧失败:', error);
+        });
+}
+
 // 创建动画球体
 function createAnimatedSphere(data) {
     console.log('=== CREATE_ANIMATED_SPHERE CALLED ===');
@@ -962,7 +1272,9 @@ function onMouseClick(event) {
     const intersects = raycaster.intersectObjects(objects);
     
     if (intersects.length > 0) {
-        selectedObject = intersects[0].object;
+        // 命中的是LOD中的某一级网格时，选中整个LOD对象
+        const hit = intersects[0].object;
+        selectedObject = hit.parent && hit.parent.isLOD ? hit.parent : hit;
         updateObjectInfo();
     } else {
         selectedObject = null;
@@ -1001,6 +1313,8 @@ function onWindowResize() {
 function animate() {
     requestAnimationFrame(animate);
     
+    updateLiveInterpolation();
+    
     // 仿真动画推进
     objects.forEach(obj => {
         // 重力仿真动画
@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# 测试中创建的轨迹运行、会话快照、性能分析和导出文件写到临时目录，不污染 data/
+_DATA_DIR = tempfile.mkdtemp(prefix="sim-platform-tests-")
+os.environ.setdefault("TRAJECTORY_DIR", os.path.join(_DATA_DIR, "trajectories"))
+os.environ.setdefault("SESSION_SNAPSHOT_DIR", os.path.join(_DATA_DIR, "sessions"))
+os.environ.setdefault("PROFILE_DIR", os.path.join(_DATA_DIR, "profiles"))
+os.environ.setdefault("EXPORT_DIR", os.path.join(_DATA_DIR, "exports"))
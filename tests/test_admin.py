@@ -0,0 +1,23 @@
+import pytest
+
+import app as app_module
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app_module, "start_background_warmup", lambda: None)
+    return app_module.app.test_client()
+
+
+def test_admin_sessions_denied_without_configured_token(client, monkeypatch):
+    monkeypatch.setattr(app_module, "ADMIN_TOKEN", None)
+    assert client.get("/api/admin/sessions").status_code == 403
+    assert client.get("/api/admin/sessions", headers={"X-Admin-Token": ""}).status_code == 403
+
+
+def test_admin_sessions_require_matching_token(client, monkeypatch):
+    monkeypatch.setattr(app_module, "ADMIN_TOKEN", "secret")
+    assert client.get("/api/admin/sessions", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    response = client.get("/api/admin/sessions", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert response.get_json()["success"]
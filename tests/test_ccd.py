@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+import ccd
+from live_simulation import LiveWorld
+
+PAIRS = 50
+RADIUS = 0.1
+DURATION = 0.4
+# 小步长参考解，离散检测在该步长下不会漏碰撞
+REFERENCE_DT = 1.0 / 4000
+# 位置误差允许值（米）
+POSITION_TOLERANCE = 0.02
+
+
+def _head_on_world(dt, use_ccd):
+    """PAIRS对相向运动的球，各对在z方向分开互不干扰，无重力、远离地面"""
+    speeds = np.random.default_rng(0).uniform(15.0, 40.0, PAIRS)
+    positions = np.zeros((2 * PAIRS, 3))
+    positions[:PAIRS, 0] = -1.0
+    positions[PAIRS:, 0] = 1.0
+    positions[:, 1] = 5.0
+    positions[:PAIRS, 2] = positions[PAIRS:, 2] = np.arange(PAIRS)
+    world = LiveWorld(positions, np.full(2 * PAIRS, RADIUS), gravity=0.0, ground=-1e9, ccd=use_ccd)
+    world.vel[:PAIRS, 0] = speeds
+    world.vel[PAIRS:, 0] = -speeds
+    for _ in range(int(round(DURATION / dt))):
+        world.step(dt)
+    return world
+
+
+def _tunnelled(world):
+    """左侧球最终跑到右侧球另一边的对数"""
+    return int((world.pos[:PAIRS, 0] > world.pos[PAIRS:, 0]).sum())
+
+
+@pytest.fixture(scope="module")
+def reference():
+    world = _head_on_world(REFERENCE_DT, use_ccd=False)
+    assert _tunnelled(world) == 0
+    return world
+
+
+@pytest.mark.parametrize("dt", [1.0 / 30, 1.0 / 60])
+def test_ccd_large_step_matches_reference(reference, dt):
+    world = _head_on_world(dt, use_ccd=True)
+    assert _tunnelled(world) == 0
+    assert world.swept_contacts > 0
+    assert np.abs(world.pos - reference.pos).max() < POSITION_TOLERANCE
+
+
+def test_discrete_large_step_tunnels():
+    world = _head_on_world(1.0 / 30, use_ccd=False)
+    assert _tunnelled(world) > PAIRS // 2
+
+
+def test_discrete_needs_many_more_steps(reference):
+    # CCD用1/30秒即可达到参考精度；离散检测用4倍步数（1/120秒）仍有约一半的对穿透，
+    # 穿透的球保持原速度继续飞行，末位置偏离参考解数米（远超POSITION_TOLERANCE）
+    world = _head_on_world(1.0 / 120, use_ccd=False)
+    assert _tunnelled(world) >= PAIRS // 4
+    assert np.abs(world.pos - reference.pos).max() > 1.0
+
+
+def test_swept_sphere_toi_head_on():
+    center_a = np.array([[-1.0, 0.0, 0.0]])
+    center_b = np.array([[1.0, 0.0, 0.0]])
+    # b相对a在本步内移动4米，中心距降到0.2（半径和）时接触
+    toi = ccd.swept_sphere_toi(center_a, center_b, np.array([0.2]), np.array([[-4.0, 0.0, 0.0]]))
+    assert toi[0] == pytest.approx(1.8 / 4.0)
+    # 相互远离时不会接触
+    away = ccd.swept_sphere_toi(center_a, center_b, np.array([0.2]), np.array([[4.0, 0.0, 0.0]]))
+    assert np.isinf(away[0])
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+import mesh_lod
+from mesh_processing import face_cross, vertex_normals
+from simulation_service import MCPService, ShapeType
+
+
+@pytest.fixture(scope="module")
+def service():
+    return MCPService()
+
+
+def _face_units(mesh):
+    cross = face_cross(mesh.positions, mesh.triangles)
+    return cross / np.linalg.norm(cross, axis=1, keepdims=True)
+
+
+def test_cube_has_flat_faces(service):
+    mesh = service._create_geometry(ShapeType.CUBE, {"size": 2.0}, None)
+    assert mesh.vertex_count == 24
+    # 每个角的顶点法线等于所在面的法线，且是坐标轴方向
+    faces = _face_units(mesh)
+    for i in range(3):
+        np.testing.assert_allclose(mesh.normals[mesh.triangles[:, i]], faces, atol=1e-12)
+    np.testing.assert_allclose(np.abs(mesh.normals).max(axis=1), 1.0)
+
+
+def test_cylinder_caps_split_from_sides(service):
+    mesh = service._create_geometry(ShapeType.CYLINDER, {"radius": 1.0, "height": 2.0}, 32)
+    on_cap = np.isclose(np.abs(mesh.normals[:, 2]), 1.0)
+    assert on_cap.sum() == 64
+    side = mesh.normals[~on_cap]
+    np.testing.assert_allclose(side[:, 2], 0.0, atol=1e-12)
+    np.testing.assert_allclose(side[:, :2], mesh.positions[~on_cap, :2], atol=0.01)
+
+
+def test_sphere_stays_smooth(service):
+    mesh = service._create_geometry(ShapeType.SPHERE, {"radius": 2.0}, 32)
+    assert mesh.vertex_count == 32 * 31 + 2
+    np.testing.assert_allclose(mesh.normals, mesh.positions / 2.0, atol=0.01)
+
+
+@pytest.mark.parametrize("shape_type,segments", [
+    (ShapeType.CUBE, None), (ShapeType.SPHERE, 6), (ShapeType.SPHERE, 16),
+    (ShapeType.CYLINDER, 3), (ShapeType.CYLINDER, 6), (ShapeType.CYLINDER, 32)])
+def test_lod_vertex_count_matches_mesh(service, shape_type, segments):
+    mesh = service._create_geometry(shape_type, {}, segments)
+    assert mesh_lod.vertex_count(shape_type.value, segments) == mesh.vertex_count
+    assert mesh_lod.triangle_count(shape_type.value, segments) == mesh.triangle_count
+
+
+def test_smooth_normals_do_not_depend_on_triangulation(service):
+    # 不拆分顶点时，立方体8个角的法线应为对角线方向；面积加权时按四边形的对角线剖分会偏向一侧
+    positions, faces = service._create_cube(2.0)
+    triangles = np.concatenate([faces[:, [0, 1, 2]], faces[:, [0, 2, 3]]])
+    normals = vertex_normals(positions.astype(np.float64), triangles)
+    np.testing.assert_allclose(normals, positions / np.linalg.norm(positions, axis=1, keepdims=True), atol=1e-12)
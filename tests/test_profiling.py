@@ -0,0 +1,60 @@
+import pytest
+
+import app as app_module
+import profiling
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(app_module, "ADMIN_TOKEN", "secret")
+    # 测试不连接Ollama和FastMCP
+    monkeypatch.setattr(app_module, "start_background_warmup", lambda: None)
+    return app_module.app.test_client()
+
+
+def test_profile_header_ignored_when_disabled(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", False)
+    response = client.get("/api/status", headers={"X-Profile": "cprofile", "X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response.headers
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_profile_header_requires_admin_token(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    response = client.get("/api/status", headers={"X-Profile": "cprofile", "X-Admin-Token": "wrong"})
+    assert "X-Profile-Id" not in response.headers
+    assert list(tmp_path.iterdir()) == []
+
+    response = client.get("/api/status", headers={"X-Profile": "cprofile", "X-Admin-Token": "secret"})
+    assert response.headers["X-Profile-Id"].endswith(".pstats")
+    assert (tmp_path / response.headers["X-Profile-Id"]).exists()
+
+
+def test_timing_header_needs_no_privileges(client, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", False)
+    response = client.get("/api/status", headers={"X-Timing": "1"})
+    assert "Server-Timing" in response.headers
+    assert "timings" in response.get_json()
+
+
+def test_profiles_endpoints_denied_without_configured_token(client, tmp_path, monkeypatch):
+    (tmp_path / "request.pstats").write_bytes(b"")
+    monkeypatch.setattr(app_module, "ADMIN_TOKEN", None)
+    assert client.get("/api/admin/profiles").status_code == 403
+    assert client.get("/api/admin/profiles/request.pstats?format=text").status_code == 403
+
+
+def test_profile_header_ignored_without_configured_token(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(app_module, "ADMIN_TOKEN", None)
+    response = client.get("/api/status", headers={"X-Profile": "cprofile"})
+    assert "X-Profile-Id" not in response.headers
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_profiles_listed_with_admin_token(client):
+    response = client.get("/api/admin/profiles", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert response.get_json()["success"]
@@ -0,0 +1,33 @@
+from scene_registry import SceneRegistry
+from simulation_service import MCPService
+
+
+def _create_cube(service):
+    result = service.create_shape("cube", {"size": 1.0})
+    assert result["success"], result
+    return result["data"]["id"]
+
+
+def test_deleted_ids_not_reused_after_eviction(tmp_path):
+    registry = SceneRegistry(MCPService(), snapshot_dir=str(tmp_path))
+    service = registry.get("ids-deleted")
+    assert [_create_cube(service) for _ in range(3)] == [0, 1, 2]
+    assert service.delete_shape(2)["success"]
+
+    registry.evict("ids-deleted")
+    restored = registry.get("ids-deleted")
+    assert restored.shapes.ids() == [0, 1]
+    assert _create_cube(restored) == 3
+
+
+def test_cleared_scene_keeps_id_counter_after_eviction(tmp_path):
+    registry = SceneRegistry(MCPService(), snapshot_dir=str(tmp_path))
+    service = registry.get("ids-cleared")
+    for _ in range(2):
+        _create_cube(service)
+    assert service.clear_scene()["success"]
+
+    registry.evict("ids-cleared")
+    restored = registry.get("ids-cleared")
+    assert len(restored.shapes) == 0
+    assert _create_cube(restored) == 2
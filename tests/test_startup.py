@@ -0,0 +1,51 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 导入app（含simulation_service等全部模块）的时间预算，python app.py 应在1秒内开始监听
+IMPORT_BUDGET_SECONDS = 1.0
+
+# 在子进程中拦截所有网络连接和域名解析并记录下来，再导入app
+_IMPORT_SCRIPT = """
+import json, socket, sys, time
+
+attempts = []
+
+def _blocked(kind):
+    def blocked(*args, **kwargs):
+        attempts.append([kind, repr(args[:2])])
+        raise OSError("测试中禁止网络访问")
+    return blocked
+
+_connect = socket.socket.connect
+def connect(self, address):
+    if self.family in (socket.AF_INET, socket.AF_INET6):
+        return _blocked("connect")(address)
+    return _connect(self, address)
+
+socket.socket.connect = connect
+socket.socket.connect_ex = lambda self, address: connect(self, address)
+socket.create_connection = _blocked("create_connection")
+socket.getaddrinfo = _blocked("getaddrinfo")
+
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "attempts": attempts}))
+"""
+
+
+def test_import_app_is_fast_and_offline(tmp_path):
+    env = dict(os.environ)
+    # Ollama和FastMCP都不可达：指向不会有服务的端口
+    env["OLLAMA_BASE_URL"] = "http://127.0.0.1:9"
+    env["PYTHONPATH"] = ROOT
+    result = subprocess.run([sys.executable, "-c", _IMPORT_SCRIPT], cwd=str(tmp_path), env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    assert report["attempts"] == []
+    assert report["seconds"] < IMPORT_BUDGET_SECONDS
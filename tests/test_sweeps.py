@@ -0,0 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import app as app_module
+import parameter_sweep
+
+
+SWEEP = {"simulation_type": "gravity", "grid": {"gravity": [9.81, 1.62]}, "base": {"time_steps": 20}, "wait": 5}
+
+
+def test_sweeps_are_private_to_their_session(monkeypatch):
+    monkeypatch.setattr(app_module, "start_background_warmup", lambda: None)
+    client = app_module.app.test_client()
+    owner = {"X-Session-ID": "sweep-owner"}
+    other = {"X-Session-ID": "sweep-other"}
+
+    result = client.post("/api/sweeps", json=SWEEP, headers=owner).get_json()
+    assert result["success"], result
+    sweep_id = result["data"]["sweep_id"]
+    assert "session_id" not in result["data"]
+
+    listed = client.get("/api/sweeps", headers=owner).get_json()["sweeps"]
+    assert [sweep["sweep_id"] for sweep in listed] == [sweep_id]
+    assert all("session_id" not in sweep for sweep in listed)
+    assert client.get("/api/sweeps", headers=other).get_json()["sweeps"] == []
+
+    assert client.get(f"/api/sweeps/{sweep_id}", headers=other).status_code == 404
+    assert client.delete(f"/api/sweeps/{sweep_id}", headers=other).status_code == 404
+    assert client.get(f"/api/sweeps/{sweep_id}", headers=owner).status_code == 200
+    assert client.delete(f"/api/sweeps/{sweep_id}", headers=owner).status_code == 200
+
+
+def test_rigid_results_after_cancel_are_discarded(monkeypatch):
+    manager = parameter_sweep.SweepManager(None)
+    # 线程池代替进程池，运行照常提交和完成
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(manager, "_pool", lambda: executor)
+    runs = [{"restitution": value} for value in (0.2, 0.5, 0.8)]
+    job = parameter_sweep.SweepJob("cancel-session", "rigid", runs, {"duration": 0.1})
+    job.cancel_event.set()
+    centers = np.array([[0.0, 1.0, 0.0]])
+    manager._run_rigid(job, centers, np.array([0.5]))
+    executor.shutdown(wait=True)
+    assert job.completed == 0
+    assert not job.errors
@@ -0,0 +1,57 @@
+import pytest
+
+import app as app_module
+from scene_registry import SceneRegistry
+from simulation_service import MCPService
+
+
+GRAVITY = {"time_steps": 20, "store_trajectory": True}
+
+
+def _stored_run(service):
+    service.create_shape("cube", {"size": 1.0})
+    result = service.run_simulation("gravity", dict(GRAVITY))
+    assert result["success"], result
+    return result["data"]["run_id"]
+
+
+def test_runs_are_private_to_their_scene():
+    owner, other = MCPService(), MCPService()
+    run_id = _stored_run(owner)
+
+    assert [meta["run_id"] for meta in owner.list_trajectory_runs()["runs"]] == [run_id]
+    assert owner.get_trajectory_frames(run_id)["success"]
+
+    assert other.list_trajectory_runs()["runs"] == []
+    assert not other.get_trajectory_frames(run_id)["success"]
+    with pytest.raises(KeyError):
+        other.build_scene_glb(run_id)
+
+
+def test_rest_returns_404_for_other_sessions(monkeypatch):
+    monkeypatch.setattr(app_module, "start_background_warmup", lambda: None)
+    client = app_module.app.test_client()
+    run_id = _stored_run(app_module.scene_registry.get("owner-session"))
+
+    owner = {"X-Session-ID": "owner-session"}
+    other = {"X-Session-ID": "other-session"}
+    assert client.get(f"/api/simulation/{run_id}/frames", headers=owner).status_code == 200
+    assert client.get(f"/api/simulation/{run_id}/frames", headers=other).status_code == 404
+    assert client.get(f"/api/scene.glb?run_id={run_id}", headers=other).status_code == 404
+    assert client.get("/api/simulation/runs", headers=other).get_json()["runs"] == []
+    assert [meta["run_id"] for meta in client.get("/api/simulation/runs", headers=owner).get_json()["runs"]] == [run_id]
+
+
+def test_runs_without_shapes_survive_eviction(tmp_path):
+    registry = SceneRegistry(MCPService(), snapshot_dir=str(tmp_path))
+    service = registry.get("nbody-session")
+    result = service.run_simulation("gravity", dict(GRAVITY))
+    assert result["success"], result
+    run_id = result["data"]["run_id"]
+    assert not service.shapes
+
+    assert registry.evict("nbody-session")
+    restored = registry.get("nbody-session")
+    assert restored is not service
+    assert [meta["run_id"] for meta in restored.list_trajectory_runs()["runs"]] == [run_id]
+    assert restored.get_trajectory_frames(run_id)["success"]
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+import trajectory_store
+from trajectory_recorder import create_stored
+from trajectory_store import TrajectoryStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TrajectoryStore(root=str(tmp_path))
+
+
+def test_writing_run_reads_only_committed_frames(store, monkeypatch):
+    monkeypatch.setattr(trajectory_store, "TRAJECTORY_FLUSH_FRAMES", 4)
+    writer = store.create_run("gravity", frames=10, bodies=1)
+    for index in range(3):
+        writer.write_frame(index, positions=np.full((1, 3), index + 1))
+    # 还没有刷新：预分配的帧不能以全零返回
+    assert store.read_frames(writer.run_id)["total_frames"] == 0
+    assert len(store.open_channel(writer.run_id, "positions")) == 0
+
+    writer.write_frame(3, positions=np.full((1, 3), 4))
+    frames = store.read_frames(writer.run_id)
+    assert frames["total_frames"] == 4
+    assert frames["positions"][:, 0, 0].tolist() == [1, 2, 3, 4]
+
+    writer.close()
+    assert store.read_frames(writer.run_id)["total_frames"] == 4
+
+
+def test_recorder_commits_frames_while_writing(store, monkeypatch):
+    monkeypatch.setattr(trajectory_store, "TRAJECTORY_FLUSH_FRAMES", 5)
+    recorder = create_stored(store, "gravity", steps=20, bodies=2, time_step=0.01)
+    for step in range(12):
+        recorder.record(positions=np.full((2, 3), step), velocities=np.zeros((2, 3)))
+    meta = store.get_meta(recorder.writer.run_id)
+    assert meta["status"] == "writing"
+    assert meta["frames"] == 10
+    positions = store.read_frames(recorder.writer.run_id)["positions"]
+    assert positions[:, 0, 0].tolist() == list(range(10))
+
+    recorder.close()
+    assert store.get_meta(recorder.writer.run_id)["frames"] == 12
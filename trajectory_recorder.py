@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+轨迹记录器 - 所有仿真共用的轨迹缓冲区：每个数据通道预分配一个 (帧, 物体, 分量) 数组，逐步写入，不再每步追加Python列表
+- stride：每stride步记录一帧（抽帧），帧数按 ceil(步数 / stride) 预分配
+- 环形模式：容量写满后覆盖最旧的帧，用于实时仿真等没有固定步数的运行
+- 直接写盘：传入轨迹存储的写入器时帧直接写进预分配的内存映射文件
+记录结果可导出为JSON响应（数组由serialization直接编码）、NPZ二进制或轨迹存储中的一次运行
+"""
+
+import io
+import math
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from trajectory_store import DEFAULT_CHANNELS, TrajectoryStore, TrajectoryWriter
+
+NPZ_CONTENT_TYPE = "application/octet-stream"
+
+
+def frame_count(steps: int, stride: int = 1) -> int:
+    """steps步按stride抽帧后的帧数（第0步总是被记录）"""
+    if stride < 1:
+        raise ValueError("stride必须为正整数")
+    return math.ceil(max(steps, 0) / stride)
+
+
+def encode_npz(arrays: Dict[str, Any]) -> bytes:
+    """数组字典编码为NPZ（numpy.load可直接读取）"""
+    buffer = io.BytesIO()
+    np.savez(buffer, **{name: np.asarray(value) for name, value in arrays.items()})
+    return buffer.getvalue()
+
+
+class TrajectoryRecorder:
+    """预分配的轨迹缓冲区；每次调用record算一步，只有第0、stride、2*stride...步写入"""
+
+    def __init__(self, frames: int, bodies: int, channels: Optional[Dict[str, int]] = None,
+                 stride: int = 1, ring: bool = False, dtype=np.float64,
+                 writer: Optional[TrajectoryWriter] = None):
+        if stride < 1:
+            raise ValueError("stride必须为正整数")
+        if ring and writer is not None:
+            raise ValueError("环形模式不能直接写盘")
+        if ring and frames < 1:
+            raise ValueError("环形模式的容量必须为正整数")
+        self.capacity = frames
+        self.bodies = bodies
+        self.channels = dict(channels or DEFAULT_CHANNELS)
+        self.stride = stride
+        self.ring = ring
+        self.writer = writer
+        if writer is not None:
+            # 写入器的内存映射文件已按 (帧, 物体, 分量) 预分配
+            self.arrays = {name: writer.arrays[name] for name in self.channels}
+        else:
+            self.arrays = {name: np.zeros((frames, bodies, dims), dtype=dtype)
+                           for name, dims in self.channels.items()}
+        self.steps = 0
+        self.recorded = 0
+
+    def __len__(self) -> int:
+        """保留的帧数（环形模式下不超过容量）"""
+        return min(self.recorded, self.capacity)
+
+    @property
+    def dropped(self) -> int:
+        """环形模式下被覆盖的帧数"""
+        return self.recorded - len(self)
+
+    def record(self, **channels) -> bool:
+        """记录一步，channels为 通道名 -> (物体, 分量) 数组；返回这一步是否写入了帧"""
+        step = self.steps
+        self.steps += 1
+        if step % self.stride:
+            return False
+        slot = self.recorded
+        if slot >= self.capacity:
+            if not self.ring:
+                raise IndexError(f"轨迹记录器已满: {self.capacity}帧")
+            slot %= self.capacity
+        # 单个物体的 (3,) 数组按广播写入 (1, 3) 的帧
+        for name, value in channels.items():
+            self.arrays[name][slot] = value
+        self.recorded += 1
+        if self.writer is not None:
+            self.writer.commit(self.recorded)
+        return True
+
+    def view(self, name: str) -> np.ndarray:
+        """按时间顺序的帧 (帧, 物体, 分量)；没有回绕时是缓冲区的视图，不复制"""
+        array = self.arrays[name]
+        if self.recorded <= self.capacity:
+            return array[:self.recorded]
+        head = self.recorded % self.capacity
+        return np.concatenate([array[head:], array[:head]])
+
+    def step_indices(self) -> np.ndarray:
+        """保留的各帧对应的步序号"""
+        first = self.recorded - len(self)
+        return np.arange(first, self.recorded, dtype=np.int64) * self.stride
+
+    def to_json(self, decimals: Optional[int] = None, squeeze: bool = False) -> Dict[str, np.ndarray]:
+        """JSON响应用的 通道名 -> 数组（由serialization直接编码，不转为嵌套列表）；
+        squeeze为true时去掉物体维（单个物体时每帧为 [x, y, z]）"""
+        result = {}
+        for name in self.channels:
+            values = self.view(name)
+            if decimals is not None:
+                values = np.round(values, decimals)
+            if squeeze and self.bodies == 1:
+                values = values[:, 0]
+            result[name] = values
+        return result
+
+    def to_npz(self) -> bytes:
+        """NPZ二进制：各通道 (帧, 物体, 分量) 数组和 step 步序号"""
+        return encode_npz({**{name: self.view(name) for name in self.channels}, "step": self.step_indices()})
+
+    def close(self) -> Dict[str, Any]:
+        """直接写盘时刷新并关闭写入器，返回运行元数据"""
+        if self.writer is None:
+            raise RuntimeError("记录器没有写入器")
+        return self.writer.close(frames=len(self))
+
+    def abort(self) -> None:
+        if self.writer is not None:
+            self.writer.abort()
+
+    def save(self, store: TrajectoryStore, simulation_type: str, time_step: float,
+             metadata: Optional[Dict[str, Any]] = None, dtype: str = "float32") -> Dict[str, Any]:
+        """把内存中保留的帧写入轨迹存储的一次新运行，返回运行元数据；
+        time_step为仿真步长，运行的帧间隔为 time_step * stride"""
+        writer = store.create_run(simulation_type, frames=len(self), bodies=self.bodies,
+                                  channels=self.channels, time_step=time_step * self.stride, dtype=dtype,
+                                  metadata={**(metadata or {}), "record_stride": self.stride,
+                                            "first_step": int(self.step_indices()[0]) if len(self) else 0})
+        try:
+            writer.write_frames(0, **{name: self.view(name) for name in self.channels})
+            return writer.close()
+        except Exception:
+            writer.abort()
+            raise
+
+
+def create_stored(store: TrajectoryStore, simulation_type: str, steps: int, bodies: int,
+                  time_step: float, stride: int = 1, metadata: Optional[Dict[str, Any]] = None,
+                  channels: Optional[Dict[str, int]] = None) -> TrajectoryRecorder:
+    """直接写盘的记录器：在轨迹存储中按抽帧后的帧数预分配一次运行"""
+    frames = frame_count(steps, stride)
+    writer = store.create_run(simulation_type, frames=frames, bodies=bodies,
+                              channels=channels, time_step=time_step * stride,
+                              metadata={**(metadata or {}), "record_stride": stride})
+    return TrajectoryRecorder(frames, bodies, channels, stride=stride, writer=writer)
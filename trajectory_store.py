@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+轨迹存储 - 基于内存映射的列式轨迹文件
+每次仿真运行(run_id)对应一个目录：meta.json + 每个数据通道一个 .npy 文件，
+读取时只映射请求的切片，不会把整次运行加载到内存
+"""
+
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Any
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 轨迹存储配置
+TRAJECTORY_DIR = os.environ.get(
+    "TRAJECTORY_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "trajectories")
+)
+TRAJECTORY_MAX_RUNS = int(os.environ.get("TRAJECTORY_MAX_RUNS", "50"))
+TRAJECTORY_MAX_AGE = float(os.environ.get("TRAJECTORY_MAX_AGE", str(24 * 3600)))
+TRAJECTORY_MAX_BYTES = int(os.environ.get("TRAJECTORY_MAX_BYTES", str(2 * 1024 ** 3)))
+# 写入中的运行每写入这么多帧刷新一次数据并更新元数据中已提交的帧数，读取只返回已提交的帧
+TRAJECTORY_FLUSH_FRAMES = int(os.environ.get("TRAJECTORY_FLUSH_FRAMES", "1000"))
+# 单次请求最多返回的帧数，防止一次切片拉取整个运行
+MAX_FRAMES_PER_REQUEST = int(os.environ.get("TRAJECTORY_MAX_FRAMES_PER_REQUEST", "10000"))
+
+# 默认数据通道：名称 -> 每个物体的分量数
+DEFAULT_CHANNELS = {"positions": 3, "velocities": 3}
+
+_RUN_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class TrajectoryWriter:
+    """单次运行的轨迹写入器，按帧写入内存映射文件"""
+
+    def __init__(self, store: "TrajectoryStore", run_id: str, path: str,
+                 meta: Dict[str, Any], arrays: Dict[str, np.memmap]):
+        self.store = store
+        self.run_id = run_id
+        self.path = path
+        self.meta = meta
+        self.arrays = arrays
+        self.frames_written = 0
+        self.closed = False
+
+    def write_frame(self, index: int, **channels) -> None:
+        """写入第index帧，channels为 通道名 -> (bodies, dims) 数组"""
+        for name, value in channels.items():
+            self.arrays[name][index] = value
+        self.commit(index + 1)
+
+    def write_frames(self, start: int, **channels) -> None:
+        """从start开始批量写入多帧，channels为 通道名 -> (frames, bodies, dims) 数组"""
+        count = 0
+        for name, block in channels.items():
+            count = len(block)
+            self.arrays[name][start:start + count] = block
+        self.commit(start + count)
+
+    def commit(self, frames: int) -> None:
+        """前frames帧已写完（由直接写入arrays的调用方通知）；距上次刷新超过 TRAJECTORY_FLUSH_FRAMES 帧时刷新"""
+        self.frames_written = max(self.frames_written, frames)
+        if self.frames_written - self.meta["frames"] >= TRAJECTORY_FLUSH_FRAMES:
+            self.flush()
+
+    def flush(self) -> None:
+        """刷新数据，再把已写入的帧数作为已提交帧数写入元数据"""
+        for array in self.arrays.values():
+            array.flush()
+        self.meta["frames"] = self.frames_written
+        self.store._write_meta(self.path, self.meta)
+
+    def close(self, frames: Optional[int] = None) -> Dict[str, Any]:
+        """刷新数据并写入最终元数据，返回运行元数据"""
+        if self.closed:
+            return self.meta
+        for array in self.arrays.values():
+            array.flush()
+        self.meta["frames"] = self.frames_written if frames is None else frames
+        self.meta["status"] = "complete"
+        self.meta["completed_at"] = time.time()
+        self.meta["bytes"] = self.store._directory_size(self.path)
+        self.store._write_meta(self.path, self.meta)
+        self.arrays.clear()
+        self.closed = True
+        self.store._writer_closed(self.run_id)
+        return self.meta
+
+    def abort(self) -> None:
+        """放弃本次写入并删除运行目录"""
+        self.arrays.clear()
+        self.closed = True
+        self.store._writer_closed(self.run_id)
+        self.store.delete_run(self.run_id)
+
+
+class TrajectoryStore:
+    """轨迹存储，负责运行的创建、切片读取以及保留/淘汰策略"""
+
+    def __init__(self, root: str = TRAJECTORY_DIR, max_runs: int = TRAJECTORY_MAX_RUNS,
+                 max_age: float = TRAJECTORY_MAX_AGE, max_bytes: int = TRAJECTORY_MAX_BYTES):
+        self.root = root
+        self.max_runs = max_runs
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._open_runs = set()
+
+    def create_run(self, simulation_type: str, frames: int, bodies: int,
+                   channels: Optional[Dict[str, int]] = None, time_step: float = 1.0,
+                   dtype: str = "float32", metadata: Optional[Dict[str, Any]] = None) -> TrajectoryWriter:
+        """创建新的运行并预分配列式文件"""
+        channels = channels or DEFAULT_CHANNELS
+        run_id = uuid.uuid4().hex
+        path = os.path.join(self.root, run_id)
+        os.makedirs(path, exist_ok=True)
+
+        arrays = {}
+        for name, dims in channels.items():
+            arrays[name] = np.lib.format.open_memmap(
+                os.path.join(path, f"{name}.npy"),
+                mode="w+",
+                dtype=np.dtype(dtype),
+                shape=(frames, bodies, dims)
+            )
+
+        meta = {
+            "run_id": run_id,
+            "simulation_type": simulation_type,
+            "frames": 0,
+            "capacity": frames,
+            "bodies": bodies,
+            "channels": dict(channels),
+            "dtype": dtype,
+            "time_step": time_step,
+            "status": "writing",
+            "created_at": time.time(),
+            "metadata": metadata or {}
+        }
+        self._write_meta(path, meta)
+
+        with self._lock:
+            self._open_runs.add(run_id)
+        self.enforce_retention()
+        logger.info(f"创建轨迹运行 {run_id}: {frames}帧 x {bodies}个物体")
+        return TrajectoryWriter(self, run_id, path, meta, arrays)
+
+    def get_meta(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """读取运行元数据，不存在时返回None"""
+        path = self._run_path(run_id)
+        if not path:
+            return None
+        try:
+            with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def list_runs(self) -> List[Dict[str, Any]]:
+        """列出所有运行的元数据，按创建时间倒序"""
+        if not os.path.isdir(self.root):
+            return []
+        runs = []
+        for run_id in os.listdir(self.root):
+            meta = self.get_meta(run_id)
+            if meta:
+                runs.append(meta)
+        runs.sort(key=lambda m: m.get("created_at", 0), reverse=True)
+        return runs
+
+    def read_frames(self, run_id: str, start: int = 0, stop: Optional[int] = None,
+                    stride: int = 1, channels: Optional[List[str]] = None) -> Dict[str, Any]:
+        """按 [start:stop:stride] 读取帧切片，只映射被访问的页面"""
+        meta = self.get_meta(run_id)
+        if not meta:
+            raise KeyError(f"轨迹运行不存在: {run_id}")
+        if stride < 1:
+            raise ValueError("stride必须为正整数")
+
+        # 写入中的运行只读已提交的帧，预分配但未写入的帧不返回
+        total = meta["frames"]
+        start, stop, _ = slice(start, stop).indices(total)
+        if stop > start and (stop - start + stride - 1) // stride > MAX_FRAMES_PER_REQUEST:
+            stop = start + MAX_FRAMES_PER_REQUEST * stride
+
+        names = channels or list(meta["channels"].keys())
+        path = self._run_path(run_id)
+        data = {}
+        for name in names:
+            if name not in meta["channels"]:
+                raise ValueError(f"未知的数据通道: {name}")
+            array = np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            data[name] = np.array(array[start:stop:stride])
+
+        frame_indices = np.arange(start, stop, stride)
+        return {
+            "run_id": run_id,
+            "simulation_type": meta["simulation_type"],
+            "start": start,
+            "stop": stop,
+            "stride": stride,
+            "total_frames": total,
+            "bodies": meta["bodies"],
+            "time": frame_indices * meta["time_step"],
+            **data
+        }
+
+    def open_channel(self, run_id: str, name: str) -> np.memmap:
+        """以只读内存映射打开整个数据通道 (frames, bodies, dims)，只包含已提交的帧"""
+        meta = self.get_meta(run_id)
+        if not meta:
+            raise KeyError(f"轨迹运行不存在: {run_id}")
+        if name not in meta["channels"]:
+            raise ValueError(f"未知的数据通道: {name}")
+        array = np.load(os.path.join(self._run_path(run_id), f"{name}.npy"), mmap_mode="r")
+        return array[:meta["frames"]]
+
+    def delete_run(self, run_id: str) -> bool:
+        """删除指定运行"""
+        path = self._run_path(run_id)
+        if not path or not os.path.isdir(path):
+            return False
+        shutil.rmtree(path, ignore_errors=True)
+        return True
+
+    def enforce_retention(self) -> List[str]:
+        """按数量、时间和总字节数淘汰旧运行，正在写入的运行不会被淘汰"""
+        with self._lock:
+            open_runs = set(self._open_runs)
+        runs = [m for m in self.list_runs() if m["run_id"] not in open_runs]
+        now = time.time()
+        evicted = []
+
+        # 过期运行
+        for meta in list(runs):
+            if self.max_age and now - meta.get("created_at", now) > self.max_age:
+                evicted.append(meta["run_id"])
+                runs.remove(meta)
+
+        # 超出数量上限（最旧的优先淘汰）
+        keep = max(self.max_runs - len(open_runs), 0)
+        while len(runs) > keep:
+            evicted.append(runs.pop()["run_id"])
+
+        # 超出总字节数上限
+        total = sum(m.get("bytes", 0) for m in runs)
+        while runs and total > self.max_bytes:
+            meta = runs.pop()
+            total -= meta.get("bytes", 0)
+            evicted.append(meta["run_id"])
+
+        for run_id in evicted:
+            self.delete_run(run_id)
+        if evicted:
+            logger.info(f"淘汰轨迹运行: {evicted}")
+        return evicted
+
+    def _run_path(self, run_id: str) -> Optional[str]:
+        """校验run_id并返回其目录，防止路径穿越"""
+        if not isinstance(run_id, str) or not _RUN_ID_PATTERN.match(run_id):
+            return None
+        return os.path.join(self.root, run_id)
+
+    def _writer_closed(self, run_id: str) -> None:
+        with self._lock:
+            self._open_runs.discard(run_id)
+
+    @staticmethod
+    def _write_meta(path: str, meta: Dict[str, Any]) -> None:
+        tmp_path = os.path.join(path, "meta.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(path, "meta.json"))
+
+    @staticmethod
+    def _directory_size(path: str) -> int:
+        return sum(
+            os.path.getsize(os.path.join(path, name))
+            for name in os.listdir(path)
+            if os.path.isfile(os.path.join(path, name))
+        )
+
+
+# 全局轨迹存储实例
+trajectory_store = TrajectoryStore()